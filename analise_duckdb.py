@@ -3,50 +3,68 @@
 🦆 ANÁLISE COM DUCKDB - SUPER RÁPIDO
 📊 SQL nativo em arquivos Parquet
 ⚡ Processamento em segundos mesmo com milhões de registros
+🔁 Resultados voltam como Polars (.pl(), via Arrow e sem pandas) e frames Polars
+   entram no SQL como tabelas virtuais (registrar_frame)
 """
 
-import duckdb
-import pandas as pd
 import plotly.express as px
+import polars as pl
 from pathlib import Path
 
-def conectar_duckdb(arquivo_parquet: str = "dados.parquet"):
-    """Conecta DuckDB diretamente ao arquivo Parquet"""
+from busca_empresas import IndiceBuscaEmpresas
+from pool_duckdb import PoolDuckDB
+from resumos_duckdb import (atualizar_resumos, estatisticas_basicas, estatisticas_tribunal,
+                            meses_do_arquivo, meses_resumidos, pool_resumos, top_empresas as top_empresas_resumo)
+
+ARQUIVO_CNAE = "tabela_cnae_classe_subclasse.csv"
+
+# Consultas comuns sobre a view do Parquet, preparadas uma vez por pool (valores sempre como parâmetros);
+# estatísticas, top empresas e tribunais vêm dos resumos materializados (resumos_duckdb.py)
+CONSULTAS = {
+    'nomes_distintos': 'SELECT DISTINCT "ÓRGÃO" FROM litigantes WHERE "ÓRGÃO" IS NOT NULL',
+    'buscar_empresa': """
+        SELECT 
+            "ÓRGÃO",
+            SUM("NOVOS") as total_novos,
+            COUNT(*) as registros,
+            SUM("NOVOS") * $2 as receita_estimada
+        FROM litigantes 
+        WHERE "ÓRGÃO" IN (SELECT UNNEST($1::VARCHAR[]))
+        AND "NOVOS" > 0
+        GROUP BY "ÓRGÃO"
+        ORDER BY total_novos DESC
+    """,
+}
+
+def conectar_duckdb(arquivo_parquet: str = "dados.parquet") -> PoolDuckDB:
+    """Pool DuckDB (banco de resumos) com a view 'litigantes', consultas preparadas e resumos em dia"""
     
     if not Path(arquivo_parquet).exists():
         print(f"❌ Arquivo {arquivo_parquet} não encontrado")
         print("💡 Execute primeiro: python analise_robusta.py")
         return None
     
-    # DuckDB conecta diretamente ao Parquet!
-    conn = duckdb.connect()
-    
-    # Registrar o arquivo como uma tabela
-    conn.execute(f"""
-        CREATE VIEW litigantes AS 
-        SELECT * FROM read_parquet('{arquivo_parquet}')
-    """)
-    
-    print("✅ DuckDB conectado ao Parquet")
-    return conn
+    # Pool compartilhado do processo: a view só é recriada se o arquivo mudar
+    pool = pool_resumos()
+    if pool.registrar_parquet('litigantes', arquivo_parquet):
+        print("✅ DuckDB conectado ao Parquet")
+    for nome, sql in CONSULTAS.items():
+        if not pool.preparada(nome):
+            pool.preparar(nome, sql)
+    
+    # Resumos materializados: só relê o Parquet se ele mudou desde o último resumo
+    atualizar_resumos(pool, arquivo_parquet)
+    return pool
 
-def consultas_rapidas(conn):
-    """Consultas SQL super rápidas"""
+def consultas_rapidas(conn: PoolDuckDB, referencia=None):
+    """Consultas SQL super rápidas: estatísticas, top 20 e tribunais lidos dos resumos do mês"""
     
     print("🚀 EXECUTANDO CONSULTAS SQL ULTRA-RÁPIDAS")
     print("=" * 60)
     
     # 1. Estatísticas básicas
     print("\n📊 ESTATÍSTICAS BÁSICAS:")
-    result = conn.execute("""
-        SELECT 
-            COUNT(*) as total_registros,
-            COUNT(DISTINCT "ÓRGÃO") as empresas_unicas,
-            SUM("NOVOS") as total_novos,
-            AVG("NOVOS") as media_novos
-        FROM litigantes 
-        WHERE "NOVOS" > 0
-    """).fetchone()
+    result = estatisticas_basicas(conn, referencia).fetchone()
     
     print(f"Total registros: {result[0]:,}")
     print(f"Empresas únicas: {result[1]:,}")
@@ -55,65 +73,66 @@ def consultas_rapidas(conn):
     
     # 2. Top 20 empresas
     print("\n🏆 TOP 20 EMPRESAS:")
-    top_empresas = conn.execute("""
-        SELECT 
-            "ÓRGÃO",
-            SUM("NOVOS") as total_novos,
-            COUNT(*) as registros,
-            AVG("NOVOS") as media_novos
-        FROM litigantes 
-        WHERE "NOVOS" > 0
-        GROUP BY "ÓRGÃO"
-        ORDER BY total_novos DESC
-        LIMIT 20
-    """).fetchdf()
+    top_empresas = top_empresas_resumo(conn, 20, referencia).pl().rename({'empresa': 'ÓRGÃO'})
     
-    print(top_empresas.to_string(index=False))
+    with pl.Config(tbl_rows=-1, tbl_hide_dataframe_shape=True, fmt_str_lengths=60):
+        print(top_empresas)
     
     # 3. Análise por tribunal
     print("\n⚖️ ANÁLISE POR TRIBUNAL:")
-    tribunal_stats = conn.execute("""
-        SELECT 
-            "TRIBUNAL",
-            SUM("NOVOS") as total_novos,
-            COUNT(DISTINCT "ÓRGÃO") as empresas_unicas,
-            COUNT(*) as registros
-        FROM litigantes 
-        GROUP BY "TRIBUNAL"
-        ORDER BY total_novos DESC
-    """).fetchdf()
+    tribunal_stats = estatisticas_tribunal(conn, referencia).pl().rename({'tribunal': 'TRIBUNAL'})
     
-    print(tribunal_stats.to_string(index=False))
+    with pl.Config(tbl_rows=-1, tbl_hide_dataframe_shape=True):
+        print(tribunal_stats)
     
     return top_empresas, tribunal_stats
 
-def buscar_empresa_sql(conn, empresa_nome: str):
+def novos_por_classe_cnae(conn: PoolDuckDB, df_cnae: pl.DataFrame, referencia=None) -> pl.DataFrame:
+    """Novos processos por classe CNAE: resumo do mês JOIN a dimensão CNAE do Polars, sem cópia nem pandas"""
+    conn.registrar_frame('dim_cnae', df_cnae)
+    ano, mes = referencia or meses_resumidos(conn)[-1]
+    return conn.consultar("""
+        SELECT c.Nome_Classe AS classe, SUM(r.novos)::BIGINT AS total_novos, SUM(r.registros)::BIGINT AS registros
+        FROM resumo_segmento_cnae r
+        JOIN dim_cnae c ON lpad(r.cnae, 7, '0') = c.Codigo_Subclasse
+        WHERE r.ano = ? AND r.mes = ?
+        GROUP BY c.Nome_Classe
+        ORDER BY total_novos DESC
+    """, [ano, mes]).pl()
+
+def indice_empresas_sql(conn: PoolDuckDB) -> IndiceBuscaEmpresas:
+    """Índice de busca sobre os nomes distintos (montado uma vez por conexão)"""
+    nomes = conn.executar('nomes_distintos').fetchall()
+    indice = IndiceBuscaEmpresas.de_nomes(nome for (nome,) in nomes)
+    print(f"🔍 Índice de busca: {len(indice):,} nomes distintos")
+    return indice
+
+def buscar_empresa_sql(conn: PoolDuckDB, empresa_nome: str, indice: IndiceBuscaEmpresas = None,
+                       preco_processo: float = 75.0):
     """Busca empresa específica com SQL"""
     
     print(f"\n🔍 BUSCANDO: {empresa_nome}")
     print("=" * 50)
     
-    result = conn.execute(f"""
-        SELECT 
-            "ÓRGÃO",
-            SUM("NOVOS") as total_novos,
-            COUNT(*) as registros,
-            SUM("NOVOS") * 75.0 as receita_estimada
-        FROM litigantes 
-        WHERE UPPER("ÓRGÃO") LIKE UPPER('%{empresa_nome}%')
-        AND "NOVOS" > 0
-        GROUP BY "ÓRGÃO"
-        ORDER BY total_novos DESC
-    """).fetchdf()
+    # Nomes resolvidos no índice (sem acentos); o SQL só compara igualdade
+    if indice is None:
+        indice = indice_empresas_sql(conn)
+    nomes = indice.nomes_correspondentes(empresa_nome)
+    
+    result = conn.executar('buscar_empresa', [nomes, preco_processo]).pl()
     
     if len(result) == 0:
         print(f"❌ Nenhuma empresa encontrada com '{empresa_nome}'")
+        sugestoes = indice.buscar(empresa_nome, limite=5)
+        if sugestoes:
+            print("💡 Você quis dizer: " + ", ".join(s['nome'] for s in sugestoes))
     else:
         print(f"✅ {len(result)} empresa(s) encontrada(s):")
-        print(result.to_string(index=False))
+        with pl.Config(tbl_rows=-1, tbl_hide_dataframe_shape=True, fmt_str_lengths=60):
+            print(result)
         
         total_processos = result['total_novos'].sum()
-        receita_total = total_processos * 75.0
+        receita_total = total_processos * preco_processo
         print(f"\n💰 RESUMO FINANCEIRO:")
         print(f"Total processos: {total_processos:,}")
         print(f"Receita estimada: R$ {receita_total:,.2f}")
@@ -126,24 +145,33 @@ def main():
     print("=" * 60)
     
     # Conectar ao arquivo
-    conn = conectar_duckdb()
+    arquivo = "dados.parquet"
+    conn = conectar_duckdb(arquivo)
     if not conn:
         return
     
-    # Executar consultas
-    top_empresas, tribunal_stats = consultas_rapidas(conn)
+    # Executar consultas (resumos do mês deste arquivo)
+    top_empresas, tribunal_stats = consultas_rapidas(conn, meses_do_arquivo(conn, arquivo)[-1])
+    
+    # Dimensão CNAE (Polars) consultada direto no SQL
+    if Path(ARQUIVO_CNAE).exists():
+        df_cnae = pl.read_csv(ARQUIVO_CNAE, separator=';', infer_schema_length=0)
+        print("\n🏭 NOVOS PROCESSOS POR CLASSE CNAE:")
+        with pl.Config(tbl_rows=15, tbl_hide_dataframe_shape=True, fmt_str_lengths=60):
+            print(novos_por_classe_cnae(conn, df_cnae, meses_do_arquivo(conn, arquivo)[-1]).head(15))
     
     # Exemplos de busca
-    buscar_empresa_sql(conn, "BANCO")
-    buscar_empresa_sql(conn, "ITAU")
-    buscar_empresa_sql(conn, "TELEFONICA")
-    buscar_empresa_sql(conn, "PETROBRAS")
+    indice = indice_empresas_sql(conn)
+    buscar_empresa_sql(conn, "BANCO", indice)
+    buscar_empresa_sql(conn, "ITAU", indice)
+    buscar_empresa_sql(conn, "TELEFONICA", indice)
+    buscar_empresa_sql(conn, "PETROBRAS", indice)
     
     # Gerar gráficos
     print("\n📊 Gerando gráficos...")
     
     fig1 = px.bar(
-        top_empresas.head(15),
+        top_empresas.head(15).to_dict(as_series=False),
         x='total_novos',
         y='ÓRGÃO',
         title='Top 15 Empresas - DuckDB Analysis'
@@ -152,7 +180,7 @@ def main():
     fig1.write_html("duckdb_top_empresas.html")
     
     fig2 = px.pie(
-        tribunal_stats,
+        tribunal_stats.to_dict(as_series=False),
         values='total_novos',
         names='TRIBUNAL',
         title='Distribuição por Tribunal - DuckDB Analysis'
@@ -163,11 +191,11 @@ def main():
     
     # SQL interativo
     print("\n💡 Para consultas personalizadas:")
-    print("import duckdb")
-    print("conn = duckdb.connect()")
-    print("conn.execute('SELECT * FROM read_parquet(\"dados.parquet\") LIMIT 10').fetchdf()")
+    print("from analise_duckdb import conectar_duckdb")
+    print("conn = conectar_duckdb('dados.parquet')")
+    print("conn.consultar('SELECT * FROM litigantes WHERE \"TRIBUNAL\" = ? LIMIT 10', ['TJSP']).pl()")
     
-    conn.close()
+    conn.fechar()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -10,48 +10,33 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-import requests
 from pathlib import Path
 import time
 from typing import Optional
 
-def download_dados_drive(file_id: str = "1Ns07hTZaK4Ry6bFEHvLACZ5tHJ7b-C2E", 
+from busca_empresas import IndiceBuscaEmpresas
+from esbocos_estatisticos import distintos_por_grupo
+from download_drive import FILE_ID_PADRAO, ErroDownload, baixar_arquivo_drive
+from validacao_parquet import validar_parquet
+
+def download_dados_drive(file_id: str = FILE_ID_PADRAO, 
                         output_path: str = "dados.parquet") -> bool:
-    """Download robusto do Google Drive"""
-    
-    urls = [
-        f"https://drive.usercontent.google.com/download?id={file_id}&export=download&authuser=0",
-        f"https://drive.google.com/uc?id={file_id}&export=download&confirm=t"
-    ]
-    
-    for i, url in enumerate(urls, 1):
-        try:
-            print(f"🔄 Tentativa {i}: Baixando arquivo...")
-            
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-            
-            with open(output_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        
-                        if total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            print(f"\r📥 Progresso: {progress:.1f}%", end="", flush=True)
-            
-            file_size = Path(output_path).stat().st_size / (1024**3)
-            print(f"\n✅ Download concluído: {file_size:.1f}GB")
-            return True
-            
-        except Exception as e:
-            print(f"❌ Tentativa {i} falhou: {e}")
-    
-    return False
+    """Download robusto do Google Drive (retomável, paralelo e com cache local)"""
+    
+    def mostrar_progresso(baixados: int, total: int):
+        if total > 0:
+            print(f"\r📥 Progresso: {baixados / total * 100:.1f}%", end="", flush=True)
+    
+    try:
+        print("🔄 Baixando arquivo (ou reaproveitando o cache local)...")
+        baixar_arquivo_drive(file_id, destino=Path(output_path), progresso=mostrar_progresso)
+    except ErroDownload as e:
+        print(f"\n❌ Download falhou: {e}")
+        return False
+    
+    file_size = Path(output_path).stat().st_size / (1024**3)
+    print(f"\n✅ Download concluído: {file_size:.1f}GB")
+    return True
 
 def carregar_dados_completos(arquivo_path: str = "dados.parquet", 
                            limite: Optional[int] = None) -> pl.DataFrame:
@@ -63,8 +48,8 @@ def carregar_dados_completos(arquivo_path: str = "dados.parquet",
     # Lazy loading - não carrega na memória ainda
     df_lazy = pl.scan_parquet(arquivo_path)
     
-    # Verificar total sem carregar
-    total_rows = df_lazy.select(pl.len()).collect().item()
+    # Verificar total sem carregar (só o rodapé do Parquet)
+    total_rows = validar_parquet(arquivo_path)['linhas']
     print(f"📊 Total de registros: {total_rows:,}")
     
     # Carregamento estratégico
@@ -112,8 +97,8 @@ def analise_top_empresas(df: pl.DataFrame, top_n: int = 50) -> pl.DataFrame:
     print(f"✅ Análise concluída: {len(top_empresas)} empresas")
     return top_empresas
 
-def gerar_relatorio_completo(df: pl.DataFrame, salvar_html: bool = True):
-    """Gera relatório completo com gráficos"""
+def gerar_relatorio_completo(df: pl.DataFrame, salvar_html: bool = True, aproximado: bool = False):
+    """Gera relatório completo com gráficos (aproximado: empresas por tribunal via HyperLogLog)"""
     
     print("📊 Gerando relatório completo...")
     
@@ -152,16 +137,31 @@ def gerar_relatorio_completo(df: pl.DataFrame, salvar_html: bool = True):
     
     # 3. Análise por tribunal
     if 'TRIBUNAL' in df.columns:
-        tribunal_stats = (
-            df
-            .group_by('TRIBUNAL')
-            .agg([
-                pl.col('NOVOS').sum().alias('total_novos'),
-                pl.col('ÓRGÃO').n_unique().alias('empresas_unicas'),
-                pl.len().alias('registros')
-            ])
-            .sort('total_novos', descending=True)
-        )
+        if aproximado:
+            # Registradores HyperLogLog por tribunal em vez de um conjunto de nomes por tribunal
+            tribunal_stats = (
+                df
+                .group_by('TRIBUNAL')
+                .agg([
+                    pl.col('NOVOS').sum().alias('total_novos'),
+                    pl.len().alias('registros')
+                ])
+                .join(distintos_por_grupo(df, 'TRIBUNAL', 'ÓRGÃO').rename({'ÓRGÃO_distintos': 'empresas_unicas'}),
+                      on='TRIBUNAL', how='left')
+                .select(['TRIBUNAL', 'total_novos', 'empresas_unicas', 'registros'])
+                .sort('total_novos', descending=True)
+            )
+        else:
+            tribunal_stats = (
+                df
+                .group_by('TRIBUNAL')
+                .agg([
+                    pl.col('NOVOS').sum().alias('total_novos'),
+                    pl.col('ÓRGÃO').n_unique().alias('empresas_unicas'),
+                    pl.len().alias('registros')
+                ])
+                .sort('total_novos', descending=True)
+            )
         
         print("\n⚖️ ANÁLISE POR TRIBUNAL:")
         print(tribunal_stats.to_pandas().to_string(index=False))
@@ -177,24 +177,28 @@ def gerar_relatorio_completo(df: pl.DataFrame, salvar_html: bool = True):
             print("📄 Gráfico salvo: tribunais.html")
 
 def simulador_financeiro(df: pl.DataFrame, empresa_busca: str, 
-                        preco_processo: float = 50.0):
+                        preco_processo: float = 50.0,
+                        indice: Optional[IndiceBuscaEmpresas] = None):
     """Simulador financeiro para empresa específica"""
     
     print(f"\n💰 SIMULADOR FINANCEIRO - {empresa_busca}")
     print("="*50)
     
-    # Buscar empresa (busca flexível)
+    # Buscar empresa (busca flexível, sem acentos) no índice de nomes distintos
+    if indice is None:
+        indice = IndiceBuscaEmpresas.de_nomes(df['ÓRGÃO'].unique().to_list())
     empresa_data = df.filter(
-        pl.col('ÓRGÃO').str.to_lowercase().str.contains(empresa_busca.lower())
+        pl.col('ÓRGÃO').is_in(indice.nomes_correspondentes(empresa_busca))
     )
     
     if len(empresa_data) == 0:
         print(f"❌ Nenhuma empresa encontrada com '{empresa_busca}'")
-        # Sugerir empresas similares
-        empresas_sample = df.select('ÓRGÃO').unique().head(10)
-        print("💡 Empresas disponíveis (amostra):")
-        for empresa in empresas_sample['ÓRGÃO']:
-            print(f"  • {empresa}")
+        # Sugerir empresas com grafia parecida
+        sugestoes = indice.buscar(empresa_busca, limite=10)
+        if sugestoes:
+            print("💡 Empresas com nome parecido:")
+            for sugestao in sugestoes:
+                print(f"  • {sugestao['nome']}")
         return
     
     # Calcular métricas financeiras
@@ -247,9 +251,10 @@ def main():
     
     # 4. Exemplos de simulação
     print("\n💰 EXEMPLOS DE SIMULAÇÃO FINANCEIRA:")
-    simulador_financeiro(df, "BANCO", 75.0)
-    simulador_financeiro(df, "ITAU", 100.0)
-    simulador_financeiro(df, "TELEFONICA", 60.0)
+    indice = IndiceBuscaEmpresas.de_nomes(df['ÓRGÃO'].unique().to_list())
+    simulador_financeiro(df, "BANCO", 75.0, indice)
+    simulador_financeiro(df, "ITAU", 100.0, indice)
+    simulador_financeiro(df, "TELEFONICA", 60.0, indice)
     
     print("\n✅ Análise completa concluída!")
     print("📄 Arquivos gerados: top_empresas.html, tribunais.html")
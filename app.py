@@ -17,17 +17,46 @@ from datetime import datetime
 from functools import wraps
 
 import polars as pl
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, flash, g, has_request_context, Response
+from flask.json.provider import DefaultJSONProvider
 from werkzeug.security import generate_password_hash, check_password_hash
 import requests
 import tempfile
+import time
 import re
 from pathlib import Path
 import numpy as np
 from typing import Dict, List, Tuple, Optional
 import json
+import threading
+
+from versoes_dataset import RegistroVersoes
+from historico_mensal import HistoricoMensal, detectar_mes_referencia
+from dimensao_empresas import construir_dimensao
+from busca_empresas import IndiceBuscaEmpresas
+from controle_admissao import ControleAdmissao, AdmissaoRecusada, estimar_custo
+from tabulacao_cruzada import tabulacao_cruzada
+from validacao_parquet import validar_parquet
+from consultas_duckdb import BACKEND_CONSULTAS, abrir_consultas_duckdb, atualizar_resumos_extrato
+from esbocos_estatisticos import EsbocosDimensoes
+from gerador_sintetico import gerar_dataset
+from instrumentacao import Instrumentacao
+import log_estruturado
+from log_estruturado import obter_logger
+
+log = obter_logger('app')
+
+# Etapas por requisição, histogramas (/metrics) e perfil das requisições lentas
+instrumentacao = Instrumentacao()
+
+class ProvedorJSONInstrumentado(DefaultJSONProvider):
+    """Serialização das respostas JSON medida como etapa 'serializacao'"""
+    def dumps(self, obj, **kwargs):
+        with instrumentacao.etapa('serializacao'):
+            return super().dumps(obj, **kwargs)
 
 app = Flask(__name__)
+app.json = ProvedorJSONInstrumentado(app)
 app.secret_key = os.environ.get('SECRET_KEY', 'pdpj2024-simulador-secreto')
 
 # Configurações globais
@@ -64,18 +93,70 @@ class DataManager:
     def __init__(self):
         self.parquet_file = "dados_grandes_litigantes.parquet"
         self.cnae_file = "tabela_cnae_classe_subclasse.csv"
-        self.df = None
-        self.df_cnae = None
+        # Dados versionados: cada carga publica uma nova versão (troca atômica)
+        self.versoes = RegistroVersoes()
+        # Apenas uma carga por vez; as requisições seguem na versão atual
+        self._carga_lock = threading.Lock()
+        # Histórico mensal particionado (um extrato ingerido por mês de referência)
+        self.historico = HistoricoMensal()
+    
+    def versao_em_uso(self):
+        """Versão fixada pela requisição atual (ou a versão mais recente fora de requisições)"""
+        if has_request_context() and 'versao_dataset' in g:
+            return g.versao_dataset
+        return self.versoes.atual
+    
+    @property
+    def numero_versao(self):
+        """Número da versão em uso: acompanha os empresa_id devolvidos (IDs valem só nessa versão)"""
+        versao = self.versao_em_uso()
+        return versao.numero if versao is not None else None
+    
+    @property
+    def df(self):
+        versao = self.versao_em_uso()
+        return versao.df if versao is not None else None
+    
+    @property
+    def df_cnae(self):
+        versao = self.versao_em_uso()
+        return versao.df_cnae if versao is not None else None
+    
+    @property
+    def dim_empresas(self):
+        versao = self.versao_em_uso()
+        return versao.indices.get('empresas') if versao is not None else None
+    
+    @property
+    def indice_busca(self):
+        versao = self.versao_em_uso()
+        return versao.indices.get('busca') if versao is not None else None
+    
+    @property
+    def consultas(self):
+        """Backend de consultas da versão (None = Polars sobre o DataFrame em memória)"""
+        versao = self.versao_em_uso()
+        return versao.indices.get('consultas') if versao is not None else None
+    
+    @property
+    def esbocos(self):
+        """Esboços HyperLogLog/KLL por valor de dimensão (modo aproximado das estatísticas)"""
+        versao = self.versao_em_uso()
+        return versao.indices.get('esbocos') if versao is not None else None
+    
+    @property
+    def carregando(self):
+        return self._carga_lock.locked()
         
     def load_cnae_data(self):
         """Carrega dados de CNAE com descrições"""
         try:
             if not os.path.exists(self.cnae_file):
-                print(f"⚠️ Arquivo CNAE não encontrado: {self.cnae_file}")
+                log.warning('⚠️ Arquivo CNAE não encontrado', extra={'arquivo': self.cnae_file})
                 return None
                 
             # Carregar com tipos corretos
-            self.df_cnae = pl.read_csv(
+            df_cnae = pl.read_csv(
                 self.cnae_file,
                 separator=";",
                 schema_overrides={
@@ -86,111 +167,162 @@ class DataManager:
                 }
             )
             
-            print(f"✅ Dados CNAE carregados: {len(self.df_cnae):,} registros")
-            return self.df_cnae
+            log.info('✅ Dados CNAE carregados', extra={'registros': len(df_cnae)})
+            return df_cnae
             
         except Exception as e:
-            print(f"❌ Erro ao carregar dados CNAE: {e}")
+            log.error('❌ Erro ao carregar dados CNAE', exc_info=True)
             return None
     
 
     
-    def load_data(self, limit=0):
-        """Carrega dados do arquivo parquet local"""
+    def load_data(self, limit=0, arquivo=None):
+        """Carrega dados do arquivo parquet local numa nova versão e publica ao final"""
+        with self._carga_lock:
+            return self._carregar_nova_versao(limit, arquivo or self.parquet_file)
+    
+    def _carregar_nova_versao(self, limit, arquivo):
+        """Monta a nova versão fora do caminho das requisições (a versão atual segue servindo)"""
         try:
             load_all = (limit == 0)
             
             # Verificar se arquivo existe
-            if not os.path.exists(self.parquet_file):
-                print(f"❌ Arquivo não encontrado: {self.parquet_file}")
-                update_progress(30, 'Arquivo não encontrado', 'Gerando dados de demonstração')
-                return self._create_fallback_data(limit if not load_all else 50000)
+            if not os.path.exists(arquivo):
+                log.error('❌ Arquivo não encontrado', extra={'arquivo': arquivo})
+                return self._falha_na_carga(limit if not load_all else 50000)
             
-            print(f"📂 Procurando arquivo parquet local...")
-            update_progress(20, 'Procurando arquivo parquet local...', f'Verificando {self.parquet_file}')
+            update_progress(20, 'Procurando arquivo parquet local...', f'Verificando {arquivo}')
             
             # Verificar tamanho do arquivo
-            file_size = os.path.getsize(self.parquet_file) / (1024 * 1024)  # MB
-            print(f"📂 Arquivo encontrado: {self.parquet_file}")
-            print(f"📊 Tamanho do arquivo: {file_size:.1f} MB")
+            file_size = os.path.getsize(arquivo) / (1024 * 1024)  # MB
+            log.info('📂 Arquivo encontrado', extra={'arquivo': arquivo, 'tamanho_mb': round(file_size, 1)})
             update_progress(30, 'Arquivo local encontrado!', f'{file_size:.1f} MB')
             
+            # Rodapé Parquet: arquivo íntegro e com as colunas usadas pela API, sem ler os dados
+            info_parquet = validar_parquet(arquivo, ['NOME', 'TRIBUNAL', 'NOVOS'])
+            log.debug('🧾 Rodapé válido', extra={'registros': info_parquet['linhas'],
+                                                  'colunas': len(info_parquet['colunas'])})
+            
             # Carregar dados
-            print(f"📊 Progresso: 40.0% - Carregando dados...")
             update_progress(40, 'Carregando dados...', 'Lendo arquivo parquet')
             
             if load_all:
-                print("🔥 Carregando TODOS os registros do arquivo...")
                 update_progress(60, 'Processando registros...', 'Carregando dados completos')
-                self.df = pl.read_parquet(self.parquet_file)
-                update_progress(75, 'Carregando CNAEs...', f'{len(self.df):,} registros carregados')
-                print(f"✅ Dados COMPLETOS carregados: {len(self.df):,} registros")
+                df = pl.read_parquet(arquivo)
+                update_progress(75, 'Carregando CNAEs...', f'{len(df):,} registros carregados')
+                log.info('✅ Dados COMPLETOS carregados', extra={'registros': len(df)})
             else:
-                print(f"📊 Carregando {limit:,} registros...")
                 update_progress(60, 'Processando registros...', f'Limitando a {limit:,} registros')
-                df_lazy = pl.scan_parquet(self.parquet_file)
-                self.df = df_lazy.head(limit).collect()
-                update_progress(75, 'Carregando CNAEs...', f'{len(self.df):,} registros processados')
-                print(f"✅ Dados carregados: {len(self.df):,} registros")
+                df_lazy = pl.scan_parquet(arquivo)
+                df = df_lazy.head(limit).collect()
+                update_progress(75, 'Carregando CNAEs...', f'{len(df):,} registros processados')
+                log.info('✅ Dados carregados', extra={'registros': len(df), 'limite': limit})
             
             # Carregar dados CNAE
-            self.load_cnae_data()
+            df_cnae = self.load_cnae_data()
             update_progress(90, 'Finalizando carregamento...', 'CNAEs integrados')
             
-            return self.df
+            # Ingerir extrato mensal completo no histórico (ex.: *_202504.parquet; ignorado se já ingerido)
+            if load_all and detectar_mes_referencia(arquivo):
+                try:
+                    self.historico.ingerir_arquivo(arquivo)
+                except ValueError as e:
+                    log.warning('⚠️ Extrato não adicionado ao histórico', extra={'arquivo': arquivo, 'erro': str(e)})
+                # Resumos por empresa/tribunal/segmento: só o mês deste extrato é recalculado
+                if BACKEND_CONSULTAS == 'duckdb':
+                    atualizar_resumos_extrato(arquivo)
+            
+            # IDs inteiros de empresa (joins/seleções/group_by sem comparar strings)
+            df, dim_empresas = construir_dimensao(df, 'NOME')
+            indice_busca = IndiceBuscaEmpresas.da_dimensao(dim_empresas)
+            indices = {'empresas': dim_empresas, 'busca': indice_busca}
+            
+            # Esboços por tribunal/grau/segmento/ramo: estatísticas aproximadas sem reagrupar a cada pedido
+            try:
+                indices['esbocos'] = EsbocosDimensoes.construir(df, calcular_processos_mensais)
+            except Exception as e:
+                log.warning('⚠️ Esboços estatísticos não construídos; só o modo exato fica disponível',
+                            extra={'erro': str(e)})
+            
+            # Backend DuckDB: tabela persistente da versão (reaproveitada se o Parquet não mudou)
+            if BACKEND_CONSULTAS == 'duckdb':
+                update_progress(95, 'Preparando DuckDB...', 'Tabela ordenada para consultas')
+                consultas = abrir_consultas_duckdb(arquivo, 0 if load_all else limit, df,
+                                                   df_cnae, dim_empresas, indice_busca)
+                if consultas is not None:
+                    indices['consultas'] = consultas
+            
+            # Troca atômica: só agora a nova versão fica visível para as requisições
+            self.versoes.publicar(df, df_cnae, origem=os.path.basename(arquivo), indices=indices)
+            return df
             
         except Exception as e:
-            print(f"❌ Erro ao carregar arquivo local: {e}")
+            log.error('❌ Erro ao carregar arquivo local', exc_info=True, extra={'arquivo': arquivo})
+            return self._falha_na_carga(limit if not load_all else 50000)
+    
+    def _falha_na_carga(self, limit):
+        """Dados de demonstração só na primeira carga; com uma versão publicada, ela segue em uso (None)"""
+        if self.versoes.atual is None:
             update_progress(50, 'Erro no carregamento...', 'Gerando dados de demonstração')
-            return self._create_fallback_data(limit if not load_all else 50000)
+            return self._create_fallback_data(limit)
+        log.warning('⚠️ Nova versão não publicada; a atual segue em uso',
+                    extra={'versao': self.versoes.atual.numero})
+        return None
+    
+    def crescimento_por_empresa(self) -> Optional[pl.DataFrame]:
+        """Crescimento mês a mês por empresa a partir do histórico (cache da versão)"""
+        versao = self.versao_em_uso()
+        if versao is None or not self.historico.disponivel():
+            return None
+        crescimento = versao.obter_cache('crescimento_mensal', self.historico.crescimento_mensal)
+        return crescimento if not crescimento.is_empty() else None
     
     def _create_fallback_data(self, limit):
         """Criar dados de demonstração em caso de falha"""
         try:
-            import random
-            
-            print("📊 Gerando dados de demonstração...")
-            
-            empresas = [
-                "BANCO DO BRASIL S.A.", "CAIXA ECONÔMICA FEDERAL", "BRADESCO S.A.",
-                "ITAÚ UNIBANCO S.A.", "SANTANDER BRASIL S.A.", "NUBANK S.A.",
-                "MAGAZINE LUIZA S.A.", "VIA VAREJO S.A.", "TELEFONICA BRASIL S.A.",
-                "TIM S.A.", "CLARO S.A.", "PETROBRAS S.A.", "VALE S.A."
-            ]
-            
-            tribunais = ["TJSP", "TJRJ", "TJMG", "TJRS", "TJPR", "TJSC", "TJBA", "TJDF"]
-            
-            data = []
-            n_records = min(limit, 10000)  # Máximo 10k para demonstração
-            
-            for i in range(n_records):
-                empresa = random.choice(empresas)
-                tribunal = random.choice(tribunais)
-                
-                # Bancos têm mais processos
-                if "BANCO" in empresa or "CAIXA" in empresa:
-                    novos = random.randint(100, 800)
-                else:
-                    novos = random.randint(10, 200)
-                
-                data.append({
-                    'NOME': empresa,
-                    'TRIBUNAL': tribunal,
-                    'NOVOS': novos
-                })
+            # Máximo 10k para demonstração
+            df = gerar_dataset(min(limit, 10000), n_empresas=200)
+            log.info('✅ Dados de demonstração (fictícios) criados', extra={'registros': len(df)})
             
-            self.df = pl.DataFrame(data)
-            print(f"✅ Dados de demonstração criados: {len(self.df):,} registros")
-            print("ℹ️ Estes são dados fictícios para demonstração")
-            
-            return self.df
+            df, dim_empresas = construir_dimensao(df, 'NOME')
+            self.versoes.publicar(df, None, origem='demonstração', indices={
+                'empresas': dim_empresas,
+                'busca': IndiceBuscaEmpresas.da_dimensao(dim_empresas)
+            })
+            return df
             
         except Exception as e:
-            print(f"❌ Erro ao criar dados de fallback: {e}")
+            log.error('❌ Erro ao criar dados de fallback', exc_info=True)
             return None
 
 data_manager = DataManager()
 
+@app.before_request
+def iniciar_instrumentacao():
+    # Regra da rota (ex.: /api/cnaes/<segmento>) como rótulo: cardinalidade limitada
+    endpoint = request.url_rule.rule if request.url_rule is not None else 'desconhecido'
+    instrumentacao.iniciar(endpoint, request.method)
+
+@app.before_request
+def fixar_versao_dataset():
+    """Fixa a versão dos dados para toda a requisição (trocas não a afetam)"""
+    g.versao_dataset = data_manager.versoes.adquirir()
+
+@app.teardown_request
+def liberar_versao_dataset(exc=None):
+    data_manager.versoes.liberar(g.pop('versao_dataset', None))
+
+@app.after_request
+def registrar_status(response):
+    instrumentacao.definir_status(response.status_code)
+    return response
+
+@app.teardown_request
+def finalizar_instrumentacao(exc=None):
+    if exc is not None:
+        instrumentacao.definir_status(500)
+    instrumentacao.finalizar()
+
 def login_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -199,6 +331,33 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated
 
+# Orçamento de memória para consultas pesadas simultâneas
+controle_admissao = ControleAdmissao(
+    orcamento_bytes=int(os.environ.get('ORCAMENTO_MEMORIA_MB', 1024)) * 1024 * 1024,
+    espera_maxima=float(os.environ.get('ESPERA_MAXIMA_ADMISSAO', 0))
+)
+
+def admissao_controlada(tipo):
+    """Estima o custo da consulta e só executa se couber no orçamento (senão 429)"""
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            dados = request.get_json(silent=True) or {}
+            custo = estimar_custo(data_manager.versao_em_uso(), dados.get('filtros') or {}, tipo)
+            try:
+                with controle_admissao.admitir(custo):
+                    return f(*args, **kwargs)
+            except AdmissaoRecusada as e:
+                resposta = jsonify({
+                    'error': 'Servidor ocupado com consultas pesadas. Tente novamente em instantes ou aplique filtros.',
+                    'retry_after': e.retry_after,
+                    'custo_estimado_mb': round(e.custo / 1024**2, 1),
+                    'admissao': controle_admissao.status()
+                })
+                return resposta, 429, {'Retry-After': str(e.retry_after)}
+        return decorated
+    return decorator
+
 @app.route('/')
 def home():
     if 'user_id' in session:
@@ -232,42 +391,84 @@ def logout():
 @login_required
 def dashboard():
     # Informações sobre dados em cache
+    versao = data_manager.versao_em_uso()
     dados_info = {
         'carregados': data_manager.df is not None,
         'total_registros': len(data_manager.df) if data_manager.df is not None else 0,
-        'timestamp': 'Nunca'
+        'timestamp': versao.criado_em.strftime('%d/%m/%Y %H:%M') if versao else 'Nunca'
     }
     
     return render_template('dashboard.html', 
                          username=session.get('username'),
                          dados_info=dados_info)
 
+def _carregar_em_segundo_plano(limit, arquivo):
+    """Alvo da carga assíncrona: fecha o progresso (100% ou erro) ao terminar, como o ramo síncrono"""
+    try:
+        df = data_manager.load_data(limit, arquivo)
+    except Exception:
+        log.exception('❌ Erro na carga em segundo plano')
+        df = None
+    
+    if df is None:
+        update_progress(0, 'Erro no carregamento', 'Falha ao carregar a nova versão; a anterior segue em uso')
+    else:
+        update_progress(100, 'Concluído!', f'Nova versão publicada - {len(df):,} registros', 'Completo', f'{len(df):,} registros')
+    
+    # Estado final visível por um instante para quem acompanha o progresso
+    time.sleep(2)
+    progress_data['active'] = False
+
 @app.route('/api/carregar-dados', methods=['POST'])
 @login_required
 def api_carregar_dados():
+    global progress_data
     try:
         data = request.get_json()
         limit = data.get('limit', 0)
+        assincrono = bool(data.get('assincrono', False))
+        
+        # Novo extrato mensal (ex.: grandes_litigantes_202504.parquet) na pasta da aplicação
+        arquivo = data.get('arquivo')
+        if arquivo:
+            arquivo = os.path.basename(arquivo)
+            if not arquivo.endswith('.parquet') or not os.path.exists(arquivo):
+                return jsonify({'error': f'Arquivo inválido ou não encontrado: {arquivo}'}), 400
+        
+        if data_manager.carregando:
+            return jsonify({'error': 'Já existe um carregamento em andamento'}), 409
+        
+        if assincrono:
+            # Carrega e indexa em segundo plano; a versão atual segue atendendo
+            progress_data['active'] = True
+            update_progress(0, 'Iniciando carregamento...', 'Nova versão em segundo plano')
+            threading.Thread(target=_carregar_em_segundo_plano, args=(limit, arquivo), daemon=True).start()
+            versao_atual = data_manager.versao_em_uso()
+            return jsonify({
+                'success': True,
+                'assincrono': True,
+                'versao_atual': versao_atual.numero if versao_atual else None
+            }), 202
         
         # Inicializar progresso
-        global progress_data
         progress_data['active'] = True
         update_progress(0, 'Iniciando carregamento...', 'Preparando sistema...')
         
         if limit == 0:
-            print("🔄 Solicitação de carregamento: TODOS os registros (14M+)")
+            log.info('🔄 Solicitação de carregamento', extra={'registros': 'todos'})
             update_progress(5, 'Carregamento completo iniciado', 'Verificando dados locais...')
         else:
-            print(f"🔄 Solicitação de carregamento: {limit:,} registros")
+            log.info('🔄 Solicitação de carregamento', extra={'registros': limit})
             update_progress(5, f'Carregando {limit:,} registros', 'Verificando cache local...')
         
         update_progress(15, 'Processando dados...', 'Conectando ao sistema de arquivos...')
         
-        df = data_manager.load_data(limit=limit)
+        df = data_manager.load_data(limit=limit, arquivo=arquivo)
         if df is None:
             update_progress(0, 'Erro no carregamento', 'Falha ao acessar dados')
-            error_msg = 'Falha ao carregar os dados do arquivo local. Verifique se o arquivo dados_grandes_litigantes.parquet existe.'
-            print(f"❌ {error_msg}")
+            error_msg = (f'Falha ao carregar {arquivo or data_manager.parquet_file}. Verifique se o arquivo existe e é válido.'
+                         + (' A versão atual dos dados segue em uso.' if data_manager.versoes.atual is not None else ''))
+            log.error('❌ %s', error_msg)
             progress_data['active'] = False
             return jsonify({'error': error_msg}), 500
         
@@ -283,10 +484,8 @@ def api_carregar_dados():
         
         update_progress(95, 'Finalizando...', f'{total_registros:,} registros processados')
         
-        print(f"✅ Dados carregados com sucesso: {total_registros:,} registros")
-        
-        # Debug: mostrar colunas disponíveis
-        print(f"📋 Colunas disponíveis: {df.columns}")
+        log.info('✅ Dados carregados com sucesso', extra={'registros': total_registros})
+        log.debug('📋 Colunas disponíveis', extra={'colunas': df.columns})
         
         # Verificar se são dados de demonstração
         is_demo = total_registros <= 10000
@@ -294,7 +493,6 @@ def api_carregar_dados():
         update_progress(100, 'Concluído!', f'Sucesso - {total_registros:,} registros carregados', 'Completo', f'{total_registros:,} registros')
         
         # Desativar progresso após um tempo
-        import threading
         def clear_progress():
             import time
             time.sleep(2)
@@ -308,13 +506,14 @@ def api_carregar_dados():
                 'total_registros': total_registros,
                 'total_processos': total_processos,
                 'coluna_empresa': coluna_empresa,
-                'is_demo': is_demo
+                'is_demo': is_demo,
+                'versao': data_manager.versoes.atual.numero if data_manager.versoes.atual else None
             }
         })
     except Exception as e:
         update_progress(0, 'Erro crítico', f'Falha: {str(e)}')
         error_msg = f'Erro no carregamento: {str(e)}'
-        print(f"❌ {error_msg}")
+        log.error('❌ %s', error_msg, exc_info=True)
         progress_data['active'] = False
         return jsonify({'error': error_msg}), 500
 
@@ -326,50 +525,51 @@ def api_filtros():
         if data_manager.df is None:
             return jsonify({'error': 'Dados não carregados'}), 400
         
-        df = data_manager.df
-        
-        # Obter valores únicos para filtros
-        filtros = {}
+        filtros = data_manager.versao_em_uso().obter_cache('filtros', lambda: _calcular_filtros(data_manager.df))
         
-        # Tribunais (retornar como 'tribunais' no plural para compatibilidade)
-        if 'TRIBUNAL' in df.columns:
-            tribunais = df.select('TRIBUNAL').unique().sort('TRIBUNAL').to_series().to_list()
-            # Remover valores None e converter para string
-            tribunais = [str(t) for t in tribunais if t is not None]
-            filtros['tribunais'] = sorted(tribunais)
-        
-        # Graus (retornar como 'graus' no plural para compatibilidade)
-        if 'GRAU' in df.columns:
-            graus = df.select('GRAU').unique().sort('GRAU').to_series().to_list()
-            # Remover valores None e converter para string
-            graus = [str(g) for g in graus if g is not None]
-            filtros['graus'] = sorted(graus)
-        
-        # Segmentos (retornar como 'segmentos' no plural para compatibilidade)
-        if 'SEGMENTO' in df.columns:
-            segmentos = df.select('SEGMENTO').unique().sort('SEGMENTO').to_series().to_list()
-            # Remover valores None e converter para string
-            segmentos = [str(s) for s in segmentos if s is not None]
-            filtros['segmentos'] = sorted(segmentos)
-        
-        # Ramos (retornar como 'ramos' no plural para compatibilidade)
-        if 'RAMO' in df.columns:
-            ramos = df.select('RAMO').unique().sort('RAMO').to_series().to_list()
-            # Remover valores None e converter para string
-            ramos = [str(r) for r in ramos if r is not None]
-            filtros['ramos'] = sorted(ramos)
-        
-        print(f"📊 Filtros gerados: {len(filtros)} categorias")
-        for categoria, valores in filtros.items():
-            print(f"  - {categoria}: {len(valores)} opções")
-        
-        return jsonify({'success': True, 'filtros': filtros})
+        return jsonify({'success': True, 'filtros': filtros, 'versao': data_manager.numero_versao})
     except Exception as e:
-        print(f"❌ Erro na API filtros: {e}")
+        log.exception('❌ Erro na API filtros')
         return jsonify({'error': str(e)}), 500
 
+def _calcular_filtros(df: pl.DataFrame) -> Dict:
+    """Valores únicos de cada filtro (resultado guardado no cache da versão)"""
+    # Obter valores únicos para filtros
+    filtros = {}
+    
+    # Tribunais (retornar como 'tribunais' no plural para compatibilidade)
+    if 'TRIBUNAL' in df.columns:
+        tribunais = df.select('TRIBUNAL').unique().sort('TRIBUNAL').to_series().to_list()
+        # Remover valores None e converter para string
+        tribunais = [str(t) for t in tribunais if t is not None]
+        filtros['tribunais'] = sorted(tribunais)
+    
+    # Graus (retornar como 'graus' no plural para compatibilidade)
+    if 'GRAU' in df.columns:
+        graus = df.select('GRAU').unique().sort('GRAU').to_series().to_list()
+        # Remover valores None e converter para string
+        graus = [str(g) for g in graus if g is not None]
+        filtros['graus'] = sorted(graus)
+    
+    # Segmentos (retornar como 'segmentos' no plural para compatibilidade)
+    if 'SEGMENTO' in df.columns:
+        segmentos = df.select('SEGMENTO').unique().sort('SEGMENTO').to_series().to_list()
+        # Remover valores None e converter para string
+        segmentos = [str(s) for s in segmentos if s is not None]
+        filtros['segmentos'] = sorted(segmentos)
+    
+    # Ramos (retornar como 'ramos' no plural para compatibilidade)
+    if 'RAMO' in df.columns:
+        ramos = df.select('RAMO').unique().sort('RAMO').to_series().to_list()
+        # Remover valores None e converter para string
+        ramos = [str(r) for r in ramos if r is not None]
+        filtros['ramos'] = sorted(ramos)
+    
+    return filtros
+
 @app.route('/api/filtros-disponiveis', methods=['POST'])
 @login_required
+@admissao_controlada('filtros_disponiveis')
 def api_filtros_disponiveis():
     """API para obter filtros disponíveis baseados nas seleções atuais (filtros cascateados)"""
     try:
@@ -379,106 +579,105 @@ def api_filtros_disponiveis():
         data = request.get_json() or {}
         filtros_selecionados = data.get('filtros', {})
         
-        df = data_manager.df
-        
-        # Aplicar filtros já selecionados para determinar valores disponíveis
-        df_filtrado = df
-        
-        # Aplicar cada filtro selecionado (usando nomes no plural)
-        if filtros_selecionados.get('tribunais') and len(filtros_selecionados['tribunais']) > 0:
-            df_filtrado = df_filtrado.filter(pl.col('TRIBUNAL').is_in(filtros_selecionados['tribunais']))
-        
-        if filtros_selecionados.get('graus') and len(filtros_selecionados['graus']) > 0:
-            df_filtrado = df_filtrado.filter(pl.col('GRAU').is_in(filtros_selecionados['graus']))
-        
-        if filtros_selecionados.get('segmentos') and len(filtros_selecionados['segmentos']) > 0:
-            df_filtrado = df_filtrado.filter(pl.col('SEGMENTO').is_in(filtros_selecionados['segmentos']))
-        
-        if filtros_selecionados.get('ramos') and len(filtros_selecionados['ramos']) > 0:
-            df_filtrado = df_filtrado.filter(pl.col('RAMO').is_in(filtros_selecionados['ramos']))
-        
-        if filtros_selecionados.get('cnae') and len(filtros_selecionados['cnae']) > 0:
-            # Converter CNAEs para string para comparação correta
-            cnaes_str = []
-            for cnae in filtros_selecionados['cnae']:
-                try:
-                    cnaes_str.append(str(cnae))
-                except:
-                    continue
-            if cnaes_str:
-                df_filtrado = df_filtrado.filter(pl.col('CNAE').cast(pl.Utf8).is_in(cnaes_str))
-        
-        # Aplicar filtros de classe e subclasse CNAE se disponíveis
-        df_com_cnae = df_filtrado
-        if data_manager.df_cnae is not None and 'CNAE' in df_filtrado.columns:
-            # JOIN com dados CNAE para filtrar por classe/subclasse
-            df_com_cnae = df_filtrado.join(
-                data_manager.df_cnae,
-                left_on=pl.col('CNAE').cast(pl.Utf8).str.zfill(7),
-                right_on='Codigo_Subclasse',
-                how='left'
-            )
+        consultas = data_manager.consultas
+        if consultas is not None:
+            # Backend DuckDB: valores distintos, contagem por CNAE e total numa única varredura
+            with instrumentacao.etapa('duckdb'):
+                valores, cnaes_contagem, total_registros = consultas.filtros_disponiveis(
+                    {k: v for k, v in filtros_selecionados.items() if k != 'busca_empresa'}
+                )
+        else:
+            df = data_manager.df
             
-            # Aplicar filtro por classe CNAE
-            if filtros_selecionados.get('classes_cnae') and len(filtros_selecionados['classes_cnae']) > 0:
-                df_com_cnae = df_com_cnae.filter(pl.col('Nome_Classe').is_in(filtros_selecionados['classes_cnae']))
+            # Aplicar filtros já selecionados para determinar valores disponíveis
+            with instrumentacao.etapa('filtro'):
+                df_filtrado = df
             
-            # Aplicar filtro por subclasse CNAE
-            if filtros_selecionados.get('subclasses_cnae') and len(filtros_selecionados['subclasses_cnae']) > 0:
-                df_com_cnae = df_com_cnae.filter(pl.col('Nome_Subclasse').is_in(filtros_selecionados['subclasses_cnae']))
+                # Aplicar cada filtro selecionado (usando nomes no plural)
+                if filtros_selecionados.get('tribunais') and len(filtros_selecionados['tribunais']) > 0:
+                    df_filtrado = df_filtrado.filter(pl.col('TRIBUNAL').is_in(filtros_selecionados['tribunais']))
             
-            # Manter apenas as colunas originais
-            colunas_originais = [col for col in df_filtrado.columns if col in df_com_cnae.columns]
-            df_filtrado = df_com_cnae.select(colunas_originais)
+                if filtros_selecionados.get('graus') and len(filtros_selecionados['graus']) > 0:
+                    df_filtrado = df_filtrado.filter(pl.col('GRAU').is_in(filtros_selecionados['graus']))
+            
+                if filtros_selecionados.get('segmentos') and len(filtros_selecionados['segmentos']) > 0:
+                    df_filtrado = df_filtrado.filter(pl.col('SEGMENTO').is_in(filtros_selecionados['segmentos']))
+            
+                if filtros_selecionados.get('ramos') and len(filtros_selecionados['ramos']) > 0:
+                    df_filtrado = df_filtrado.filter(pl.col('RAMO').is_in(filtros_selecionados['ramos']))
+            
+                if filtros_selecionados.get('cnae') and len(filtros_selecionados['cnae']) > 0:
+                    # Converter CNAEs para string para comparação correta
+                    cnaes_str = []
+                    for cnae in filtros_selecionados['cnae']:
+                        try:
+                            cnaes_str.append(str(cnae))
+                        except:
+                            continue
+                    if cnaes_str:
+                        df_filtrado = df_filtrado.filter(pl.col('CNAE').cast(pl.Utf8).is_in(cnaes_str))
+            
+            # Aplicar filtros de classe e subclasse CNAE se disponíveis
+            with instrumentacao.etapa('join'):
+                df_com_cnae = df_filtrado
+                if data_manager.df_cnae is not None and 'CNAE' in df_filtrado.columns:
+                    # JOIN com dados CNAE para filtrar por classe/subclasse
+                    df_com_cnae = df_filtrado.join(
+                        data_manager.df_cnae,
+                        left_on=pl.col('CNAE').cast(pl.Utf8).str.zfill(7),
+                        right_on='Codigo_Subclasse',
+                        how='left'
+                    )
+            
+                    # Aplicar filtro por classe CNAE
+                    if filtros_selecionados.get('classes_cnae') and len(filtros_selecionados['classes_cnae']) > 0:
+                        df_com_cnae = df_com_cnae.filter(pl.col('Nome_Classe').is_in(filtros_selecionados['classes_cnae']))
+            
+                    # Aplicar filtro por subclasse CNAE
+                    if filtros_selecionados.get('subclasses_cnae') and len(filtros_selecionados['subclasses_cnae']) > 0:
+                        df_com_cnae = df_com_cnae.filter(pl.col('Nome_Subclasse').is_in(filtros_selecionados['subclasses_cnae']))
+            
+                    # Manter apenas as colunas originais
+                    colunas_originais = [col for col in df_filtrado.columns if col in df_com_cnae.columns]
+                    df_filtrado = df_com_cnae.select(colunas_originais)
+            
+            with instrumentacao.etapa('group_by'):
+                valores = {}
+                for coluna in ['TRIBUNAL', 'GRAU', 'SEGMENTO', 'RAMO']:
+                    if coluna in df_filtrado.columns:
+                        distintos = df_filtrado.get_column(coluna).unique().to_list()
+                        valores[coluna] = sorted(str(v) for v in distintos if v is not None)
+            
+                cnaes_contagem = None
+                if 'CNAE' in df_filtrado.columns:
+                    cnaes_contagem = (
+                        df_filtrado
+                        .group_by(['CNAE'])
+                        .agg([pl.len().alias('registros')])
+                        .sort(['registros'], descending=True)
+                    )
+                total_registros = len(df_filtrado)
         
         # Obter valores únicos disponíveis para cada filtro baseado no dataset filtrado
+        # (nomes no plural para compatibilidade com o frontend)
         filtros_disponiveis = {}
+        for chave, coluna in [('tribunais', 'TRIBUNAL'), ('graus', 'GRAU'), ('segmentos', 'SEGMENTO'), ('ramos', 'RAMO')]:
+            if coluna in valores:
+                filtros_disponiveis[chave] = valores[coluna]
         
-        print(f"🔍 Debug - Colunas disponíveis: {df_filtrado.columns}")
-        print(f"🔍 Debug - Registros no df_filtrado: {len(df_filtrado)}")
-        
-        # Tribunais (retornar como 'tribunais' no plural para compatibilidade)
-        if 'TRIBUNAL' in df_filtrado.columns:
-            tribunais = df_filtrado.select('TRIBUNAL').unique().sort('TRIBUNAL').to_series().to_list()
-            print(f"🔍 Debug - Tribunais únicos encontrados: {len(tribunais)}")
-            if len(tribunais) > 0:
-                print(f"🔍 Debug - Primeiros tribunais: {tribunais[:5]}")
-            tribunais = [str(t) for t in tribunais if t is not None]
-            filtros_disponiveis['tribunais'] = sorted(tribunais)
-        
-        # Graus (retornar como 'graus' no plural para compatibilidade)
-        if 'GRAU' in df_filtrado.columns:
-            graus = df_filtrado.select('GRAU').unique().sort('GRAU').to_series().to_list()
-            print(f"🔍 Debug - Graus únicos encontrados: {len(graus)}")
-            graus = [str(g) for g in graus if g is not None]
-            filtros_disponiveis['graus'] = sorted(graus)
-        
-        # Segmentos (retornar como 'segmentos' no plural para compatibilidade)
-        if 'SEGMENTO' in df_filtrado.columns:
-            segmentos = df_filtrado.select('SEGMENTO').unique().sort('SEGMENTO').to_series().to_list()
-            print(f"🔍 Debug - Segmentos únicos encontrados: {len(segmentos)}")
-            segmentos = [str(s) for s in segmentos if s is not None]
-            filtros_disponiveis['segmentos'] = sorted(segmentos)
-        
-        # Ramos (retornar como 'ramos' no plural para compatibilidade)
-        if 'RAMO' in df_filtrado.columns:
-            ramos = df_filtrado.select('RAMO').unique().sort('RAMO').to_series().to_list()
-            print(f"🔍 Debug - Ramos únicos encontrados: {len(ramos)}")
-            ramos = [str(r) for r in ramos if r is not None]
-            filtros_disponiveis['ramos'] = sorted(ramos)
-        
-        # Classes e Subclasses CNAE disponíveis
+        # Classes e Subclasses CNAE disponíveis (a partir da contagem por CNAE: o JOIN é
+        # com uma linha por CNAE, não com o dataset filtrado inteiro)
         classes_cnae_disponiveis = []
         subclasses_cnae_disponiveis = []
         
-        if data_manager.df_cnae is not None and 'CNAE' in df_filtrado.columns:
-            # JOIN para obter classes e subclasses disponíveis
-            df_cnae_filtrado = df_filtrado.join(
-                data_manager.df_cnae,
-                left_on=pl.col('CNAE').cast(pl.Utf8).str.zfill(7),
-                right_on='Codigo_Subclasse',
-                how='left'
-            )
+        if data_manager.df_cnae is not None and cnaes_contagem is not None:
+            with instrumentacao.etapa('join'):
+                df_cnae_filtrado = cnaes_contagem.join(
+                    data_manager.df_cnae,
+                    left_on=pl.col('CNAE').cast(pl.Utf8).str.zfill(7),
+                    right_on='Codigo_Subclasse',
+                    how='left'
+                )
             
             # Classes CNAE únicas
             if 'Nome_Classe' in df_cnae_filtrado.columns:
@@ -486,7 +685,7 @@ def api_filtros_disponiveis():
                     df_cnae_filtrado
                     .filter(pl.col('Nome_Classe').is_not_null())
                     .group_by('Nome_Classe')
-                    .agg([pl.len().alias('registros')])
+                    .agg([pl.col('registros').sum()])
                     .sort(['registros', 'Nome_Classe'], descending=[True, False])
                 )
                 
@@ -504,7 +703,7 @@ def api_filtros_disponiveis():
                     df_cnae_filtrado
                     .filter(pl.col('Nome_Subclasse').is_not_null())
                     .group_by(['Nome_Subclasse', 'Nome_Classe'])
-                    .agg([pl.len().alias('registros')])
+                    .agg([pl.col('registros').sum()])
                     .sort(['registros', 'Nome_Subclasse'], descending=[True, False])
                 )
                 
@@ -522,16 +721,10 @@ def api_filtros_disponiveis():
         
         # CNAEs disponíveis com contagem para organização hierárquica
         cnaes_disponiveis = []
-        if 'CNAE' in df_filtrado.columns:
-            cnaes_df = (
-                df_filtrado
-                .group_by(['CNAE'])
-                .agg([pl.len().alias('registros')])
-                .with_columns([
-                    pl.col('CNAE').cast(pl.Utf8).str.zfill(7).alias('cnae_str')
-                ])
-                .sort(['registros'], descending=True)
-            )
+        if cnaes_contagem is not None:
+            cnaes_df = cnaes_contagem.with_columns([
+                pl.col('CNAE').cast(pl.Utf8).str.zfill(7).alias('cnae_str')
+            ])
             
             if data_manager.df_cnae is not None:
                 # JOIN com dados CNAE para obter descrições
@@ -604,20 +797,21 @@ def api_filtros_disponiveis():
         
         filtros_disponiveis['cnaes'] = cnaes_disponiveis
         
-        print(f"🔄 Filtros cascateados - Total registros disponíveis: {len(df_filtrado)}")
-        print(f"🏷️ Classes CNAE disponíveis: {len(classes_cnae_disponiveis)}")
-        print(f"🏷️ Subclasses CNAE disponíveis: {len(subclasses_cnae_disponiveis)}")
+        instrumentacao.anotar(
+            total_registros=total_registros,
+            classes_cnae=len(classes_cnae_disponiveis),
+            subclasses_cnae=len(subclasses_cnae_disponiveis)
+        )
         
         return jsonify({
             'success': True,
             'filtros_disponiveis': filtros_disponiveis,
-            'total_registros': len(df_filtrado)
+            'total_registros': total_registros,
+            'versao': data_manager.numero_versao
         })
         
     except Exception as e:
-        print(f"❌ Erro na API filtros disponíveis: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception('❌ Erro na API filtros disponíveis')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/test-dados', methods=['GET'])
@@ -632,60 +826,64 @@ def api_test_dados():
 
 @app.route('/api/estatisticas-gerais', methods=['POST'])
 @login_required
+@admissao_controlada('estatisticas')
 def api_estatisticas_gerais():
     """API para obter estatísticas gerais baseadas nos filtros atuais"""
     try:
-        print(f"🔍 Status dos dados: df é None? {data_manager.df is None}")
-        if data_manager.df is not None:
-            print(f"📊 Dados disponíveis: {len(data_manager.df)} registros")
-        
         if data_manager.df is None:
-            print("❌ data_manager.df é None - retornando erro 400")
             return jsonify({'error': 'Dados não carregados'}), 400
         
         data = request.get_json() or {}
         filtros = data.get('filtros', {})
-        
-        print(f"🔍 Filtros recebidos: {filtros}")
-        
-        # Aplicar filtros para obter dados filtrados
-        df_filtrado = aplicar_filtros_avancados(data_manager.df, filtros)
-        
-        print(f"📊 Registros antes dos filtros: {len(data_manager.df)}")
-        print(f"📊 Registros após filtros: {len(df_filtrado)}")
-        
-        # Calcular estatísticas por empresa
-        if 'NOME' not in df_filtrado.columns:
-            return jsonify({'error': 'Coluna NOME não encontrada'}), 400
-        
-        # Agrupar por empresa
-        empresas_df = agrupar_por_empresa(df_filtrado)
-        
-        # Calcular processos mensais (adiciona coluna volume_mensal)
-        empresas_df = calcular_processos_mensais(empresas_df)
-        
-        # Aplicar filtros de volume após criar a coluna volume_mensal
-        empresas_df = aplicar_filtros_volume(empresas_df, filtros)
-        
-        # Calcular estatísticas
-        total_empresas = len(empresas_df)
-        
-        # Calcular processos mensais total
-        processos_mensais_total = int(empresas_df.select('volume_mensal').sum().item())
-        
-        # Calcular mediana mensal (usando Polars)
-        if total_empresas > 0:
-            mediana_mensal = int(empresas_df.select('volume_mensal').median().item())
+        instrumentacao.anotar(filtros=filtros, modo=data.get('modo', 'exato'))
+        
+        # modo 'aproximado': esboços pré-calculados (instantâneo); sem esboço para os filtros, cai no exato
+        esbocos = data_manager.esbocos if data.get('modo') == 'aproximado' else None
+        aproximadas = esbocos.estatisticas(filtros) if esbocos is not None else None
+        if aproximadas is not None:
+            return jsonify({'success': True, 'modo': 'aproximado', 'estatisticas': aproximadas})
+        
+        consultas = data_manager.consultas
+        if consultas is not None:
+            # Backend DuckDB: agregação por empresa e estatísticas numa única consulta SQL
+            with instrumentacao.etapa('duckdb'):
+                estatisticas = consultas.estatisticas(filtros)
+            total_empresas = estatisticas['total_empresas']
+            processos_mensais_total = estatisticas['processos_mensais_total']
+            mediana_mensal = estatisticas['mediana_mensal']
         else:
-            mediana_mensal = 0
-        
-        print(f"📊 Estatísticas gerais calculadas:")
-        print(f"   - Total empresas: {total_empresas}")
-        print(f"   - Processos mensais total: {processos_mensais_total}")
-        print(f"   - Mediana mensal: {mediana_mensal}")
+            # Aplicar filtros para obter dados filtrados
+            df_filtrado = aplicar_filtros_avancados(data_manager.df, filtros)
+            instrumentacao.anotar(registros_filtrados=len(df_filtrado))
+            
+            # Calcular estatísticas por empresa
+            if 'NOME' not in df_filtrado.columns:
+                return jsonify({'error': 'Coluna NOME não encontrada'}), 400
+            
+            # Agrupar por empresa
+            empresas_df = agrupar_por_empresa(df_filtrado)
+            
+            # Calcular processos mensais (adiciona coluna volume_mensal)
+            empresas_df = calcular_processos_mensais(empresas_df)
+            
+            # Aplicar filtros de volume após criar a coluna volume_mensal
+            empresas_df = aplicar_filtros_volume(empresas_df, filtros)
+            
+            # Calcular estatísticas
+            total_empresas = len(empresas_df)
+            
+            # Calcular processos mensais total
+            processos_mensais_total = int(empresas_df.select('volume_mensal').sum().item())
+            
+            # Calcular mediana mensal (usando Polars)
+            if total_empresas > 0:
+                mediana_mensal = int(empresas_df.select('volume_mensal').median().item())
+            else:
+                mediana_mensal = 0
         
         return jsonify({
             'success': True,
+            'modo': 'exato',
             'estatisticas': {
                 'total_empresas': total_empresas,
                 'processos_mensais_total': processos_mensais_total,
@@ -694,9 +892,7 @@ def api_estatisticas_gerais():
         })
         
     except Exception as e:
-        print(f"❌ Erro na API estatísticas gerais: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception('❌ Erro na API estatísticas gerais')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cnaes/<segmento>', methods=['GET'])
@@ -714,34 +910,33 @@ def api_cnaes_por_segmento(segmento):
             return jsonify({'error': 'Colunas SEGMENTO ou CNAE não encontradas'}), 400
         
         # Filtrar CNAEs do segmento específico
-        cnaes_df = (
-            df.filter(pl.col('SEGMENTO') == segmento)
-            .group_by(['CNAE'])
-            .agg([pl.len().alias('registros')])
-            .with_columns([
-                pl.col('CNAE').cast(pl.Utf8).alias('CNAE_STR')
-            ])
-            .sort(['registros', 'CNAE'], descending=[True, False])
-        )
+        with instrumentacao.etapa('group_by'):
+            cnaes_df = (
+                df.filter(pl.col('SEGMENTO') == segmento)
+                .group_by(['CNAE'])
+                .agg([pl.len().alias('registros')])
+                .with_columns([
+                    pl.col('CNAE').cast(pl.Utf8).alias('CNAE_STR')
+                ])
+                .sort(['registros', 'CNAE'], descending=[True, False])
+            )
         
         # Se temos dados CNAE, fazer JOIN para obter descrições
         if data_manager.df_cnae is not None:
-            print("🔗 Fazendo JOIN com dados CNAE...")
-            
             # JOIN com subclasses
-            cnaes_com_desc = cnaes_df.join(
-                data_manager.df_cnae,
-                left_on='CNAE_STR',
-                right_on='Codigo_Subclasse',
-                how='left'
-            )
+            with instrumentacao.etapa('join'):
+                cnaes_com_desc = cnaes_df.join(
+                    data_manager.df_cnae,
+                    left_on='CNAE_STR',
+                    right_on='Codigo_Subclasse',
+                    how='left'
+                )
             
             # Agrupar por CLASSE para organização hierárquica
             classes_dict = {}
             
             # Verificar quantas colunas o JOIN retornou
             colunas = cnaes_com_desc.columns
-            print(f"🔍 Colunas após JOIN: {colunas}")
             
             for row in cnaes_com_desc.iter_rows():
                 # Adaptar baseado no número de colunas retornadas
@@ -789,7 +984,7 @@ def api_cnaes_por_segmento(segmento):
             
             total_cnaes = sum(len(classe['subclasses']) for classe in classes)
             
-            print(f"🏷️ CNAEs organizados para '{segmento}': {len(classes)} classes, {total_cnaes} CNAEs")
+            instrumentacao.anotar(classes=len(classes), cnaes=total_cnaes)
             
             return jsonify({
                 'success': True,
@@ -800,7 +995,6 @@ def api_cnaes_por_segmento(segmento):
             })
         else:
             # Fallback: sem descrições, apenas códigos
-            print("⚠️ Dados CNAE não disponíveis, retornando apenas códigos")
             cnaes = []
             for row in cnaes_df.iter_rows():
                 cnae, registros, cnae_str = row
@@ -819,9 +1013,7 @@ def api_cnaes_por_segmento(segmento):
             })
         
     except Exception as e:
-        print(f"❌ Erro na API CNAEs por segmento: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception('❌ Erro na API CNAEs por segmento')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/cnaes/todos', methods=['GET'])
@@ -839,34 +1031,35 @@ def api_todos_cnaes():
             return jsonify({'error': 'Coluna CNAE não encontrada'}), 400
         
         # Obter todos os CNAEs únicos com contagem
-        cnaes_df = (
-            df
-            .group_by(['CNAE'])
-            .agg([pl.len().alias('registros')])
-            .with_columns([
-                pl.col('CNAE').cast(pl.Utf8).str.zfill(7).alias('cnae_str')
-            ])
-            .sort(['registros'], descending=True)
-        )
+        with instrumentacao.etapa('group_by'):
+            cnaes_df = (
+                df
+                .group_by(['CNAE'])
+                .agg([pl.len().alias('registros')])
+                .with_columns([
+                    pl.col('CNAE').cast(pl.Utf8).str.zfill(7).alias('cnae_str')
+                ])
+                .sort(['registros'], descending=True)
+            )
         
         if data_manager.df_cnae is not None:
             # JOIN com dados CNAE para obter descrições
-            cnaes_com_desc = (
-                cnaes_df
-                .join(
-                    data_manager.df_cnae,
-                    left_on='cnae_str',
-                    right_on='Codigo_Subclasse',
-                    how='left'
+            with instrumentacao.etapa('join'):
+                cnaes_com_desc = (
+                    cnaes_df
+                    .join(
+                        data_manager.df_cnae,
+                        left_on='cnae_str',
+                        right_on='Codigo_Subclasse',
+                        how='left'
+                    )
                 )
-            )
             
             # Agrupar por CLASSE para organização hierárquica
             classes_dict = {}
             
             # Verificar quantas colunas o JOIN retornou
             colunas = cnaes_com_desc.columns
-            print(f"🔍 Colunas após JOIN todos CNAEs: {colunas}")
             
             for row in cnaes_com_desc.iter_rows():
                 # Adaptar baseado no número de colunas retornadas
@@ -914,7 +1107,7 @@ def api_todos_cnaes():
             
             total_cnaes = sum(len(classe['subclasses']) for classe in classes)
             
-            print(f"🏷️ Todos os CNAEs carregados: {len(classes)} classes, {total_cnaes} CNAEs")
+            instrumentacao.anotar(classes=len(classes), cnaes=total_cnaes)
             
             return jsonify({
                 'success': True,
@@ -924,7 +1117,6 @@ def api_todos_cnaes():
             })
         else:
             # Fallback: sem descrições, apenas códigos
-            print("⚠️ Dados CNAE não disponíveis, retornando apenas códigos")
             cnaes = []
             for row in cnaes_df.iter_rows():
                 cnae, registros, cnae_str = row
@@ -942,13 +1134,12 @@ def api_todos_cnaes():
             })
         
     except Exception as e:
-        print(f"❌ Erro na API todos CNAEs: {e}")
-        import traceback
-        traceback.print_exc()
+        log.exception('❌ Erro na API todos CNAEs')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/ranking', methods=['POST'])
 @login_required
+@admissao_controlada('ranking')
 def api_ranking():
     try:
         if data_manager.df is None:
@@ -964,27 +1155,59 @@ def api_ranking():
         if not coluna_empresa:
             return jsonify({'error': 'Coluna empresa não encontrada'}), 400
         
-        # Aplicar filtros se fornecidos
-        if filtros:
-            df = aplicar_filtros_avancados(df, filtros)
-        
-        # Verificar quais colunas existem para agregar de forma segura
-        colunas_agg = [pl.col('NOVOS').sum().alias('total_novos')]
+        consultas = data_manager.consultas
+        if consultas is not None:
+            # Backend DuckDB: só o ranking agregado (uma linha por empresa) volta ao Python
+            with instrumentacao.etapa('duckdb'):
+                ranking_completo = consultas.ranking(filtros)
+        else:
+            # Aplicar filtros se fornecidos
+            if filtros:
+                df = aplicar_filtros_avancados(df, filtros)
+            
+            # Verificar quais colunas existem para agregar de forma segura
+            colunas_agg = [pl.col('NOVOS').sum().alias('total_novos')]
+            
+            # Adicionar PENDENTES apenas se existir
+            if 'PENDENTES' in df.columns:
+                colunas_agg.append(pl.col('PENDENTES').sum().alias('total_pendentes'))
+            elif 'PENDENTES BRUTO' in df.columns:
+                colunas_agg.append(pl.col('PENDENTES BRUTO').sum().alias('total_pendentes'))
+            else:
+                # Se não há coluna de pendentes, usar 0
+                colunas_agg.append(pl.lit(0).alias('total_pendentes'))
+            
+            # Ranking completo SEM LIMITE (todas as empresas) para distribuição
+            dim_empresas = data_manager.dim_empresas
+            if 'EMPRESA_ID' in df.columns and dim_empresas is not None and not dim_empresas.is_empty():
+                # Agrupa pelo ID inteiro e traz o nome canônico da dimensão
+                with instrumentacao.etapa('group_by'):
+                    ranking_completo = df.group_by('EMPRESA_ID').agg(colunas_agg)
+                with instrumentacao.etapa('join'):
+                    ranking_completo = (
+                        ranking_completo
+                        .join(dim_empresas.select(['EMPRESA_ID', pl.col('NOME').alias(coluna_empresa)]),
+                              on='EMPRESA_ID', how='left')
+                        .sort('total_novos', descending=True)
+                    )
+            else:
+                with instrumentacao.etapa('group_by'):
+                    ranking_completo = (
+                        df.group_by(coluna_empresa)
+                        .agg(colunas_agg)
+                        .with_columns(pl.lit(None, dtype=pl.UInt32).alias('EMPRESA_ID'))
+                        .sort('total_novos', descending=True)
+                    )
         
-        # Adicionar PENDENTES apenas se existir
-        if 'PENDENTES' in df.columns:
-            colunas_agg.append(pl.col('PENDENTES').sum().alias('total_pendentes'))
-        elif 'PENDENTES BRUTO' in df.columns:
-            colunas_agg.append(pl.col('PENDENTES BRUTO').sum().alias('total_pendentes'))
+        # Crescimento mês a mês observado no histórico (quando houver 2+ extratos)
+        crescimento = data_manager.crescimento_por_empresa()
+        if crescimento is not None:
+            with instrumentacao.etapa('join'):
+                ranking_completo = ranking_completo.join(crescimento, left_on=coluna_empresa, right_on='NOME', how='left')
         else:
-            # Se não há coluna de pendentes, usar 0
-            colunas_agg.append(pl.lit(0).alias('total_pendentes'))
-        
-        # Ranking completo SEM LIMITE (todas as empresas) para distribuição
-        ranking_completo = (
-            df.group_by(coluna_empresa)
-            .agg(colunas_agg)
-            .sort('total_novos', descending=True)
+            ranking_completo = ranking_completo.with_columns(pl.lit(None, dtype=pl.Float64).alias('crescimento_mensal'))
+        ranking_completo = ranking_completo.select(
+            [coluna_empresa, 'total_novos', 'total_pendentes', 'crescimento_mensal', 'EMPRESA_ID']
         )
         
         # Ranking limitado para renderização na interface (evitar erro JavaScript)
@@ -994,7 +1217,7 @@ def api_ranking():
         resultado = []
         volume_total_mensal = 0
         for i, row in enumerate(ranking_limitado.iter_rows()):
-            empresa, novos, pendentes = row
+            empresa, novos, pendentes, crescimento_mensal, empresa_id = row
             # Garantir que empresa seja string
             empresa_str = str(empresa) if empresa is not None else "Não informado"
             volume_mensal = novos if novos else 0
@@ -1002,21 +1225,24 @@ def api_ranking():
             
             resultado.append({
                 'posicao': i + 1,
+                'empresa_id': empresa_id,
                 'nome': empresa_str,  # Mudado de 'empresa' para 'nome' para compatibilidade
                 'empresa': empresa_str,  # Manter também para compatibilidade
                 'processos': novos,
                 'volume_mensal': volume_mensal,
-                'pendentes': pendentes if pendentes else 0
+                'pendentes': pendentes if pendentes else 0,
+                'crescimento_mensal': crescimento_mensal
             })
         
         # Dados completos para distribuição (TODAS as empresas)
         ranking_distribuicao = []
         for row in ranking_completo.iter_rows():
-            empresa, novos, pendentes = row
+            empresa, novos, pendentes, _, empresa_id = row
             empresa_str = str(empresa) if empresa is not None else "Não informado"
             volume_mensal = novos if novos else 0
             
             ranking_distribuicao.append({
+                'empresa_id': empresa_id,
                 'empresa': empresa_str,
                 'processos': novos,
                 'volume_mensal': volume_mensal,
@@ -1039,10 +1265,11 @@ def api_ranking():
             'success': True, 
             'ranking': resultado,
             'ranking_completo': ranking_distribuicao,  # Dados completos para distribuição
-            'estatisticas': estatisticas  # Adicionar estatísticas na resposta
+            'estatisticas': estatisticas,  # Adicionar estatísticas na resposta
+            'versao': data_manager.numero_versao  # empresa_id só vale nesta versão
         })
     except Exception as e:
-        print(f"❌ Erro na API ranking: {e}")  # Debug
+        log.exception('❌ Erro na API ranking')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/simulacao', methods=['POST'])
@@ -1054,16 +1281,26 @@ def api_simulacao():
         
         # Parâmetros da simulação
         empresas_selecionadas = data.get('empresas_selecionadas', [])
+        empresas_ids = data.get('empresas_ids', [])
+        if empresas_ids and data.get('versao_dataset') != data_manager.numero_versao:
+            # IDs densos são recalculados a cada carga: de outra versão (troca a quente)
+            # apontariam para outras empresas. Resolve pelos nomes, se vieram
+            if not empresas_selecionadas:
+                return jsonify({'error': 'empresas_ids de outra versão dos dados; recarregue o ranking',
+                                'versao': data_manager.numero_versao}), 409
+            empresas_ids = []
         volume_customizado = data.get('volume_customizado')
         preco = float(data.get('preco', 50.0))
         custo_base = int(data.get('custo_base', 50000))
         clientes = int(data.get('clientes', 3))
         reinvestimento = float(data.get('reinvestimento', 30.0)) / 100
+        usar_crescimento = bool(data.get('usar_crescimento', False))
+        crescimento_aplicado = None
         
         # Calcular volume total
         if volume_customizado:
             volume_total = volume_customizado
-        elif empresas_selecionadas:
+        elif empresas_ids or empresas_selecionadas:
             if data_manager.df is None:
                 return jsonify({'error': 'Dados não carregados'}), 400
             
@@ -1071,15 +1308,35 @@ def api_simulacao():
             # A coluna principal de empresa é 'NOME'
             coluna_empresa = 'NOME' if 'NOME' in df.columns else None
             
+            # Seleção por ID inteiro (preferencial) ou pelos nomes (clientes antigos)
+            if empresas_ids and 'EMPRESA_ID' in df.columns:
+                selecao = pl.col('EMPRESA_ID').is_in([int(i) for i in empresas_ids])
+            else:
+                selecao = pl.col(coluna_empresa).is_in(empresas_selecionadas)
+            
             # Somar volume das empresas selecionadas
             empresas_df = (
-                df.filter(pl.col(coluna_empresa).is_in(empresas_selecionadas))
+                df.filter(selecao)
                 .group_by(coluna_empresa)
                 .agg([pl.col('NOVOS').sum().alias('total_novos')])
             )
             
-            volume_total = empresas_df.select(pl.col('total_novos').sum()).item() or 0
-            volume_total = round(volume_total / 12)  # Converter para mensal
+            crescimento = data_manager.crescimento_por_empresa() if usar_crescimento else None
+            if crescimento is not None:
+                # Projeta o próximo mês com o crescimento observado no histórico de cada empresa
+                empresas_df = (
+                    empresas_df.join(crescimento, left_on=coluna_empresa, right_on='NOME', how='left')
+                    .with_columns(pl.col('crescimento_mensal').fill_null(0.0))
+                )
+                volume_anual = empresas_df.select(pl.col('total_novos').sum()).item() or 0
+                volume_projetado = empresas_df.select(
+                    (pl.col('total_novos') * (1 + pl.col('crescimento_mensal'))).sum()
+                ).item() or 0
+                crescimento_aplicado = (volume_projetado / volume_anual - 1) if volume_anual else 0.0
+                volume_total = round(volume_projetado / 12)
+            else:
+                volume_total = empresas_df.select(pl.col('total_novos').sum()).item() or 0
+                volume_total = round(volume_total / 12)  # Converter para mensal
         else:
             return jsonify({'error': 'Volume não especificado'}), 400
         
@@ -1117,6 +1374,7 @@ def api_simulacao():
         return jsonify({
             'success': True,
             'volume_simulado': volume_total,
+            'crescimento_aplicado': crescimento_aplicado,
             'resultados': resultados,
             'break_even': break_even,
             'sensibilidade': sensibilidade
@@ -1125,17 +1383,65 @@ def api_simulacao():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _faixa_porte() -> pl.Expr:
+    """Faixa de porte da empresa pelo volume mensal"""
+    return (
+        pl.when(pl.col('volume_mensal') <= 10)
+        .then(pl.lit('1. Micro (1-10 proc/mês)'))
+        .when(pl.col('volume_mensal') <= 50)
+        .then(pl.lit('2. Pequena (11-50 proc/mês)'))
+        .when(pl.col('volume_mensal') <= 100)
+        .then(pl.lit('3. Média (51-100 proc/mês)'))
+        .when(pl.col('volume_mensal') <= 500)
+        .then(pl.lit('4. Grande (101-500 proc/mês)'))
+        .when(pl.col('volume_mensal') <= 1000)
+        .then(pl.lit('4. Muito Grande (501-1000 proc/mês)'))
+        .otherwise(pl.lit('5. Gigante (1000+ proc/mês)'))
+        .alias('faixa_porte')
+    )
+
+def _agregar_dimensao(lf: pl.LazyFrame, chaves: List[str], renomear: Dict[str, str],
+                      extras: Optional[List[pl.Expr]] = None) -> pl.LazyFrame:
+    """Quantidade de empresas e volume mensal (total/médio) por dimensão do relatório"""
+    return (
+        lf.group_by(chaves)
+        .agg([
+            pl.len().alias('quantidade'),
+            pl.col('volume_mensal').sum().alias('volume_total'),
+            pl.col('volume_mensal').mean().alias('volume_medio'),
+            *(extras or [])
+        ])
+        .with_columns([
+            pl.col('volume_total').fill_null(0).cast(pl.Int64),
+            pl.col('volume_medio').fill_null(0).cast(pl.Int64)
+        ])
+        .rename(renomear)
+    )
+
 @app.route('/api/relatorio-detalhado', methods=['POST'])
 @login_required
+@admissao_controlada('relatorio')
 def api_relatorio_detalhado():
     """API para gerar relatório detalhado com análises por porte, ramo, segmento e CNAE"""
     try:
-        filtros = request.json.get('filtros', {})
+        data = request.get_json() or {}
+        filtros = data.get('filtros', {})
         
-        # Carregar dados
-        df_empresas = aplicar_filtros_avancados(data_manager.df, filtros)
+        consultas = data_manager.consultas
+        if consultas is not None:
+            # Backend DuckDB: filtros e agregação por empresa no SQL
+            with instrumentacao.etapa('duckdb'):
+                empresas_df = consultas.empresas(filtros)
+        else:
+            # Carregar dados
+            df_empresas = aplicar_filtros_avancados(data_manager.df, filtros)
+            empresas_df = df_empresas if df_empresas.is_empty() else (
+                df_empresas
+                .pipe(agrupar_por_empresa)
+                .pipe(calcular_processos_mensais)
+            )
         
-        if df_empresas.is_empty():
+        if empresas_df.is_empty():
             return jsonify({
                 'success': True,
                 'porte': [],
@@ -1146,170 +1452,142 @@ def api_relatorio_detalhado():
             })
         
         # Calcular dados empresariais
-        empresas_df = (
-            df_empresas
-            .pipe(agrupar_por_empresa)
-            .pipe(calcular_processos_mensais)
-            .with_columns([
-                pl.when(pl.col('volume_mensal') <= 10)
-                .then(pl.lit('1. Micro (1-10 proc/mês)'))
-                .when(pl.col('volume_mensal') <= 50)
-                .then(pl.lit('2. Pequena (11-50 proc/mês)'))
-                .when(pl.col('volume_mensal') <= 100)
-                .then(pl.lit('3. Média (51-100 proc/mês)'))
-                .when(pl.col('volume_mensal') <= 500)
-                .then(pl.lit('4. Grande (101-500 proc/mês)'))
-                .when(pl.col('volume_mensal') <= 1000)
-                .then(pl.lit('4. Muito Grande (501-1000 proc/mês)'))
-                .otherwise(pl.lit('5. Gigante (1000+ proc/mês)'))
-                .alias('faixa_porte')
-            ])
-        )
-        
-        # === 1. ANÁLISE POR PORTE ===
-        porte_analise = (
-            empresas_df.group_by('faixa_porte')
-            .agg([
-                pl.len().alias('quantidade'),
-                pl.col('volume_mensal').sum().alias('volume_total'),
-                pl.col('volume_mensal').mean().alias('volume_medio')
-            ])
-            .sort('faixa_porte')
-        )
-        
-        porte_resultado = []
-        for row in porte_analise.iter_rows():
-            faixa, quantidade, volume_total, volume_medio = row
-            porte_resultado.append({
-                'faixa': faixa,
-                'quantidade': quantidade,
-                'volume_total': int(volume_total) if volume_total else 0,
-                'volume_medio': int(volume_medio) if volume_medio else 0
-            })
-        
-        # === 2. ANÁLISE POR RAMO ===
-        ramo_resultado = []
+        empresas_df = empresas_df.with_columns(_faixa_porte())
+        
+        # Todas as dimensões como planos lazy sobre o mesmo frame agregado por empresa,
+        # executados juntos (em paralelo) por pl.collect_all
+        base = empresas_df.lazy()
+        planos = {
+            'porte': (
+                _agregar_dimensao(base, ['faixa_porte'], {'faixa_porte': 'faixa'})
+                .sort('faixa')
+            )
+        }
         if 'RAMO' in empresas_df.columns:
-            ramo_analise = (
-                empresas_df.group_by('RAMO')
-                .agg([
-                    pl.len().alias('quantidade'),
-                    pl.col('volume_mensal').sum().alias('volume_total'),
-                    pl.col('volume_mensal').mean().alias('volume_medio')
-                ])
+            planos['ramo'] = (
+                _agregar_dimensao(base, ['RAMO'], {'RAMO': 'ramo'})
                 .sort('quantidade', descending=True)
             )
-            
-            for row in ramo_analise.iter_rows():
-                ramo, quantidade, volume_total, volume_medio = row
-                ramo_resultado.append({
-                    'ramo': ramo,
-                    'quantidade': quantidade,
-                    'volume_total': int(volume_total) if volume_total else 0,
-                    'volume_medio': int(volume_medio) if volume_medio else 0
-                })
-        
-        # === 3. ANÁLISE POR SEGMENTO ===
-        segmento_resultado = []
         if 'SEGMENTO' in empresas_df.columns:
-            segmento_analise = (
-                empresas_df.group_by('SEGMENTO')
-                .agg([
-                    pl.len().alias('quantidade'),
-                    pl.col('volume_mensal').sum().alias('volume_total'),
-                    pl.col('volume_mensal').mean().alias('volume_medio')
-                ])
+            planos['segmento'] = (
+                _agregar_dimensao(base, ['SEGMENTO'], {'SEGMENTO': 'segmento'})
                 .sort('quantidade', descending=True)
             )
+        
+        # === ANÁLISE POR CNAE (CLASSES E SUBCLASSES) ===
+        if data_manager.df_cnae is not None and 'CNAE' in empresas_df.columns:
+            # Mapear CNAEs para suas classes e subclasses (mesmo join da tabulação cruzada)
+            empresas_com_cnae = base.join(
+                data_manager.df_cnae.lazy().select(['Codigo_Subclasse', 'Codigo_Classe', 'Nome_Classe', 'Nome_Subclasse']),
+                left_on=pl.col('CNAE').cast(pl.Utf8).str.zfill(7),
+                right_on='Codigo_Subclasse',
+                how='left'
+            )
             
-            for row in segmento_analise.iter_rows():
-                segmento, quantidade, volume_total, volume_medio = row
-                segmento_resultado.append({
-                    'segmento': segmento,
-                    'quantidade': quantidade,
-                    'volume_total': int(volume_total) if volume_total else 0,
-                    'volume_medio': int(volume_medio) if volume_medio else 0
-                })
+            planos['cnae_classes'] = (
+                _agregar_dimensao(
+                    empresas_com_cnae.filter(pl.col('Nome_Classe').is_not_null()),
+                    ['Nome_Classe'], {'Nome_Classe': 'classe'},
+                    [pl.col('Codigo_Classe').first().alias('codigo_classe')]
+                )
+                .sort('quantidade', descending=True)
+            )
+            planos['cnae_subclasses'] = (
+                _agregar_dimensao(
+                    empresas_com_cnae.filter(pl.col('Nome_Subclasse').is_not_null()),
+                    ['Nome_Subclasse', 'Nome_Classe'], {'Nome_Subclasse': 'subclasse', 'Nome_Classe': 'classe_pai'},
+                    [pl.col('Codigo_Subclasse').first().alias('codigo_subclasse')]
+                )
+                .sort('quantidade', descending=True)
+                .limit(20)  # Limitar a 20 subclasses mais relevantes
+            )
         
-        # === 4. ANÁLISE POR CNAE (CLASSES E SUBCLASSES) ===
-        cnae_classes_resultado = []
-        cnae_subclasses_resultado = []
+        for nome, plano in planos.items():
+            instrumentacao.registrar_plano(nome, plano)
+        with instrumentacao.etapa('group_by'):
+            resultados = dict(zip(planos.keys(), pl.collect_all(list(planos.values()))))
+        
+        # formato='colunas' devolve cada dimensão como listas por coluna (mais compacto)
+        colunar = data.get('formato') == 'colunas'
+        resposta = {'success': True}
+        for dimensao in ['porte', 'ramo', 'segmento', 'cnae_classes', 'cnae_subclasses']:
+            resultado = resultados.get(dimensao)
+            if resultado is None:
+                resposta[dimensao] = {} if colunar else []
+            else:
+                resposta[dimensao] = resultado.to_dict(as_series=False) if colunar else resultado.to_dicts()
         
-        if 'CNAE' in empresas_df.columns:
-            # Carregar dados CNAE com informações de classe e subclasse
-            try:
-                df_cnae_info = pl.read_csv(data_manager.cnae_file)
-                
-                # Mapear CNAEs para suas classes e subclasses
-                empresas_com_cnae = empresas_df.join(
-                    df_cnae_info.select(['CNAE', 'CODIGO_CLASSE', 'CODIGO_SUBCLASSE', 'NOME_CLASSE', 'NOME_SUBCLASSE']),
-                    on='CNAE',
-                    how='left'
-                )
-                
-                # Análise por Classes CNAE
-                if 'NOME_CLASSE' in empresas_com_cnae.columns:
-                    classe_analise = (
-                        empresas_com_cnae.filter(pl.col('NOME_CLASSE').is_not_null())
-                        .group_by('NOME_CLASSE')
-                        .agg([
-                            pl.len().alias('quantidade'),
-                            pl.col('volume_mensal').sum().alias('volume_total'),
-                            pl.col('volume_mensal').mean().alias('volume_medio'),
-                            pl.col('CODIGO_CLASSE').first().alias('codigo_classe')
-                        ])
-                        .sort('quantidade', descending=True)
-                    )
-                    
-                    for row in classe_analise.iter_rows():
-                        nome_classe, quantidade, volume_total, volume_medio, codigo_classe = row
-                        cnae_classes_resultado.append({
-                            'classe': nome_classe,
-                            'codigo_classe': codigo_classe,
-                            'quantidade': quantidade,
-                            'volume_total': int(volume_total) if volume_total else 0,
-                            'volume_medio': int(volume_medio) if volume_medio else 0
-                        })
-                
-                # Análise por Subclasses CNAE
-                if 'NOME_SUBCLASSE' in empresas_com_cnae.columns:
-                    subclasse_analise = (
-                        empresas_com_cnae.filter(pl.col('NOME_SUBCLASSE').is_not_null())
-                        .group_by(['NOME_SUBCLASSE', 'NOME_CLASSE'])
-                        .agg([
-                            pl.len().alias('quantidade'),
-                            pl.col('volume_mensal').sum().alias('volume_total'),
-                            pl.col('volume_mensal').mean().alias('volume_medio'),
-                            pl.col('CODIGO_SUBCLASSE').first().alias('codigo_subclasse')
-                        ])
-                        .sort('quantidade', descending=True)
-                        .limit(20)  # Limitar a 20 subclasses mais relevantes
-                    )
-                    
-                    for row in subclasse_analise.iter_rows():
-                        nome_subclasse, nome_classe, quantidade, volume_total, volume_medio, codigo_subclasse = row
-                        cnae_subclasses_resultado.append({
-                            'subclasse': nome_subclasse,
-                            'classe_pai': nome_classe,
-                            'codigo_subclasse': codigo_subclasse,
-                            'quantidade': quantidade,
-                            'volume_total': int(volume_total) if volume_total else 0,
-                            'volume_medio': int(volume_medio) if volume_medio else 0
-                        })
-                        
-            except Exception as e:
-                print(f"⚠️ Erro ao carregar análise CNAE: {e}")
+        return jsonify(resposta)
+    except Exception as e:
+        log.exception('❌ Erro na API relatório detalhado')
+        return jsonify({'error': str(e)}), 500
+
+# Dimensões aceitas na tabulação cruzada
+DIMENSOES_CRUZAMENTO = ['TRIBUNAL', 'GRAU', 'SEGMENTO', 'RAMO', 'CLASSE_CNAE', 'faixa_porte']
+
+@app.route('/api/tabulacao-cruzada', methods=['POST'])
+@login_required
+@admissao_controlada('tabulacao')
+def api_tabulacao_cruzada():
+    """API de tabulação cruzada (2-3 dimensões) com subtotais e total geral numa única passada"""
+    try:
+        if data_manager.df is None:
+            return jsonify({'error': 'Dados não carregados'}), 400
+        
+        data = request.get_json() or {}
+        dimensoes = data.get('dimensoes', [])
+        modo = data.get('modo', 'cube')
+        
+        if not 2 <= len(dimensoes) <= 3 or len(set(dimensoes)) != len(dimensoes):
+            return jsonify({'error': 'Informe 2 ou 3 dimensões distintas'}), 400
+        invalidas = [d for d in dimensoes if d not in DIMENSOES_CRUZAMENTO]
+        if invalidas:
+            return jsonify({'error': f'Dimensões inválidas: {invalidas}. Use: {DIMENSOES_CRUZAMENTO}'}), 400
+        if modo not in ('cube', 'rollup'):
+            return jsonify({'error': "modo deve ser 'cube' ou 'rollup'"}), 400
+        
+        df = aplicar_filtros_avancados(data_manager.df, data.get('filtros', {}))
+        ausentes = [d for d in dimensoes if d not in ('CLASSE_CNAE', 'faixa_porte') and d not in df.columns]
+        if ausentes:
+            return jsonify({'error': f'Colunas não disponíveis nos dados: {ausentes}'}), 400
+        
+        # Volume por linha: NOVOS (janela de 12 meses) / 12
+        fatos = df.lazy().with_columns((pl.col('NOVOS') / 12).alias('volume_mensal'))
+        
+        if 'CLASSE_CNAE' in dimensoes:
+            if data_manager.df_cnae is None or 'CNAE' not in df.columns:
+                return jsonify({'error': 'Tabela CNAE não carregada'}), 400
+            fatos = fatos.join(
+                data_manager.df_cnae.lazy().select(['Codigo_Subclasse', pl.col('Nome_Classe').alias('CLASSE_CNAE')]),
+                left_on=pl.col('CNAE').cast(pl.Utf8).str.zfill(7),
+                right_on='Codigo_Subclasse',
+                how='left'
+            )
+        
+        if 'faixa_porte' in dimensoes:
+            # Porte é atributo da empresa (volume consolidado), não da linha
+            portes = (
+                calcular_processos_mensais(agrupar_por_empresa(df))
+                .select(['EMPRESA_ID', _faixa_porte()])
+            )
+            fatos = fatos.join(portes.lazy(), on='EMPRESA_ID', how='left')
+        
+        instrumentacao.registrar_plano('fatos', fatos)
+        with instrumentacao.etapa('group_by'):
+            resultado = tabulacao_cruzada(fatos, dimensoes, modo=modo, colunas_soma=['NOVOS'])
+        resultado = resultado.with_columns([
+            pl.col('volume_mensal').round(0).cast(pl.Int64),
+            pl.col('volume_medio').round(1)
+        ])
         
         return jsonify({
             'success': True,
-            'porte': porte_resultado,
-            'ramo': ramo_resultado,
-            'segmento': segmento_resultado,
-            'cnae_classes': cnae_classes_resultado,
-            'cnae_subclasses': cnae_subclasses_resultado
+            'dimensoes': dimensoes,
+            'modo': modo,
+            'linhas': resultado.to_dict(as_series=False) if data.get('formato') == 'colunas' else resultado.to_dicts()
         })
     except Exception as e:
-        print(f"❌ Erro na API relatório detalhado: {e}")
+        log.exception('❌ Erro na API tabulação cruzada')
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/progress', methods=['GET'])
@@ -1318,6 +1596,102 @@ def api_progress():
     """API para obter progresso do carregamento"""
     return jsonify(progress_data)
 
+@app.route('/api/tendencia', methods=['POST'])
+@login_required
+def api_tendencia():
+    """API para série mensal de novos processos por empresa/tribunal (histórico particionado)"""
+    try:
+        if not data_manager.historico.disponivel():
+            return jsonify({'error': 'Histórico mensal vazio'}), 400
+        
+        data = request.get_json() or {}
+        
+        def _mes(valor):
+            # Aceita 'AAAA-MM'
+            if not valor:
+                return None
+            ano, mes = str(valor).split('-')
+            ano, mes = int(ano), int(mes)
+            if not 1 <= mes <= 12:
+                raise ValueError(valor)
+            return ano, mes
+        
+        try:
+            desde, ate = _mes(data.get('desde')), _mes(data.get('ate'))
+        except ValueError:
+            return jsonify({'error': "Mês inválido: use 'AAAA-MM' em desde/ate"}), 400
+        
+        serie = data_manager.historico.tendencia(
+            empresas=data.get('empresas') or None,
+            tribunais=data.get('tribunais') or None,
+            desde=desde,
+            ate=ate,
+            por_tribunal=bool(data.get('por_tribunal', False))
+        )
+        
+        return jsonify({
+            'success': True,
+            'meses': [f"{a:04d}-{m:02d}" for a, m in data_manager.historico.meses()],
+            'serie': serie.to_dicts()
+        })
+    except Exception as e:
+        log.exception('❌ Erro na API tendência')
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/versoes', methods=['GET'])
+@login_required
+def api_versoes():
+    """API para consultar a versão atual dos dados e versões antigas ainda em uso"""
+    status = data_manager.versoes.status()
+    status['carregando'] = data_manager.carregando
+    status['backend_consultas'] = 'duckdb' if data_manager.consultas is not None else 'polars'
+    return jsonify({'success': True, **status})
+
+@app.route('/metrics', methods=['GET'])
+def metricas_prometheus():
+    """Histogramas de duração por endpoint e etapa no formato texto do Prometheus"""
+    token = os.environ.get('TOKEN_METRICAS')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return Response('não autorizado\n', status=401, mimetype='text/plain')
+    descartados = log_estruturado.status()['descartados']
+    metricas = instrumentacao.prometheus() + (
+        '# HELP litigantes_log_descartados_total Registros de log descartados com a fila cheia.\n'
+        '# TYPE litigantes_log_descartados_total counter\n'
+        f'litigantes_log_descartados_total {descartados}\n'
+    )
+    return Response(metricas, mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/requisicoes-lentas', methods=['GET'])
+@login_required
+def api_requisicoes_lentas():
+    """Relatórios das requisições acima do limiar: etapas, planos Polars e pilhas amostradas"""
+    return jsonify({
+        'success': True,
+        'limiar_ms': instrumentacao.limiar_lenta * 1000,
+        'requisicoes': instrumentacao.lentas()
+    })
+
+@app.route('/api/buscar-empresas', methods=['GET'])
+@login_required
+def api_buscar_empresas():
+    """API de sugestões para busca por digitação (prefixo, substring e aproximada, sem acentos)"""
+    try:
+        consulta = request.args.get('q', '').strip()
+        limite = min(max(request.args.get('limite', 10, type=int), 1), 50)
+
+        indice = data_manager.indice_busca
+        if indice is None:
+            return jsonify({'error': 'Dados não carregados'}), 400
+
+        return jsonify({
+            'success': True,
+            'consulta': consulta,
+            'sugestoes': indice.buscar(consulta, limite) if consulta else [],
+            'versao': data_manager.numero_versao
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 def update_progress(percent, status, details='', speed='', bytes=''):
     """Atualizar progresso global"""
     global progress_data
@@ -1329,10 +1703,11 @@ def update_progress(percent, status, details='', speed='', bytes=''):
         'bytes': bytes,
         'active': True
     })
-    print(f"📊 Progresso: {percent:.1f}% - {status}")
+    log.info('📊 Progresso', extra={'evento': 'progresso', 'percentual': round(percent, 1), 'status': status})
 
 
 
+@instrumentacao.cronometrar('group_by')
 def agrupar_por_empresa(df: pl.DataFrame) -> pl.DataFrame:
     """
     Agrupa dados por empresa, priorizando CNPJ quando disponível
@@ -1344,7 +1719,28 @@ def agrupar_por_empresa(df: pl.DataFrame) -> pl.DataFrame:
     # Detectar se existe coluna de CNPJ
     colunas_cnpj = [col for col in df.columns if 'CNPJ' in col.upper()]
     
-    if colunas_cnpj:
+    if 'EMPRESA_ID' in df.columns:
+        # ID da dimensão de empresas (já resolve CNPJ/variações de nome): group_by em inteiro.
+        # Uma linha por empresa, como no agrupamento por CNPJ: empresa presente em vários
+        # segmentos fica com o SEGMENTO/TRIBUNAL da primeira linha (o fallback por nome,
+        # sem ID, ainda separa por (NOME, SEGMENTO))
+        agregacoes = [
+            pl.col('NOME').first().alias('NOME'),
+            pl.col('NOVOS').sum().alias('NOVOS'),
+            pl.col('TRIBUNAL').first().alias('TRIBUNAL'),
+            pl.len().alias('REGISTROS_AGRUPADOS')
+        ]
+        
+        for col in df.columns:
+            if col not in ['EMPRESA_ID', 'NOME', 'NOVOS', 'TRIBUNAL'] + colunas_cnpj:
+                if 'PENDENTES' in col or 'BAIXADOS' in col:
+                    agregacoes.append(pl.col(col).sum().alias(col))
+                else:
+                    agregacoes.append(pl.col(col).first().alias(col))
+        
+        df_agrupado = df.group_by('EMPRESA_ID').agg(agregacoes)
+        
+    elif colunas_cnpj:
         # Usar CNPJ para agrupamento (método mais preciso)
         coluna_cnpj = colunas_cnpj[0]
         
@@ -1401,16 +1797,23 @@ def calcular_processos_mensais(df: pl.DataFrame) -> pl.DataFrame:
     PENDENTES: Snapshot do mês de referência
     """
     if df.is_empty():
-        return df
+        # Seleção vazia mantém o schema de saída (quem chama soma/filtra volume_mensal)
+        return df.with_columns([
+            pl.lit(None, dtype=pl.Float64).alias('volume_mensal'),
+            pl.lit(None, dtype=pl.Utf8).alias('metodo_calculo')
+        ])
     
     df_com_calculo = df.with_columns([
+        # Arredondamento meio-para-cima explícito (floor(x + 0.5)): o round()
+        # muda de regra entre versões do Polars e difere do round() do DuckDB,
+        # e os dois backends de consulta precisam dar os mesmos números
         # Método 1: NOVOS ÷ 12 (metodologia CNJ correta)
         pl.when(pl.col('NOVOS').is_not_null() & (pl.col('NOVOS') > 0))
-        .then((pl.col('NOVOS').cast(pl.Float64) / 12).round())
+        .then((pl.col('NOVOS').cast(pl.Float64) / 12 + 0.5).floor())
         
         # Método 2: Estimativa por PENDENTES ÷ 10 (rotatividade)
         .when(pl.col('PENDENTES BRUTO').is_not_null() & (pl.col('PENDENTES BRUTO') > 0))
-        .then((pl.col('PENDENTES BRUTO').cast(pl.Float64) / 10).round())
+        .then((pl.col('PENDENTES BRUTO').cast(pl.Float64) / 10 + 0.5).floor())
         
         # Método 3: Estimativa mínima
         .otherwise(25)
@@ -1427,6 +1830,7 @@ def calcular_processos_mensais(df: pl.DataFrame) -> pl.DataFrame:
     
     return df_com_calculo
 
+@instrumentacao.cronometrar('filtro')
 def aplicar_filtros_avancados(df: pl.DataFrame, filtros: dict) -> pl.DataFrame:
     """Aplica filtros avançados baseados nos parâmetros (suporta seleção múltipla)"""
     if df.is_empty():
@@ -1515,15 +1919,21 @@ def aplicar_filtros_avancados(df: pl.DataFrame, filtros: dict) -> pl.DataFrame:
     # Nota: Filtros de volume são aplicados após calcular_processos_mensais()
     # pois a coluna volume_mensal ainda não existe neste ponto
     
-    # Busca por nome da empresa
+    # Busca por nome da empresa: índice sobre nomes distintos -> IDs -> linhas
     if filtros.get('busca_empresa'):
-        busca = filtros['busca_empresa'].lower()
-        df_filtrado = df_filtrado.filter(
-            pl.col('NOME').str.to_lowercase().str.contains(busca)
-        )
+        indice = data_manager.indice_busca
+        if indice is not None and 'EMPRESA_ID' in df_filtrado.columns:
+            ids = indice.ids_correspondentes(filtros['busca_empresa'])
+            df_filtrado = df_filtrado.filter(pl.col('EMPRESA_ID').is_in(ids))
+        else:
+            busca = filtros['busca_empresa'].lower()
+            df_filtrado = df_filtrado.filter(
+                pl.col('NOME').str.to_lowercase().str.contains(busca, literal=True)
+            )
     
     return df_filtrado
 
+@instrumentacao.cronometrar('filtro')
 def aplicar_filtros_volume(df: pl.DataFrame, filtros: dict) -> pl.DataFrame:
     """Aplica filtros de volume após a coluna volume_mensal ser criada"""
     if df.is_empty():
@@ -1615,43 +2025,8 @@ def encontrar_break_even(preco: float, custo_base: int, clientes: int) -> int:
 
 def gerar_dados_simulados() -> pl.DataFrame:
     """Gera dados simulados para demonstração"""
-    import random
-    
-    # Usar seed fixa para dados consistentes
-    np.random.seed(42)
-    random.seed(42)
-    
-    # Empresas brasileiras conhecidas
-    empresas = [
-        'BANCO DO BRASIL S.A.', 'ITAÚ UNIBANCO S.A.', 'BRADESCO S.A.', 'SANTANDER BRASIL S.A.',
-        'TELEFÔNICA BRASIL S.A.', 'TIM S.A.', 'CLARO S.A.', 'OI S.A.',
-        'PETROBRAS S.A.', 'VALE S.A.', 'AMBEV S.A.', 'JBS S.A.',
-        'MAGAZINE LUIZA S.A.', 'VIA VAREJO S.A.', 'LOJAS AMERICANAS S.A.', 'B2W DIGITAL S.A.',
-        'BANCO SANTANDER S.A.', 'CAIXA ECONÔMICA FEDERAL', 'BANCO INTER S.A.', 'NUBANK S.A.',
-        'EMBRAER S.A.', 'GERDAU S.A.', 'USIMINAS S.A.', 'CSN S.A.',
-        'CARREFOUR BRASIL S.A.', 'WALMART BRASIL S.A.', 'ATACADÃO S.A.', 'GRUPO PÃO DE AÇÚCAR S.A.'
-    ] * 36  # Repetir para ter 1000 registros
-    
-    ramos = [
-        'BANCOS E SERVIÇOS FINANCEIROS', 'TELECOMUNICAÇÕES', 'ENERGIA E PETRÓLEO', 
-        'VAREJO E COMÉRCIO', 'SIDERURGIA E MINERAÇÃO', 'ALIMENTAÇÃO E BEBIDAS',
-        'TECNOLOGIA', 'CONSTRUÇÃO CIVIL', 'SAÚDE', 'EDUCAÇÃO'
-    ]
-    
-    dados_fake = {
-        'NOME': empresas[:1000],
-        'TRIBUNAL': np.random.choice(['TRT1', 'TRT2', 'TJSP', 'TRF1', 'TST', 'TJRJ', 'TJMG'], 1000),
-        'GRAU': np.random.choice(['1º GRAU', '2º GRAU', 'INSTÂNCIA ÚNICA'], 1000),
-        'RAMO': np.random.choice(ramos, 1000),
-        'NOVOS': np.random.randint(100, 5000, 1000),
-        'PENDENTES BRUTO': np.random.randint(500, 20000, 1000),
-        'PENDENTES LÍQUIDO': np.random.randint(300, 15000, 1000),
-        'SEGMENTO': np.random.choice(['ADMINISTRAÇÃO PÚBLICA', 'TELECOMUNICAÇÕES', 'BANCÁRIO', 'VAREJO', 'ENERGIA'], 1000),
-        'ANO': [2025] * 1000,
-        'MES': np.random.randint(1, 13, 1000)
-    }
-    
-    return pl.DataFrame(dados_fake)
+    # Semente fixa (padrão do gerador) para dados consistentes
+    return gerar_dataset(1000, n_empresas=1000, ano=2025)
 
 
 
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+⏱️ BENCHMARK DA API - LATÊNCIA, VAZÃO E MEMÓRIA POR ENDPOINT
+
+Mede os caminhos quentes da API sobre datasets sintéticos em várias escalas
+(gerador_sintetico.py, com cardinalidades realistas), pelo test client do
+Flask - sem rede e sem servidor no meio:
+
+- /api/filtros-disponiveis, /api/ranking, /api/estatisticas-gerais,
+  /api/relatorio-detalhado e /api/simulacao, com alguns cenários de filtro
+- latência p50/p95/p99/máx, vazão sequencial (req/s) e pico de RSS; respostas
+  diferentes de 200 são contadas como erro e ficam fora da latência
+
+Cada escala roda num processo próprio: o pico de RSS (ru_maxrss) não se
+mistura entre escalas. Os datasets ficam no cache (mesma semente, mesmo
+arquivo) e os resultados vão para benchmarks/benchmark_<data>.json, que
+podem ser comparados entre si para detectar regressões.
+
+Uso:
+    python benchmark_api.py                                  # 1M, 5M e 15M linhas
+    python benchmark_api.py --escalas 100000 --repeticoes 5  # rodada rápida
+    python benchmark_api.py --comparar benchmarks/base.json benchmarks/novo.json
+    BACKEND_CONSULTAS=duckdb python benchmark_api.py         # mesmo roteiro no DuckDB
+"""
+
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import polars as pl
+
+from download_drive import DIRETORIO_CACHE
+from gerador_sintetico import SEMENTE_PADRAO, gerar_parquet
+
+ESCALAS_PADRAO = [1_000_000, 5_000_000, 15_000_000]
+REPETICOES_PADRAO = 20
+AQUECIMENTO = 2
+DIRETORIO_DATASETS = DIRETORIO_CACHE / 'benchmark'
+DIRETORIO_RESULTADOS = Path('benchmarks')
+
+# Piora relativa de p50/p95 a partir da qual a comparação acusa regressão
+LIMIAR_REGRESSAO = 0.10
+
+
+def dataset_sintetico(linhas: int, semente: int = SEMENTE_PADRAO) -> Path:
+    """Parquet sintético da escala (gerado uma vez e reaproveitado do cache)"""
+    DIRETORIO_DATASETS.mkdir(parents=True, exist_ok=True)
+    # Dígitos agrupados: o nome não pode parecer um extrato mensal (AAAAMM) e cair no histórico
+    destino = DIRETORIO_DATASETS / f"sintetico_{linhas:_}_semente_{semente:_}.parquet"
+    if not destino.exists():
+        print(f"🧪 Gerando {linhas:,} linhas em {destino}...")
+        gerar_parquet(destino, linhas, semente=semente)
+    return destino
+
+
+def _rss_pico_mb() -> float:
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return pico / 1024**2 if sys.platform == 'darwin' else pico / 1024
+
+
+def cenarios(df: pl.DataFrame) -> Dict[str, List[Tuple[str, Dict]]]:
+    """Requisições por endpoint, com valores de filtro tirados do próprio dataset"""
+    def mais_frequentes(coluna: str, n: int, base: pl.DataFrame = df) -> List:
+        return base[coluna].value_counts().sort('count', descending=True)[coluna].head(n).to_list()
+
+    tribunais = mais_frequentes('TRIBUNAL', 3)
+    segmento = mais_frequentes('SEGMENTO', 1)
+    # CNAEs do próprio segmento: a combinação precisa existir nos dados
+    cnae = [str(c) for c in mais_frequentes('CNAE', 2, df.filter(pl.col('SEGMENTO') == segmento[0]))]
+    empresas = mais_frequentes('NOME', 3)
+    busca = empresas[0].split()[0]
+
+    filtros = [
+        ('sem_filtro', {}),
+        ('tribunal', {'tribunais': tribunais[:1]}),
+        ('tres_tribunais', {'tribunais': tribunais}),
+        ('segmento_cnae', {'segmentos': segmento, 'cnae': cnae}),
+        ('busca', {'busca_empresa': busca}),
+    ]
+    return {
+        '/api/filtros-disponiveis': [(nome, {'filtros': f}) for nome, f in filtros],
+        '/api/ranking': [(nome, {'filtros': f}) for nome, f in filtros],
+        '/api/estatisticas-gerais': [(nome, {'filtros': f}) for nome, f in filtros]
+                                    + [('aproximado_tres_tribunais', {'filtros': {'tribunais': tribunais},
+                                                                      'modo': 'aproximado'})],
+        '/api/relatorio-detalhado': [(nome, {'filtros': f}) for nome, f in filtros[:4]],
+        '/api/simulacao': [
+            ('uma_empresa', {'empresas_selecionadas': empresas[:1], 'preco': 50}),
+            ('tres_empresas', {'empresas_selecionadas': empresas, 'preco': 50, 'clientes': 3}),
+        ],
+    }
+
+
+def _percentis(latencias: List[float]) -> Dict:
+    if not latencias:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None, 'media_ms': None}
+    ms = np.array(latencias) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(ms, 50)), 2),
+        'p95_ms': round(float(np.percentile(ms, 95)), 2),
+        'p99_ms': round(float(np.percentile(ms, 99)), 2),
+        'max_ms': round(float(ms.max()), 2),
+        'media_ms': round(float(ms.mean()), 2),
+    }
+
+
+def medir_escala(linhas: int, repeticoes: int = REPETICOES_PADRAO, semente: int = SEMENTE_PADRAO) -> Dict:
+    """Carrega o dataset da escala no app e mede cada endpoint (no processo atual)"""
+    arquivo = dataset_sintetico(linhas, semente)
+
+    import app as aplicacao
+    cliente = aplicacao.app.test_client()
+    cliente.post('/login', data={'username': 'admin', 'password': '123'})
+
+    inicio = time.perf_counter()
+    aplicacao.data_manager.load_data(0, str(arquivo))
+    carga_s = time.perf_counter() - inicio
+    resultado = {
+        'linhas': linhas,
+        'arquivo_mb': round(arquivo.stat().st_size / 1024**2, 1),
+        'carga_s': round(carga_s, 2),
+        'rss_apos_carga_mb': round(_rss_pico_mb(), 1),
+        'endpoints': {},
+    }
+
+    for endpoint, lista in cenarios(aplicacao.data_manager.df).items():
+        latencias, por_cenario, erros = [], {}, 0
+        for nome, payload in lista:
+            for _ in range(AQUECIMENTO):
+                cliente.post(endpoint, json=payload)
+            tempos = []
+            for _ in range(repeticoes):
+                inicio = time.perf_counter()
+                resposta = cliente.post(endpoint, json=payload)
+                decorrido = time.perf_counter() - inicio
+                # Respostas de erro (rápidas) não entram na latência: só são contadas
+                if resposta.status_code == 200:
+                    tempos.append(decorrido)
+                else:
+                    erros += 1
+            if len(tempos) < repeticoes:
+                print(f"   ❌ {endpoint} [{nome}]: {repeticoes - len(tempos)} respostas != 200")
+            latencias.extend(tempos)
+            por_cenario[nome] = round(float(np.median(tempos)) * 1000, 2) if tempos else None
+
+        resultado['endpoints'][endpoint] = {
+            **_percentis(latencias),
+            'req_s': round(len(latencias) / sum(latencias), 1) if latencias else 0.0,
+            'requisicoes': len(latencias),
+            'erros': erros,
+            'rss_pico_mb': round(_rss_pico_mb(), 1),
+            'p50_por_cenario_ms': por_cenario,
+        }
+        print(f"   {endpoint}: p50 {resultado['endpoints'][endpoint]['p50_ms']}ms, "
+              f"p95 {resultado['endpoints'][endpoint]['p95_ms']}ms, erros {erros}")
+
+    resultado['rss_pico_mb'] = round(_rss_pico_mb(), 1)
+    return resultado
+
+
+def _metadados() -> Dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'polars': pl.__version__,
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'backend_consultas': os.environ.get('BACKEND_CONSULTAS', 'polars'),
+    }
+
+
+def executar(escalas: List[int], repeticoes: int = REPETICOES_PADRAO, semente: int = SEMENTE_PADRAO,
+             saida: Optional[Path] = None) -> Path:
+    """Roda cada escala num subprocesso e grava o JSON consolidado"""
+    resultados = {'metadados': {**_metadados(), 'repeticoes': repeticoes, 'semente': semente}, 'escalas': {}}
+    for linhas in escalas:
+        print(f"\n⏱️ Escala {linhas:,} linhas")
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as temporario:
+            caminho_parcial = Path(temporario.name)
+        try:
+            subprocess.run([sys.executable, __file__, '--_escala', str(linhas), '--repeticoes', str(repeticoes),
+                            '--semente', str(semente), '--_saida', str(caminho_parcial)], check=True)
+            resultados['escalas'][str(linhas)] = json.loads(caminho_parcial.read_text())
+        except subprocess.CalledProcessError as e:
+            print(f"❌ Escala {linhas:,} falhou (código {e.returncode})")
+            resultados['escalas'][str(linhas)] = {'linhas': linhas, 'erro': f"código de saída {e.returncode}"}
+        finally:
+            caminho_parcial.unlink(missing_ok=True)
+
+    if saida is None:
+        DIRETORIO_RESULTADOS.mkdir(parents=True, exist_ok=True)
+        saida = DIRETORIO_RESULTADOS / f"benchmark_{datetime.now():%Y%m%d_%H%M%S}.json"
+    saida.write_text(json.dumps(resultados, indent=2, ensure_ascii=False))
+    return saida
+
+
+def comparar(base: Path, novo: Path, limiar: float = LIMIAR_REGRESSAO) -> List[str]:
+    """Regressões de p50/p95 e pico de RSS do `novo` em relação à `base` (escalas e endpoints comuns)"""
+    antes = json.loads(Path(base).read_text())['escalas']
+    depois = json.loads(Path(novo).read_text())['escalas']
+    regressoes = []
+    for escala in sorted(set(antes) & set(depois), key=int):
+        a_endpoints = antes[escala].get('endpoints', {})
+        d_endpoints = depois[escala].get('endpoints', {})
+        for endpoint in sorted(set(a_endpoints) & set(d_endpoints)):
+            linha = [f"{int(escala):>11,} {endpoint:<28}"]
+            for metrica in ('p50_ms', 'p95_ms', 'rss_pico_mb'):
+                valor_a, valor_d = a_endpoints[endpoint][metrica], d_endpoints[endpoint][metrica]
+                if valor_a is None or valor_d is None:
+                    # Endpoint sem nenhuma resposta 200 numa das rodadas: não há latência a comparar
+                    linha.append(f"{metrica} sem medida")
+                    continue
+                variacao = (valor_d / valor_a - 1) if valor_a else 0.0
+                marca = ' ⚠️' if variacao > limiar else ''
+                linha.append(f"{metrica} {valor_a:>9.1f} -> {valor_d:>9.1f} ({variacao:+.0%}){marca}")
+                if variacao > limiar:
+                    regressoes.append(f"{escala} {endpoint} {metrica} {variacao:+.0%}")
+            print('  '.join(linha))
+    return regressoes
+
+
+def _imprimir(resultados: Dict):
+    for escala, dados in resultados['escalas'].items():
+        if 'erro' in dados:
+            print(f"\n❌ {int(escala):,} linhas: {dados['erro']}")
+            continue
+        print(f"\n📊 {int(escala):,} linhas - carga {dados['carga_s']}s, pico RSS {dados['rss_pico_mb']}MB")
+        for endpoint, m in dados['endpoints'].items():
+            p50, p95, p99 = (f"{m[k]:>8.1f}" if m[k] is not None else f"{'-':>8}" for k in ('p50_ms', 'p95_ms', 'p99_ms'))
+            print(f"   {endpoint:<28} p50 {p50}ms  p95 {p95}ms  "
+                  f"p99 {p99}ms  {m['req_s']:>7.1f} req/s  erros {m['erros']}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Benchmark dos endpoints da API em datasets sintéticos')
+    parser.add_argument('--escalas', type=int, nargs='+', default=ESCALAS_PADRAO)
+    parser.add_argument('--repeticoes', type=int, default=REPETICOES_PADRAO)
+    parser.add_argument('--semente', type=int, default=SEMENTE_PADRAO)
+    parser.add_argument('--saida', type=Path, help='Padrão: benchmarks/benchmark_<data>.json')
+    parser.add_argument('--comparar', nargs=2, metavar=('BASE', 'NOVO'), help='Compara dois resultados')
+    parser.add_argument('--_escala', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--_saida', type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.comparar:
+        regressoes = comparar(*args.comparar)
+        if regressoes:
+            print(f"\n⚠️ {len(regressoes)} regressão(ões) acima de {LIMIAR_REGRESSAO:.0%}:")
+            for regressao in regressoes:
+                print(f"   {regressao}")
+            sys.exit(1)
+        print("\n✅ Sem regressões")
+    elif args._escala:
+        # Processo filho: uma escala só
+        args._saida.write_text(json.dumps(medir_escala(args._escala, args.repeticoes, args.semente)))
+    else:
+        caminho = executar(args.escalas, args.repeticoes, args.semente, args.saida)
+        _imprimir(json.loads(caminho.read_text()))
+        print(f"\n💾 Resultados: {caminho}")
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🔍 ÍNDICE DE BUSCA DE EMPRESAS - PREFIXO, SUBSTRING E APROXIMADA
+
+Construído uma vez sobre os nomes DISTINTOS (não sobre as linhas), com a
+mesma normalização da dimensão de empresas (sem acentos, maiúsculas, sem
+pontuação). Estruturas:
+
+- tokens ordenados (prefixo por busca binária, para digitação incremental)
+- índice invertido de trigramas (substring e correspondência aproximada)
+
+Os resultados trazem EMPRESA_ID, que mapeia de volta às linhas com
+pl.col('EMPRESA_ID').is_in(ids).
+"""
+
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+
+import polars as pl
+
+from dimensao_empresas import normalizar_nome
+
+# Fração mínima dos trigramas da consulta presentes no nome para sugestões aproximadas
+LIMIAR_APROXIMADO = 0.6
+
+# Pontuação por tipo de correspondência (maior = melhor)
+PONTOS_INICIO = 3.0
+PONTOS_PREFIXO = 2.0
+PONTOS_CONTEM = 1.0
+
+
+def _trigramas(texto: str) -> Set[str]:
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class IndiceBuscaEmpresas:
+    """Busca de empresas por nome em milissegundos, independente do total de linhas"""
+
+    def __init__(self, nomes: Iterable[str], ids: Optional[Iterable[int]] = None,
+                 pesos: Optional[Iterable[int]] = None, exibicao: Optional[Iterable[str]] = None):
+        self.nomes: List[str] = list(nomes)
+        total = len(self.nomes)
+        self.ids: List[int] = list(ids) if ids is not None else list(range(total))
+        self.pesos: List[int] = list(pesos) if pesos is not None else [0] * total
+        # Nome mostrado ao usuário (ex.: nome canônico quando o indexado é um apelido)
+        self.exibicao: List[str] = list(exibicao) if exibicao is not None else self.nomes
+        self.normalizados: List[str] = [normalizar_nome(n) or '' for n in self.nomes]
+
+        # Tokens ordenados: prefixo = faixa contígua encontrada por busca binária
+        pares = sorted(
+            (token, i) for i, norm in enumerate(self.normalizados) for token in set(norm.split())
+        )
+        self._tokens = [token for token, _ in pares]
+        self._tokens_entrada = [i for _, i in pares]
+
+        # Índice invertido de trigramas
+        self._trigramas: Dict[str, Set[int]] = defaultdict(set)
+        self._total_trigramas: List[int] = []
+        for i, norm in enumerate(self.normalizados):
+            trigramas = _trigramas(norm)
+            self._total_trigramas.append(len(trigramas))
+            for trigrama in trigramas:
+                self._trigramas[trigrama].add(i)
+
+    @classmethod
+    def da_dimensao(cls, dimensao: pl.DataFrame) -> 'IndiceBuscaEmpresas':
+        """Indexa nome canônico e apelidos de cada empresa da dimensão"""
+        if dimensao is None or dimensao.is_empty():
+            return cls([])
+        colunas = ['EMPRESA_ID', 'NOME', 'REGISTROS']
+        if 'ALIASES' in dimensao.columns:
+            entradas = (
+                dimensao.select(colunas + ['ALIASES'])
+                .explode('ALIASES')
+                .select([pl.col('ALIASES').fill_null(pl.col('NOME')).alias('INDEXADO'), *colunas])
+                .unique(subset=['EMPRESA_ID', 'INDEXADO'], maintain_order=True)
+            )
+        else:
+            entradas = dimensao.select([pl.col('NOME').alias('INDEXADO'), *colunas])
+        return cls(entradas['INDEXADO'].to_list(), entradas['EMPRESA_ID'].to_list(),
+                   entradas['REGISTROS'].to_list(), entradas['NOME'].to_list())
+
+    @classmethod
+    def de_nomes(cls, nomes: Iterable[str]) -> 'IndiceBuscaEmpresas':
+        """Indexa uma lista de nomes (o ID é a posição na lista)"""
+        return cls([n for n in nomes if n is not None])
+
+    def __len__(self) -> int:
+        return len(self.nomes)
+
+    # === CORRESPONDÊNCIAS ===
+
+    def _prefixo_token(self, prefixo: str) -> Set[int]:
+        inicio = bisect_left(self._tokens, prefixo)
+        encontrados = set()
+        for posicao in range(inicio, len(self._tokens)):
+            if not self._tokens[posicao].startswith(prefixo):
+                break
+            encontrados.add(self._tokens_entrada[posicao])
+        return encontrados
+
+    def _por_prefixo(self, consulta: str) -> Set[int]:
+        """Todos os termos da consulta são prefixo de algum token do nome"""
+        candidatos: Optional[Set[int]] = None
+        for termo in consulta.split():
+            encontrados = self._prefixo_token(termo)
+            candidatos = encontrados if candidatos is None else candidatos & encontrados
+            if not candidatos:
+                return set()
+        return candidatos or set()
+
+    def _por_substring(self, consulta: str) -> Set[int]:
+        trigramas = _trigramas(consulta)
+        if not trigramas:
+            return set()
+        listas = sorted((self._trigramas.get(t, set()) for t in trigramas), key=len)
+        candidatos = set(listas[0]).intersection(*listas[1:])
+        return {i for i in candidatos if consulta in self.normalizados[i]}
+
+    def _aproximados(self, consulta: str) -> Dict[int, float]:
+        trigramas = _trigramas(consulta)
+        if not trigramas:
+            return {}
+        comuns = Counter()
+        for trigrama in trigramas:
+            comuns.update(self._trigramas.get(trigrama, ()))
+        similares = {}
+        for i, n_comuns in comuns.items():
+            cobertura = n_comuns / len(trigramas)
+            if cobertura >= LIMIAR_APROXIMADO:
+                # Desempate: nomes mais curtos (mais parecidos com a consulta) primeiro
+                similares[i] = 0.9 * cobertura + 0.09 * (n_comuns / max(self._total_trigramas[i], 1))
+        return similares
+
+    def _pontuar(self, consulta: str, aproximada: bool) -> Dict[int, float]:
+        pontuacoes: Dict[int, float] = {}
+        for i in self._por_prefixo(consulta):
+            pontuacoes[i] = PONTOS_INICIO if self.normalizados[i].startswith(consulta) else PONTOS_PREFIXO
+        for i in self._por_substring(consulta):
+            pontuacoes.setdefault(i, PONTOS_CONTEM)
+        if aproximada:
+            # Similaridade < 1: sempre abaixo das correspondências exatas (typos, letras trocadas)
+            for i, similaridade in self._aproximados(consulta).items():
+                pontuacoes.setdefault(i, similaridade)
+        return pontuacoes
+
+    # === API ===
+
+    def buscar(self, consulta: str, limite: int = 10, aproximada: bool = True) -> List[Dict]:
+        """Sugestões ordenadas por relevância e, no empate, por volume de registros"""
+        normalizada = normalizar_nome(consulta)
+        if not normalizada:
+            return []
+
+        pontuacoes = self._pontuar(normalizada, aproximada)
+        ordenados = sorted(pontuacoes.items(), key=lambda item: (-item[1], -self.pesos[item[0]], self.normalizados[item[0]]))
+
+        resultados = []
+        vistos = set()
+        for i, pontuacao in ordenados:
+            # Apelidos da mesma empresa: fica só a melhor correspondência
+            if self.ids[i] in vistos:
+                continue
+            vistos.add(self.ids[i])
+            if pontuacao >= PONTOS_INICIO:
+                tipo = 'inicio'
+            elif pontuacao >= PONTOS_PREFIXO:
+                tipo = 'prefixo'
+            elif pontuacao >= PONTOS_CONTEM:
+                tipo = 'contem'
+            else:
+                tipo = 'aproximado'
+            resultados.append({
+                'empresa_id': self.ids[i],
+                'nome': self.exibicao[i],
+                'nome_indexado': self.nomes[i],
+                'tipo': tipo,
+                'pontuacao': round(pontuacao, 3),
+                'registros': self.pesos[i]
+            })
+            if len(resultados) >= limite:
+                break
+        return resultados
+
+    def ids_correspondentes(self, consulta: str) -> List[int]:
+        """IDs de todas as empresas cujo nome contém a consulta (sem aproximação) - para filtrar linhas"""
+        normalizada = normalizar_nome(consulta)
+        if not normalizada:
+            return []
+        return sorted({self.ids[i] for i in self._pontuar(normalizada, aproximada=False)})
+
+    def nomes_correspondentes(self, consulta: str) -> List[str]:
+        """Nomes indexados que contêm a consulta - para fontes sem EMPRESA_ID"""
+        normalizada = normalizar_nome(consulta)
+        if not normalizada:
+            return []
+        return [self.nomes[i] for i in self._pontuar(normalizada, aproximada=False)]
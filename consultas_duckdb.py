@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🦆 BACKEND DUCKDB - CONSULTAS DA API FORA DA MEMÓRIA DO PROCESSO
+
+Alternativa ao Polars em memória para os endpoints pesados do app.py
+(estatísticas, ranking, filtros cascateados e relatório). Com
+BACKEND_CONSULTAS=duckdb, cada versão do dataset ganha uma tabela num banco
+DuckDB persistente (ARQUIVO_DUCKDB):
+
+- a tabela é criada uma vez a partir do Parquet (read_parquet), já ordenada
+  por SEGMENTO, TRIBUNAL e CNAE: os zone maps (min/max por grupo de linhas que
+  o DuckDB mantém em toda tabela) descartam os grupos fora do filtro
+- a tabela é identificada pelo hash do rodapé do Parquet + limite de
+  registros: reiniciar o app com o mesmo arquivo reaproveita a tabela sem
+  reler os dados
+- a tabela é descartada quando a última versão que a usa é liberada
+  (RegistroVersoes.liberar); tabelas de execuções anteriores que não forem
+  reaproveitadas são descartadas na próxima abertura
+- as consultas rodam no motor do DuckDB (paralelo, com spill para disco) e só
+  o resultado agregado - no máximo uma linha por empresa - volta ao Python
+
+As respostas da API são as mesmas nos dois backends, então dá para comparar
+os dois sobre os mesmos endpoints.
+"""
+
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import polars as pl
+
+from download_drive import DIRETORIO_CACHE
+from log_estruturado import obter_logger
+from preparar_parquet import ORDEM_CLUSTER
+from validacao_parquet import validar_parquet
+
+try:
+    from pool_duckdb import PoolDuckDB, obter_pool
+    from resumos_duckdb import atualizar_resumos, pool_resumos
+    DUCKDB_DISPONIVEL = True
+except ImportError:
+    DUCKDB_DISPONIVEL = False
+
+log = obter_logger('consultas_duckdb')
+
+# 'polars' (padrão, dados em memória) ou 'duckdb'
+BACKEND_CONSULTAS = os.environ.get('BACKEND_CONSULTAS', 'polars').lower()
+ARQUIVO_DUCKDB = Path(os.environ.get('ARQUIVO_DUCKDB', DIRETORIO_CACHE / 'consultas.duckdb'))
+
+# Filtros de seleção múltipla do JSON da API -> coluna dos dados
+FILTROS_COLUNA = {'tribunais': 'TRIBUNAL', 'graus': 'GRAU', 'segmentos': 'SEGMENTO', 'ramos': 'RAMO'}
+
+_pool_lock = threading.Lock()
+
+# Tabela -> versões deste processo que a usam (a mesma carga repetida reaproveita a tabela)
+_tabelas_em_uso: Dict[str, int] = {}
+
+# Consultas fixas do catálogo de tabelas (preparadas uma vez no pool)
+CONSULTAS_CATALOGO = {
+    'catalogo_linhas': "SELECT linhas FROM _catalogo WHERE tabela = ?",
+    'catalogo_inserir': "INSERT INTO _catalogo (tabela, arquivo, linhas) VALUES (?, ?, ?)",
+    'catalogo_usar': "UPDATE _catalogo SET usado_em = current_timestamp WHERE tabela = ?",
+    'catalogo_tabelas': "SELECT tabela FROM _catalogo",
+    'catalogo_remover': "DELETE FROM _catalogo WHERE tabela = ?",
+    'colunas_tabela': (
+        "SELECT column_name, data_type FROM information_schema.columns "
+        "WHERE table_name = ? ORDER BY ordinal_position"
+    ),
+}
+
+
+def _ident(coluna: str) -> str:
+    return '"' + coluna.replace('"', '""') + '"'
+
+
+def pool_compartilhado() -> 'PoolDuckDB':
+    """Pool do banco persistente, com o catálogo de tabelas criado e as consultas fixas preparadas"""
+    pool = obter_pool(ARQUIVO_DUCKDB)
+    with _pool_lock:
+        if not pool.preparada('catalogo_linhas'):
+            pool.consultar("""
+                CREATE TABLE IF NOT EXISTS _catalogo (
+                    tabela VARCHAR PRIMARY KEY,
+                    arquivo VARCHAR,
+                    linhas BIGINT,
+                    usado_em TIMESTAMP DEFAULT current_timestamp
+                )
+            """)
+            for nome, sql in CONSULTAS_CATALOGO.items():
+                pool.preparar(nome, sql)
+    return pool
+
+
+def _nome_tabela(hash_rodape: str, limite: int) -> str:
+    return 'litigantes_' + hashlib.sha1(f"{hash_rodape}|{limite}".encode('utf-8')).hexdigest()[:16]
+
+
+def _tabela_cnae(tabela: str) -> str:
+    return f"{tabela}_cnae"
+
+
+def _construir_tabela(pool: 'PoolDuckDB', tabela: str, arquivo: str, colunas: List[str], limite: int,
+                      mapa_empresas: pl.DataFrame):
+    """Copia o Parquet para a tabela, ordenado pelas colunas de cluster e com EMPRESA_ID"""
+    origem = 'SELECT * FROM read_parquet(?)' + (f' LIMIT {int(limite)}' if limite else '')
+    chaves = [c for c in mapa_empresas.columns if c != 'EMPRESA_ID']
+    juncao = ' AND '.join(f"f.{_ident(c)} IS NOT DISTINCT FROM m.{_ident(c)}" for c in chaves)
+    ordem = ', '.join(_ident(c) for c in ORDEM_CLUSTER if c in colunas)
+
+    cursor = pool.cursor()
+    cursor.register('_mapa_empresas', mapa_empresas.to_arrow())
+    try:
+        cursor.execute(f"""
+            CREATE OR REPLACE TABLE {tabela} AS
+            SELECT f.*, m.EMPRESA_ID
+            FROM ({origem}) f
+            LEFT JOIN _mapa_empresas m ON {juncao}
+            {'ORDER BY ' + ordem + ' NULLS LAST' if ordem else ''}
+        """, [arquivo])
+    finally:
+        cursor.unregister('_mapa_empresas')
+
+
+def _descartar_tabela(pool: 'PoolDuckDB', tabela: str):
+    pool.consultar(f"DROP TABLE IF EXISTS {tabela}")
+    pool.remover_frame(_tabela_cnae(tabela))
+    pool.executar('catalogo_remover', [tabela])
+
+
+def _descartar_orfas(pool: 'PoolDuckDB'):
+    """Tabelas do catálogo sem nenhuma versão deste processo usando (sobras de execuções anteriores)"""
+    for (tabela,) in pool.executar('catalogo_tabelas').fetchall():
+        with _pool_lock:
+            em_uso = tabela in _tabelas_em_uso
+        if not em_uso:
+            _descartar_tabela(pool, tabela)
+            log.info('🧹 Tabela órfã descartada do DuckDB', extra={'tabela': tabela})
+
+
+class ConsultasDuckDB:
+    """Consultas da API sobre a tabela DuckDB de uma versão do dataset"""
+
+    nome = 'duckdb'
+
+    def __init__(self, pool: 'PoolDuckDB', tabela: str, tipos: Dict[str, str],
+                 df_cnae: Optional[pl.DataFrame] = None,
+                 dim_empresas: Optional[pl.DataFrame] = None,
+                 indice_busca=None):
+        self._pool = pool
+        self.tabela = tabela
+        self.tipos = tipos
+        self.colunas = list(tipos)
+        self.df_cnae = df_cnae
+        self.dim_empresas = dim_empresas
+        self.indice_busca = indice_busca
+        self._descartada = False
+
+    def descartar(self):
+        """Chamado quando a versão é liberada: a tabela sai do banco se nenhuma outra versão a usa"""
+        with _pool_lock:
+            if self._descartada:
+                return
+            self._descartada = True
+            restantes = _tabelas_em_uso.get(self.tabela, 1) - 1
+            if restantes > 0:
+                _tabelas_em_uso[self.tabela] = restantes
+            else:
+                _tabelas_em_uso.pop(self.tabela, None)
+        if restantes <= 0:
+            _descartar_tabela(self._pool, self.tabela)
+            log.info('🧹 Tabela descartada do DuckDB', extra={'tabela': self.tabela})
+
+    def _consultar(self, sql: str, parametros: Optional[List] = None) -> pl.DataFrame:
+        # Cursor da thread (pool): requisições concorrentes não dividem conexão
+        return self._pool.consultar(sql, parametros).pl()
+
+    # ------------------------------------------------------------------
+    # Filtros (mesma semântica de aplicar_filtros_avancados)
+    # ------------------------------------------------------------------
+
+    def _condicao_cnae(self, cnaes) -> Tuple[Optional[str], List]:
+        if not isinstance(cnaes, list):
+            cnaes = [] if cnaes == 'Todos' else [cnaes]
+        cnaes_str = [str(c) for c in cnaes if c and str(c).strip() != '']
+        if not cnaes_str:
+            return None, []
+        # Coluna inteira e códigos canônicos: compara inteiros (aproveita os zone maps)
+        if self.tipos.get('CNAE', '').upper() in ('BIGINT', 'INTEGER') and all(c.isdigit() and str(int(c)) == c for c in cnaes_str):
+            return 'CNAE IN (SELECT UNNEST(?))', [[int(c) for c in cnaes_str]]
+        return 'CAST(CNAE AS VARCHAR) IN (SELECT UNNEST(?))', [cnaes_str]
+
+    def _condicao_classes_cnae(self, filtros: Dict) -> Tuple[Optional[str], List]:
+        """Filtro de classe/subclasse CNAE via dimensão registrada no pool (tabela virtual sobre o Arrow do df_cnae)"""
+        classes = filtros.get('classes_cnae') or []
+        subclasses = filtros.get('subclasses_cnae') or []
+        if not (classes or subclasses) or self.df_cnae is None or 'CNAE' not in self.colunas:
+            return None, []
+        condicoes, parametros = [], []
+        if classes:
+            condicoes.append('Nome_Classe IN (SELECT UNNEST(?))')
+            parametros.append(classes if isinstance(classes, list) else [classes])
+        if subclasses:
+            condicoes.append('Nome_Subclasse IN (SELECT UNNEST(?))')
+            parametros.append(subclasses if isinstance(subclasses, list) else [subclasses])
+        return (f"lpad(CAST(CNAE AS VARCHAR), 7, '0') IN (SELECT Codigo_Subclasse FROM {_tabela_cnae(self.tabela)} "
+                f"WHERE Codigo_Subclasse IS NOT NULL AND {' AND '.join(condicoes)})"), parametros
+
+    def _where(self, filtros: Dict) -> Tuple[str, List]:
+        condicoes, parametros = [], []
+
+        for chave, coluna in FILTROS_COLUNA.items():
+            valores = filtros.get(chave)
+            if not valores or coluna not in self.colunas:
+                continue
+            if isinstance(valores, list):
+                condicoes.append(f"{_ident(coluna)} IN (SELECT UNNEST(?))")
+                parametros.append(valores)
+            elif valores != 'Todos':
+                condicoes.append(f"{_ident(coluna)} = ?")
+                parametros.append(valores)
+
+        if filtros.get('cnae') and 'CNAE' in self.colunas:
+            condicao, valores = self._condicao_cnae(filtros['cnae'])
+            if condicao:
+                condicoes.append(condicao)
+                parametros.extend(valores)
+
+        condicao, valores = self._condicao_classes_cnae(filtros)
+        if condicao:
+            condicoes.append(condicao)
+            parametros.extend(valores)
+
+        if filtros.get('busca_empresa'):
+            if self.indice_busca is not None:
+                ids = self.indice_busca.ids_correspondentes(filtros['busca_empresa'])
+                if ids:
+                    condicoes.append('EMPRESA_ID IN (SELECT UNNEST(?))')
+                    parametros.append(list(ids))
+                else:
+                    condicoes.append('FALSE')
+            else:
+                condicoes.append('contains(lower(NOME), ?)')
+                parametros.append(filtros['busca_empresa'].lower())
+
+        return ('WHERE ' + ' AND '.join(condicoes)) if condicoes else '', parametros
+
+    # ------------------------------------------------------------------
+    # Agregações por empresa (agrupar_por_empresa + calcular_processos_mensais)
+    # ------------------------------------------------------------------
+
+    def _sql_empresas(self, filtros: Dict) -> Tuple[str, List]:
+        where, parametros = self._where(filtros)
+        agregacoes = [
+            'first(NOME) AS NOME',
+            'sum(NOVOS)::BIGINT AS NOVOS',
+            'first(TRIBUNAL) AS TRIBUNAL',
+            'count(*)::BIGINT AS REGISTROS_AGRUPADOS',
+        ]
+        for coluna in self.colunas:
+            if coluna in ('EMPRESA_ID', 'NOME', 'NOVOS', 'TRIBUNAL') or 'CNPJ' in coluna.upper():
+                continue
+            if 'PENDENTES' in coluna or 'BAIXADOS' in coluna:
+                agregacoes.append(f"sum({_ident(coluna)})::BIGINT AS {_ident(coluna)}")
+            else:
+                agregacoes.append(f"first({_ident(coluna)}) AS {_ident(coluna)}")
+
+        # Mesmo arredondamento de calcular_processos_mensais (floor(x + 0.5));
+        # o round() do DuckDB afasta do zero e o do Polars varia com a versão
+        pendentes = ('WHEN "PENDENTES BRUTO" > 0 THEN floor("PENDENTES BRUTO" / 10 + 0.5)'
+                     if 'PENDENTES BRUTO' in self.colunas else '')
+        sql = f"""
+            SELECT *,
+                CASE WHEN NOVOS > 0 THEN floor(NOVOS / 12 + 0.5) {pendentes} ELSE 25 END::DOUBLE AS volume_mensal
+            FROM (
+                SELECT EMPRESA_ID, {', '.join(agregacoes)}
+                FROM {self.tabela}
+                {where}
+                GROUP BY EMPRESA_ID
+            )
+        """
+        return sql, parametros
+
+    @staticmethod
+    def _where_volume(filtros: Dict) -> Tuple[str, List]:
+        condicoes, parametros = [], []
+        if filtros.get('volume_minimo'):
+            condicoes.append('volume_mensal >= ?')
+            parametros.append(filtros['volume_minimo'])
+        if filtros.get('volume_maximo'):
+            condicoes.append('volume_mensal <= ?')
+            parametros.append(filtros['volume_maximo'])
+        return ('WHERE ' + ' AND '.join(condicoes)) if condicoes else '', parametros
+
+    def empresas(self, filtros: Dict) -> pl.DataFrame:
+        """Uma linha por empresa, com volume_mensal (entrada do relatório detalhado)"""
+        sql, parametros = self._sql_empresas(filtros)
+        return self._consultar(sql, parametros)
+
+    def estatisticas(self, filtros: Dict) -> Dict:
+        """Total de empresas, processos mensais e mediana mensal (com os filtros de volume)"""
+        sql_empresas, parametros = self._sql_empresas(filtros)
+        where_volume, parametros_volume = self._where_volume(filtros)
+        total, soma, mediana = self._pool.consultar(f"""
+            WITH empresas AS ({sql_empresas})
+            SELECT count(*), coalesce(sum(volume_mensal), 0), median(volume_mensal)
+            FROM empresas {where_volume}
+        """, parametros + parametros_volume).fetchone()
+        return {
+            'total_empresas': int(total),
+            'processos_mensais_total': int(soma),
+            'mediana_mensal': int(mediana) if total else 0,
+        }
+
+    def ranking(self, filtros: Dict) -> pl.DataFrame:
+        """NOME, total_novos, total_pendentes e EMPRESA_ID de todas as empresas, por volume"""
+        where, parametros = self._where(filtros)
+        if 'PENDENTES' in self.colunas:
+            pendentes = 'sum(PENDENTES)::BIGINT'
+        elif 'PENDENTES BRUTO' in self.colunas:
+            pendentes = 'sum("PENDENTES BRUTO")::BIGINT'
+        else:
+            pendentes = '0::BIGINT'
+        ranking = self._consultar(f"""
+            SELECT EMPRESA_ID, sum(NOVOS)::BIGINT AS total_novos, {pendentes} AS total_pendentes
+            FROM {self.tabela}
+            {where}
+            GROUP BY EMPRESA_ID
+            ORDER BY total_novos DESC
+        """, parametros).with_columns(pl.col('EMPRESA_ID').cast(pl.UInt32))
+
+        # Nome canônico da dimensão (o resultado tem uma linha por empresa)
+        if self.dim_empresas is not None and not self.dim_empresas.is_empty():
+            ranking = (
+                ranking.join(self.dim_empresas.select(['EMPRESA_ID', 'NOME']), on='EMPRESA_ID', how='left')
+                .sort('total_novos', descending=True)
+            )
+        else:
+            ranking = ranking.with_columns(pl.lit(None, dtype=pl.Utf8).alias('NOME'))
+        return ranking.select(['NOME', 'total_novos', 'total_pendentes', 'EMPRESA_ID'])
+
+    def filtros_disponiveis(self, filtros: Dict) -> Tuple[Dict[str, List[str]], Optional[pl.DataFrame], int]:
+        """
+        Valores distintos das colunas de filtro, contagem por CNAE e total de
+        registros após os filtros, numa única varredura (GROUPING SETS).
+        """
+        where, parametros = self._where(filtros)
+        dimensoes = [c for c in list(FILTROS_COLUNA.values()) + ['CNAE'] if c in self.colunas]
+        conjuntos = ', '.join(f"({_ident(d)})" for d in dimensoes)
+        marcadores = ', '.join(f"GROUPING({_ident(d)}) AS _g{i}" for i, d in enumerate(dimensoes))
+        resultado = self._consultar(f"""
+            SELECT {', '.join(_ident(d) for d in dimensoes)}, count(*)::BIGINT AS registros, {marcadores}
+            FROM {self.tabela}
+            {where}
+            GROUP BY GROUPING SETS ({conjuntos}, ())
+        """, parametros)
+
+        def conjunto(i):
+            # Linhas do conjunto (dimensoes[i]): só ela agrupada
+            return resultado.filter(pl.all_horizontal(
+                [pl.col(f'_g{j}') == (0 if j == i else 1) for j in range(len(dimensoes))]
+            ))
+
+        total = resultado.filter(pl.all_horizontal([pl.col(f'_g{j}') == 1 for j in range(len(dimensoes))]))
+        valores, cnaes = {}, None
+        for i, dimensao in enumerate(dimensoes):
+            linhas = conjunto(i)
+            if dimensao == 'CNAE':
+                cnaes = linhas.select(['CNAE', 'registros']).sort('registros', descending=True)
+            else:
+                valores[dimensao] = sorted(str(v) for v in linhas[dimensao].to_list() if v is not None)
+        return valores, cnaes, int(total['registros'][0]) if total.height else 0
+
+
+def atualizar_resumos_extrato(arquivo: Union[str, Path]):
+    """Resumos materializados (resumos_duckdb.py) atualizados com o extrato mensal, se houver duckdb"""
+    if not DUCKDB_DISPONIVEL:
+        return
+    try:
+        atualizar_resumos(pool_resumos(), arquivo)
+    except Exception as e:
+        log.warning('⚠️ Resumos materializados não atualizados', extra={'arquivo': str(arquivo), 'erro': str(e)})
+
+
+def abrir_consultas_duckdb(arquivo: Union[str, Path], limite: int, df: pl.DataFrame,
+                           df_cnae: Optional[pl.DataFrame] = None,
+                           dim_empresas: Optional[pl.DataFrame] = None,
+                           indice_busca=None) -> Optional[ConsultasDuckDB]:
+    """
+    Backend DuckDB para a versão carregada de `arquivo` (None se indisponível).
+
+    `df` é a versão em memória com EMPRESA_ID: dela sai só o mapa nome -> ID
+    (uma linha por grafia), para os IDs da tabela coincidirem com os da dimensão.
+    """
+    if not DUCKDB_DISPONIVEL:
+        log.warning('⚠️ BACKEND_CONSULTAS=duckdb, mas o pacote duckdb não está instalado (usando Polars)')
+        return None
+    if 'EMPRESA_ID' not in df.columns:
+        return None
+
+    try:
+        info = validar_parquet(arquivo, [])
+        tabela = _nome_tabela(info['hash_rodape'], limite)
+        pool = pool_compartilhado()
+
+        existente = pool.executar('catalogo_linhas', [tabela]).fetchone()
+        if existente is None:
+            log.info('🦆 Criando tabela no DuckDB', extra={'tabela': tabela, 'banco': ARQUIVO_DUCKDB})
+            chaves = ['NOME'] + [c for c in df.columns if 'CNPJ' in c.upper()][:1]
+            mapa = df.select(chaves + ['EMPRESA_ID']).unique(subset=chaves)
+            _construir_tabela(pool, tabela, str(arquivo), list(info['colunas']), limite, mapa)
+            linhas = pool.consultar(f"SELECT count(*) FROM {tabela}").fetchone()[0]
+            pool.executar('catalogo_inserir', [tabela, str(arquivo), linhas])
+        else:
+            linhas = existente[0]
+            log.info('🦆 Tabela reaproveitada do DuckDB', extra={'tabela': tabela, 'registros': linhas})
+            pool.executar('catalogo_usar', [tabela])
+        with _pool_lock:
+            _tabelas_em_uso[tabela] = _tabelas_em_uso.get(tabela, 0) + 1
+        _descartar_orfas(pool)
+
+        tipos = dict(pool.executar('colunas_tabela', [tabela]).fetchall())
+        if df_cnae is not None:
+            # Dimensão CNAE como tabela virtual: os filtros de classe/subclasse fazem o JOIN no próprio SQL
+            pool.registrar_frame(_tabela_cnae(tabela), df_cnae)
+        return ConsultasDuckDB(pool, tabela, tipos, df_cnae, dim_empresas, indice_busca)
+    except Exception as e:
+        log.warning('⚠️ Backend DuckDB indisponível; consultas seguem no Polars', exc_info=True)
+        return None
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🚦 CONTROLE DE ADMISSÃO - ORÇAMENTO DE MEMÓRIA PARA CONSULTAS PESADAS
+
+Antes de executar um endpoint pesado, o custo em memória é estimado a partir
+da seletividade dos filtros (contagens por valor das colunas filtráveis,
+calculadas uma vez por versão do dataset) e do formato de agregação do
+endpoint. Consultas que não cabem no orçamento simultâneo recebem 429 na hora,
+com sugestão de quando tentar de novo (Retry-After). Consultas baratas nunca
+são recusadas.
+
+A espera opcional (espera_maxima > 0) acontece dentro da requisição: no
+servidor ASGI isso prende uma thread do pool pesado, que fica indisponível
+para as consultas que caberiam no orçamento. Por isso o padrão é não esperar.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+import polars as pl
+
+# Filtro da API -> coluna do dataset com estatísticas por valor
+COLUNAS_FILTRO = {
+    'tribunais': 'TRIBUNAL',
+    'graus': 'GRAU',
+    'segmentos': 'SEGMENTO',
+    'ramos': 'RAMO',
+    'cnae': 'CNAE',
+}
+
+# Memória de trabalho relativa ao recorte filtrado (cópias, group_by, joins)
+FATOR_ENDPOINT = {
+    'relatorio': 3.0,
+    'tabulacao': 2.0,
+    'filtros_disponiveis': 2.0,
+    'estatisticas': 1.5,
+    'ranking': 1.5,
+}
+
+
+class AdmissaoRecusada(Exception):
+    """Consulta não coube no orçamento dentro do tempo de espera"""
+
+    def __init__(self, retry_after: int, custo: int, disponivel: int):
+        super().__init__(f"Orçamento de memória esgotado (custo {custo / 1024**2:.0f} MB, "
+                         f"disponível {disponivel / 1024**2:.0f} MB)")
+        self.retry_after = retry_after
+        self.custo = custo
+        self.disponivel = disponivel
+
+
+class EstatisticasColunas:
+    """Contagens por valor das colunas filtráveis (base da seletividade)"""
+
+    def __init__(self, df: pl.DataFrame):
+        self.total_linhas = len(df)
+        self.bytes_por_linha = df.estimated_size() / self.total_linhas if self.total_linhas else 0
+        self.contagens: Dict[str, Dict[str, int]] = {}
+        for coluna in COLUNAS_FILTRO.values():
+            if coluna in df.columns:
+                contagem = df.group_by(pl.col(coluna).cast(pl.Utf8)).agg(pl.len().alias('n'))
+                self.contagens[coluna] = dict(contagem.iter_rows())
+
+    def seletividade(self, filtros: Dict) -> float:
+        """Fração estimada de linhas após os filtros (independência entre colunas)"""
+        if not self.total_linhas:
+            return 0.0
+        fracao = 1.0
+        for chave, coluna in COLUNAS_FILTRO.items():
+            valores = filtros.get(chave)
+            if not valores or coluna not in self.contagens or valores == 'Todos':
+                continue
+            if not isinstance(valores, list):
+                valores = [valores]
+            linhas = sum(self.contagens[coluna].get(str(v), 0) for v in valores)
+            fracao *= linhas / self.total_linhas
+        return fracao
+
+
+def estimar_custo(versao, filtros: Dict, tipo: str) -> int:
+    """Bytes de memória estimados para executar o endpoint `tipo` com `filtros` na versão"""
+    if versao is None or versao.df is None or versao.df.is_empty():
+        return 0
+    estatisticas = versao.obter_cache('estatisticas_colunas', lambda: EstatisticasColunas(versao.df))
+    fracao = estatisticas.seletividade(filtros or {})
+
+    # Busca por nome: linhas das empresas encontradas, pela dimensão de empresas
+    busca = (filtros or {}).get('busca_empresa')
+    indice = versao.indices.get('busca')
+    dimensao = versao.indices.get('empresas')
+    if busca and indice is not None and dimensao is not None and not dimensao.is_empty():
+        ids = indice.ids_correspondentes(busca)
+        linhas = dimensao.filter(pl.col('EMPRESA_ID').is_in(ids))['REGISTROS'].sum() or 0
+        fracao *= linhas / estatisticas.total_linhas
+
+    linhas_estimadas = estatisticas.total_linhas * fracao
+    return int(linhas_estimadas * estatisticas.bytes_por_linha * FATOR_ENDPOINT.get(tipo, 1.0))
+
+
+class ControleAdmissao:
+    """Orçamento de memória compartilhado entre as consultas pesadas em execução"""
+
+    def __init__(self, orcamento_bytes: int, espera_maxima: float = 0.0, limiar_barato: int = 32 * 1024**2):
+        self.orcamento_bytes = orcamento_bytes
+        self.espera_maxima = espera_maxima
+        self.limiar_barato = limiar_barato
+        self._condicao = threading.Condition()
+        self._em_uso = 0
+        self._ativas = 0
+        # Duração média (móvel exponencial) das consultas admitidas, base do Retry-After
+        self._duracao_media = 5.0
+
+    def _sugerir_espera(self) -> int:
+        return max(1, math.ceil(self._duracao_media))
+
+    @contextmanager
+    def admitir(self, custo: int):
+        """Reserva `custo` bytes durante o bloco; sem espaço, espera até espera_maxima (padrão 0) e recusa"""
+        if custo < self.limiar_barato:
+            yield
+            return
+
+        prazo = time.monotonic() + self.espera_maxima
+        with self._condicao:
+            # Uma consulta maior que o orçamento inteiro só roda sozinha
+            while self._ativas > 0 and self._em_uso + custo > self.orcamento_bytes:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    raise AdmissaoRecusada(self._sugerir_espera(), custo, self.orcamento_bytes - self._em_uso)
+                self._condicao.wait(restante)
+            self._em_uso += custo
+            self._ativas += 1
+
+        inicio = time.monotonic()
+        try:
+            yield
+        finally:
+            duracao = time.monotonic() - inicio
+            with self._condicao:
+                self._em_uso -= custo
+                self._ativas -= 1
+                self._duracao_media = 0.8 * self._duracao_media + 0.2 * duracao
+                self._condicao.notify_all()
+
+    def status(self) -> Dict:
+        with self._condicao:
+            return {
+                'orcamento_mb': round(self.orcamento_bytes / 1024**2, 1),
+                'em_uso_mb': round(self._em_uso / 1024**2, 1),
+                'consultas_ativas': self._ativas,
+                'duracao_media_s': round(self._duracao_media, 2)
+            }
@@ -6,81 +6,16 @@ para validar o funcionamento da aplicação web
 """
 
 import polars as pl
-import random
-from datetime import datetime
+
+from gerador_sintetico import gerar_dataset
 
 def create_test_data():
     """Criar dados de teste simulando os grandes litigantes"""
     
     print("📊 Criando dados de teste...")
     
-    # Empresas fictícias baseadas em padrões reais
-    empresas = [
-        "BANCO DO BRASIL S.A.",
-        "CAIXA ECONÔMICA FEDERAL",
-        "BRADESCO S.A.",
-        "ITAÚ UNIBANCO S.A.",
-        "SANTANDER BRASIL S.A.",
-        "BTG PACTUAL S.A.",
-        "NUBANK S.A.",
-        "MAGAZINE LUIZA S.A.",
-        "VIA VAREJO S.A.",
-        "MERCADOLIVRE BRASIL LTDA",
-        "TELEFONICA BRASIL S.A.",
-        "TIM S.A.",
-        "CLARO S.A.",
-        "OI S.A.",
-        "NET SERVICOS LTDA",
-        "NATURA COSMETICOS S.A.",
-        "PETROBRAS S.A.",
-        "VALE S.A.",
-        "JBS S.A.",
-        "AMBEV S.A.",
-        "GERDAU S.A.",
-        "USIMINAS S.A.",
-        "SUZANO S.A.",
-        "KLABIN S.A.",
-        "WEG S.A.",
-        "EMBRAER S.A.",
-        "GOL LINHAS AEREAS S.A.",
-        "AZUL S.A.",
-        "LATAM AIRLINES BRASIL S.A.",
-        "TAM LINHAS AEREAS S.A."
-    ]
-    
-    tribunais = [
-        "TJSP", "TJRJ", "TJMG", "TJRS", "TJPR", "TJSC", "TJBA", 
-        "TJGO", "TJDF", "TJPE", "TJCE", "TJMA", "TJPB", "TJES",
-        "TJMT", "TJMS", "TJTO", "TJAC", "TJAP", "TJRR", "TJRO",
-        "TJAL", "TJRN", "TJSE", "TJPI", "TJAM", "TJPA"
-    ]
-    
-    # Gerar dados
-    n_records = 50000  # 50k registros para teste
-    
-    data = []
-    for i in range(n_records):
-        empresa = random.choice(empresas)
-        tribunal = random.choice(tribunais)
-        
-        # Simular distribuição realista de processos
-        if empresa.startswith("BANCO") or "CAIXA" in empresa:
-            novos = random.randint(50, 500)  # Bancos têm mais processos
-        elif "TELEFONICA" in empresa or "TIM" in empresa:
-            novos = random.randint(30, 300)  # Telecoms também
-        else:
-            novos = random.randint(1, 100)   # Outros
-        
-        data.append({
-            'NOME': empresa,
-            'TRIBUNAL': tribunal,
-            'NOVOS': novos,
-            'ANO': 2024,
-            'MES': random.randint(1, 12)
-        })
-    
-    # Criar DataFrame
-    df = pl.DataFrame(data)
+    # 50k registros para teste, volume concentrado nas grandes litigantes (bancos, telecoms)
+    df = gerar_dataset(50000, n_empresas=500, ano=2024)
     
     # Salvar como parquet
     output_file = "dados_litigantes.parquet"
@@ -88,13 +23,15 @@ def create_test_data():
     
     print(f"✅ Dados de teste criados: {output_file}")
     print(f"📊 Total de registros: {len(df):,}")
-    print(f"🏢 Empresas únicas: {df.select('NOME').n_unique()}")
-    print(f"⚖️ Tribunais únicos: {df.select('TRIBUNAL').n_unique()}")
-    print(f"📈 Total de processos novos: {df.select(pl.col('NOVOS').sum()).item():,}")
+    print(f"🏢 Empresas únicas: {df['NOME'].n_unique()}")
+    print(f"⚖️ Tribunais únicos: {df['TRIBUNAL'].n_unique()}")
+    print(f"📈 Total de processos novos: {df['NOVOS'].sum():,}")
     
     # Mostrar amostra
     print("\n📋 Amostra dos dados:")
-    print(df.head(10).to_pandas().to_string(index=False))
+    with pl.Config(tbl_rows=10, tbl_cols=-1, tbl_width_chars=220, fmt_str_lengths=30,
+                   tbl_hide_dataframe_shape=True):
+        print(df.head(10))
     
     return output_file
 
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🏢 DIMENSÃO DE EMPRESAS - IDENTIFICADORES INTEIROS
+
+Construída uma vez na carga dos dados: cada empresa recebe um EMPRESA_ID
+denso (0..N-1) com nome canônico, CNPJ (quando existir) e apelidos (variações
+de grafia do nome). Todas as linhas de fatos recebem a coluna EMPRESA_ID, de
+modo que joins, seleções e group_by trabalhem com inteiros em vez de strings.
+"""
+
+import re
+import unicodedata
+from typing import Optional, Tuple
+
+import polars as pl
+
+from log_estruturado import obter_logger
+
+log = obter_logger('dimensao_empresas')
+
+# Pontos e barras de siglas somem ('S.A.', 'S/A' -> 'SA'); demais símbolos viram espaço
+_SIGLAS = re.compile(r"[./']")
+_NAO_ALFANUMERICO = re.compile(r'[^A-Z0-9 ]+')
+_ESPACOS = re.compile(r'\s+')
+
+
+def normalizar_nome(nome: Optional[str]) -> Optional[str]:
+    """Maiúsculas, sem acentos e sem pontuação: 'Itaú Unibanco S.A.' -> 'ITAU UNIBANCO SA'"""
+    if nome is None:
+        return None
+    sem_acentos = unicodedata.normalize('NFKD', str(nome)).encode('ascii', 'ignore').decode('ascii')
+    texto = _NAO_ALFANUMERICO.sub(' ', _SIGLAS.sub('', sem_acentos.upper()))
+    return _ESPACOS.sub(' ', texto).strip()
+
+
+def detectar_coluna_cnpj(df: pl.DataFrame) -> Optional[str]:
+    colunas_cnpj = [col for col in df.columns if 'CNPJ' in col.upper()]
+    return colunas_cnpj[0] if colunas_cnpj else None
+
+
+def construir_dimensao(df: pl.DataFrame, coluna_nome: str = 'NOME') -> Tuple[pl.DataFrame, pl.DataFrame]:
+    """
+    Retorna (df com EMPRESA_ID, dimensão de empresas)
+
+    Identidade: CNPJ quando disponível; senão o nome normalizado (une
+    variações como 'BANCO DO BRASIL S.A.' e 'Banco do Brasil SA').
+    """
+    if df.is_empty() or coluna_nome not in df.columns:
+        return df, pl.DataFrame()
+
+    coluna_cnpj = detectar_coluna_cnpj(df)
+    chaves = [coluna_nome] + ([coluna_cnpj] if coluna_cnpj else [])
+
+    # Trabalhar apenas sobre as combinações distintas (ordens de grandeza menor que os fatos)
+    distintos = df.group_by(chaves).agg(pl.len().alias('_registros')).filter(pl.col(coluna_nome).is_not_null())
+
+    nomes = distintos[coluna_nome].unique().to_list()
+    normalizados = pl.DataFrame(
+        {coluna_nome: nomes, 'NOME_NORMALIZADO': [normalizar_nome(n) for n in nomes]},
+        schema={coluna_nome: distintos.schema[coluna_nome], 'NOME_NORMALIZADO': pl.Utf8}
+    )
+    distintos = distintos.join(normalizados, on=coluna_nome, how='left')
+
+    if coluna_cnpj:
+        chave_identidade = (
+            pl.when(pl.col(coluna_cnpj).is_not_null())
+            .then(pl.lit('CNPJ:') + pl.col(coluna_cnpj).cast(pl.Utf8))
+            .otherwise(pl.lit('NOME:') + pl.col('NOME_NORMALIZADO'))
+        )
+    else:
+        chave_identidade = pl.col('NOME_NORMALIZADO')
+    distintos = distintos.with_columns(chave_identidade.alias('_chave'))
+
+    agregacoes = [
+        # Nome canônico = grafia mais frequente
+        pl.col(coluna_nome).sort_by('_registros', descending=True).first().alias('NOME'),
+        pl.col('NOME_NORMALIZADO').first(),
+        pl.col(coluna_nome).unique().sort().alias('ALIASES'),
+        pl.col('_registros').sum().alias('REGISTROS')
+    ]
+    if coluna_cnpj:
+        agregacoes.append(pl.col(coluna_cnpj).first().alias('CNPJ'))
+
+    dimensao = (
+        distintos.group_by('_chave')
+        .agg(agregacoes)
+        # Ordem determinística -> IDs estáveis para os mesmos dados
+        .sort(['NOME', '_chave'])
+        .with_row_index('EMPRESA_ID')
+        .with_columns(pl.col('EMPRESA_ID').cast(pl.UInt32))
+    )
+
+    mapa_ids = distintos.select(chaves + ['_chave']).join(
+        dimensao.select(['_chave', 'EMPRESA_ID']), on='_chave', how='left'
+    )
+    if coluna_cnpj:
+        # Linhas com CNPJ usam o CNPJ; linhas sem CNPJ caem no nome
+        por_cnpj = (
+            mapa_ids.filter(pl.col(coluna_cnpj).is_not_null())
+            .select([coluna_cnpj, pl.col('EMPRESA_ID').alias('_id_cnpj')])
+            .unique(subset=[coluna_cnpj])
+        )
+        por_nome = (
+            mapa_ids.filter(pl.col(coluna_cnpj).is_null())
+            .select([coluna_nome, pl.col('EMPRESA_ID').alias('_id_nome')])
+            .unique(subset=[coluna_nome])
+        )
+        df_com_id = (
+            df.join(por_cnpj, on=coluna_cnpj, how='left')
+            .join(por_nome, on=coluna_nome, how='left')
+            .with_columns(pl.coalesce(['_id_cnpj', '_id_nome']).alias('EMPRESA_ID'))
+            .drop(['_id_cnpj', '_id_nome'])
+        )
+    else:
+        df_com_id = df.join(mapa_ids.drop('_chave'), on=coluna_nome, how='left')
+
+    dimensao = dimensao.drop('_chave')
+    log.info('🏢 Dimensão de empresas', extra={'empresas': len(dimensao), 'grafias': len(nomes)})
+    return df_com_id, dimensao
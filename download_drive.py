@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📥 DOWNLOAD DO GOOGLE DRIVE - RETOMÁVEL, PARALELO E COM CACHE LOCAL
+
+Módulo único usado pelo Streamlit, pela análise robusta e pela GUI desktop:
+
+- partes baixadas em paralelo com HTTP Range, gravadas direto na posição
+  final de um arquivo pré-alocado (sem concatenação)
+- retomada: as partes concluídas ficam registradas ao lado do arquivo
+  parcial; uma nova chamada baixa só o que falta
+- servidor sem suporte a Range: download sequencial com buffer grande
+- validação pelo rodapé Parquet (validacao_parquet.py) e SHA-256 opcional
+  do arquivo inteiro, calculado durante o download
+- cache local endereçado por conteúdo: objetos/<sha256 do rodapé>.parquet,
+  com um índice chave -> objeto (chave = ID do Drive)
+
+As URLs são parâmetros, então o download pode ser testado contra um servidor
+HTTP local no lugar do Drive (teste_download_drive.py).
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+import requests
+
+from log_estruturado import obter_logger
+from validacao_parquet import COLUNAS_OBRIGATORIAS, ParquetInvalido, hash_rodape_parquet, validar_parquet
+
+log = obter_logger('download_drive')
+
+FILE_ID_PADRAO = "1Ns07hTZaK4Ry6bFEHvLACZ5tHJ7b-C2E"
+
+DIRETORIO_CACHE = Path(os.environ.get(
+    'CACHE_DOWNLOADS', Path.home() / '.cache' / 'grandes_litigantes'
+))
+TAMANHO_PARTE = int(os.environ.get('DOWNLOAD_TAMANHO_PARTE_MB', 16)) * 1024**2
+PARTES_PARALELAS = int(os.environ.get('DOWNLOAD_PARTES_PARALELAS', 4))
+TAMANHO_BUFFER = 1024**2
+TENTATIVAS_POR_PARTE = 3
+TIMEOUT = (15, 120)
+
+CABECALHOS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                  '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# progresso(bytes_baixados, bytes_totais); total 0 = desconhecido
+Progresso = Callable[[int, int], None]
+
+
+class ErroDownload(Exception):
+    """Nenhuma URL entregou um arquivo válido"""
+
+
+def urls_drive(file_id: str) -> List[str]:
+    """URLs de download direto do Drive, em ordem de preferência"""
+    return [
+        f"https://drive.usercontent.google.com/download?id={file_id}&export=download&confirm=t&authuser=0",
+        f"https://drive.google.com/uc?id={file_id}&export=download&confirm=t",
+        f"https://docs.google.com/uc?export=download&id={file_id}&confirm=t",
+    ]
+
+
+# === CACHE ENDEREÇADO POR CONTEÚDO ===
+
+class CacheDownloads:
+    """objetos/<hash>.parquet + indice.json (chave -> hash, tamanho, etag) + parciais/"""
+
+    def __init__(self, diretorio: Path = DIRETORIO_CACHE):
+        self.diretorio = Path(diretorio)
+        self.objetos = self.diretorio / 'objetos'
+        self.parciais = self.diretorio / 'parciais'
+        self.arquivo_indice = self.diretorio / 'indice.json'
+        self._trava = threading.Lock()
+
+    def _ler_indice(self) -> Dict:
+        try:
+            return json.loads(self.arquivo_indice.read_text(encoding='utf-8'))
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def procurar(self, chave: str, tamanho: int = 0, etag: Optional[str] = None) -> Optional[Path]:
+        """Objeto em cache para a chave, se ainda corresponder ao remoto (tamanho/etag) e ao próprio hash"""
+        entrada = self._ler_indice().get(chave)
+        if not entrada:
+            return None
+        if (tamanho and entrada.get('tamanho') != tamanho) or (etag and entrada.get('etag') and entrada['etag'] != etag):
+            return None
+        caminho = self.objetos / f"{entrada['hash']}.parquet"
+        try:
+            if hash_rodape_parquet(caminho) == entrada['hash']:
+                return caminho
+        except (OSError, ParquetInvalido):
+            pass
+        return None
+
+    def guardar(self, chave: str, arquivo: Path, hash_conteudo: str, etag: Optional[str] = None) -> Path:
+        """Move o arquivo baixado para objetos/ e registra a chave no índice"""
+        self.objetos.mkdir(parents=True, exist_ok=True)
+        destino = self.objetos / f"{hash_conteudo}.parquet"
+        os.replace(arquivo, destino)
+        with self._trava:
+            indice = self._ler_indice()
+            indice[chave] = {
+                'hash': hash_conteudo,
+                'tamanho': destino.stat().st_size,
+                'etag': etag,
+                'baixado_em': time.strftime('%Y-%m-%dT%H:%M:%S')
+            }
+            temporario = self.arquivo_indice.with_suffix('.tmp')
+            temporario.write_text(json.dumps(indice, indent=2, ensure_ascii=False), encoding='utf-8')
+            os.replace(temporario, self.arquivo_indice)
+        return destino
+
+    def parcial(self, chave: str) -> Tuple[Path, Path]:
+        """Arquivo parcial e registro de partes concluídas da chave"""
+        self.parciais.mkdir(parents=True, exist_ok=True)
+        nome = re.sub(r'[^A-Za-z0-9_.-]', '_', chave)
+        return self.parciais / f"{nome}.part", self.parciais / f"{nome}.partes.json"
+
+
+# === DOWNLOAD ===
+
+def _sondar(sessao: requests.Session, url: str) -> Tuple[int, bool, Optional[str]]:
+    """(tamanho total, aceita Range, etag) pedindo só o primeiro byte"""
+    resposta = sessao.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=TIMEOUT)
+    try:
+        resposta.raise_for_status()
+        if 'text/html' in resposta.headers.get('content-type', ''):
+            # Página de confirmação/erro do Drive em vez do arquivo
+            raise ErroDownload(f"URL devolveu HTML: {url[:80]}")
+        etag = resposta.headers.get('etag')
+        if resposta.status_code == 206:
+            intervalo = resposta.headers.get('content-range', '')
+            total = intervalo.rsplit('/', 1)[-1]
+            if total.isdigit():
+                return int(total), True, etag
+        return int(resposta.headers.get('content-length') or 0), False, etag
+    finally:
+        resposta.close()
+
+
+def _baixar_parte(url: str, caminho: Path, inicio: int, fim: int, contador: Callable[[int], None]) -> int:
+    """Baixa [inicio, fim] e grava na mesma posição do arquivo parcial"""
+    ultimo_erro = None
+    for tentativa in range(TENTATIVAS_POR_PARTE):
+        gravados = 0
+        try:
+            with requests.get(url, headers={**CABECALHOS, 'Range': f'bytes={inicio}-{fim}'},
+                              stream=True, timeout=TIMEOUT) as resposta:
+                if resposta.status_code != 206:
+                    raise ErroDownload(f"Servidor ignorou o Range (HTTP {resposta.status_code})")
+                with open(caminho, 'r+b', buffering=TAMANHO_BUFFER) as f:
+                    f.seek(inicio)
+                    for bloco in resposta.iter_content(chunk_size=TAMANHO_BUFFER):
+                        f.write(bloco)
+                        gravados += len(bloco)
+                        contador(len(bloco))
+            if gravados != fim - inicio + 1:
+                raise ErroDownload(f"Parte {inicio}-{fim} incompleta ({gravados} bytes)")
+            return inicio
+        except (requests.RequestException, ErroDownload) as e:
+            ultimo_erro = e
+            contador(-gravados)
+            time.sleep(min(2 ** tentativa, 10))
+    raise ErroDownload(f"Parte {inicio}-{fim} falhou após {TENTATIVAS_POR_PARTE} tentativas: {ultimo_erro}")
+
+
+class _HashEmOrdem:
+    """SHA-256 do arquivo calculado durante o download paralelo: cada parte entra
+    no hash assim que ela e todas as anteriores estiverem concluídas (ainda no
+    cache de páginas do SO, sem uma segunda leitura completa no fim)"""
+
+    def __init__(self, parcial: Path, total: int):
+        self.parcial = parcial
+        self.total = total
+        self.hash = hashlib.sha256()
+        self._proximo = 0
+        self._prontas = set()
+
+    def concluir(self, inicio: int):
+        self._prontas.add(inicio)
+        with open(self.parcial, 'rb') as f:
+            while self._proximo in self._prontas:
+                f.seek(self._proximo)
+                restante = min(TAMANHO_PARTE, self.total - self._proximo)
+                while restante > 0:
+                    bloco = f.read(min(TAMANHO_BUFFER, restante))
+                    self.hash.update(bloco)
+                    restante -= len(bloco)
+                self._prontas.discard(self._proximo)
+                self._proximo += TAMANHO_PARTE
+
+
+def _baixar_em_partes(url: str, total: int, parcial: Path, registro: Path,
+                      partes_paralelas: int, progresso: Optional[Progresso], hasher=None):
+    concluidas = set()
+    if parcial.exists() and registro.exists():
+        try:
+            estado = json.loads(registro.read_text(encoding='utf-8'))
+            if estado.get('total') == total and estado.get('tamanho_parte') == TAMANHO_PARTE:
+                concluidas = set(estado.get('concluidas', []))
+        except ValueError:
+            pass
+    if not concluidas:
+        # Pré-aloca o arquivo: cada parte escreve na sua posição final
+        with open(parcial, 'wb') as f:
+            f.truncate(total)
+
+    inicios = [i for i in range(0, total, TAMANHO_PARTE) if i not in concluidas]
+    hash_em_ordem = _HashEmOrdem(parcial, total) if hasher is not None else None
+    for inicio in sorted(concluidas):
+        if hash_em_ordem:
+            hash_em_ordem.concluir(inicio)
+    trava = threading.Lock()
+    baixados = [total - sum(min(TAMANHO_PARTE, total - i) for i in inicios)]
+
+    def contar(n: int):
+        with trava:
+            baixados[0] += n
+            if progresso:
+                progresso(baixados[0], total)
+
+    def registrar(inicio: int):
+        with trava:
+            concluidas.add(inicio)
+            registro.write_text(json.dumps({
+                'url': url, 'total': total, 'tamanho_parte': TAMANHO_PARTE,
+                'concluidas': sorted(concluidas)
+            }), encoding='utf-8')
+
+    if progresso:
+        progresso(baixados[0], total)
+    with ThreadPoolExecutor(max_workers=max(1, partes_paralelas), thread_name_prefix='download') as pool:
+        futuros = [
+            pool.submit(_baixar_parte, url, parcial, inicio, min(inicio + TAMANHO_PARTE, total) - 1, contar)
+            for inicio in inicios
+        ]
+        for futuro in as_completed(futuros):
+            inicio = futuro.result()
+            registrar(inicio)
+            if hash_em_ordem:
+                hash_em_ordem.concluir(inicio)
+    if hash_em_ordem:
+        return hash_em_ordem.hash
+
+
+def _baixar_sequencial(sessao: requests.Session, url: str, parcial: Path, progresso: Optional[Progresso],
+                       hasher=None):
+    with sessao.get(url, stream=True, timeout=TIMEOUT) as resposta:
+        resposta.raise_for_status()
+        if 'text/html' in resposta.headers.get('content-type', ''):
+            raise ErroDownload(f"URL devolveu HTML: {url[:80]}")
+        total = int(resposta.headers.get('content-length') or 0)
+        baixados = 0
+        with open(parcial, 'wb', buffering=TAMANHO_BUFFER) as f:
+            for bloco in resposta.iter_content(chunk_size=TAMANHO_BUFFER):
+                f.write(bloco)
+                if hasher is not None:
+                    hasher.update(bloco)
+                baixados += len(bloco)
+                if progresso:
+                    progresso(baixados, total)
+    return hasher
+
+
+def baixar(urls: List[str], chave: str, destino: Optional[Path] = None,
+           progresso: Optional[Progresso] = None, partes_paralelas: int = PARTES_PARALELAS,
+           cache: Optional[CacheDownloads] = None, forcar: bool = False,
+           sha256_esperado: Optional[str] = None,
+           colunas_obrigatorias=COLUNAS_OBRIGATORIAS) -> Path:
+    """
+    Baixa o Parquet da primeira URL que funcionar e devolve o caminho no cache
+    (ou `destino`, quando informado, como link/cópia do objeto em cache).
+    O arquivo novo é validado pelo rodapé (sem ler os dados) e, com
+    `sha256_esperado`, pelo SHA-256 calculado durante o download.
+    Se nenhuma URL responder (offline, Drive fora do ar ou limitando), a
+    cópia em cache da chave é usada mesmo sem conferir tamanho/etag remotos.
+    """
+    cache = cache or CacheDownloads()
+    sessao = requests.Session()
+    sessao.headers.update(CABECALHOS)
+    erros = []
+
+    for url in urls:
+        try:
+            total, aceita_range, etag = _sondar(sessao, url)
+
+            caminho = None if forcar else cache.procurar(chave, total, etag)
+            if caminho is None:
+                parcial, registro = cache.parcial(chave)
+                hasher = hashlib.sha256() if sha256_esperado else None
+                if aceita_range and total > 0:
+                    hasher = _baixar_em_partes(url, total, parcial, registro, partes_paralelas, progresso, hasher)
+                else:
+                    hasher = _baixar_sequencial(sessao, url, parcial, progresso, hasher)
+                try:
+                    if hasher is not None and hasher.hexdigest() != sha256_esperado.lower():
+                        raise ParquetInvalido(f"SHA-256 divergente ({hasher.hexdigest()[:12]}…)")
+                    hash_conteudo = validar_parquet(parcial, colunas_obrigatorias)['hash_rodape']
+                except ParquetInvalido as e:
+                    parcial.unlink(missing_ok=True)
+                    registro.unlink(missing_ok=True)
+                    raise ErroDownload(f"Arquivo baixado não é um Parquet válido: {e}")
+                caminho = cache.guardar(chave, parcial, hash_conteudo, etag)
+                registro.unlink(missing_ok=True)
+
+            if destino is None:
+                return caminho
+            return _materializar(caminho, Path(destino))
+
+        except (requests.RequestException, ErroDownload) as e:
+            erros.append(f"{url[:80]}: {e}")
+
+    caminho = None if forcar else cache.procurar(chave)
+    if caminho is not None:
+        log.warning('⚠️ Remoto indisponível, usando a cópia em cache', extra={'chave': chave, 'erros': len(erros)})
+        return caminho if destino is None else _materializar(caminho, Path(destino))
+
+    raise ErroDownload("Todas as URLs falharam:\n" + "\n".join(erros))
+
+
+def _materializar(origem: Path, destino: Path) -> Path:
+    """Disponibiliza o objeto do cache em `destino` (hard link quando possível, senão cópia)"""
+    if destino.exists():
+        if destino.samefile(origem):
+            return destino
+        destino.unlink()
+    destino.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(origem, destino)
+    except OSError:
+        shutil.copyfile(origem, destino)
+    return destino
+
+
+def baixar_arquivo_drive(file_id: str = FILE_ID_PADRAO, destino: Optional[Path] = None,
+                         progresso: Optional[Progresso] = None, **kwargs) -> Path:
+    """Download do dataset no Google Drive com cache local (chave = ID do arquivo)"""
+    # SHA-256 publicado do dataset, quando configurado, é conferido durante o download
+    kwargs.setdefault('sha256_esperado', os.environ.get('SHA256_DATASET') or None)
+    return baixar(urls_drive(file_id), chave=f"drive-{file_id}", destino=destino, progresso=progresso, **kwargs)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Baixa o dataset do Google Drive para o cache local')
+    parser.add_argument('--file-id', default=FILE_ID_PADRAO)
+    parser.add_argument('--destino', help='Caminho de saída (link para o objeto em cache)')
+    parser.add_argument('--partes', type=int, default=PARTES_PARALELAS, help='Partes baixadas em paralelo')
+    parser.add_argument('--forcar', action='store_true', help='Ignora o cache e baixa de novo')
+    parser.add_argument('--sha256', default=os.environ.get('SHA256_DATASET'),
+                        help='SHA-256 esperado do arquivo (conferido durante o download)')
+    args = parser.parse_args()
+
+    def mostrar(baixados: int, total: int):
+        if total:
+            print(f"\r📥 Progresso: {baixados / total * 100:.1f}% ({baixados / 1024**2:.0f}MB)", end="", flush=True)
+
+    inicio = time.time()
+    caminho = baixar_arquivo_drive(args.file_id, args.destino, mostrar, partes_paralelas=args.partes,
+                                   forcar=args.forcar, sha256_esperado=args.sha256)
+    print(f"\n✅ {caminho} ({caminho.stat().st_size / 1024**2:.1f}MB em {time.time() - inicio:.1f}s)")
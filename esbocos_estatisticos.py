@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📐 ESBOÇOS ESTATÍSTICOS - CONTAGENS DISTINTAS E QUANTIS APROXIMADOS
+
+Estatísticas interativas sem materializar o conjunto agrupado a cada pedido:
+
+- HyperLogLog: empresas distintas em 2^precisao registradores de 1 byte
+  (erro padrão ~1.04/sqrt(2^precisao): 1,6% com precisao=12)
+- KLL: mediana e percentis com k itens por nível (erro de posto ~1/k)
+
+Os dois esboços são combináveis: a união de duas seleções é a fusão dos
+esboços de cada uma (máximo dos registradores / concatenação dos níveis).
+EsbocosDimensoes monta, na carga da versão, um par de esboços por valor de
+cada dimensão de filtro (tribunal, grau, segmento, ramo); uma seleção de um
+valor usa o esboço dele, e uma de vários valores funde os esboços só quando
+cada empresa pertence a um único valor daquela dimensão.
+
+Limites da aproximação:
+- filtros fora das dimensões esboçadas (CNAE, busca, volume), em duas
+  dimensões ao mesmo tempo ou com vários valores de uma dimensão em que as
+  empresas se repetem entre valores (os grandes litigantes aparecem em quase
+  todos os tribunais) não têm esboço: quem chama usa o cálculo exato. O KLL
+  de cada valor guarda o volume (valor, empresa), não o total da empresa na
+  seleção, e a fusão contaria cada empresa uma vez por valor
+
+Os hashes são os do Polars (Series.hash): estáveis no processo, mas não
+entre versões do Polars - os esboços não são persistidos.
+"""
+
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import polars as pl
+
+from consultas_duckdb import FILTROS_COLUNA
+
+PRECISAO_HLL = 12
+K_KLL = 200
+SEMENTE_HASH = 42
+PERCENTIS = (0.25, 0.75, 0.9, 0.99)
+
+
+def _hashes(serie: pl.Series) -> np.ndarray:
+    return serie.drop_nulls().hash(seed=SEMENTE_HASH).to_numpy()
+
+
+def _grupos(df: pl.DataFrame, coluna: str):
+    """(valor, sub-DataFrame) por valor de `coluna` (chave escalar ou tupla, conforme a versão do Polars)"""
+    for chave, grupo in df.partition_by(coluna, as_dict=True).items():
+        yield (chave[0] if isinstance(chave, tuple) else chave), grupo
+
+
+def _indices_e_postos(hashes: np.ndarray, precisao: int):
+    """Registrador (bits altos) e posto do primeiro bit 1 no restante do hash"""
+    bits = 64 - precisao
+    indices = (hashes >> np.uint64(bits)).astype(np.int64)
+    resto = hashes & np.uint64((1 << bits) - 1)
+    # resto < 2^53 é exato em float64: o expoente de frexp é o número de bits significativos
+    _, expoentes = np.frexp(resto.astype(np.float64))
+    return indices, (bits - expoentes + 1).astype(np.uint8)
+
+
+class HyperLogLog:
+    """Contagem distinta aproximada e combinável"""
+
+    def __init__(self, precisao: int = PRECISAO_HLL, registros: Optional[np.ndarray] = None):
+        self.precisao = precisao
+        self.registros = registros if registros is not None else np.zeros(1 << precisao, dtype=np.uint8)
+
+    @classmethod
+    def de_serie(cls, serie: pl.Series, precisao: int = PRECISAO_HLL) -> 'HyperLogLog':
+        hll = cls(precisao)
+        hll.adicionar_hashes(_hashes(serie))
+        return hll
+
+    def adicionar_hashes(self, hashes: np.ndarray):
+        if len(hashes) == 0:
+            return
+        indices, postos = _indices_e_postos(hashes, self.precisao)
+        np.maximum.at(self.registros, indices, postos)
+
+    def mesclar(self, outro: 'HyperLogLog') -> 'HyperLogLog':
+        if outro.precisao != self.precisao:
+            raise ValueError(f"Precisões diferentes: {self.precisao} e {outro.precisao}")
+        return HyperLogLog(self.precisao, np.maximum(self.registros, outro.registros))
+
+    def estimativa(self) -> int:
+        m = len(self.registros)
+        alfa = 0.7213 / (1 + 1.079 / m)
+        bruta = alfa * m * m / np.sum(np.exp2(-self.registros.astype(np.float64)))
+        vazios = int(np.count_nonzero(self.registros == 0))
+        # Poucos elementos: contagem linear pelos registradores vazios é mais precisa
+        if bruta <= 2.5 * m and vazios:
+            return int(round(m * np.log(m / vazios)))
+        return int(round(bruta))
+
+
+class SketchKLL:
+    """Quantis aproximados e combináveis (Karnin, Lang e Liberty)"""
+
+    def __init__(self, k: int = K_KLL, semente: int = 0):
+        self.k = k
+        self.n = 0
+        self._niveis: List[np.ndarray] = [np.empty(0)]
+        self._rng = np.random.default_rng(semente)
+
+    def _capacidade(self, nivel: int) -> int:
+        # Níveis mais altos (itens de peso maior) guardam mais; os baixos encolhem 2/3 por nível
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (len(self._niveis) - nivel - 1))))
+
+    def adicionar(self, valores: Iterable[float]):
+        valores = np.asarray(valores, dtype=np.float64).ravel()
+        valores = valores[~np.isnan(valores)]
+        if len(valores) == 0:
+            return
+        self.n += len(valores)
+        self._niveis[0] = np.concatenate([self._niveis[0], valores])
+        self._compactar()
+
+    def _compactar(self):
+        while sum(len(itens) for itens in self._niveis) > sum(self._capacidade(h) for h in range(len(self._niveis))):
+            for nivel, itens in enumerate(self._niveis):
+                if len(itens) >= self._capacidade(nivel):
+                    break
+            if nivel + 1 == len(self._niveis):
+                self._niveis.append(np.empty(0))
+            itens = np.sort(itens)
+            # Metade dos itens (pares ou ímpares, ao acaso) sobe com peso dobrado; o ímpar que sobra fica
+            sobra = itens[-1:] if len(itens) % 2 else itens[:0]
+            pares = itens[:len(itens) - len(sobra)]
+            promovidos = pares[self._rng.integers(2)::2]
+            self._niveis[nivel + 1] = np.concatenate([self._niveis[nivel + 1], promovidos])
+            self._niveis[nivel] = sobra
+
+    def mesclar(self, outro: 'SketchKLL') -> 'SketchKLL':
+        novo = SketchKLL(self.k)
+        novo.n = self.n + outro.n
+        altura = max(len(self._niveis), len(outro._niveis))
+        novo._niveis = [
+            np.concatenate([a[h] if h < len(a) else np.empty(0) for a in (self._niveis, outro._niveis)])
+            for h in range(altura)
+        ]
+        novo._compactar()
+        return novo
+
+    def quantil(self, q: float) -> Optional[float]:
+        if self.n == 0:
+            return None
+        valores = np.concatenate(self._niveis)
+        pesos = np.concatenate([np.full(len(itens), 2.0 ** h) for h, itens in enumerate(self._niveis)])
+        ordem = np.argsort(valores, kind='stable')
+        acumulado = np.cumsum(pesos[ordem])
+        posicao = int(np.searchsorted(acumulado, q * acumulado[-1]))
+        return float(valores[ordem][min(posicao, len(valores) - 1)])
+
+
+class EsbocoSelecao:
+    """Esboços de um conjunto de empresas: distintas, soma exata e quantis do volume mensal"""
+
+    def __init__(self, hll: HyperLogLog, kll: SketchKLL, soma: float = 0.0):
+        self.hll = hll
+        self.kll = kll
+        self.soma = soma
+
+    @classmethod
+    def de_empresas(cls, ids: pl.Series, volumes: pl.Series) -> 'EsbocoSelecao':
+        kll = SketchKLL()
+        kll.adicionar(volumes.cast(pl.Float64).to_numpy())
+        return cls(HyperLogLog.de_serie(ids), kll, float(volumes.sum() or 0))
+
+    def mesclar(self, outro: 'EsbocoSelecao') -> 'EsbocoSelecao':
+        return EsbocoSelecao(self.hll.mesclar(outro.hll), self.kll.mesclar(outro.kll), self.soma + outro.soma)
+
+    def estatisticas(self) -> Dict:
+        if self.kll.n == 0:
+            return {'total_empresas': 0, 'processos_mensais_total': 0, 'mediana_mensal': 0,
+                    'percentis': {f"p{int(q * 100)}": 0 for q in PERCENTIS}}
+        return {
+            'total_empresas': self.hll.estimativa(),
+            'processos_mensais_total': int(self.soma),
+            'mediana_mensal': int(self.kll.quantil(0.5)),
+            'percentis': {f"p{int(q * 100)}": int(self.kll.quantil(q)) for q in PERCENTIS},
+        }
+
+
+class EsbocosDimensoes:
+    """Esboços pré-calculados por valor de dimensão de filtro, mais o do conjunto inteiro"""
+
+    def __init__(self, total: EsbocoSelecao, por_dimensao: Dict[str, Dict[str, EsbocoSelecao]],
+                 exclusivas: Iterable[str] = ()):
+        self.total = total
+        self.por_dimensao = por_dimensao
+        # Dimensões em que cada empresa tem um só valor: só nelas a fusão é exata nos quantis
+        self.exclusivas = set(exclusivas)
+
+    @classmethod
+    def construir(cls, df: pl.DataFrame, volume_mensal: Callable[[pl.DataFrame], pl.DataFrame],
+                  chave: str = 'EMPRESA_ID') -> 'EsbocosDimensoes':
+        """
+        Agrupa por (valor, empresa) uma vez por dimensão; `volume_mensal` recebe as
+        empresas agregadas (NOVOS, PENDENTES BRUTO) e devolve com a coluna volume_mensal.
+        """
+        somas = [pl.col(c).sum() for c in ('NOVOS', 'PENDENTES BRUTO') if c in df.columns]
+        if 'PENDENTES BRUTO' not in df.columns:
+            somas.append(pl.lit(None, dtype=pl.Int64).alias('PENDENTES BRUTO'))
+
+        empresas = volume_mensal(df.group_by(chave).agg(somas))
+        total = EsbocoSelecao.de_empresas(empresas[chave], empresas['volume_mensal'])
+
+        por_dimensao, exclusivas = {}, []
+        for filtro, coluna in FILTROS_COLUNA.items():
+            if coluna not in df.columns:
+                continue
+            agregado = volume_mensal(df.filter(pl.col(coluna).is_not_null()).group_by([coluna, chave]).agg(somas))
+            por_dimensao[filtro] = {
+                valor: EsbocoSelecao.de_empresas(grupo[chave], grupo['volume_mensal'])
+                for valor, grupo in _grupos(agregado, coluna)
+            }
+            if agregado[chave].is_unique().all():
+                exclusivas.append(filtro)
+        return cls(total, por_dimensao, exclusivas)
+
+    def selecao(self, filtros: Dict) -> Optional[EsbocoSelecao]:
+        """Esboço fundido da seleção (None se os filtros não são cobertos pelos esboços)"""
+        ativos = {chave: valor for chave, valor in (filtros or {}).items()
+                  if valor not in (None, '', [], 'Todos', 0)}
+        if not ativos:
+            return self.total
+        if len(ativos) > 1 or next(iter(ativos)) not in self.por_dimensao:
+            return None
+
+        filtro, valores = next(iter(ativos.items()))
+        valores = list(dict.fromkeys(valores if isinstance(valores, list) else [valores]))
+        if len(valores) > 1 and filtro not in self.exclusivas:
+            return None
+        esbocos = [self.por_dimensao[filtro][v] for v in valores if v in self.por_dimensao[filtro]]
+        if not esbocos:
+            return EsbocoSelecao(HyperLogLog(), SketchKLL())
+        fundido = esbocos[0]
+        for esboco in esbocos[1:]:
+            fundido = fundido.mesclar(esboco)
+        return fundido
+
+    def estatisticas(self, filtros: Dict) -> Optional[Dict]:
+        selecao = self.selecao(filtros)
+        return selecao.estatisticas() if selecao is not None else None
+
+
+def distintos_por_grupo(df: pl.DataFrame, grupo: str, coluna: str, precisao: int = PRECISAO_HLL) -> pl.DataFrame:
+    """Estimativa HyperLogLog de valores distintos de `coluna` por `grupo` (sem conjunto por grupo)"""
+    base = df.select([grupo, coluna]).drop_nulls(coluna)
+    hashes = base[coluna].hash(seed=SEMENTE_HASH).to_numpy()
+    indices, postos = _indices_e_postos(hashes, precisao)
+    registros = (
+        pl.DataFrame({grupo: base[grupo], 'registro': indices, 'posto': postos})
+        .group_by([grupo, 'registro'])
+        .agg(pl.col('posto').max())
+    )
+    linhas = []
+    for valor, regs in _grupos(registros, grupo):
+        hll = HyperLogLog(precisao)
+        hll.registros[regs['registro'].to_numpy()] = regs['posto'].to_numpy()
+        linhas.append({grupo: valor, f"{coluna}_distintos": hll.estimativa()})
+    return pl.DataFrame(linhas, schema={grupo: df.schema[grupo], f"{coluna}_distintos": pl.Int64})
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Compara contagens distintas e quantis aproximados com os exatos')
+    parser.add_argument('parquet')
+    parser.add_argument('--grupo', default='TRIBUNAL')
+    parser.add_argument('--coluna', default='NOME')
+    args = parser.parse_args()
+
+    df = pl.read_parquet(args.parquet)
+
+    inicio = time.perf_counter()
+    exato = df.group_by(args.grupo).agg(pl.col(args.coluna).n_unique().alias('exato'))
+    tempo_exato = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    aproximado = distintos_por_grupo(df, args.grupo, args.coluna)
+    tempo_aproximado = time.perf_counter() - inicio
+
+    comparacao = exato.join(aproximado, on=args.grupo).with_columns(
+        ((pl.col(f"{args.coluna}_distintos") / pl.col('exato') - 1) * 100).round(2).alias('erro_%')
+    ).sort('exato', descending=True)
+    print(comparacao)
+    print(f"⏱️ Exato {tempo_exato * 1000:.1f}ms, aproximado {tempo_aproximado * 1000:.1f}ms")
+
+    if 'NOVOS' in df.columns:
+        kll = SketchKLL()
+        kll.adicionar(df['NOVOS'].cast(pl.Float64).to_numpy())
+        for q in (0.5,) + PERCENTIS:
+            print(f"📐 p{int(q * 100)}: aproximado {kll.quantil(q):,.0f}, exato {df['NOVOS'].quantile(q, 'nearest'):,.0f}")
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🧪 GERADOR DE DADOS SINTÉTICOS - GRANDES LITIGANTES EM ESCALA
+
+Dataset no layout do export do CNJ, gerado com NumPy vetorizado (sem laço
+por linha) e cardinalidades próximas das reais:
+
+- milhares de empresas com CNPJ válido e volume concentrado (Zipf, expoente
+  configurável em `assimetria`): as maiores são as litigantes conhecidas
+  (bancos, telefonia, varejo), como nos dados reais
+- ~90 tribunais (TJ, TRT, TRF, TRE, TJM e superiores), também concentrados
+- CNAEs (subclasses) de tabela_cnae_classe_subclasse.csv; sem a tabela,
+  códigos sintéticos nas divisões reais. Segmento e ramo da empresa saem da
+  divisão do CNAE
+
+Dezenas de milhões de linhas cabem em memória limitada: o dataset é gerado
+em lotes gravados como grupos de linhas num Parquet bruto (pyarrow) e depois
+reescrito no layout ordenado do app, uma faixa de (SEGMENTO, TRIBUNAL) por
+vez (preparar_parquet.gravar_ordenado_em_faixas). A mesma semente gera
+sempre o mesmo dataset.
+
+Uso:
+    python gerador_sintetico.py sintetico.parquet --linhas 30000000
+    python gerador_sintetico.py demo.parquet --linhas 100000 --empresas 500 --assimetria 1.2
+"""
+
+import os
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import polars as pl
+
+from preparar_parquet import gravar_ordenado, gravar_ordenado_em_faixas
+
+try:
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+EMPRESAS_PADRAO = 5_000
+CNAES_PADRAO = 1_300
+ASSIMETRIA_PADRAO = 0.9
+SEMENTE_PADRAO = 42
+LINHAS_POR_LOTE = 1_000_000
+ARQUIVO_CNAE = 'tabela_cnae_classe_subclasse.csv'
+
+COLUNAS = ['NOME', 'CNPJ', 'TRIBUNAL', 'GRAU', 'RAMO', 'SEGMENTO', 'CNAE',
+           'NOVOS', 'PENDENTES BRUTO', 'PENDENTES LÍQUIDO']
+
+UFS = ['AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA',
+       'PB', 'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO']
+TRIBUNAIS = (
+    [f'TJ{uf}' for uf in UFS]
+    + [f'TRT{i}' for i in range(1, 25)]
+    + [f'TRF{i}' for i in range(1, 7)]
+    + [f'TRE-{uf}' for uf in UFS]
+    + ['TJMSP', 'TJMMG', 'TJMRS', 'STJ', 'TST', 'TSE', 'STM']
+)
+GRAUS = ['1º GRAU', '2º GRAU', 'INSTÂNCIA ÚNICA']
+PESOS_GRAUS = [0.75, 0.2, 0.05]
+
+# Divisões da CNAE 2.0 (2 primeiros dígitos da subclasse), para os códigos sintéticos
+DIVISOES_CNAE = (list(range(1, 4)) + list(range(5, 10)) + list(range(10, 34)) + list(range(35, 40))
+                 + list(range(41, 44)) + list(range(45, 48)) + list(range(49, 54)) + [55, 56]
+                 + list(range(58, 67)) + list(range(68, 76)) + list(range(77, 83)) + [84, 85]
+                 + list(range(86, 89)) + list(range(90, 98)) + [99])
+
+# Divisão CNAE -> (segmento, ramo)
+SEGMENTOS_DIVISAO = {
+    range(5, 10): ('MINERAÇÃO', 'SIDERURGIA E MINERAÇÃO'),
+    range(10, 13): ('ALIMENTÍCIO', 'ALIMENTAÇÃO E BEBIDAS'),
+    range(35, 36): ('ENERGIA', 'ENERGIA E PETRÓLEO'),
+    range(41, 44): ('CONSTRUÇÃO', 'CONSTRUÇÃO CIVIL'),
+    range(45, 48): ('VAREJO', 'VAREJO E COMÉRCIO'),
+    range(61, 62): ('TELECOMUNICAÇÕES', 'TELECOMUNICAÇÕES'),
+    range(62, 64): ('TECNOLOGIA', 'TECNOLOGIA'),
+    range(64, 67): ('BANCÁRIO', 'BANCOS E SERVIÇOS FINANCEIROS'),
+    range(84, 85): ('ADMINISTRAÇÃO PÚBLICA', 'ADMINISTRAÇÃO PÚBLICA'),
+    range(85, 86): ('EDUCACIONAL', 'EDUCAÇÃO'),
+    range(86, 89): ('SAÚDE', 'SAÚDE'),
+}
+SEGMENTO_OUTROS = ('OUTROS', 'OUTROS SERVIÇOS')
+
+# Maiores litigantes (primeiras posições do Zipf) e a divisão CNAE de cada uma
+EMPRESAS_CONHECIDAS = {
+    'BANCO DO BRASIL S.A.': 64, 'ITAÚ UNIBANCO S.A.': 64, 'BRADESCO S.A.': 64,
+    'CAIXA ECONÔMICA FEDERAL': 64, 'SANTANDER BRASIL S.A.': 64, 'TELEFÔNICA BRASIL S.A.': 61,
+    'TIM S.A.': 61, 'CLARO S.A.': 61, 'OI S.A.': 61, 'NUBANK S.A.': 64,
+    'MAGAZINE LUIZA S.A.': 47, 'VIA VAREJO S.A.': 47, 'LOJAS AMERICANAS S.A.': 47,
+    'BANCO INTER S.A.': 64, 'CARREFOUR BRASIL S.A.': 47, 'PETROBRAS S.A.': 6,
+    'VALE S.A.': 7, 'AMBEV S.A.': 11, 'JBS S.A.': 10, 'GERDAU S.A.': 24,
+}
+PREFIXOS_NOME = ['BANCO', 'COMPANHIA', 'GRUPO', 'INDÚSTRIA', 'COMERCIAL', 'SERVIÇOS', 'TELECOM', 'ENERGIA']
+SUFIXOS_NOME = ['S.A.', 'LTDA', 'EIRELI']
+
+PESOS_DV1_CNPJ = np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+PESOS_DV2_CNPJ = np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2])
+
+
+def _pesos_zipf(n: int, expoente: float, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """Pesos ∝ 1/posto^expoente (embaralhados se houver rng)"""
+    pesos = 1.0 / np.arange(1, n + 1) ** expoente
+    if rng is not None:
+        rng.shuffle(pesos)
+    return pesos / pesos.sum()
+
+
+def _divisao(cnaes: np.ndarray) -> np.ndarray:
+    return cnaes // 100_000
+
+
+def _segmento_ramo(cnaes: np.ndarray):
+    divisoes = _divisao(cnaes)
+    segmentos = np.full(len(cnaes), SEGMENTO_OUTROS[0], dtype=object)
+    ramos = np.full(len(cnaes), SEGMENTO_OUTROS[1], dtype=object)
+    for faixa, (segmento, ramo) in SEGMENTOS_DIVISAO.items():
+        mascara = (divisoes >= faixa.start) & (divisoes < faixa.stop)
+        segmentos[mascara] = segmento
+        ramos[mascara] = ramo
+    return segmentos, ramos
+
+
+def carregar_cnaes(arquivo: Union[str, Path] = ARQUIVO_CNAE) -> Optional[np.ndarray]:
+    """Subclasses da tabela CNAE como inteiros (o app compara com zfill(7)); None sem a tabela"""
+    if not Path(arquivo).exists():
+        return None
+    tabela = pl.read_csv(arquivo, separator=';', schema_overrides={'Codigo_Subclasse': pl.Utf8})
+    codigos = (
+        tabela['Codigo_Subclasse'].drop_nulls()
+        .str.replace_all(r'\D', '').cast(pl.Int64, strict=False).drop_nulls().unique().sort()
+    )
+    return codigos.to_numpy() if len(codigos) else None
+
+
+def cnaes_sinteticos(n: int, rng: np.random.Generator) -> np.ndarray:
+    """Subclasses de 7 dígitos nas divisões reais da CNAE 2.0 (sem a tabela oficial)"""
+    divisoes = rng.choice(DIVISOES_CNAE, size=n * 2)
+    codigos = np.unique(divisoes * 100_000 + rng.integers(0, 100_000, size=n * 2))
+    return np.sort(rng.choice(codigos, size=min(n, len(codigos)), replace=False))
+
+
+def gerar_cnpjs(n: int, rng: np.random.Generator) -> pl.Series:
+    """CNPJs de matriz (/0001) distintos, com dígitos verificadores válidos"""
+    raizes = rng.choice(10**8, size=n, replace=False)
+    digitos = (raizes[:, None] // 10 ** np.arange(7, -1, -1)) % 10
+    digitos = np.hstack([digitos, np.tile([0, 0, 0, 1], (n, 1))])
+    for pesos in (PESOS_DV1_CNPJ, PESOS_DV2_CNPJ):
+        resto = (digitos * pesos).sum(axis=1) % 11
+        digitos = np.hstack([digitos, np.where(resto < 2, 0, 11 - resto)[:, None]])
+    numeros = (digitos * 10 ** np.arange(13, -1, -1, dtype=np.int64)).sum(axis=1)
+    return pl.Series('CNPJ', numeros).cast(pl.Utf8).str.zfill(14)
+
+
+def gerar_empresas(n_empresas: int = EMPRESAS_PADRAO, n_cnaes: int = CNAES_PADRAO,
+                   rng: Optional[np.random.Generator] = None,
+                   arquivo_cnae: Union[str, Path] = ARQUIVO_CNAE) -> pl.DataFrame:
+    """Uma linha por empresa, da maior para a menor litigante: nome, CNPJ, CNAE, segmento e ramo"""
+    rng = rng or np.random.default_rng(SEMENTE_PADRAO)
+    cnaes = carregar_cnaes(arquivo_cnae)
+    if cnaes is None:
+        cnaes = cnaes_sinteticos(n_cnaes, rng)
+    elif len(cnaes) > n_cnaes:
+        cnaes = np.sort(rng.choice(cnaes, size=n_cnaes, replace=False))
+    cnae_empresa = rng.choice(cnaes, size=n_empresas)
+
+    # Conhecidas primeiro, com um CNAE da sua divisão (quando a lista de CNAEs tem a divisão)
+    conhecidas = list(EMPRESAS_CONHECIDAS)[:n_empresas]
+    for i, nome in enumerate(conhecidas):
+        da_divisao = cnaes[_divisao(cnaes) == EMPRESAS_CONHECIDAS[nome]]
+        if len(da_divisao):
+            cnae_empresa[i] = rng.choice(da_divisao)
+    segmentos, ramos = _segmento_ramo(cnae_empresa)
+
+    n_sinteticas = n_empresas - len(conhecidas)
+    sinteticas = pl.DataFrame({
+        'prefixo': rng.choice(PREFIXOS_NOME, size=n_sinteticas),
+        'numero': np.arange(len(conhecidas), n_empresas),
+        'sufixo': rng.choice(SUFIXOS_NOME, size=n_sinteticas),
+    }).select(
+        pl.format('{} {} {}', 'prefixo', pl.col('numero').cast(pl.Utf8).str.zfill(5), 'sufixo')
+    ).to_series()
+
+    return pl.DataFrame({
+        'NOME': pl.Series(conhecidas, dtype=pl.Utf8).append(sinteticas),
+        'CNPJ': gerar_cnpjs(n_empresas, rng),
+        'CNAE': cnae_empresa.astype(np.int64),
+        'SEGMENTO': segmentos.tolist(),
+        'RAMO': ramos.tolist(),
+    })
+
+
+class _Gerador:
+    """Estado compartilhado entre os lotes: empresas, pesos e o gerador aleatório"""
+
+    def __init__(self, n_empresas: int, n_cnaes: int, assimetria: float, semente: int,
+                 arquivo_cnae: Union[str, Path], ano: Optional[int]):
+        self.rng = np.random.default_rng(semente)
+        self.empresas = gerar_empresas(n_empresas, n_cnaes, self.rng, arquivo_cnae)
+        self.pesos_empresas = _pesos_zipf(n_empresas, assimetria)
+        self.pesos_tribunais = _pesos_zipf(len(TRIBUNAIS), 0.8, self.rng)
+        self.ano = ano
+
+    def lote(self, linhas: int) -> pl.DataFrame:
+        rng = self.rng
+        empresa = rng.choice(len(self.empresas), size=linhas, p=self.pesos_empresas)
+        tribunal = rng.choice(len(TRIBUNAIS), size=linhas, p=self.pesos_tribunais)
+        grau = rng.choice(len(GRAUS), size=linhas, p=PESOS_GRAUS)
+
+        novos = np.maximum(1, rng.lognormal(3.0, 1.2, size=linhas)).astype(np.int64)
+        pendentes_bruto = (novos * rng.uniform(1.5, 4.0, size=linhas)).astype(np.int64)
+        pendentes_liquido = (pendentes_bruto * rng.uniform(0.6, 0.95, size=linhas)).astype(np.int64)
+
+        df = (
+            self.empresas.select(pl.all().gather(empresa))
+            .with_columns([
+                pl.Series('TRIBUNAL', TRIBUNAIS).gather(tribunal),
+                pl.Series('GRAU', GRAUS).gather(grau),
+                pl.Series('NOVOS', novos),
+                pl.Series('PENDENTES BRUTO', pendentes_bruto),
+                pl.Series('PENDENTES LÍQUIDO', pendentes_liquido),
+            ])
+            .select(COLUNAS)
+        )
+        if self.ano is not None:
+            df = df.with_columns([
+                pl.lit(self.ano, dtype=pl.Int64).alias('ANO'),
+                pl.Series('MES', rng.integers(1, 13, size=linhas)),
+            ])
+        return df
+
+
+def gerar_dataset(linhas: int, n_empresas: int = EMPRESAS_PADRAO, n_cnaes: int = CNAES_PADRAO,
+                  semente: int = SEMENTE_PADRAO, assimetria: float = ASSIMETRIA_PADRAO,
+                  arquivo_cnae: Union[str, Path] = ARQUIVO_CNAE, ano: Optional[int] = None) -> pl.DataFrame:
+    """`linhas` registros (empresa, tribunal, grau) em memória; com `ano`, também ANO e MES"""
+    return _Gerador(n_empresas, n_cnaes, assimetria, semente, arquivo_cnae, ano).lote(linhas)
+
+
+def gerar_parquet(destino: Union[str, Path], linhas: int, n_empresas: int = EMPRESAS_PADRAO,
+                  n_cnaes: int = CNAES_PADRAO, semente: int = SEMENTE_PADRAO,
+                  assimetria: float = ASSIMETRIA_PADRAO, arquivo_cnae: Union[str, Path] = ARQUIVO_CNAE,
+                  ano: Optional[int] = None, linhas_por_lote: int = LINHAS_POR_LOTE,
+                  ordenar: bool = True) -> Path:
+    """Grava o dataset em lotes (memória limitada ao lote) e, se `ordenar`, no layout do app"""
+    destino = Path(destino)
+    gerador = _Gerador(n_empresas, n_cnaes, assimetria, semente, arquivo_cnae, ano)
+
+    if not PYARROW_DISPONIVEL or linhas <= 0:
+        # Sem gravador incremental: o dataset inteiro passa pela memória
+        # (com 0 linhas, um Parquet vazio com o schema completo)
+        df = gerador.lote(max(linhas, 0))
+        if ordenar:
+            return gravar_ordenado(df.lazy(), destino)
+        df.write_parquet(destino, compression='zstd')
+        return destino
+
+    bruto = destino.with_suffix('.bruto.parquet')
+    escritor = None
+    try:
+        for inicio in range(0, linhas, linhas_por_lote):
+            tabela = gerador.lote(min(linhas_por_lote, linhas - inicio)).to_arrow()
+            if escritor is None:
+                escritor = pq.ParquetWriter(str(bruto), tabela.schema, compression='zstd')
+            escritor.write_table(tabela)
+        escritor.close()
+        escritor = None
+        if ordenar:
+            # Ordenação por faixas de (SEGMENTO, TRIBUNAL): memória limitada a uma faixa
+            return gravar_ordenado_em_faixas(bruto, destino)
+        os.replace(bruto, destino)
+        return destino
+    finally:
+        if escritor is not None:
+            escritor.close()
+        bruto.unlink(missing_ok=True)
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Gera dataset sintético de grandes litigantes')
+    parser.add_argument('destino')
+    parser.add_argument('--linhas', type=int, default=1_000_000)
+    parser.add_argument('--empresas', type=int, default=EMPRESAS_PADRAO)
+    parser.add_argument('--cnaes', type=int, default=CNAES_PADRAO)
+    parser.add_argument('--assimetria', type=float, default=ASSIMETRIA_PADRAO,
+                        help='Expoente Zipf do volume por empresa (maior = mais concentrado)')
+    parser.add_argument('--semente', type=int, default=SEMENTE_PADRAO)
+    parser.add_argument('--tabela-cnae', default=ARQUIVO_CNAE)
+    parser.add_argument('--ano', type=int, help='Adiciona ANO (fixo) e MES (aleatório)')
+    parser.add_argument('--linhas-por-lote', type=int, default=LINHAS_POR_LOTE)
+    parser.add_argument('--sem-ordenar', action='store_true', help='Mantém a ordem de geração')
+    args = parser.parse_args()
+
+    if not Path(args.tabela_cnae).exists():
+        print(f"⚠️ {args.tabela_cnae} não encontrada: usando CNAEs sintéticos nas divisões reais")
+
+    inicio = time.time()
+    caminho = gerar_parquet(args.destino, args.linhas, args.empresas, args.cnaes, args.semente,
+                            args.assimetria, args.tabela_cnae, args.ano, args.linhas_por_lote,
+                            ordenar=not args.sem_ordenar)
+    print(f"✅ {caminho}: {args.linhas:,} linhas em {time.time() - inicio:.1f}s "
+          f"({caminho.stat().st_size / 1024**2:.1f}MB)")
+
+    maiores = (
+        pl.scan_parquet(caminho).group_by('NOME').agg(pl.col('NOVOS').sum())
+        .sort('NOVOS', descending=True).head(5).collect()
+    )
+    print(f"🏆 Maiores litigantes: {', '.join(maiores['NOME'].to_list())}")
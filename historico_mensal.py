@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📅 HISTÓRICO MENSAL - SÉRIE DE EXTRATOS DO CNJ
+📂 Partições Parquet estilo Hive por mês de referência (ano=AAAA/mes=MM)
+📈 Consultas de tendência por empresa/tribunal com poda de partições
+
+Cada extrato mensal é ingerido uma única vez, agregado por (NOME, TRIBUNAL),
+e grava apenas a(s) partição(ões) do seu mês. Consultas que filtram por
+ano/mês só leem as partições necessárias.
+
+Uso:
+    python historico_mensal.py ingerir grandes_litigantes_202504.parquet
+    python historico_mensal.py tendencia --empresa "BANCO DO BRASIL"
+"""
+
+import json
+import os
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import polars as pl
+
+from log_estruturado import obter_logger
+
+log = obter_logger('historico')
+
+HISTORICO_DIR = os.environ.get('HISTORICO_DIR', 'historico')
+
+# Ex.: grandes_litigantes_202504.parquet -> (2025, 4)
+PADRAO_MES_ARQUIVO = re.compile(r'(20\d{2})(0[1-9]|1[0-2])')
+
+
+def detectar_mes_referencia(arquivo: str) -> Optional[Tuple[int, int]]:
+    """Extrai (ano, mês) do nome do arquivo do extrato"""
+    match = PADRAO_MES_ARQUIVO.search(Path(arquivo).stem)
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+class HistoricoMensal:
+    """Armazena extratos mensais agregados e responde consultas de tendência"""
+
+    def __init__(self, diretorio: str = HISTORICO_DIR):
+        self.diretorio = Path(diretorio)
+        self.manifesto_path = self.diretorio / '_manifesto.json'
+
+    # === INGESTÃO ===
+
+    def _ler_manifesto(self) -> Dict:
+        if not self.manifesto_path.exists():
+            return {}
+        with open(self.manifesto_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _salvar_manifesto(self, manifesto: Dict):
+        tmp = self.manifesto_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifesto, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.manifesto_path)
+
+    @staticmethod
+    def _assinatura(arquivo: str) -> str:
+        stat = os.stat(arquivo)
+        return f"{stat.st_size}-{int(stat.st_mtime)}"
+
+    def ja_ingerido(self, arquivo: str) -> bool:
+        """Verifica se este extrato (mesmo tamanho e data) já está no histórico"""
+        registro = self._ler_manifesto().get(Path(arquivo).name)
+        return registro is not None and registro.get('assinatura') == self._assinatura(arquivo)
+
+    def ingerir_arquivo(self, arquivo: str, ano: Optional[int] = None, mes: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Ingere um extrato Parquet (incremental: extratos já ingeridos são ignorados)"""
+        if self.ja_ingerido(arquivo):
+            log.info('⏭️ Extrato já ingerido no histórico', extra={'arquivo': arquivo})
+            return []
+
+        particoes = self.ingerir(pl.scan_parquet(arquivo), ano, mes, origem=arquivo)
+
+        manifesto = self._ler_manifesto()
+        manifesto[Path(arquivo).name] = {
+            'assinatura': self._assinatura(arquivo),
+            'particoes': [f"{a:04d}-{m:02d}" for a, m in particoes]
+        }
+        self._salvar_manifesto(manifesto)
+        return particoes
+
+    def ingerir(self, dados, ano: Optional[int] = None, mes: Optional[int] = None,
+                origem: str = '') -> List[Tuple[int, int]]:
+        """Agrega o extrato por (mês, NOME, TRIBUNAL) e grava uma partição por mês"""
+        lf = dados.lazy() if isinstance(dados, pl.DataFrame) else dados
+        colunas = lf.collect_schema().names()
+
+        coluna_empresa = next((c for c in ['NOME', 'EMPRESA', 'ÓRGÃO', 'ORGAO'] if c in colunas), None)
+        if coluna_empresa is None or 'NOVOS' not in colunas or 'TRIBUNAL' not in colunas:
+            raise ValueError(f"Extrato sem colunas necessárias (NOME, TRIBUNAL, NOVOS): {colunas}")
+
+        # Mês de referência: parâmetro > nome do arquivo > colunas ANO/MES do próprio extrato
+        if ano is None or mes is None:
+            referencia = detectar_mes_referencia(origem) if origem else None
+            if referencia:
+                ano, mes = referencia
+
+        if ano is not None and mes is not None:
+            lf = lf.with_columns([pl.lit(ano).alias('ano'), pl.lit(mes).alias('mes')])
+        elif 'ANO' in colunas and 'MES' in colunas:
+            lf = lf.with_columns([pl.col('ANO').cast(pl.Int32).alias('ano'), pl.col('MES').cast(pl.Int32).alias('mes')])
+        else:
+            raise ValueError("Mês de referência não encontrado (informe ano/mes ou use colunas ANO/MES)")
+
+        agregacoes = [
+            pl.col('NOVOS').cast(pl.Int64).sum().alias('NOVOS'),
+            pl.len().alias('REGISTROS')
+        ]
+        if 'PENDENTES BRUTO' in colunas:
+            agregacoes.append(pl.col('PENDENTES BRUTO').cast(pl.Int64).sum().alias('PENDENTES BRUTO'))
+
+        agregado = (
+            lf.rename({coluna_empresa: 'NOME'} if coluna_empresa != 'NOME' else {})
+            .group_by(['ano', 'mes', 'NOME', 'TRIBUNAL'])
+            .agg(agregacoes)
+            # Ordenar por empresa deixa as estatísticas min/max dos row groups úteis
+            .sort(['ano', 'mes', 'NOME', 'TRIBUNAL'])
+            .collect()
+        )
+
+        particoes = []
+        for (ano_p, mes_p), parte in agregado.group_by(['ano', 'mes'], maintain_order=True):
+            destino = self.diretorio / f"ano={int(ano_p):04d}" / f"mes={int(mes_p):02d}"
+            destino.mkdir(parents=True, exist_ok=True)
+            tmp = destino / 'dados.parquet.tmp'
+            # Colunas de partição ficam só no caminho (estilo Hive)
+            parte.drop(['ano', 'mes']).write_parquet(tmp, statistics=True)
+            os.replace(tmp, destino / 'dados.parquet')
+            particoes.append((int(ano_p), int(mes_p)))
+            log.info('📅 Partição gravada', extra={'particao': f'{int(ano_p):04d}-{int(mes_p):02d}',
+                                                  'linhas': len(parte)})
+
+        return particoes
+
+    # === CONSULTAS ===
+
+    def disponivel(self) -> bool:
+        return any(self.diretorio.glob('ano=*/mes=*/dados.parquet'))
+
+    def scan(self) -> pl.LazyFrame:
+        """LazyFrame do histórico; filtros em ano/mes podam partições"""
+        return pl.scan_parquet(str(self.diretorio / '**' / '*.parquet'), hive_partitioning=True)
+
+    def meses(self) -> List[Tuple[int, int]]:
+        """Meses disponíveis, lidos apenas dos nomes das partições"""
+        meses = []
+        for caminho in self.diretorio.glob('ano=*/mes=*'):
+            ano = int(caminho.parent.name.split('=')[1])
+            mes = int(caminho.name.split('=')[1])
+            meses.append((ano, mes))
+        return sorted(meses)
+
+    def _filtrar_periodo(self, lf: pl.LazyFrame, desde: Optional[Tuple[int, int]],
+                         ate: Optional[Tuple[int, int]]) -> pl.LazyFrame:
+        chave = pl.col('ano') * 100 + pl.col('mes')
+        if desde:
+            lf = lf.filter(chave >= desde[0] * 100 + desde[1])
+        if ate:
+            lf = lf.filter(chave <= ate[0] * 100 + ate[1])
+        return lf
+
+    def tendencia(self, empresas: Optional[List[str]] = None, tribunais: Optional[List[str]] = None,
+                  desde: Optional[Tuple[int, int]] = None, ate: Optional[Tuple[int, int]] = None,
+                  por_tribunal: bool = False) -> pl.DataFrame:
+        """Série mensal de NOVOS por empresa (e opcionalmente por tribunal)"""
+        lf = self._filtrar_periodo(self.scan(), desde, ate)
+        if empresas:
+            lf = lf.filter(pl.col('NOME').is_in(empresas))
+        if tribunais:
+            lf = lf.filter(pl.col('TRIBUNAL').is_in(tribunais))
+
+        chaves = ['NOME', 'TRIBUNAL'] if por_tribunal else ['NOME']
+        return (
+            lf.group_by(chaves + ['ano', 'mes'])
+            .agg(pl.col('NOVOS').sum())
+            .sort(chaves + ['ano', 'mes'])
+            .with_columns(
+                (pl.col('NOVOS').cast(pl.Float64) / pl.col('NOVOS').shift(1).over(chaves) - 1)
+                .alias('variacao_mensal')
+            )
+            .collect()
+        )
+
+    def crescimento_mensal(self, n_meses: int = 3) -> pl.DataFrame:
+        """
+        Taxa de crescimento mês a mês por empresa nos últimos n_meses extratos
+        (média geométrica da variação de NOVOS, que é a janela móvel de 12 meses do CNJ)
+        """
+        meses = self.meses()
+        if len(meses) < 2:
+            return pl.DataFrame(schema={'NOME': pl.Utf8, 'crescimento_mensal': pl.Float64})
+
+        janela = meses[-n_meses:] if n_meses >= 2 else meses[-2:]
+        serie = self.tendencia(desde=janela[0], ate=janela[-1])
+
+        return (
+            serie.group_by('NOME')
+            .agg([
+                pl.col('NOVOS').first().alias('primeiro'),
+                pl.col('NOVOS').last().alias('ultimo'),
+                # Distância em meses de calendário: extratos podem faltar no meio da janela
+                ((pl.col('ano').last() - pl.col('ano').first()) * 12
+                 + pl.col('mes').last() - pl.col('mes').first()).alias('meses_decorridos')
+            ])
+            .filter((pl.col('meses_decorridos') >= 1) & (pl.col('primeiro') > 0))
+            .with_columns(
+                ((pl.col('ultimo').cast(pl.Float64) / pl.col('primeiro'))
+                 .pow(1.0 / pl.col('meses_decorridos')) - 1)
+                .alias('crescimento_mensal')
+            )
+            .select(['NOME', 'crescimento_mensal'])
+        )
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Histórico mensal de extratos do CNJ')
+    parser.add_argument('--dir', default=HISTORICO_DIR, help='Diretório do histórico')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_ingerir = sub.add_parser('ingerir', help='Ingere extratos Parquet')
+    p_ingerir.add_argument('arquivos', nargs='+')
+    p_ingerir.add_argument('--ano', type=int)
+    p_ingerir.add_argument('--mes', type=int)
+
+    p_tendencia = sub.add_parser('tendencia', help='Série mensal de uma empresa')
+    p_tendencia.add_argument('--empresa', action='append')
+    p_tendencia.add_argument('--tribunal', action='append')
+
+    sub.add_parser('crescimento', help='Crescimento mensal por empresa')
+
+    args = parser.parse_args()
+    historico = HistoricoMensal(args.dir)
+
+    if args.comando == 'ingerir':
+        for arquivo in args.arquivos:
+            particoes = historico.ingerir_arquivo(arquivo, args.ano, args.mes)
+            print(f"✅ {arquivo}: {len(particoes)} partição(ões)")
+    elif args.comando == 'tendencia':
+        print(historico.tendencia(args.empresa, args.tribunal, por_tribunal=bool(args.tribunal)))
+    else:
+        print(historico.crescimento_mensal().sort('crescimento_mensal', descending=True))
+
+
+if __name__ == "__main__":
+    main()
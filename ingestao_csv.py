@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📄 INGESTÃO DE CSV - CONVERSÃO ÚNICA PARA PARQUET EM MEMÓRIA LIMITADA
+
+O export antigo em CSV (separador ';', muitas vezes em Windows-1252) é
+convertido uma vez para Parquet tipado e todas as cargas seguintes leem o
+Parquet do cache:
+
+1. encoding detectado uma vez, numa amostra do início do arquivo
+2. se não for UTF-8, transcodificação em blocos para um UTF-8 temporário
+   (decodificador incremental: caracteres multibyte não quebram entre blocos)
+3. parsing paralelo do Polars (scan_csv) com tipos fixados (contagens
+   inteiras; CNPJ e CNAE como texto, preservando zeros à esquerda) e
+   gravação em streaming, já no layout ordenado de preparar_parquet.py - o
+   arquivo inteiro nunca fica na memória, então não há mais a amostra de
+   100 mil linhas para CSVs > 1GB
+
+O cache é indexado por caminho + tamanho + data de modificação do CSV.
+"""
+
+import codecs
+import hashlib
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+import polars as pl
+
+from download_drive import DIRETORIO_CACHE
+from preparar_parquet import gravar_ordenado
+from validacao_parquet import ParquetInvalido, validar_parquet
+
+DIRETORIO_CACHE_CSV = DIRETORIO_CACHE / 'csv'
+TAMANHO_AMOSTRA = 1024**2
+TAMANHO_BLOCO_TRANSCODIFICACAO = 16 * 1024**2
+
+# Contagens do CNJ: inteiras mesmo quando o export traz algum lixo na coluna
+COLUNAS_INTEIRAS = ['NOVOS', 'PENDENTES BRUTO', 'PENDENTES LÍQUIDO']
+
+
+def _eh_identificador(coluna: str) -> bool:
+    """Códigos lidos como texto: a inferência os faria Int64 e perderia os zeros à esquerda"""
+    return 'CNPJ' in coluna.upper() or coluna == 'CNAE'
+
+# progresso(etapa, detalhe)
+Progresso = Callable[[str, str], None]
+
+
+def detectar_encoding(caminho: Union[str, Path]) -> str:
+    """Encoding do arquivo pela amostra inicial (chardet se instalado, senão heurística)"""
+    with open(caminho, 'rb') as f:
+        amostra = f.read(TAMANHO_AMOSTRA)
+
+    if amostra.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+
+    # UTF-8 estrito na amostra (o fim pode cortar um caractere multibyte ao meio)
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(amostra, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    try:
+        import chardet
+        resultado = chardet.detect(amostra)
+        if resultado.get('encoding') and resultado.get('confidence', 0) >= 0.7:
+            return resultado['encoding'].lower()
+    except ImportError:
+        pass
+
+    # Export do CNJ fora de UTF-8 é Windows-1252; latin-1 aceita qualquer byte
+    try:
+        amostra.decode('windows-1252')
+        return 'windows-1252'
+    except UnicodeDecodeError:
+        return 'latin-1'
+
+
+def transcodificar_utf8(origem: Union[str, Path], destino: Union[str, Path], encoding: str) -> Path:
+    """Reescreve o arquivo em UTF-8, bloco a bloco (memória constante)"""
+    decodificador = codecs.getincrementaldecoder(encoding)(errors='replace')
+    with open(origem, 'rb') as entrada, open(destino, 'wb', buffering=TAMANHO_BLOCO_TRANSCODIFICACAO) as saida:
+        while True:
+            bloco = entrada.read(TAMANHO_BLOCO_TRANSCODIFICACAO)
+            texto = decodificador.decode(bloco, final=not bloco)
+            saida.write(texto.encode('utf-8'))
+            if not bloco:
+                break
+    return Path(destino)
+
+
+def _chave_cache(caminho: Path) -> str:
+    estado = caminho.stat()
+    assinatura = f"{caminho.resolve()}|{estado.st_size}|{estado.st_mtime_ns}"
+    return hashlib.sha1(assinatura.encode('utf-8')).hexdigest()
+
+
+def _plano_tipado(caminho_utf8: Path, separador: str) -> pl.LazyFrame:
+    # Só o cabeçalho, para fixar os identificadores antes da inferência de tipos
+    colunas = pl.scan_csv(
+        caminho_utf8, separator=separador, encoding='utf8', n_rows=0, infer_schema_length=0
+    ).collect_schema().names()
+    lf = pl.scan_csv(
+        caminho_utf8,
+        separator=separador,
+        encoding='utf8',
+        infer_schema_length=10_000,
+        schema_overrides={c: pl.Utf8 for c in colunas if _eh_identificador(c)},
+        ignore_errors=True,
+        truncate_ragged_lines=True,
+    )
+    return lf.with_columns([
+        pl.col(c).cast(pl.Int64, strict=False) for c in COLUNAS_INTEIRAS if c in colunas
+    ])
+
+
+def parquet_de_csv(caminho_csv: Union[str, Path], separador: str = ';', forcar: bool = False,
+                   progresso: Optional[Progresso] = None,
+                   diretorio_cache: Path = DIRETORIO_CACHE_CSV) -> Path:
+    """Parquet convertido do CSV (do cache, se o CSV não mudou desde a última conversão)"""
+    caminho_csv = Path(caminho_csv)
+    avisar = progresso or (lambda etapa, detalhe: None)
+    diretorio_cache.mkdir(parents=True, exist_ok=True)
+    destino = diretorio_cache / f"{_chave_cache(caminho_csv)}.parquet"
+
+    if destino.exists() and not forcar:
+        try:
+            validar_parquet(destino, [])
+            avisar('cache', f"Parquet já convertido: {destino.name}")
+            return destino
+        except ParquetInvalido:
+            destino.unlink()
+
+    encoding = detectar_encoding(caminho_csv)
+    avisar('encoding', encoding)
+
+    fonte = caminho_csv
+    temporario_utf8 = None
+    if encoding not in ('utf-8', 'utf8', 'ascii', 'utf-8-sig'):
+        temporario_utf8 = destino.with_suffix('.utf8.csv')
+        avisar('transcodificacao', f"{encoding} -> UTF-8")
+        fonte = transcodificar_utf8(caminho_csv, temporario_utf8, encoding)
+
+    try:
+        avisar('conversao', f"{caminho_csv.name} -> Parquet")
+        # Streaming com o layout ordenado dos filtros do app (memória limitada)
+        gravar_ordenado(_plano_tipado(fonte, separador), destino)
+    finally:
+        if temporario_utf8 is not None:
+            temporario_utf8.unlink(missing_ok=True)
+
+    info = validar_parquet(destino, [])
+    avisar('concluido', f"{info['linhas']:,} linhas, {info['tamanho'] / 1024**2:.1f}MB")
+    return destino
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Converte o CSV do CNJ para Parquet (cache local)')
+    parser.add_argument('csv')
+    parser.add_argument('--separador', default=';')
+    parser.add_argument('--forcar', action='store_true', help='Converte de novo mesmo com cache válido')
+    args = parser.parse_args()
+
+    inicio = time.time()
+    caminho = parquet_de_csv(args.csv, args.separador, args.forcar,
+                             progresso=lambda etapa, detalhe: print(f"📄 {etapa}: {detalhe}"))
+    print(f"✅ {caminho} ({time.time() - inicio:.1f}s)")
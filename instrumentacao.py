@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+⏱️ INSTRUMENTAÇÃO POR REQUISIÇÃO - ETAPAS, HISTOGRAMAS E PERFIL DAS LENTAS
+
+Cada requisição ganha um perfil (por thread) com a duração das etapas
+marcadas no código (filtro, join, group_by, duckdb, serializacao...). Ao
+final, as durações entram em histogramas agregados por endpoint e etapa,
+exportados no formato texto do Prometheus.
+
+Requisições acima do limiar (LIMIAR_REQUISICAO_LENTA_MS) guardam um
+relatório com as etapas, anotações do endpoint, o plano otimizado dos
+LazyFrames registrados e, se a amostragem estiver ligada, as pilhas Python
+mais frequentes: uma thread amostra a pilha das requisições que já passaram
+de metade do limiar (formato colapsado, pronto para flamegraph). Fora
+dessas, o custo é um perf_counter por etapa.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from log_estruturado import obter_logger
+
+log = obter_logger('instrumentacao')
+
+# Limites superiores (segundos) dos buckets dos histogramas
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LIMIAR_LENTA_MS = float(os.environ.get('LIMIAR_REQUISICAO_LENTA_MS', 1000))
+AMOSTRAGEM_LENTAS = os.environ.get('AMOSTRAGEM_REQUISICOES_LENTAS', '1') != '0'
+INTERVALO_AMOSTRAGEM = 0.01
+PROFUNDIDADE_PILHA = 40
+MAX_LENTAS = 50
+MAX_PILHAS_RELATORIO = 15
+
+
+class Histograma:
+    """Contagens cumulativas por bucket, soma e total (semântica do Prometheus)"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS_SEGUNDOS):
+        self.buckets = buckets
+        self.contagens = [0] * len(buckets)
+        self.soma = 0.0
+        self.total = 0
+
+    def observar(self, valor: float):
+        for i, limite in enumerate(self.buckets):
+            if valor <= limite:
+                self.contagens[i] += 1
+        self.soma += valor
+        self.total += 1
+
+    def linhas_prometheus(self, nome: str, rotulos: Dict[str, str]) -> List[str]:
+        base = _rotulos(rotulos)
+        separador = ',' if base else ''
+        linhas = [
+            f'{nome}_bucket{{{base}{separador}le="{limite}"}} {contagem}'
+            for limite, contagem in zip(self.buckets, self.contagens)
+        ]
+        linhas.append(f'{nome}_bucket{{{base}{separador}le="+Inf"}} {self.total}')
+        linhas.append(f'{nome}_sum{{{base}}} {self.soma:.6f}')
+        linhas.append(f'{nome}_count{{{base}}} {self.total}')
+        return linhas
+
+
+def _rotulos(rotulos: Dict[str, str]) -> str:
+    def escapar(valor) -> str:
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{chave}="{escapar(valor)}"' for chave, valor in rotulos.items())
+
+
+def _pilha(quadro) -> str:
+    """Pilha da raiz para a folha como 'pasta/arquivo:função:linha;...' (formato colapsado)"""
+    partes = []
+    while quadro is not None and len(partes) < PROFUNDIDADE_PILHA:
+        codigo = quadro.f_code
+        arquivo = Path(codigo.co_filename)
+        partes.append(f"{arquivo.parent.name}/{arquivo.name}:{codigo.co_name}:{quadro.f_lineno}")
+        quadro = quadro.f_back
+    return ';'.join(reversed(partes))
+
+
+class Perfil:
+    """Medições de uma requisição em andamento"""
+
+    def __init__(self, endpoint: str, metodo: str):
+        self.endpoint = endpoint
+        self.metodo = metodo
+        self.inicio = time.perf_counter()
+        self.status = 200
+        self.etapas: Dict[str, float] = {}
+        self.trechos: List[Tuple[str, float, float]] = []
+        self.planos: List[Tuple[str, object]] = []
+        self.anotacoes: Dict[str, object] = {}
+        self.amostras: Counter = Counter()
+
+    def decorrido(self) -> float:
+        return time.perf_counter() - self.inicio
+
+
+class Instrumentacao:
+    """Perfis por requisição, histogramas agregados e relatórios das requisições lentas"""
+
+    def __init__(self, limiar_lenta_ms: float = LIMIAR_LENTA_MS, amostrar: bool = AMOSTRAGEM_LENTAS,
+                 intervalo_amostragem: float = INTERVALO_AMOSTRAGEM, max_lentas: int = MAX_LENTAS):
+        # limiar_lenta_ms <= 0 desliga relatórios e amostragem (só histogramas)
+        self.limiar_lenta = limiar_lenta_ms / 1000
+        self.amostrar = amostrar and self.limiar_lenta > 0
+        self.intervalo_amostragem = intervalo_amostragem
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._requisicoes: Dict[Tuple[str, str], Histograma] = {}
+        self._etapas: Dict[Tuple[str, str], Histograma] = {}
+        self._status: Counter = Counter()
+        self._contagem_lentas: Counter = Counter()
+        self._lentas = deque(maxlen=max_lentas)
+        # Requisições em andamento por thread (alvo da amostragem)
+        self._ativas: Dict[int, Perfil] = {}
+        self._ha_ativas = threading.Event()
+        self._amostrador: Optional[threading.Thread] = None
+
+    # --- ciclo da requisição -------------------------------------------------
+
+    def iniciar(self, endpoint: str, metodo: str = 'GET') -> Perfil:
+        perfil = Perfil(endpoint, metodo)
+        self._local.perfil = perfil
+        if self.amostrar:
+            with self._lock:
+                self._ativas[threading.get_ident()] = perfil
+                self._ha_ativas.set()
+                if self._amostrador is None:
+                    self._amostrador = threading.Thread(target=self._amostrar, daemon=True,
+                                                        name='amostrador-requisicoes')
+                    self._amostrador.start()
+        return perfil
+
+    def definir_status(self, status: int):
+        perfil = self.perfil_atual()
+        if perfil is not None:
+            perfil.status = status
+
+    def finalizar(self) -> Optional[Dict]:
+        """Registra a requisição da thread atual; devolve o relatório se ela foi lenta"""
+        perfil = self.perfil_atual()
+        if perfil is None:
+            return None
+        self._local.perfil = None
+        duracao = perfil.decorrido()
+        with self._lock:
+            if self._ativas.pop(threading.get_ident(), None) is not None and not self._ativas:
+                self._ha_ativas.clear()
+            chave = (perfil.endpoint, perfil.metodo)
+            self._requisicoes.setdefault(chave, Histograma()).observar(duracao)
+            self._status[(perfil.endpoint, perfil.metodo, str(perfil.status))] += 1
+            for etapa, segundos in perfil.etapas.items():
+                self._etapas.setdefault((perfil.endpoint, etapa), Histograma()).observar(segundos)
+
+        if self.limiar_lenta <= 0 or duracao < self.limiar_lenta:
+            return None
+        relatorio = self._relatorio(perfil, duracao)
+        with self._lock:
+            self._contagem_lentas[perfil.endpoint] += 1
+            self._lentas.append(relatorio)
+        log.warning('🐢 Requisição lenta', extra={
+            'endpoint': perfil.endpoint, 'metodo': perfil.metodo,
+            'duracao_ms': relatorio['duracao_ms'], 'etapas_ms': relatorio['etapas_ms']
+        })
+        return relatorio
+
+    def perfil_atual(self) -> Optional[Perfil]:
+        return getattr(self._local, 'perfil', None)
+
+    # --- marcações no código dos endpoints -----------------------------------
+
+    @contextmanager
+    def etapa(self, nome: str):
+        """Soma a duração do bloco à etapa `nome` da requisição atual (sem requisição: nada)"""
+        perfil = self.perfil_atual()
+        if perfil is None:
+            yield
+            return
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            fim = time.perf_counter()
+            perfil.etapas[nome] = perfil.etapas.get(nome, 0.0) + (fim - inicio)
+            perfil.trechos.append((nome, inicio - perfil.inicio, fim - inicio))
+
+    def cronometrar(self, nome: str):
+        """Decorador: cada chamada da função conta como etapa `nome`"""
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                with self.etapa(nome):
+                    return f(*args, **kwargs)
+            return decorated
+        return decorator
+
+    def registrar_plano(self, nome: str, lazy_frame):
+        """Guarda o LazyFrame; o plano (explain) só é gerado se a requisição for lenta"""
+        perfil = self.perfil_atual()
+        if perfil is not None and self.limiar_lenta > 0:
+            perfil.planos.append((nome, lazy_frame))
+
+    def anotar(self, **valores):
+        """Contexto do endpoint (contagens, filtros) que aparece no relatório das lentas"""
+        perfil = self.perfil_atual()
+        if perfil is not None:
+            perfil.anotacoes.update(valores)
+
+    # --- relatórios e exportação ---------------------------------------------
+
+    def _relatorio(self, perfil: Perfil, duracao: float) -> Dict:
+        planos = {}
+        for nome, lazy_frame in perfil.planos:
+            try:
+                planos[nome] = lazy_frame.explain()
+            except Exception as e:
+                planos[nome] = f"(plano indisponível: {e})"
+        total_amostras = sum(perfil.amostras.values())
+        return {
+            'endpoint': perfil.endpoint,
+            'metodo': perfil.metodo,
+            'status': perfil.status,
+            'quando': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'duracao_ms': round(duracao * 1000, 1),
+            'etapas_ms': {nome: round(s * 1000, 1) for nome, s in perfil.etapas.items()},
+            'trechos': [
+                {'etapa': nome, 'inicio_ms': round(inicio * 1000, 1), 'duracao_ms': round(d * 1000, 1)}
+                for nome, inicio, d in perfil.trechos
+            ],
+            'anotacoes': perfil.anotacoes,
+            'planos': planos,
+            'amostras': total_amostras,
+            'pilhas': [
+                {'pilha': pilha, 'amostras': n, 'fracao': round(n / total_amostras, 3)}
+                for pilha, n in perfil.amostras.most_common(MAX_PILHAS_RELATORIO)
+            ],
+        }
+
+    def lentas(self) -> List[Dict]:
+        """Relatórios das requisições lentas mais recentes (mais nova primeiro)"""
+        with self._lock:
+            return list(reversed(self._lentas))
+
+    def prometheus(self) -> str:
+        """Métricas agregadas no formato de exposição texto do Prometheus"""
+        with self._lock:
+            linhas = [
+                '# HELP litigantes_requisicao_segundos Duração das requisições HTTP.',
+                '# TYPE litigantes_requisicao_segundos histogram',
+            ]
+            for (endpoint, metodo), histograma in sorted(self._requisicoes.items()):
+                linhas += histograma.linhas_prometheus(
+                    'litigantes_requisicao_segundos', {'endpoint': endpoint, 'metodo': metodo})
+            linhas += [
+                '# HELP litigantes_etapa_segundos Duração das etapas por requisição (soma das ocorrências).',
+                '# TYPE litigantes_etapa_segundos histogram',
+            ]
+            for (endpoint, etapa), histograma in sorted(self._etapas.items()):
+                linhas += histograma.linhas_prometheus(
+                    'litigantes_etapa_segundos', {'endpoint': endpoint, 'etapa': etapa})
+            linhas += [
+                '# HELP litigantes_requisicoes_total Requisições HTTP concluídas por status.',
+                '# TYPE litigantes_requisicoes_total counter',
+            ]
+            for (endpoint, metodo, status), n in sorted(self._status.items()):
+                rotulos = _rotulos({'endpoint': endpoint, 'metodo': metodo, 'status': status})
+                linhas.append(f'litigantes_requisicoes_total{{{rotulos}}} {n}')
+            linhas += [
+                '# HELP litigantes_requisicoes_lentas_total Requisições acima do limiar de lentidão.',
+                '# TYPE litigantes_requisicoes_lentas_total counter',
+            ]
+            for endpoint, n in sorted(self._contagem_lentas.items()):
+                linhas.append(f'litigantes_requisicoes_lentas_total{{{_rotulos({"endpoint": endpoint})}}} {n}')
+        return '\n'.join(linhas) + '\n'
+
+    # --- amostragem de pilhas ------------------------------------------------
+
+    def _amostrar(self):
+        inicio_amostragem = self.limiar_lenta / 2
+        while True:
+            self._ha_ativas.wait()
+            time.sleep(self.intervalo_amostragem)
+            with self._lock:
+                if not self._ativas:
+                    continue
+                quadros = sys._current_frames()
+                for ident, perfil in self._ativas.items():
+                    if perfil.decorrido() < inicio_amostragem:
+                        continue
+                    quadro = quadros.get(ident)
+                    if quadro is not None:
+                        perfil.amostras[_pilha(quadro)] += 1
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📝 LOG ESTRUTURADO - NÍVEIS, AMOSTRAGEM E ESCRITA FORA DAS THREADS DE REQUISIÇÃO
+
+Substitui os print() do servidor por logging com campos estruturados:
+
+    log = obter_logger('app')
+    log.info('✅ Dados carregados', extra={'registros': len(df)})
+
+- Nível global em LOG_NIVEL (padrão INFO): debug desligado não formata nada
+- Saída em texto legível ou JSON por linha (LOG_FORMATO=json, para produção)
+- Eventos frequentes marcados com extra={'evento': ...} são amostrados
+  (LOG_AMOSTRAGEM="progresso=10" mantém 1 a cada 10); WARNING+ sempre passa
+- A thread que loga só enfileira (fila limitada, put_nowait); a escrita no
+  stdout fica numa thread própria (QueueListener). Com a fila cheia o
+  registro é descartado e contado, nunca bloqueia a requisição
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+RAIZ = 'litigantes'
+NIVEL_PADRAO = os.environ.get('LOG_NIVEL', 'INFO').upper()
+FORMATO_PADRAO = os.environ.get('LOG_FORMATO', 'texto')
+AMOSTRAGEM_PADRAO = os.environ.get('LOG_AMOSTRAGEM', 'progresso=10')
+TAMANHO_FILA = int(os.environ.get('LOG_TAMANHO_FILA', 10_000))
+
+# Atributos de todo LogRecord: o que sobrar veio de extra= (campos estruturados)
+_ATRIBUTOS_RECORD = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'taskName'}
+
+
+def _campos(record: logging.LogRecord) -> Dict:
+    return {chave: valor for chave, valor in vars(record).items() if chave not in _ATRIBUTOS_RECORD}
+
+
+def _taxas_amostragem(especificacao: str) -> Dict[str, int]:
+    """'progresso=10,download=100' -> {'progresso': 10, 'download': 100}"""
+    taxas = {}
+    for item in especificacao.split(','):
+        evento, _, taxa = item.partition('=')
+        if evento.strip() and taxa.strip().isdigit():
+            taxas[evento.strip()] = int(taxa)
+    return taxas
+
+
+class FormatadorTexto(logging.Formatter):
+    """hora nível mensagem chave=valor ... (traceback na linha seguinte)"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        linha = f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} {record.getMessage()}"
+        campos = _campos(record)
+        if campos:
+            linha += ' ' + ' '.join(f'{chave}={valor}' for chave, valor in campos.items())
+        if record.exc_text:
+            linha += '\n' + record.exc_text
+        return linha
+
+
+class FormatadorJSON(logging.Formatter):
+    """Um objeto JSON por linha: ts, nivel, logger, msg, campos de extra= e exc"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        evento = {
+            'ts': f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            'nivel': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        evento.update(_campos(record))
+        if record.exc_text:
+            evento['exc'] = record.exc_text
+        return json.dumps(evento, ensure_ascii=False, default=str)
+
+
+class FiltroAmostragem(logging.Filter):
+    """Deixa passar 1 a cada N registros de cada `evento` configurado (WARNING+ sempre passa)"""
+
+    def __init__(self, taxas: Dict[str, int]):
+        super().__init__()
+        self.taxas = taxas
+        self._contagens: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        evento = getattr(record, 'evento', None)
+        taxa = self.taxas.get(evento, 1) if evento is not None else 1
+        if taxa <= 1 or record.levelno >= logging.WARNING:
+            return True
+        with self._lock:
+            ordem = self._contagens[evento]
+            self._contagens[evento] = ordem + 1
+        if ordem % taxa:
+            return False
+        # Cada registro que passa representa `taxa` ocorrências
+        record.amostragem = taxa
+        return True
+
+
+class HandlerFila(logging.handlers.QueueHandler):
+    """Enfileira sem bloquear; com a fila cheia, descarta e conta"""
+
+    def __init__(self, fila: queue.Queue):
+        super().__init__(fila)
+        self.descartados = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Mensagem e traceback resolvidos aqui (os args podem mudar depois);
+        # os campos de extra= seguem no record para o formatador da outra thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.descartados += 1
+
+
+_configuracao_lock = threading.Lock()
+_handler: Optional[HandlerFila] = None
+_ouvinte: Optional[logging.handlers.QueueListener] = None
+
+
+def configurar(nivel: str = NIVEL_PADRAO, formato: str = FORMATO_PADRAO,
+               amostragem: str = AMOSTRAGEM_PADRAO, destino=None) -> logging.Logger:
+    """(Re)configura o logger raiz da aplicação: nível, formato, amostragem e fila"""
+    global _handler, _ouvinte
+    with _configuracao_lock:
+        raiz = logging.getLogger(RAIZ)
+        if _ouvinte is not None:
+            _ouvinte.stop()
+        if _handler is not None:
+            raiz.removeHandler(_handler)
+
+        saida = logging.StreamHandler(destino or sys.stdout)
+        saida.setFormatter(FormatadorJSON() if formato == 'json' else FormatadorTexto())
+
+        fila = queue.Queue(maxsize=TAMANHO_FILA)
+        _handler = HandlerFila(fila)
+        _handler.addFilter(FiltroAmostragem(_taxas_amostragem(amostragem)))
+        _ouvinte = logging.handlers.QueueListener(fila, saida, respect_handler_level=True)
+        _ouvinte.start()
+
+        raiz.addHandler(_handler)
+        raiz.setLevel(getattr(logging, str(nivel).upper(), logging.INFO))
+        raiz.propagate = False
+        return raiz
+
+
+def obter_logger(nome: str) -> logging.Logger:
+    """Logger `litigantes.<nome>`; configura com o ambiente na primeira chamada"""
+    if _ouvinte is None:
+        configurar()
+    return logging.getLogger(f'{RAIZ}.{nome}')
+
+
+def status() -> Dict:
+    """Registros descartados (fila cheia) e pendentes na fila"""
+    if _handler is None:
+        return {'descartados': 0, 'na_fila': 0}
+    return {'descartados': _handler.descartados, 'na_fila': _handler.queue.qsize()}
+
+
+def encerrar():
+    """Esvazia a fila e para a thread de escrita"""
+    global _ouvinte
+    with _configuracao_lock:
+        if _ouvinte is not None:
+            _ouvinte.stop()
+            _ouvinte = None
+
+
+def _apos_fork():
+    # A thread de escrita não sobrevive ao fork (gunicorn --preload): recria no filho
+    global _ouvinte, _configuracao_lock
+    _configuracao_lock = threading.Lock()
+    if _ouvinte is not None:
+        _ouvinte = None
+        configurar()
+
+
+atexit.register(encerrar)
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_apos_fork)
@@ -1,19 +1,389 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+"""
+📊 MONITOR DE MEMÓRIA E GERADOR DE CARGA - SIMULADOR FINANCEIRO
+
+Modo monitor (padrão): RSS/CPU do processo do app a cada segundo, com
+alertas, log JSONL e gráfico em tempo real (se houver matplotlib).
+
+Modo carga (--carga): sessões autenticadas disparam um mix realista de
+requisições (payloads de filtro montados com os valores de /api/filtros e
+os nomes do ranking) com concorrência configurável:
+
+- malha fechada (padrão): N threads, cada uma emenda requisição após
+  requisição
+- malha aberta (--taxa R): chegadas de Poisson a R req/s, independentes
+  das respostas; a latência conta desde a chegada programada, então a
+  espera por uma thread livre entra na medida (sem omissão coordenada)
+
+O relatório traz p50/p95/p99 e taxa de erro por endpoint e uma linha do
+tempo por janela (vazão, p95, erros, RSS e CPU do processo do app), com a
+correlação entre latência e recursos.
+
+Uso:
+    python monitor_memoria_tempo_real.py --duracao 120 --sem-graficos
+    python monitor_memoria_tempo_real.py --carga --concorrencia 8 --duracao 60
+    python monitor_memoria_tempo_real.py --carga --taxa 20 --iniciar-app --arquivo dados.parquet
+"""
 
 import psutil
 import time
 import json
+import math
+import os
+import random
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 import threading
 import sys
 from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
 import requests
-import matplotlib.pyplot as plt
 from collections import deque
 import warnings
 warnings.filterwarnings('ignore')
 
+try:
+    import matplotlib.pyplot as plt
+    MATPLOTLIB_DISPONIVEL = True
+except ImportError:
+    MATPLOTLIB_DISPONIVEL = False
+
+USUARIO_PADRAO = os.environ.get('MONITOR_USUARIO', 'admin')
+SENHA_PADRAO = os.environ.get('MONITOR_SENHA', '123')
+
+# Peso de cada tipo de requisição no mix (uso típico do dashboard)
+PESOS_MIX = {
+    'filtros_disponiveis': 25,
+    'ranking': 20,
+    'estatisticas_aproximado': 15,
+    'estatisticas_exato': 15,
+    'relatorio': 8,
+    'simulacao': 7,
+    'busca_empresas': 7,
+    'cnaes_todos': 3,
+}
+INTERVALO_RECURSOS = 0.5
+JANELA_LINHA_DO_TEMPO = 5
+# Malha aberta: acima disso em espera, novas chegadas são descartadas no cliente
+MAX_PENDENTES_POR_THREAD = 50
+
+
+def percentis(valores: List[float]) -> Dict:
+    """p50/p95/p99/máx/média em ms (posto mais próximo)"""
+    if not valores:
+        return {'p50_ms': None, 'p95_ms': None, 'p99_ms': None, 'max_ms': None, 'media_ms': None}
+    ordenados = sorted(valores)
+
+    def posto(q):
+        return ordenados[max(0, math.ceil(q * len(ordenados)) - 1)] * 1000
+
+    return {
+        'p50_ms': round(posto(0.50), 1),
+        'p95_ms': round(posto(0.95), 1),
+        'p99_ms': round(posto(0.99), 1),
+        'max_ms': round(ordenados[-1] * 1000, 1),
+        'media_ms': round(sum(ordenados) / len(ordenados) * 1000, 1),
+    }
+
+
+def correlacao(x: List[float], y: List[float]) -> Optional[float]:
+    """Pearson entre duas séries (None se alguma for constante ou curta)"""
+    pares = [(a, b) for a, b in zip(x, y) if a is not None and b is not None]
+    if len(pares) < 3:
+        return None
+    mx = sum(a for a, _ in pares) / len(pares)
+    my = sum(b for _, b in pares) / len(pares)
+    sxy = sum((a - mx) * (b - my) for a, b in pares)
+    sxx = sum((a - mx) ** 2 for a, _ in pares)
+    syy = sum((b - my) ** 2 for _, b in pares)
+    if sxx == 0 or syy == 0:
+        return None
+    return round(sxy / math.sqrt(sxx * syy), 3)
+
+
+def abrir_sessao(url_app: str, usuario: str = USUARIO_PADRAO, senha: str = SENHA_PADRAO) -> requests.Session:
+    """Sessão com o cookie de login do app (o login responde 302 para o dashboard)"""
+    sessao = requests.Session()
+    resposta = sessao.post(f"{url_app}/login", data={'username': usuario, 'password': senha},
+                           allow_redirects=False, timeout=10)
+    if resposta.status_code != 302 or 'dashboard' not in resposta.headers.get('Location', ''):
+        raise RuntimeError(f"Login falhou para '{usuario}' (status {resposta.status_code})")
+    return sessao
+
+
+def montar_mix(sessao: requests.Session, url_app: str) -> List[Tuple[str, str, str, Callable]]:
+    """
+    Tipos de requisição como (nome, método, caminho, gerar(rng) -> kwargs do requests).
+
+    Os valores dos filtros e os nomes de empresa vêm do próprio app, para os
+    payloads baterem com os dados carregados.
+    """
+    filtros = sessao.get(f"{url_app}/api/filtros", timeout=30).json().get('filtros', {})
+    ranking = sessao.post(f"{url_app}/api/ranking", json={'filtros': {}}, timeout=120).json().get('ranking', [])
+    empresas = [item['nome'] for item in ranking[:50]] or ['BANCO']
+    tribunais = filtros.get('tribunais', [])
+    graus = filtros.get('graus', [])
+    segmentos = filtros.get('segmentos', [])
+
+    def filtro_aleatorio(rng: random.Random) -> Dict:
+        sorteio = rng.random()
+        if sorteio < 0.4 or not tribunais:
+            return {}
+        if sorteio < 0.7:
+            return {'tribunais': rng.sample(tribunais, min(len(tribunais), rng.randint(1, 3)))}
+        if sorteio < 0.85 and segmentos:
+            return {'segmentos': [rng.choice(segmentos)]}
+        filtro = {'tribunais': [rng.choice(tribunais)]}
+        if graus:
+            filtro['graus'] = [rng.choice(graus)]
+        return filtro
+
+    def busca(rng: random.Random) -> str:
+        return rng.choice(empresas).split()[0].lower()
+
+    return [
+        ('filtros_disponiveis', 'POST', '/api/filtros-disponiveis',
+         lambda rng: {'json': {'filtros': filtro_aleatorio(rng)}}),
+        ('ranking', 'POST', '/api/ranking',
+         lambda rng: {'json': {'filtros': filtro_aleatorio(rng) if rng.random() < 0.8
+                               else {'busca_empresa': busca(rng)}}}),
+        ('estatisticas_aproximado', 'POST', '/api/estatisticas-gerais',
+         lambda rng: {'json': {'filtros': filtro_aleatorio(rng), 'modo': 'aproximado'}}),
+        ('estatisticas_exato', 'POST', '/api/estatisticas-gerais',
+         lambda rng: {'json': {'filtros': filtro_aleatorio(rng)}}),
+        ('relatorio', 'POST', '/api/relatorio-detalhado',
+         lambda rng: {'json': {'filtros': filtro_aleatorio(rng), 'formato': 'colunas'}}),
+        ('simulacao', 'POST', '/api/simulacao',
+         lambda rng: {'json': {'empresas_selecionadas': rng.sample(empresas, min(len(empresas), rng.randint(1, 3))),
+                               'preco': rng.choice([30, 50, 80])}}),
+        ('busca_empresas', 'GET', '/api/buscar-empresas',
+         lambda rng: {'params': {'q': busca(rng)[:rng.randint(3, 6)], 'limite': 10}}),
+        ('cnaes_todos', 'GET', '/api/cnaes/todos', lambda rng: {}),
+    ]
+
+
+class GeradorCarga:
+    """Carga concorrente autenticada, em malha fechada ou aberta, com amostras de RSS/CPU do app"""
+
+    def __init__(self, url_app: str, concorrencia: int = 8, taxa: Optional[float] = None,
+                 duracao: float = 60, usuario: str = USUARIO_PADRAO, senha: str = SENHA_PADRAO,
+                 semente: int = 42, pid: Optional[int] = None, timeout: float = 120):
+        self.url_app = url_app.rstrip('/')
+        self.concorrencia = concorrencia
+        self.taxa = taxa
+        self.duracao = duracao
+        self.usuario = usuario
+        self.senha = senha
+        self.semente = semente
+        self.timeout = timeout
+        self.processo = psutil.Process(pid) if pid else None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.resultados: List[Tuple[float, str, int, float, float]] = []
+        self.recursos: List[Tuple[float, float, float]] = []
+        self.descartadas_cliente = 0
+
+    def _sessao(self) -> requests.Session:
+        # Uma sessão (e um pool de conexões) por thread
+        sessao = getattr(self._local, 'sessao', None)
+        if sessao is None:
+            sessao = self._local.sessao = abrir_sessao(self.url_app, self.usuario, self.senha)
+        return sessao
+
+    def _disparar(self, tipo: Tuple, kwargs: Dict, chegada: float):
+        nome, metodo, caminho, _ = tipo
+        inicio = time.perf_counter()
+        try:
+            resposta = self._sessao().request(metodo, f"{self.url_app}{caminho}", timeout=self.timeout, **kwargs)
+            status = resposta.status_code
+        except Exception:
+            status = 0
+        fim = time.perf_counter()
+        with self._lock:
+            # (instante da chegada, tipo, status, latência desde a chegada, tempo de serviço)
+            self.resultados.append((chegada - self._t0, nome, status, fim - chegada, fim - inicio))
+
+    def _amostrar_recursos(self, parar: threading.Event):
+        if self.processo is None:
+            return
+        self.processo.cpu_percent()
+        while not parar.wait(INTERVALO_RECURSOS):
+            try:
+                rss = self.processo.memory_info().rss / 1024**2
+                cpu = self.processo.cpu_percent()
+            except psutil.NoSuchProcess:
+                return
+            self.recursos.append((time.perf_counter() - self._t0, rss, cpu))
+
+    def executar(self) -> Dict:
+        """Roda a carga pela duração configurada e devolve o relatório"""
+        sessao = abrir_sessao(self.url_app, self.usuario, self.senha)
+        mix = montar_mix(sessao, self.url_app)
+        pesos = [PESOS_MIX.get(tipo[0], 1) for tipo in mix]
+        rng = random.Random(self.semente)
+
+        modo = f"aberta, {self.taxa} req/s" if self.taxa else "fechada"
+        print(f"🔥 Carga em malha {modo}: {self.concorrencia} threads por {self.duracao:.0f}s em {self.url_app}")
+
+        parar = threading.Event()
+        self._t0 = time.perf_counter()
+        amostrador = threading.Thread(target=self._amostrar_recursos, args=(parar,), daemon=True)
+        amostrador.start()
+        fim = self._t0 + self.duracao
+
+        with ThreadPoolExecutor(max_workers=self.concorrencia, thread_name_prefix='carga') as executor:
+            if self.taxa:
+                # Malha aberta: chegadas de Poisson programadas, independentes das respostas
+                chegada = self._t0
+                pendentes = []
+                while True:
+                    chegada += rng.expovariate(self.taxa)
+                    if chegada >= fim:
+                        break
+                    espera = chegada - time.perf_counter()
+                    if espera > 0:
+                        time.sleep(espera)
+                    pendentes = [f for f in pendentes if not f.done()]
+                    if len(pendentes) >= self.concorrencia * MAX_PENDENTES_POR_THREAD:
+                        self.descartadas_cliente += 1
+                        continue
+                    tipo = rng.choices(mix, weights=pesos)[0]
+                    pendentes.append(executor.submit(self._disparar, tipo, tipo[3](rng), chegada))
+            else:
+                # Malha fechada: cada thread emenda requisições até o fim do tempo
+                def trabalhador(indice: int):
+                    rng_local = random.Random(self.semente + indice)
+                    while time.perf_counter() < fim:
+                        tipo = rng_local.choices(mix, weights=pesos)[0]
+                        self._disparar(tipo, tipo[3](rng_local), time.perf_counter())
+                for indice in range(self.concorrencia):
+                    executor.submit(trabalhador, indice)
+
+        parar.set()
+        amostrador.join()
+        return self.relatorio(time.perf_counter() - self._t0)
+
+    def relatorio(self, decorrido: float) -> Dict:
+        resultados = list(self.resultados)
+
+        def resumo(linhas) -> Dict:
+            erros = sum(1 for r in linhas if r[2] == 0 or (r[2] >= 400 and r[2] != 429))
+            recusadas = sum(1 for r in linhas if r[2] == 429)
+            return {
+                'requisicoes': len(linhas),
+                'erros': erros,
+                'taxa_erro': round(erros / len(linhas), 4) if linhas else 0.0,
+                'recusadas_429': recusadas,
+                **percentis([r[3] for r in linhas]),
+                'servico_p95_ms': percentis([r[4] for r in linhas])['p95_ms'],
+            }
+
+        por_tipo: Dict[str, List] = {}
+        for r in resultados:
+            por_tipo.setdefault(r[1], []).append(r)
+
+        linha_do_tempo = []
+        # Chegadas só acontecem dentro da duração; o que sobra é a drenagem final
+        n_janelas = max(1, math.ceil(min(decorrido, self.duracao) / JANELA_LINHA_DO_TEMPO))
+        for j in range(n_janelas):
+            inicio, fim = j * JANELA_LINHA_DO_TEMPO, (j + 1) * JANELA_LINHA_DO_TEMPO
+            linhas = [r for r in resultados if inicio <= r[0] < fim]
+            amostras = [a for a in self.recursos if inicio <= a[0] < fim]
+            linha_do_tempo.append({
+                't_s': inicio,
+                'vazao_rps': round(len(linhas) / JANELA_LINHA_DO_TEMPO, 2),
+                'p95_ms': percentis([r[3] for r in linhas])['p95_ms'],
+                'erros': sum(1 for r in linhas if r[2] == 0 or (r[2] >= 400 and r[2] != 429)),
+                'rss_mb': round(max(a[1] for a in amostras), 1) if amostras else None,
+                'cpu_percent': round(sum(a[2] for a in amostras) / len(amostras), 1) if amostras else None,
+            })
+
+        p95 = [j['p95_ms'] for j in linha_do_tempo]
+        return {
+            'config': {
+                'url': self.url_app, 'concorrencia': self.concorrencia, 'taxa_rps': self.taxa,
+                'malha': 'aberta' if self.taxa else 'fechada', 'duracao_s': self.duracao,
+                'semente': self.semente, 'pid_monitorado': self.processo.pid if self.processo else None,
+            },
+            'total': {
+                **resumo(resultados),
+                'vazao_rps': round(len(resultados) / decorrido, 2) if decorrido else 0.0,
+                'descartadas_cliente': self.descartadas_cliente,
+            },
+            'endpoints': {nome: resumo(linhas) for nome, linhas in sorted(por_tipo.items())},
+            'linha_do_tempo': linha_do_tempo,
+            'correlacao': {
+                'p95_x_rss': correlacao(p95, [j['rss_mb'] for j in linha_do_tempo]),
+                'p95_x_cpu': correlacao(p95, [j['cpu_percent'] for j in linha_do_tempo]),
+                'vazao_x_cpu': correlacao([j['vazao_rps'] for j in linha_do_tempo],
+                                          [j['cpu_percent'] for j in linha_do_tempo]),
+            },
+        }
+
+
+def imprimir_relatorio_carga(relatorio: Dict):
+    """Tabela por endpoint, linha do tempo e correlações"""
+    total = relatorio['total']
+    print("\n" + "=" * 50)
+    print("📋 RELATÓRIO DE CARGA")
+    print("=" * 50)
+    print(f"📊 {total['requisicoes']:,} requisições, {total['vazao_rps']} req/s, "
+          f"erros {total['taxa_erro']:.2%}, 429: {total['recusadas_429']}, "
+          f"descartadas no cliente: {total['descartadas_cliente']}")
+    print(f"⏱️ p50 {total['p50_ms']}ms | p95 {total['p95_ms']}ms | p99 {total['p99_ms']}ms | máx {total['max_ms']}ms")
+
+    print(f"\n{'endpoint':<26}{'n':>7}{'erros':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'serv.p95':>10}")
+    for nome, r in relatorio['endpoints'].items():
+        print(f"{nome:<26}{r['requisicoes']:>7}{r['taxa_erro']:>8.1%}{r['p50_ms']:>9}{r['p95_ms']:>9}"
+              f"{r['p99_ms']:>9}{r['servico_p95_ms']:>10}")
+
+    print(f"\n{'t(s)':>6}{'req/s':>8}{'p95 ms':>9}{'erros':>7}{'RSS MB':>9}{'CPU %':>7}")
+    for j in relatorio['linha_do_tempo']:
+        print(f"{j['t_s']:>6}{j['vazao_rps']:>8}{str(j['p95_ms']):>9}{j['erros']:>7}"
+              f"{str(j['rss_mb']):>9}{str(j['cpu_percent']):>7}")
+
+    c = relatorio['correlacao']
+    print(f"\n🔗 Correlação p95×RSS {c['p95_x_rss']} | p95×CPU {c['p95_x_cpu']} | vazão×CPU {c['vazao_x_cpu']}")
+
+
+def iniciar_app_local(porta: int = 5000, arquivo: Optional[str] = None,
+                      usuario: str = USUARIO_PADRAO, senha: str = SENHA_PADRAO,
+                      espera_maxima: float = 60) -> subprocess.Popen:
+    """Sobe app.py nesta pasta, espera responder e, com `arquivo`, carrega o dataset completo"""
+    processo = subprocess.Popen(
+        [sys.executable, 'app.py'], env={**os.environ, 'PORT': str(porta)},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    url = f"http://127.0.0.1:{porta}"
+    prazo = time.time() + espera_maxima
+    while True:
+        try:
+            requests.get(f"{url}/login", timeout=2)
+            break
+        except requests.ConnectionError:
+            if processo.poll() is not None or time.time() > prazo:
+                processo.kill()
+                raise RuntimeError("app.py não respondeu a tempo")
+            time.sleep(0.5)
+    print(f"🚀 App local iniciado: PID {processo.pid} em {url}")
+
+    sessao = abrir_sessao(url, usuario, senha)
+    corpo = {'limit': 0, 'arquivo': arquivo} if arquivo else {'limit': 0}
+    resposta = sessao.post(f"{url}/api/carregar-dados", json=corpo, timeout=3600).json()
+    if not resposta.get('success'):
+        processo.kill()
+        raise RuntimeError(f"Carga de dados falhou: {resposta.get('error')}")
+    # Sem nenhuma versão publicada, uma carga que falha cai nos dados de demonstração
+    origem = sessao.get(f"{url}/api/versoes", timeout=30).json()['atual']['origem']
+    if origem == 'demonstração':
+        processo.kill()
+        raise RuntimeError(f"O app publicou dados de demonstração no lugar de {arquivo or 'o arquivo padrão'}")
+    print(f"✅ Dados carregados no app: {resposta['stats']['total_registros']:,} registros ({origem})")
+    return processo
+
+
 class MonitorMemoriaTempoReal:
     """Monitor de memória em tempo real para o Simulador Financeiro"""
     
@@ -144,37 +514,37 @@ class MonitorMemoriaTempoReal:
                 self.alertas.append(alerta)
                 print(alerta['mensagem'])
     
-    def testar_endpoints(self):
-        """Testa principais endpoints da aplicação"""
-        endpoints = [
-            '/api/filtros',
-            '/api/cnaes/todos',
-            '/api/ranking'
-        ]
-        
+    def testar_endpoints(self, usuario=USUARIO_PADRAO, senha=SENHA_PADRAO):
+        """Uma requisição autenticada de cada tipo do mix (método e payload corretos)"""
         resultados = {}
+        try:
+            sessao = abrir_sessao(self.url_app, usuario, senha)
+            mix = montar_mix(sessao, self.url_app)
+        except Exception as e:
+            print(f"❌ Erro ao preparar os testes: {e}")
+            return {'erro': str(e)}
         
-        for endpoint in endpoints:
+        rng = random.Random(42)
+        for nome, metodo, caminho, gerar in mix:
             try:
-                url = f"{self.url_app}{endpoint}"
-                inicio = time.time()
-                response = requests.get(url, timeout=10)
-                fim = time.time()
+                inicio = time.perf_counter()
+                response = sessao.request(metodo, f"{self.url_app}{caminho}", timeout=120, **gerar(rng))
+                fim = time.perf_counter()
                 
-                resultados[endpoint] = {
+                resultados[nome] = {
                     'status': response.status_code,
                     'tempo_resposta': fim - inicio,
                     'tamanho_mb': len(response.content) / (1024 * 1024)
                 }
                 
                 if response.status_code != 200:
-                    print(f"⚠️ Endpoint {endpoint}: Status {response.status_code}")
+                    print(f"⚠️ Endpoint {caminho} ({nome}): Status {response.status_code}")
                 
             except Exception as e:
-                resultados[endpoint] = {
+                resultados[nome] = {
                     'erro': str(e)
                 }
-                print(f"❌ Erro ao testar {endpoint}: {e}")
+                print(f"❌ Erro ao testar {caminho}: {e}")
         
         return resultados
     
@@ -239,41 +609,16 @@ class MonitorMemoriaTempoReal:
         except Exception as e:
             print(f"⚠️ Erro ao salvar log: {e}")
     
-    def executar_teste_stress(self):
-        """Executa teste de stress nos endpoints"""
+    def executar_teste_stress(self, duracao=30, concorrencia=4, taxa=None):
+        """Carga concorrente curta (GeradorCarga) com RSS/CPU do processo monitorado"""
         print("\n🔥 INICIANDO TESTE DE STRESS")
         print("-" * 30)
         
-        # Endpoints para testar
-        endpoints_stress = [
-            '/api/filtros',
-            '/api/cnaes/todos',
-            '/api/ranking'
-        ]
-        
-        for endpoint in endpoints_stress:
-            print(f"🔄 Testando {endpoint}...")
-            
-            # Fazer 10 requisições rápidas
-            tempos = []
-            for i in range(10):
-                try:
-                    inicio = time.time()
-                    response = requests.get(f"{self.url_app}{endpoint}", timeout=5)
-                    fim = time.time()
-                    tempos.append(fim - inicio)
-                    
-                    if response.status_code != 200:
-                        print(f"  ❌ Falha na requisição {i+1}: {response.status_code}")
-                    
-                    time.sleep(0.1)  # Pequena pausa
-                    
-                except Exception as e:
-                    print(f"  ❌ Erro na requisição {i+1}: {e}")
-            
-            if tempos:
-                print(f"  ⏱️ Tempo médio: {sum(tempos)/len(tempos):.3f}s")
-                print(f"  📊 Min/Max: {min(tempos):.3f}s / {max(tempos):.3f}s")
+        gerador = GeradorCarga(self.url_app, concorrencia=concorrencia, taxa=taxa,
+                               duracao=duracao, pid=self.pid)
+        relatorio = gerador.executar()
+        imprimir_relatorio_carga(relatorio)
+        return relatorio
     
     def monitorar(self, duracao_segundos=300, com_graficos=True, teste_stress=False):
         """Inicia o monitoramento"""
@@ -285,6 +630,10 @@ class MonitorMemoriaTempoReal:
         print(f"📊 Monitoramento iniciado por {duracao_segundos} segundos")
         print("📋 Pressione Ctrl+C para parar antecipadamente")
         
+        if com_graficos and not MATPLOTLIB_DISPONIVEL:
+            print("⚠️ matplotlib não instalado: monitorando sem gráficos")
+            com_graficos = False
+        
         if com_graficos:
             plt.ion()  # Modo interativo
             plt.show()
@@ -369,15 +718,55 @@ class MonitorMemoriaTempoReal:
 def main():
     import argparse
     
-    parser = argparse.ArgumentParser(description='Monitor de memória em tempo real para Simulador Financeiro')
+    parser = argparse.ArgumentParser(description='Monitor de memória em tempo real e gerador de carga para Simulador Financeiro')
     parser.add_argument('--pid', type=int, help='PID do processo Flask')
     parser.add_argument('--duracao', type=int, default=300, help='Duração em segundos (padrão: 300)')
     parser.add_argument('--sem-graficos', action='store_true', help='Executar sem gráficos')
     parser.add_argument('--teste-stress', action='store_true', help='Executar teste de stress no final')
     parser.add_argument('--url', default='http://127.0.0.1:5000', help='URL da aplicação')
     
+    carga = parser.add_argument_group('modo carga')
+    carga.add_argument('--carga', action='store_true', help='Gerar carga concorrente em vez de só monitorar')
+    carga.add_argument('--concorrencia', type=int, default=8, help='Threads de requisição (padrão: 8)')
+    carga.add_argument('--taxa', type=float, help='Malha aberta: chegadas de Poisson em req/s')
+    carga.add_argument('--usuario', default=USUARIO_PADRAO)
+    carga.add_argument('--senha', default=SENHA_PADRAO)
+    carga.add_argument('--semente', type=int, default=42)
+    carga.add_argument('--iniciar-app', action='store_true', help='Sobe app.py local (porta da --url) e monitora o PID dele')
+    carga.add_argument('--arquivo', help='Parquet (na pasta do app) carregado antes da carga')
+    carga.add_argument('--saida', help='Arquivo JSON do relatório (padrão: carga_<data>.json)')
+    
     args = parser.parse_args()
     
+    if args.carga:
+        print("🔥 GERADOR DE CARGA - SIMULADOR FINANCEIRO")
+        print("=" * 50)
+        
+        app_local = None
+        pid = args.pid
+        if args.iniciar_app:
+            porta = int(args.url.rsplit(':', 1)[-1].split('/')[0])
+            app_local = iniciar_app_local(porta, args.arquivo, args.usuario, args.senha)
+            pid = app_local.pid
+        elif pid is None:
+            pid = MonitorMemoriaTempoReal().encontrar_processo_flask()
+        
+        try:
+            gerador = GeradorCarga(args.url, concorrencia=args.concorrencia, taxa=args.taxa,
+                                   duracao=args.duracao, usuario=args.usuario, senha=args.senha,
+                                   semente=args.semente, pid=pid)
+            relatorio = gerador.executar()
+        finally:
+            if app_local is not None:
+                app_local.terminate()
+                app_local.wait(timeout=10)
+        
+        imprimir_relatorio_carga(relatorio)
+        saida = Path(args.saida or f"carga_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+        saida.write_text(json.dumps(relatorio, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\n✅ Relatório salvo em: {saida}")
+        return
+    
     print("📊 MONITOR DE MEMÓRIA - SIMULADOR FINANCEIRO")
     print("=" * 50)
     
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🦆 ACESSO AO DUCKDB - POOL DE CURSORES, CONSULTAS PREPARADAS E CATÁLOGO DE VIEWS
+
+Uma conexão por banco no processo e um cursor por thread: cursores do DuckDB
+são conexões leves ao mesmo banco, e uma conexão não pode ser usada por duas
+threads ao mesmo tempo. Em cima disso:
+
+- consultas nomeadas registradas uma vez (preparar) e executadas só com
+  parâmetros (executar): o SQL é analisado uma vez e os valores são sempre
+  ligados pelo DuckDB, nunca interpolados no texto
+- catálogo de views sobre arquivos Parquet: a view é criada uma vez por banco
+  e só é refeita quando o arquivo muda (tamanho ou data de modificação)
+- DataFrames Polars (ou tabelas Arrow) registrados como tabelas virtuais: o
+  DuckDB lê os buffers Arrow do frame sem copiar, e o resultado volta para o
+  Polars também pelo Arrow (.pl() / .arrow()), sem passar pelo pandas
+
+Uso:
+    pool = obter_pool()                       # banco em memória compartilhado
+    pool.registrar_parquet('litigantes', 'dados.parquet')
+    pool.preparar('top', 'SELECT ... FROM litigantes ... LIMIT ?')
+    pool.executar('top', [20]).pl()
+    pool.registrar_frame('dim_cnae', df_cnae)  # JOIN dim_cnae direto no SQL
+"""
+
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import duckdb
+import polars as pl
+
+BANCO_MEMORIA = ':memory:'
+
+
+def _ident(nome: str) -> str:
+    return '"' + nome.replace('"', '""') + '"'
+
+
+def _literal_texto(texto: str) -> str:
+    # DDL (CREATE VIEW) não aceita parâmetros: o caminho entra como literal escapado
+    return "'" + texto.replace("'", "''") + "'"
+
+
+class PoolDuckDB:
+    """Conexão única a um banco DuckDB com um cursor por thread"""
+
+    def __init__(self, banco: Union[str, Path] = BANCO_MEMORIA, somente_leitura: bool = False):
+        self.banco = str(banco)
+        self._conexao = duckdb.connect(self.banco, read_only=somente_leitura)
+        self._lock = threading.Lock()
+        self._cursores: Dict[int, duckdb.DuckDBPyConnection] = {}
+        self._consultas: Dict[str, object] = {}
+        self._views: Dict[str, Tuple[str, int, int]] = {}
+        self._frames: Dict[str, object] = {}
+        self._registrados: Dict[int, Dict[str, object]] = {}
+
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """Cursor da thread atual (criado no primeiro uso)"""
+        ident = threading.get_ident()
+        cursor = self._cursores.get(ident)
+        if cursor is None:
+            with self._lock:
+                # Threads encerradas não voltam: fecha os cursores delas
+                vivas = {t.ident for t in threading.enumerate()}
+                for morta in [i for i in self._cursores if i not in vivas]:
+                    self._cursores.pop(morta).close()
+                    self._registrados.pop(morta, None)
+                cursor = self._cursores[ident] = self._conexao.cursor()
+        if self._registrados.get(ident) is not self._frames:
+            self._sincronizar_frames(ident, cursor)
+        return cursor
+
+    def _sincronizar_frames(self, ident: int, cursor: duckdb.DuckDBPyConnection):
+        # Objetos registrados valem por cursor; cada thread atualiza o seu (nunca o de outra thread)
+        with self._lock:
+            frames = self._frames
+        anteriores = self._registrados.get(ident) or {}
+        for nome, tabela in anteriores.items():
+            if frames.get(nome) is not tabela:
+                cursor.unregister(nome)
+        for nome, tabela in frames.items():
+            if anteriores.get(nome) is not tabela:
+                cursor.register(nome, tabela)
+        self._registrados[ident] = frames
+
+    def preparar(self, nome: str, sql: str):
+        """Registra a consulta `nome` (um único comando SQL com parâmetros '?' ou '$n')"""
+        comandos = self._conexao.extract_statements(sql)
+        if len(comandos) != 1:
+            raise ValueError(f"Consulta '{nome}' deve ter exatamente um comando SQL ({len(comandos)} encontrados)")
+        with self._lock:
+            self._consultas[nome] = comandos[0]
+
+    def preparada(self, nome: str) -> bool:
+        return nome in self._consultas
+
+    def executar(self, nome: str, parametros: Optional[List] = None) -> duckdb.DuckDBPyConnection:
+        """Executa a consulta preparada `nome` no cursor da thread"""
+        try:
+            comando = self._consultas[nome]
+        except KeyError:
+            raise KeyError(f"Consulta '{nome}' não preparada") from None
+        return self.cursor().execute(comando, parametros or [])
+
+    def consultar(self, sql: str, parametros: Optional[List] = None) -> duckdb.DuckDBPyConnection:
+        """SQL avulso (montado pelo chamador), com os valores sempre como parâmetros"""
+        return self.cursor().execute(sql, parametros or [])
+
+    def registrar_parquet(self, view: str, arquivo: Union[str, Path]) -> bool:
+        """Cria (ou atualiza) a view `view` sobre o Parquet; False se já estava em dia"""
+        caminho = Path(arquivo).resolve()
+        estado = caminho.stat()
+        assinatura = (str(caminho), estado.st_size, estado.st_mtime_ns)
+        with self._lock:
+            if self._views.get(view) == assinatura:
+                return False
+            self._conexao.execute(
+                f"CREATE OR REPLACE VIEW {_ident(view)} AS SELECT * FROM read_parquet({_literal_texto(str(caminho))})"
+            )
+            self._views[view] = assinatura
+        return True
+
+    def registrar_frame(self, nome: str, frame: Union[pl.DataFrame, 'pyarrow.Table']):
+        """Expõe o DataFrame (ou tabela Arrow) como tabela virtual `nome` nos cursores, sem cópia"""
+        tabela = frame.to_arrow() if isinstance(frame, pl.DataFrame) else frame
+        with self._lock:
+            # Dicionário novo a cada mudança: os cursores percebem na próxima consulta
+            self._frames = {**self._frames, nome: tabela}
+
+    def remover_frame(self, nome: str):
+        with self._lock:
+            if nome in self._frames:
+                self._frames = {n: t for n, t in self._frames.items() if n != nome}
+
+    def frames(self) -> List[str]:
+        """Nomes das tabelas virtuais registradas"""
+        return list(self._frames)
+
+    def views(self) -> Dict[str, str]:
+        """Views do catálogo -> arquivo Parquet"""
+        return {view: assinatura[0] for view, assinatura in self._views.items()}
+
+    def fechar(self):
+        with self._lock:
+            for cursor in self._cursores.values():
+                cursor.close()
+            self._cursores.clear()
+            self._frames = {}
+            self._registrados.clear()
+            self._conexao.close()
+        with _pools_lock:
+            if _pools.get(self.banco) is self:
+                del _pools[self.banco]
+
+
+_pools: Dict[str, PoolDuckDB] = {}
+_pools_lock = threading.Lock()
+
+
+def obter_pool(banco: Union[str, Path] = BANCO_MEMORIA) -> PoolDuckDB:
+    """Pool compartilhado do processo para o banco (arquivo ou ':memory:')"""
+    chave = str(banco) if str(banco) == BANCO_MEMORIA else str(Path(banco).resolve())
+    with _pools_lock:
+        pool = _pools.get(chave)
+        if pool is None:
+            if chave != BANCO_MEMORIA:
+                Path(chave).parent.mkdir(parents=True, exist_ok=True)
+            pool = _pools[chave] = PoolDuckDB(chave)
+        return pool
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🗂️ PREPARAÇÃO DO PARQUET - LAYOUT ORDENADO PARA OS FILTROS DO APP
+
+Os filtros do app são quase sempre por SEGMENTO, TRIBUNAL e CNAE, mas o
+Parquet exportado vem em ordem arbitrária: cada grupo de linhas contém todos
+os valores e nenhum pode ser pulado. Este comando reescreve o dataset:
+
+- ordenado por (SEGMENTO, TRIBUNAL, CNAE), com ordenação fora da memória
+  (motor de streaming do Polars)
+- grupos de linhas de tamanho controlado (LINHAS_POR_GRUPO)
+- estatísticas min/max por grupo e codificação por dicionário nas colunas
+  de texto (padrão do gravador do Polars)
+
+Com isso, scans com filtro (pl.scan_parquet(...).filter(...), DuckDB) leem
+só os grupos cujo intervalo min/max contém o valor filtrado.
+
+Uso:
+    python preparar_parquet.py grandes_litigantes_202504.parquet
+    python preparar_parquet.py entrada.parquet saida.parquet --linhas-por-grupo 250000
+    python preparar_parquet.py entrada.parquet --substituir
+"""
+
+import os
+from pathlib import Path
+from typing import Dict, List, Optional, Union
+
+import polars as pl
+
+from log_estruturado import obter_logger
+from validacao_parquet import validar_parquet
+
+try:
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+log = obter_logger('preparar_parquet')
+
+# Do filtro mais seletivo para o agrupamento (segmento) ao mais fino (CNAE)
+ORDEM_CLUSTER = ['SEGMENTO', 'TRIBUNAL', 'CNAE']
+
+# Grupos pequenos podam melhor; grandes comprimem e leem melhor em varreduras completas
+LINHAS_POR_GRUPO = int(os.environ.get('PARQUET_LINHAS_POR_GRUPO', 128_000))
+
+# Linhas ordenadas em memória por vez em gravar_ordenado_em_faixas
+LINHAS_POR_FAIXA = int(os.environ.get('PARQUET_LINHAS_POR_FAIXA', 2_000_000))
+
+
+def plano_ordenado(lf: pl.LazyFrame, ordem: Optional[List[str]] = None) -> pl.LazyFrame:
+    """Ordena pelas colunas de cluster presentes no dataset (nulos por último)"""
+    colunas = lf.collect_schema().names()
+    chaves = [c for c in (ordem or ORDEM_CLUSTER) if c in colunas]
+    if not chaves:
+        return lf
+    return lf.sort(chaves, nulls_last=True, maintain_order=True)
+
+
+def _coletar_em_streaming(plano: pl.LazyFrame) -> pl.DataFrame:
+    # Polars 1.x (novo motor) e 2.0: engine='streaming'. Antes do 1.0, collect não tem
+    # engine (TypeError) e o streaming antigo é streaming=True; nos 1.x anteriores ao novo
+    # motor, engine só aceita 'cpu'/'gpu' (ValueError) e streaming=True ainda existe.
+    try:
+        return plano.collect(engine='streaming')
+    except (TypeError, ValueError):
+        return plano.collect(streaming=True)
+
+
+def _sink_nao_suportado(erro: Exception) -> bool:
+    """Plano que o streaming antigo (Polars < 1.0) não sabe gravar direto no arquivo"""
+    return isinstance(erro, pl.exceptions.InvalidOperationError) and 'not yet supported' in str(erro)
+
+
+def gravar_ordenado(lf: pl.LazyFrame, destino: Union[str, Path],
+                    linhas_por_grupo: int = LINHAS_POR_GRUPO, ordem: Optional[List[str]] = None) -> Path:
+    """Grava o plano ordenado em `destino` (arquivo temporário + troca atômica)"""
+    destino = Path(destino)
+    temporario = destino.with_suffix('.parquet.tmp')
+    plano = plano_ordenado(lf, ordem)
+    opcoes = dict(compression='zstd', statistics=True, row_group_size=linhas_por_grupo)
+    try:
+        try:
+            # Ordenação e gravação em streaming: o dataset não precisa caber na memória
+            plano.sink_parquet(temporario, **opcoes)
+        except pl.exceptions.InvalidOperationError as e:
+            if not _sink_nao_suportado(e):
+                raise
+            log.warning('⚠️ sink_parquet não suportado para este plano; coletando antes de gravar',
+                        extra={'destino': str(destino), 'erro': str(e)})
+            _coletar_em_streaming(plano).write_parquet(temporario, **opcoes)
+        os.replace(temporario, destino)
+    finally:
+        temporario.unlink(missing_ok=True)
+    return destino
+
+
+def _faixas(contagens: pl.DataFrame, chaves: List[str], linhas_por_faixa: int) -> List[List[tuple]]:
+    """Pares (chave1, chave2) consecutivos na ordem final, agrupados até ~linhas_por_faixa linhas"""
+    faixas, atual, linhas = [], [], 0
+    for *par, n in contagens.select(chaves + ['linhas']).iter_rows():
+        if atual and linhas + n > linhas_por_faixa:
+            faixas.append(atual)
+            atual, linhas = [], 0
+        atual.append(tuple(par))
+        linhas += n
+    if atual:
+        faixas.append(atual)
+    return faixas
+
+
+def _condicao_faixa(faixa: List[tuple], chaves: List[str]) -> pl.Expr:
+    segundas_por_primeira: Dict = {}
+    for primeira, segunda in faixa:
+        segundas_por_primeira.setdefault(primeira, []).append(segunda)
+    condicao = pl.lit(False)
+    for primeira, segundas in segundas_por_primeira.items():
+        na_primeira = pl.col(chaves[0]).is_null() if primeira is None else pl.col(chaves[0]) == primeira
+        valores = [v for v in segundas if v is not None]
+        na_segunda = pl.col(chaves[1]).is_in(valores) if valores else pl.lit(False)
+        if len(valores) < len(segundas):
+            na_segunda = na_segunda | pl.col(chaves[1]).is_null()
+        condicao = condicao | (na_primeira & na_segunda)
+    return condicao
+
+
+def gravar_ordenado_em_faixas(origem: Union[str, Path], destino: Union[str, Path],
+                              linhas_por_faixa: int = LINHAS_POR_FAIXA,
+                              linhas_por_grupo: int = LINHAS_POR_GRUPO,
+                              ordem: Optional[List[str]] = None) -> Path:
+    """
+    Mesmo layout de gravar_ordenado, com memória limitada a uma faixa.
+
+    As contagens por (SEGMENTO, TRIBUNAL) dividem a ordem final em faixas
+    contíguas de ~linhas_por_faixa linhas; cada faixa é lida do Parquet de
+    origem (filtro), ordenada em memória e anexada ao destino (requer pyarrow).
+    """
+    destino = Path(destino)
+    lf = pl.scan_parquet(origem)
+    chaves = [c for c in (ordem or ORDEM_CLUSTER) if c in lf.collect_schema().names()]
+    if not PYARROW_DISPONIVEL or len(chaves) < 2:
+        return gravar_ordenado(lf, destino, linhas_por_grupo, ordem)
+
+    contagens = (
+        lf.group_by(chaves[:2]).agg(pl.len().alias('linhas'))
+        .sort(chaves[:2], nulls_last=True).collect()
+    )
+    temporario = destino.with_suffix('.parquet.tmp')
+    escritor = None
+    try:
+        for faixa in _faixas(contagens, chaves[:2], linhas_por_faixa):
+            tabela = (
+                lf.filter(_condicao_faixa(faixa, chaves[:2]))
+                .sort(chaves, nulls_last=True, maintain_order=True)
+                .collect()
+                .to_arrow()
+            )
+            if escritor is None:
+                escritor = pq.ParquetWriter(str(temporario), tabela.schema, compression='zstd')
+            escritor.write_table(tabela, row_group_size=linhas_por_grupo)
+        if escritor is None:
+            return gravar_ordenado(lf, destino, linhas_por_grupo, ordem)
+        escritor.close()
+        escritor = None
+        os.replace(temporario, destino)
+    finally:
+        if escritor is not None:
+            escritor.close()
+        temporario.unlink(missing_ok=True)
+    return destino
+
+
+def preparar_parquet(entrada: Union[str, Path], saida: Optional[Union[str, Path]] = None,
+                     linhas_por_grupo: int = LINHAS_POR_GRUPO) -> Path:
+    """Reescreve `entrada` ordenado e em grupos de linhas (saída padrão: <nome>_ordenado.parquet)"""
+    entrada = Path(entrada)
+    validar_parquet(entrada, [])
+    saida = Path(saida) if saida else entrada.with_name(f"{entrada.stem}_ordenado.parquet")
+    gravar_ordenado(pl.scan_parquet(entrada), saida, linhas_por_grupo)
+    validar_parquet(saida, [])
+    return saida
+
+
+def faixas_grupos(caminho: Union[str, Path], colunas: Optional[List[str]] = None) -> List[Dict]:
+    """Min/max por grupo de linhas das colunas de cluster (requer pyarrow)"""
+    if not PYARROW_DISPONIVEL:
+        return []
+    metadados = pq.read_metadata(str(caminho))
+    colunas = colunas or ORDEM_CLUSTER
+    faixas = []
+    for i in range(metadados.num_row_groups):
+        grupo = metadados.row_group(i)
+        faixa = {'linhas': grupo.num_rows}
+        for j in range(grupo.num_columns):
+            coluna = grupo.column(j)
+            if coluna.path_in_schema in colunas and coluna.statistics is not None and coluna.statistics.has_min_max:
+                faixa[coluna.path_in_schema] = (coluna.statistics.min, coluna.statistics.max)
+        faixas.append(faixa)
+    return faixas
+
+
+def grupos_lidos(faixas: List[Dict], filtros: Dict[str, List]) -> int:
+    """Quantos grupos um filtro de igualdade (coluna -> valores) precisa ler pelas estatísticas"""
+    lidos = 0
+    for faixa in faixas:
+        candidato = True
+        for coluna, valores in filtros.items():
+            if coluna not in faixa:
+                continue
+            minimo, maximo = faixa[coluna]
+            if not any(minimo <= v <= maximo for v in valores):
+                candidato = False
+                break
+        lidos += candidato
+    return lidos
+
+
+def _resumo_poda(caminho: Path, filtros: Dict[str, List]) -> str:
+    faixas = faixas_grupos(caminho)
+    if not faixas:
+        return "(pyarrow indisponível)"
+    return f"{grupos_lidos(faixas, filtros)}/{len(faixas)} grupos lidos"
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Reescreve o Parquet ordenado por SEGMENTO, TRIBUNAL e CNAE')
+    parser.add_argument('entrada')
+    parser.add_argument('saida', nargs='?', help='Padrão: <entrada>_ordenado.parquet')
+    parser.add_argument('--linhas-por-grupo', type=int, default=LINHAS_POR_GRUPO)
+    parser.add_argument('--substituir', action='store_true', help='Substitui o arquivo de entrada')
+    args = parser.parse_args()
+
+    inicio = time.time()
+    saida = preparar_parquet(args.entrada, args.saida, args.linhas_por_grupo)
+    print(f"✅ {saida} gravado em {time.time() - inicio:.1f}s")
+
+    # Exemplo de poda: primeiro segmento e primeiro tribunal do arquivo
+    amostra = pl.scan_parquet(saida).select([c for c in ORDEM_CLUSTER[:2]
+                                              if c in pl.read_parquet_schema(saida)]).head(1).collect()
+    if amostra.height:
+        filtros = {c: [amostra[c][0]] for c in amostra.columns}
+        print(f"🔍 Filtro {filtros}: antes {_resumo_poda(Path(args.entrada), filtros)}, "
+              f"depois {_resumo_poda(saida, filtros)}")
+
+    if args.substituir:
+        os.replace(saida, args.entrada)
+        print(f"♻️ {args.entrada} substituído pela versão ordenada")
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+📋 RESUMOS MATERIALIZADOS NO DUCKDB - ATUALIZAÇÃO INCREMENTAL POR EXTRATO
+
+Contagens, top empresas e estatísticas por tribunal não precisam varrer o
+Parquet bruto a cada consulta. Este módulo mantém, num arquivo DuckDB
+(ARQUIVO_RESUMOS), tabelas de resumo por mês de referência:
+
+- resumo_mes: totais do extrato (uma linha por mês; serve de manifesto)
+- resumo_empresa: por empresa, com a posição no ranking já calculada
+- resumo_tribunal: por tribunal, com empresas distintas
+- resumo_segmento_cnae: por (SEGMENTO, CNAE), com empresas distintas
+
+Ao chegar um novo extrato mensal, só ele é lido e só as linhas do seu mês
+são substituídas (numa transação); os meses anteriores não são tocados. Um
+extrato já resumido (mesmo tamanho e data) é ignorado. As consultas são
+preparadas e leem poucas linhas já ordenadas, em sub-milissegundos.
+
+Uso:
+    python resumos_duckdb.py atualizar grandes_litigantes_202504.parquet
+    python resumos_duckdb.py top --n 20
+    python resumos_duckdb.py tribunais --mes 2025-04
+"""
+
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple, Union
+
+import duckdb
+
+from download_drive import DIRETORIO_CACHE
+from historico_mensal import detectar_mes_referencia
+from log_estruturado import obter_logger
+from pool_duckdb import PoolDuckDB, obter_pool
+
+log = obter_logger('resumos_duckdb')
+
+ARQUIVO_RESUMOS = Path(os.environ.get('ARQUIVO_RESUMOS', DIRETORIO_CACHE / 'resumos.duckdb'))
+
+# Extrato sem mês no nome nem colunas ANO/MES (ex.: dados.parquet)
+SEM_REFERENCIA = (0, 0)
+
+COLUNAS_EMPRESA = ['NOME', 'ÓRGÃO', 'EMPRESA', 'ORGAO']
+
+TABELAS = [
+    """
+    CREATE TABLE IF NOT EXISTS resumo_mes (
+        ano INTEGER, mes INTEGER,
+        registros BIGINT, registros_positivos BIGINT,
+        novos BIGINT, novos_positivos BIGINT,
+        empresas BIGINT, empresas_positivas BIGINT,
+        arquivo VARCHAR, assinatura VARCHAR,
+        atualizado_em TIMESTAMP DEFAULT current_timestamp,
+        PRIMARY KEY (ano, mes)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS resumo_empresa (
+        ano INTEGER, mes INTEGER, posicao INTEGER, empresa VARCHAR,
+        novos BIGINT, registros BIGINT,
+        novos_positivos BIGINT, registros_positivos BIGINT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS resumo_tribunal (
+        ano INTEGER, mes INTEGER, tribunal VARCHAR,
+        novos BIGINT, registros BIGINT, empresas BIGINT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS resumo_segmento_cnae (
+        ano INTEGER, mes INTEGER, segmento VARCHAR, cnae VARCHAR,
+        novos BIGINT, registros BIGINT, empresas BIGINT
+    )
+    """,
+]
+
+# Consultas de leitura (preparadas uma vez por pool); $1/$2 = ano/mês
+CONSULTAS_RESUMO = {
+    'resumo_assinatura': "SELECT assinatura FROM resumo_mes WHERE ano = $1 AND mes = $2",
+    'resumo_meses': "SELECT ano, mes, arquivo, registros, atualizado_em FROM resumo_mes ORDER BY ano, mes",
+    'resumo_meses_arquivo': "SELECT ano, mes FROM resumo_mes WHERE arquivo = $1 ORDER BY ano, mes",
+    'resumo_estatisticas': """
+        SELECT registros_positivos AS total_registros,
+               empresas_positivas AS empresas_unicas,
+               novos_positivos AS total_novos,
+               novos_positivos / nullif(registros_positivos, 0) AS media_novos
+        FROM resumo_mes WHERE ano = $1 AND mes = $2
+    """,
+    'resumo_top_empresas': """
+        SELECT empresa, novos_positivos AS total_novos, registros_positivos AS registros,
+               novos_positivos / registros_positivos AS media_novos
+        FROM resumo_empresa
+        WHERE ano = $1 AND mes = $2 AND posicao <= $3
+        ORDER BY posicao
+    """,
+    'resumo_tribunais': """
+        SELECT tribunal, novos AS total_novos, empresas AS empresas_unicas, registros
+        FROM resumo_tribunal WHERE ano = $1 AND mes = $2
+        ORDER BY total_novos DESC
+    """,
+    'resumo_segmento_cnae': """
+        SELECT segmento, cnae, novos AS total_novos, empresas AS empresas_unicas, registros
+        FROM resumo_segmento_cnae WHERE ano = $1 AND mes = $2
+        ORDER BY total_novos DESC
+    """,
+}
+
+Referencia = Tuple[int, int]
+
+
+def _ident(coluna: str) -> str:
+    return '"' + coluna.replace('"', '""') + '"'
+
+
+def pool_resumos(banco: Union[str, Path] = ARQUIVO_RESUMOS) -> PoolDuckDB:
+    """Pool do banco de resumos, com as tabelas criadas e as consultas preparadas"""
+    pool = obter_pool(banco)
+    if not pool.preparada('resumo_meses'):
+        for ddl in TABELAS:
+            pool.consultar(ddl)
+        for nome, sql in CONSULTAS_RESUMO.items():
+            pool.preparar(nome, sql)
+    return pool
+
+
+def _assinatura(arquivo: Union[str, Path]) -> str:
+    estado = os.stat(arquivo)
+    return f"{estado.st_size}-{int(estado.st_mtime)}"
+
+
+def _referencias(cursor, arquivo: str, colunas: List[str], ano: Optional[int], mes: Optional[int]):
+    """Meses do extrato e a expressão SQL de (ano, mês) de cada linha"""
+    # Mesma precedência do histórico: parâmetro > nome do arquivo > colunas ANO/MES
+    if ano is None or mes is None:
+        referencia = detectar_mes_referencia(arquivo)
+        if referencia:
+            ano, mes = referencia
+    if ano is not None and mes is not None:
+        return [(int(ano), int(mes))], f"{int(ano)}", f"{int(mes)}"
+    if 'ANO' in colunas and 'MES' in colunas:
+        meses = cursor.execute(
+            "SELECT DISTINCT CAST(ANO AS INTEGER), CAST(MES AS INTEGER) FROM read_parquet(?) ORDER BY 1, 2", [arquivo]
+        ).fetchall()
+        return [tuple(m) for m in meses], 'CAST(ANO AS INTEGER)', 'CAST(MES AS INTEGER)'
+    return [SEM_REFERENCIA], '0', '0'
+
+
+def atualizar_resumos(pool: PoolDuckDB, arquivo: Union[str, Path], ano: Optional[int] = None,
+                      mes: Optional[int] = None, forcar: bool = False) -> List[Referencia]:
+    """
+    Resume o extrato `arquivo` e substitui só os meses dele nas tabelas de
+    resumo. Devolve os meses atualizados ([] se o extrato já estava resumido).
+    """
+    arquivo = str(Path(arquivo).resolve())
+    assinatura = _assinatura(arquivo)
+    cursor = pool.cursor()
+    colunas = [linha[0] for linha in cursor.execute("DESCRIBE SELECT * FROM read_parquet(?)", [arquivo]).fetchall()]
+
+    coluna_empresa = next((c for c in COLUNAS_EMPRESA if c in colunas), None)
+    if coluna_empresa is None or 'NOVOS' not in colunas or 'TRIBUNAL' not in colunas:
+        raise ValueError(f"Extrato sem colunas necessárias (NOME/ÓRGÃO, TRIBUNAL, NOVOS): {colunas}")
+
+    meses, expr_ano, expr_mes = _referencias(cursor, arquivo, colunas, ano, mes)
+    if not forcar and all(
+        (pool.executar('resumo_assinatura', list(m)).fetchone() or [None])[0] == assinatura for m in meses
+    ):
+        log.info('⏭️ Resumos já atualizados', extra={'arquivo': Path(arquivo).name})
+        return []
+
+    empresa = _ident(coluna_empresa)
+    segmento = 'SEGMENTO' if 'SEGMENTO' in colunas else 'NULL'
+    cnae = 'CAST(CNAE AS VARCHAR)' if 'CNAE' in colunas else 'NULL'
+    # Só as colunas usadas saem do Parquet; os três resumos leem a mesma projeção
+    extrato = f"""
+        SELECT {expr_ano} AS ano, {expr_mes} AS mes, {empresa} AS empresa, TRIBUNAL AS tribunal,
+               {segmento} AS segmento, {cnae} AS cnae, NOVOS AS novos
+        FROM read_parquet(?)
+    """
+
+    cursor.execute("BEGIN TRANSACTION")
+    try:
+        for ano_m, mes_m in meses:
+            for tabela in ('resumo_mes', 'resumo_empresa', 'resumo_tribunal', 'resumo_segmento_cnae'):
+                cursor.execute(f"DELETE FROM {tabela} WHERE ano = ? AND mes = ?", [ano_m, mes_m])
+
+        cursor.execute(f"""
+            INSERT INTO resumo_empresa
+            SELECT ano, mes,
+                   row_number() OVER (PARTITION BY ano, mes ORDER BY novos_positivos DESC NULLS LAST, empresa) AS posicao,
+                   empresa, novos, registros, novos_positivos, registros_positivos
+            FROM (
+                SELECT ano, mes, empresa,
+                       sum(novos)::BIGINT AS novos, count(*) AS registros,
+                       coalesce(sum(novos) FILTER (WHERE novos > 0), 0)::BIGINT AS novos_positivos,
+                       count(*) FILTER (WHERE novos > 0) AS registros_positivos
+                FROM ({extrato})
+                WHERE empresa IS NOT NULL
+                GROUP BY ano, mes, empresa
+            )
+            ORDER BY ano, mes, posicao
+        """, [arquivo])
+
+        cursor.execute(f"""
+            INSERT INTO resumo_tribunal
+            SELECT ano, mes, tribunal, sum(novos)::BIGINT, count(*), count(DISTINCT empresa)
+            FROM ({extrato})
+            GROUP BY ano, mes, tribunal
+            ORDER BY ano, mes, 4 DESC
+        """, [arquivo])
+
+        cursor.execute(f"""
+            INSERT INTO resumo_segmento_cnae
+            SELECT ano, mes, segmento, cnae, sum(novos)::BIGINT, count(*), count(DISTINCT empresa)
+            FROM ({extrato})
+            GROUP BY ano, mes, segmento, cnae
+            ORDER BY ano, mes, 5 DESC
+        """, [arquivo])
+
+        # Totais do mês a partir dos resumos por empresa (sem nova leitura do Parquet)
+        for ano_m, mes_m in meses:
+            cursor.execute("""
+                INSERT INTO resumo_mes (ano, mes, registros, registros_positivos, novos, novos_positivos,
+                                        empresas, empresas_positivas, arquivo, assinatura)
+                SELECT ano, mes, sum(registros), sum(registros_positivos), sum(novos), sum(novos_positivos),
+                       count(*), count(*) FILTER (WHERE registros_positivos > 0), ?, ?
+                FROM resumo_empresa
+                WHERE ano = ? AND mes = ?
+                GROUP BY ano, mes
+            """, [arquivo, assinatura, ano_m, mes_m])
+        cursor.execute("COMMIT")
+    except Exception:
+        cursor.execute("ROLLBACK")
+        raise
+
+    log.info('📋 Resumos atualizados', extra={'arquivo': Path(arquivo).name,
+                                             'meses': [f'{a:04d}-{m:02d}' for a, m in meses]})
+    return meses
+
+
+def meses_resumidos(pool: PoolDuckDB) -> List[Referencia]:
+    return [(ano, mes) for ano, mes, *_ in pool.executar('resumo_meses').fetchall()]
+
+
+def meses_do_arquivo(pool: PoolDuckDB, arquivo: Union[str, Path]) -> List[Referencia]:
+    """Meses cujo resumo veio de `arquivo`"""
+    return [tuple(m) for m in pool.executar('resumo_meses_arquivo', [str(Path(arquivo).resolve())]).fetchall()]
+
+
+def _referencia(pool: PoolDuckDB, referencia: Optional[Referencia]) -> Referencia:
+    if referencia is not None:
+        return referencia
+    meses = meses_resumidos(pool)
+    if not meses:
+        raise ValueError("Nenhum extrato resumido (execute atualizar_resumos primeiro)")
+    return meses[-1]
+
+
+def estatisticas_basicas(pool: PoolDuckDB, referencia: Optional[Referencia] = None) -> duckdb.DuckDBPyConnection:
+    """Registros, empresas únicas, total e média de novos (linhas com NOVOS > 0) do mês"""
+    return pool.executar('resumo_estatisticas', list(_referencia(pool, referencia)))
+
+
+def top_empresas(pool: PoolDuckDB, n: int = 20, referencia: Optional[Referencia] = None) -> duckdb.DuckDBPyConnection:
+    return pool.executar('resumo_top_empresas', [*_referencia(pool, referencia), n])
+
+
+def estatisticas_tribunal(pool: PoolDuckDB, referencia: Optional[Referencia] = None) -> duckdb.DuckDBPyConnection:
+    return pool.executar('resumo_tribunais', list(_referencia(pool, referencia)))
+
+
+def estatisticas_segmento_cnae(pool: PoolDuckDB, referencia: Optional[Referencia] = None) -> duckdb.DuckDBPyConnection:
+    return pool.executar('resumo_segmento_cnae', list(_referencia(pool, referencia)))
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Resumos materializados dos extratos no DuckDB')
+    parser.add_argument('--banco', default=str(ARQUIVO_RESUMOS))
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p_atualizar = sub.add_parser('atualizar', help='Resume extratos Parquet (só os meses novos/alterados)')
+    p_atualizar.add_argument('arquivos', nargs='+')
+    p_atualizar.add_argument('--forcar', action='store_true')
+
+    for nome in ('top', 'tribunais', 'segmentos'):
+        p = sub.add_parser(nome)
+        p.add_argument('--mes', help='AAAA-MM (padrão: último mês resumido)')
+        if nome == 'top':
+            p.add_argument('--n', type=int, default=20)
+
+    args = parser.parse_args()
+    pool = pool_resumos(args.banco)
+
+    if args.comando == 'atualizar':
+        for arquivo in args.arquivos:
+            inicio = time.time()
+            atualizar_resumos(pool, arquivo, forcar=args.forcar)
+            print(f"✅ {arquivo} ({time.time() - inicio:.1f}s)")
+    else:
+        referencia = tuple(int(p) for p in args.mes.split('-')) if args.mes else None
+        inicio = time.perf_counter()
+        if args.comando == 'top':
+            linhas = top_empresas(pool, args.n, referencia).fetchall()
+        elif args.comando == 'tribunais':
+            linhas = estatisticas_tribunal(pool, referencia).fetchall()
+        else:
+            linhas = estatisticas_segmento_cnae(pool, referencia).fetchall()
+        decorrido = (time.perf_counter() - inicio) * 1000
+        for linha in linhas:
+            print(linha)
+        print(f"⚡ {len(linhas)} linhas em {decorrido:.2f}ms")
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+⚡ SERVIDOR ASGI - CONSULTAS PESADAS FORA DO LOOP DE EVENTOS
+
+Adaptador ASGI para a aplicação Flask (app.py) sem reescrever as rotas:
+
+- Endpoints pesados (Polars sobre o dataset completo) rodam num pool de
+  threads limitado, com limite de concorrência por endpoint
+- Endpoints leves (progresso, filtros em cache, versões) usam outro pool e
+  nunca ficam na fila atrás de um relatório ou de uma carga
+- Polars libera o GIL durante o processamento, então as threads trabalham
+  em paralelo de verdade com um único processo (uma cópia dos dados na memória)
+
+Uso:
+    uvicorn servidor_asgi:app --host 0.0.0.0 --port 5000
+    python servidor_asgi.py
+"""
+
+import asyncio
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple
+
+from app import app as flask_app
+from log_estruturado import obter_logger
+
+log = obter_logger('asgi')
+
+THREADS_PESADOS = int(os.environ.get('ASGI_THREADS_PESADOS', min(4, os.cpu_count() or 2)))
+THREADS_LEVES = int(os.environ.get('ASGI_THREADS_LEVES', 8))
+
+# Máximo de requisições simultâneas por endpoint pesado (as demais aguardam a vez)
+LIMITES_ENDPOINT: Dict[str, int] = {
+    '/api/carregar-dados': 1,
+    '/api/relatorio-detalhado': 2,
+    '/api/filtros-disponiveis': 2,
+    '/api/estatisticas-gerais': 2,
+    '/api/tendencia': 2,
+    '/api/tabulacao-cruzada': 2,
+    '/api/cnaes/': 2,
+    '/api/ranking': 3,
+    '/api/simulacao': 3,
+}
+
+
+def limite_endpoint(caminho: str) -> Optional[int]:
+    """Limite de concorrência do endpoint (None = endpoint leve)"""
+    if caminho in LIMITES_ENDPOINT:
+        return LIMITES_ENDPOINT[caminho]
+    for prefixo, limite in LIMITES_ENDPOINT.items():
+        if prefixo.endswith('/') and caminho.startswith(prefixo):
+            return limite
+    return None
+
+
+class AplicacaoASGI:
+    """Executa a aplicação WSGI em pools de threads separados por custo do endpoint"""
+
+    def __init__(self, wsgi_app, threads_pesados: int = THREADS_PESADOS, threads_leves: int = THREADS_LEVES):
+        self.wsgi_app = wsgi_app
+        self.pool_pesado = ThreadPoolExecutor(max_workers=threads_pesados, thread_name_prefix='pesado')
+        self.pool_leve = ThreadPoolExecutor(max_workers=threads_leves, thread_name_prefix='leve')
+        self._semaforos: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaforo(self, caminho: str, limite: int) -> asyncio.Semaphore:
+        # Endpoints com prefixo ('/api/cnaes/<segmento>') compartilham o mesmo semáforo
+        chave = next((p for p in LIMITES_ENDPOINT if p.endswith('/') and caminho.startswith(p)), caminho)
+        if chave not in self._semaforos:
+            self._semaforos[chave] = asyncio.Semaphore(limite)
+        return self._semaforos[chave]
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http':
+            await self._http(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'lifespan.startup':
+                log.info('⚡ Servidor ASGI iniciado', extra={'threads_pesadas': self.pool_pesado._max_workers,
+                                                            'threads_leves': self.pool_leve._max_workers})
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensagem['type'] == 'lifespan.shutdown':
+                self.pool_pesado.shutdown(wait=False)
+                self.pool_leve.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _http(self, scope, receive, send):
+        corpo = bytearray()
+        while True:
+            mensagem = await receive()
+            if mensagem['type'] == 'http.disconnect':
+                return
+            corpo.extend(mensagem.get('body', b''))
+            if not mensagem.get('more_body', False):
+                break
+
+        environ = self._montar_environ(scope, bytes(corpo))
+        loop = asyncio.get_running_loop()
+        limite = limite_endpoint(scope['path'])
+
+        try:
+            if limite is None:
+                status, cabecalhos, resposta = await loop.run_in_executor(self.pool_leve, self._executar_wsgi, environ)
+            else:
+                async with self._semaforo(scope['path'], limite):
+                    status, cabecalhos, resposta = await loop.run_in_executor(
+                        self.pool_pesado, self._executar_wsgi, environ
+                    )
+        except Exception as e:
+            log.exception('❌ Erro no servidor ASGI', extra={'caminho': scope['path']})
+            status, cabecalhos, resposta = 500, [(b'content-type', b'text/plain; charset=utf-8')], b'Erro interno'
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': cabecalhos})
+        await send({'type': 'http.response.body', 'body': resposta})
+
+    @staticmethod
+    def _montar_environ(scope, corpo: bytes) -> Dict:
+        servidor = scope.get('server') or ('localhost', 80)
+        cliente = scope.get('client') or ('', 0)
+        environ = {
+            'REQUEST_METHOD': scope['method'],
+            'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+            'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+            'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+            'SERVER_NAME': str(servidor[0]),
+            'SERVER_PORT': str(servidor[1]),
+            'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+            'REMOTE_ADDR': cliente[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': scope.get('scheme', 'http'),
+            'wsgi.input': BytesIO(corpo),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+            'CONTENT_LENGTH': str(len(corpo)),
+        }
+        for nome, valor in scope.get('headers', []):
+            nome = nome.decode('latin-1').upper().replace('-', '_')
+            valor = valor.decode('latin-1')
+            if nome == 'CONTENT_TYPE':
+                environ['CONTENT_TYPE'] = valor
+            elif nome != 'CONTENT_LENGTH':
+                chave = f'HTTP_{nome}'
+                # Cabeçalhos repetidos viram um só; Cookie usa "; " (RFC 6265), os demais ","
+                separador = '; ' if chave == 'HTTP_COOKIE' else ','
+                environ[chave] = f"{environ[chave]}{separador}{valor}" if chave in environ else valor
+        return environ
+
+    def _executar_wsgi(self, environ: Dict) -> Tuple[int, List[Tuple[bytes, bytes]], bytes]:
+        """Roda a aplicação WSGI numa thread do pool e devolve a resposta completa"""
+        resposta_inicial = {}
+
+        def start_response(status, cabecalhos, exc_info=None):
+            resposta_inicial['status'] = int(status.split(' ', 1)[0])
+            resposta_inicial['cabecalhos'] = [
+                (nome.lower().encode('latin-1'), valor.encode('latin-1')) for nome, valor in cabecalhos
+            ]
+
+        iteravel = self.wsgi_app(environ, start_response)
+        try:
+            corpo = b''.join(iteravel)
+        finally:
+            if hasattr(iteravel, 'close'):
+                iteravel.close()
+        return resposta_inicial['status'], resposta_inicial['cabecalhos'], corpo
+
+
+app = AplicacaoASGI(flask_app)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    porta = int(os.environ.get('PORT', 5000))
+    print("🚀 Iniciando servidor ASGI...")
+    print(f"📍 URL: http://127.0.0.1:{porta}")
+    # Um único processo: os pools de threads fazem o paralelismo sem duplicar o dataset
+    uvicorn.run(app, host='0.0.0.0', port=porta, workers=1)
@@ -185,54 +185,41 @@ class SimuladorGUI:
                 self.atualizar_status("Baixando dados...")
                 self.log_resultado("🚀 INICIANDO DOWNLOAD...")
                 
-                import polars as pl
-                import requests
+                from download_drive import ErroDownload, baixar_arquivo_drive
+                from validacao_parquet import ParquetInvalido, validar_parquet
                 
                 file_id = "1Ns07hTZaK4Ry6bFEHvLACZ5tHJ7b-C2E"
                 nome_arquivo = "grandes_litigantes_202504.parquet"
                 
                 self.log_resultado("📥 Conectando ao Google Drive...")
                 
-                urls = [
-                    f"https://drive.google.com/uc?export=download&id={file_id}",
-                    f"https://drive.google.com/uc?id={file_id}&export=download"
-                ]
+                marcos = {'proximo': 10}
                 
-                for i, url in enumerate(urls):
-                    try:
-                        self.log_resultado(f"🔄 Tentativa {i+1}...")
-                        
-                        session = requests.Session()
-                        response = session.get(url, stream=True, timeout=300)
-                        
-                        if response.status_code == 200:
-                            self.log_resultado("💾 Salvando arquivo...")
-                            
-                            with open(nome_arquivo, 'wb') as f:
-                                for chunk in response.iter_content(chunk_size=8192):
-                                    if chunk:
-                                        f.write(chunk)
-                            
-                            if os.path.exists(nome_arquivo) and os.path.getsize(nome_arquivo) > 1000000:
-                                try:
-                                    test_df = pl.scan_parquet(nome_arquivo)
-                                    rows = test_df.select(pl.len()).collect().item()
-                                    
-                                    self.arquivo_path = nome_arquivo
-                                    self.dados_status.config(text=f"✅ Arquivo: {rows:,} registros", fg='green')
-                                    self.log_resultado(f"✅ SUCESSO! {rows:,} registros disponíveis")
-                                    self.atualizar_status("Dados prontos")
-                                    return
-                                    
-                                except Exception as e:
-                                    self.log_resultado(f"⚠️ Arquivo corrompido: {e}")
-                                    continue
-                    
-                    except Exception as e:
-                        self.log_resultado(f"❌ Erro: {str(e)[:100]}")
+                def mostrar_progresso(baixados, total):
+                    if total and baixados / total * 100 >= marcos['proximo']:
+                        self.log_resultado(f"💾 {marcos['proximo']}% ({baixados / 1024**2:.0f}MB)")
+                        marcos['proximo'] += 10
+                
+                try:
+                    # Retomável e com cache local: um novo clique continua de onde parou
+                    baixar_arquivo_drive(file_id, destino=nome_arquivo, progresso=mostrar_progresso)
+                except ErroDownload as e:
+                    self.log_resultado(f"❌ Erro: {str(e)[:200]}")
+                    self.log_resultado("❌ Download falhou. Tente 'Escolher Arquivo' se já tem o arquivo.")
+                    messagebox.showerror("Erro", "Download falhou. Use 'Escolher Arquivo' se já tem o .parquet")
+                    return
                 
-                self.log_resultado("❌ Download falhou. Tente 'Escolher Arquivo' se já tem o arquivo.")
-                messagebox.showerror("Erro", "Download falhou. Use 'Escolher Arquivo' se já tem o .parquet")
+                try:
+                    # Download já validado pelo rodapé; o total de linhas vem dos metadados
+                    rows = validar_parquet(nome_arquivo)['linhas']
+                    
+                    self.arquivo_path = nome_arquivo
+                    self.dados_status.config(text=f"✅ Arquivo: {rows:,} registros", fg='green')
+                    self.log_resultado(f"✅ SUCESSO! {rows:,} registros disponíveis")
+                    self.atualizar_status("Dados prontos")
+                    
+                except (ParquetInvalido, OSError) as e:
+                    self.log_resultado(f"⚠️ Arquivo corrompido: {e}")
                 
             except Exception as e:
                 self.log_resultado(f"❌ ERRO: {str(e)}")
@@ -254,9 +241,8 @@ class SimuladorGUI:
         
         if file_path:
             try:
-                import polars as pl
-                test_df = pl.scan_parquet(file_path)
-                rows = test_df.select(pl.len()).collect().item()
+                from validacao_parquet import validar_parquet
+                rows = validar_parquet(file_path)['linhas']
                 
                 self.arquivo_path = file_path
                 self.dados_status.config(text=f"✅ Arquivo: {rows:,} registros", fg='green')
@@ -10,14 +10,20 @@ import streamlit as st
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import pandas as pd
 from pathlib import Path
 import numpy as np
 from typing import Dict, List, Tuple, Optional
-import requests
 import io
-import tempfile
-import re
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dimensao_empresas import construir_dimensao
+from ingestao_csv import parquet_de_csv
+from download_drive import ErroDownload, baixar_arquivo_drive
+from tabulacao_cruzada import tabulacao_cruzada, selecionar_conjunto
+from validacao_parquet import ParquetInvalido, validar_parquet
+from gerador_sintetico import gerar_dataset
 
 # Configuração da página
 st.set_page_config(
@@ -27,288 +33,109 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-def detectar_encoding(arquivo_path: str) -> str:
-    """Detecta o encoding do arquivo CSV testando os primeiros bytes"""
-    try:
-        # Tentar importar chardet para detecção automática
-        try:
-            import chardet
-            with open(arquivo_path, 'rb') as f:
-                sample = f.read(10000)  # Ler primeiros 10KB
-                result = chardet.detect(sample)
-                encoding_detectado = result['encoding']
-                confidence = result['confidence']
-                st.info(f"🔍 Encoding detectado: {encoding_detectado} (confiança: {confidence:.2f})")
-                return encoding_detectado
-        except ImportError:
-            st.warning("📦 chardet não instalado - usando detecção manual")
-    except Exception as e:
-        st.warning(f"⚠️ Erro na detecção automática: {e}")
+class _CargaSemDados(Exception):
+    """Carga falhou (o erro já foi mostrado): levantada dentro das funções em cache,
+    porque o Streamlit não guarda exceções, só valores de retorno"""
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _carregar_dados_do_drive_compartilhado(file_id: str, nome_arquivo: str) -> pl.DataFrame:
+    """Baixa do Google Drive (retomável, em partes paralelas, com cache local em disco) e carrega"""
+    st.info(f"📡 Baixando {nome_arquivo} do Google Drive (ou reaproveitando o cache local)...")
+    
+    progress_bar = st.progress(0)
+    status_text = st.empty()
+    estado = {'baixados': 0, 'total': 0}
+    
+    # O download roda em outra thread; a barra é atualizada pela thread do script
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        futuro = pool.submit(
+            baixar_arquivo_drive, file_id,
+            progresso=lambda baixados, total: estado.update(baixados=baixados, total=total)
+        )
+        while not futuro.done():
+            if estado['total']:
+                progress_bar.progress(min(estado['baixados'] / estado['total'], 1.0))
+            status_text.text(f"Baixado: {estado['baixados']/(1024*1024):.1f}MB")
+            time.sleep(0.25)
+    
+    progress_bar.empty()
+    status_text.empty()
     
-    # Detecção manual - testar primeiros bytes
     try:
-        with open(arquivo_path, 'rb') as f:
-            sample = f.read(1000)
-            
-        # Verificar BOM UTF-8
-        if sample.startswith(b'\xef\xbb\xbf'):
-            return 'utf-8-sig'
-        
-        # Verificar se é UTF-8 válido
-        try:
-            sample.decode('utf-8')
-            return 'utf-8'
-        except UnicodeDecodeError:
-            pass
-        
-        # Verificar se é Windows-1252
-        try:
-            sample.decode('windows-1252')
-            return 'windows-1252'
-        except UnicodeDecodeError:
-            pass
-        
-        # Fallback para latin-1 (sempre funciona)
-        return 'latin-1'
-        
-    except Exception:
-        return 'utf-8'  # Fallback padrão
+        caminho = futuro.result()
+    except ErroDownload as e:
+        st.error("❌ Todas as tentativas de download falharam")
+        st.warning(str(e))
+        st.info("💡 Soluções:")
+        st.info("• Verifique se o arquivo no Google Drive é público")
+        st.info("• Tente a opção 'Upload de arquivo' como alternativa")
+        st.info("• Use 'Dados simulados' para testar o sistema")
+        raise _CargaSemDados(file_id) from e
+    
+    st.success(f"✅ Arquivo disponível ({caminho.stat().st_size/(1024*1024):.1f} MB)")
+    
+    # Mesmo objeto do cache de arquivos locais: nenhuma cópia adicional na memória
+    df = _carregar_dados_grandes_compartilhado(str(caminho))
+    st.success("🎉 Dados carregados com sucesso!")
+    return df
+
+# === DATASET COMPARTILHADO (cache_resource) ===
+# cache_data serializa e copia o DataFrame a cada acerto de cache (2x a memória
+# num arquivo de 3GB). Com cache_resource existe uma única cópia no processo,
+# compartilhada entre sessões e reruns; cada chamada recebe um clone raso
+# (mesmos buffers Arrow, sem cópia), então alterações in-place do chamador
+# não chegam ao objeto em cache.
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _impressao_compartilhada(_df: pl.DataFrame, origem: Tuple) -> str:
+    # Uma varredura por dataset compartilhado; os reruns reaproveitam o hash
+    return impressao_digital_dataset(_df)
+
+
+def _dataset_somente_leitura(carregador, *args) -> Tuple[pl.DataFrame, str]:
+    try:
+        df = carregador(*args)
+    except _CargaSemDados:
+        # Nada foi guardado no cache: a próxima tentativa carrega de novo
+        return pl.DataFrame(), 'vazio'
+    # id(df) distingue uma recarga do mesmo argumento depois de o cache expirar
+    impressao = _impressao_compartilhada(df, (carregador.__name__, *args, id(df)))
+    return df.clone(), impressao
+
+
+def carregar_dados_do_drive(file_id: str, nome_arquivo: str) -> Tuple[pl.DataFrame, str]:
+    """Dataset do Google Drive, baixado uma vez por processo, e sua impressão digital"""
+    return _dataset_somente_leitura(_carregar_dados_do_drive_compartilhado, file_id, nome_arquivo)
+
+
+def carregar_dados_grandes(arquivo_path: str, n_registros: Optional[int] = None) -> Tuple[pl.DataFrame, str]:
+    """Dataset local/upload, carregado uma vez por processo (n_registros=None: arquivo completo), e sua impressão digital"""
+    return _dataset_somente_leitura(_carregar_dados_grandes_compartilhado, arquivo_path, n_registros)
 
-@st.cache_data
-def carregar_dados_do_drive(file_id: str, nome_arquivo: str) -> pl.DataFrame:
-    """Carrega dados diretamente do Google Drive com múltiplas estratégias"""
-    
-    # Estratégias de URL do Google Drive (ordem de prioridade)
-    urls_para_tentar = [
-        f"https://drive.usercontent.google.com/download?id={file_id}&export=download&authuser=0",
-        f"https://drive.google.com/uc?id={file_id}&export=download&confirm=t",
-        f"https://drive.google.com/uc?export=download&id={file_id}&confirm=t",
-        f"https://docs.google.com/uc?export=download&id={file_id}&confirm=t"
-    ]
-    
-    for i, drive_url in enumerate(urls_para_tentar, 1):
-        try:
-            st.info(f"📡 Tentativa {i}/3: Baixando {nome_arquivo} do Google Drive")
-            st.info(f"🔗 URL: {drive_url}")
-            
-            # Configurar sessão com headers adequados
-            session = requests.Session()
-            session.headers.update({
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-            })
-            
-            with st.spinner(f"⏳ Conectando ao Google Drive (tentativa {i})..."):
-                # Primeira requisição para verificar se precisa de confirmação
-                response = session.get(drive_url, stream=True)
-                
-                # Verificar se o Google Drive está pedindo confirmação de vírus
-                response_text = response.text if hasattr(response, 'text') else ""
-                
-                if any(keyword in response_text.lower() for keyword in ['download_warning', 'virus scan', 'too large', 'can\'t scan']):
-                    st.info("⚠️ Arquivo grande detectado - processando confirmação de vírus...")
-                    
-                    # Estratégias para contornar confirmação
-                    confirmation_patterns = [
-                        r'confirm=([^&"\s]+)',
-                        r'"confirm":"([^"]+)"',
-                        r'name="confirm" value="([^"]+)"'
-                    ]
-                    
-                    confirm_token = None
-                    for pattern in confirmation_patterns:
-                        match = re.search(pattern, response_text)
-                        if match:
-                            confirm_token = match.group(1)
-                            break
-                    
-                    if confirm_token:
-                        # Tentar diferentes formatos de URL de confirmação
-                        confirm_urls = [
-                            f"{drive_url}&confirm={confirm_token}",
-                            f"https://drive.usercontent.google.com/download?id={file_id}&export=download&confirm={confirm_token}&authuser=0",
-                            f"https://drive.google.com/uc?export=download&confirm={confirm_token}&id={file_id}"
-                        ]
-                        
-                        for confirm_url in confirm_urls:
-                            try:
-                                st.info(f"🔄 Tentando confirmação: {confirm_url[:80]}...")
-                                response = session.get(confirm_url, stream=True)
-                                if response.headers.get('content-type', '').startswith('application/'):
-                                    st.success("✅ Confirmação aceita!")
-                                    break
-                            except:
-                                continue
-                    else:
-                        # Se não encontrar token, tentar URLs pré-confirmadas
-                        preconfirmed_urls = [
-                            f"https://drive.usercontent.google.com/download?id={file_id}&export=download&confirm=t&authuser=0",
-                            f"https://drive.google.com/uc?export=download&confirm=t&id={file_id}"
-                        ]
-                        
-                        for confirm_url in preconfirmed_urls:
-                            try:
-                                st.info(f"🔄 Tentando pré-confirmação...")
-                                response = session.get(confirm_url, stream=True)
-                                if not 'text/html' in response.headers.get('content-type', ''):
-                                    st.success("✅ Pré-confirmação aceita!")
-                                    break
-                            except:
-                                continue
-                
-                response.raise_for_status()
-            
-            # Verificar se realmente baixou conteúdo
-            content_length = response.headers.get('content-length')
-            if content_length and int(content_length) == 0:
-                st.warning(f"⚠️ Tentativa {i} retornou arquivo vazio")
-                continue
-                
-            # Verificar o Content-Type
-            content_type = response.headers.get('content-type', '')
-            st.info(f"📋 Content-Type: {content_type}")
-            
-            if 'text/html' in content_type:
-                st.warning(f"⚠️ Tentativa {i} retornou HTML (provável página de erro)")
-                continue
-            
-            # Calcular tamanho
-            if content_length:
-                size_mb = int(content_length) / (1024 * 1024)
-                st.info(f"📊 Tamanho do arquivo: {size_mb:.1f} MB")
-            
-            # Salvar temporariamente
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.parquet') as tmp_file:
-                st.info("💾 Salvando arquivo temporário...")
-                
-                total_size = int(content_length) if content_length else 0
-                downloaded = 0
-                
-                if total_size > 1024*1024:  # > 1MB, mostrar progresso
-                    progress_bar = st.progress(0)
-                    status_text = st.empty()
-                    
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            tmp_file.write(chunk)
-                            downloaded += len(chunk)
-                            if total_size > 0:
-                                progress = min(downloaded / total_size, 1.0)
-                                progress_bar.progress(progress)
-                                status_text.text(f"Baixado: {downloaded/(1024*1024):.1f}MB")
-                    
-                    progress_bar.empty()
-                    status_text.empty()
-                else:
-                    # Arquivo pequeno, baixar sem progresso
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            tmp_file.write(chunk)
-                            downloaded += len(chunk)
-                
-                tmp_file.flush()
-                
-                # Verificar se o arquivo foi realmente baixado
-                file_size = Path(tmp_file.name).stat().st_size
-                if file_size == 0:
-                    st.error(f"❌ Tentativa {i}: Arquivo baixado está vazio")
-                    Path(tmp_file.name).unlink()
-                    continue
-                
-                st.success(f"✅ Arquivo baixado com sucesso! ({file_size/(1024*1024):.1f} MB)")
-                
-                # Verificar se é realmente um arquivo Parquet
-                try:
-                    with open(tmp_file.name, 'rb') as f:
-                        # Verificar assinatura Parquet (PAR1 no início e fim)
-                        header = f.read(4)
-                        if header != b'PAR1':
-                            st.error(f"❌ Tentativa {i}: Arquivo baixado não é um Parquet válido")
-                            st.info(f"🔍 Header encontrado: {header}")
-                            Path(tmp_file.name).unlink()
-                            continue
-                except Exception as e:
-                    st.error(f"❌ Tentativa {i}: Erro ao verificar arquivo: {str(e)}")
-                    Path(tmp_file.name).unlink()
-                    continue
-                
-                # Carregar usando a função existente
-                df = carregar_dados_grandes(tmp_file.name)
-                
-                # Limpar arquivo temporário
-                try:
-                    Path(tmp_file.name).unlink()
-                except:
-                    pass
-                
-                if not df.is_empty():
-                    st.success(f"🎉 Dados carregados com sucesso da tentativa {i}!")
-                    return df
-                else:
-                    st.warning(f"⚠️ Tentativa {i}: DataFrame vazio após carregamento")
-                
-        except requests.exceptions.RequestException as e:
-            st.warning(f"⚠️ Tentativa {i} falhou: {str(e)}")
-            continue
-        except Exception as e:
-            st.warning(f"⚠️ Tentativa {i} - erro inesperado: {str(e)}")
-            continue
-    
-    # Se chegou aqui, todas as tentativas falharam
-    st.error("❌ Todas as tentativas de download falharam")
-    st.info("💡 Soluções:")
-    st.info("• Verifique se o arquivo no Google Drive é público")
-    st.info("• Tente a opção 'Upload de arquivo' como alternativa")
-    st.info("• Use 'Dados simulados' para testar o sistema")
-    
-    return pl.DataFrame()
 
 @st.cache_data  
 def gerar_dados_simulados() -> pl.DataFrame:
     """Gera dados simulados para demonstração"""
-    import random
-    
     st.info("🎭 Gerando dados simulados com empresas brasileiras...")
     
-    # Empresas brasileiras conhecidas
-    empresas = [
-        'BANCO DO BRASIL S.A.', 'ITAÚ UNIBANCO S.A.', 'BRADESCO S.A.', 'SANTANDER BRASIL S.A.',
-        'TELEFÔNICA BRASIL S.A.', 'TIM S.A.', 'CLARO S.A.', 'OI S.A.',
-        'PETROBRAS S.A.', 'VALE S.A.', 'AMBEV S.A.', 'JBS S.A.',
-        'MAGAZINE LUIZA S.A.', 'VIA VAREJO S.A.', 'LOJAS AMERICANAS S.A.', 'B2W DIGITAL S.A.',
-        'BANCO SANTANDER S.A.', 'CAIXA ECONÔMICA FEDERAL', 'BANCO INTER S.A.', 'NUBANK S.A.',
-        'EMBRAER S.A.', 'GERDAU S.A.', 'USIMINAS S.A.', 'CSN S.A.',
-        'CARREFOUR BRASIL S.A.', 'WALMART BRASIL S.A.', 'ATACADÃO S.A.', 'GRUPO PÃO DE AÇÚCAR S.A.'
-    ] * 36  # Repetir para ter 1000 registros
-    
-    ramos = [
-        'BANCOS E SERVIÇOS FINANCEIROS', 'TELECOMUNICAÇÕES', 'ENERGIA E PETRÓLEO', 
-        'VAREJO E COMÉRCIO', 'SIDERURGIA E MINERAÇÃO', 'ALIMENTAÇÃO E BEBIDAS',
-        'TECNOLOGIA', 'CONSTRUÇÃO CIVIL', 'SAÚDE', 'EDUCAÇÃO'
-    ]
-    
-    # Usar seed fixa para dados consistentes
-    np.random.seed(42)
-    random.seed(42)
-    
-    dados_fake = {
-        'ÓRGÃO': empresas[:1000],
-        'TRIBUNAL': np.random.choice(['TRT1', 'TRT2', 'TJSP', 'TRF1', 'TST', 'TJRJ', 'TJMG'], 1000),
-        'GRAU': np.random.choice(['1º GRAU', '2º GRAU', 'INSTÂNCIA ÚNICA'], 1000),
-        'RAMO': np.random.choice(ramos, 1000),
-        'NOVOS': np.random.randint(100, 5000, 1000),
-        'PENDENTES BRUTO': np.random.randint(500, 20000, 1000),
-        'PENDENTES LÍQUIDO': np.random.randint(300, 15000, 1000),
-        'SEGMENTO': np.random.choice(['ADMINISTRAÇÃO PÚBLICA', 'TELECOMUNICAÇÕES', 'BANCÁRIO', 'VAREJO', 'ENERGIA'], 1000)
-    }
-    
-    df = pl.DataFrame(dados_fake)
+    # Semente fixa (padrão do gerador) para dados consistentes
+    df = gerar_dataset(1000, n_empresas=1000).rename({'NOME': 'ÓRGÃO'})
     st.success(f"✅ Dados simulados gerados: {len(df):,} registros")
     
     return df
 
-@st.cache_data
-def carregar_dados_grandes(arquivo_path: str) -> pl.DataFrame:
-    """Carrega e processa o arquivo de 3GB com cache - versão otimizada para Parquet e CSV"""
+@st.cache_resource(show_spinner=False, max_entries=2)
+def _carregar_dados_grandes_compartilhado(arquivo_path: str, n_registros: Optional[int] = None) -> pl.DataFrame:
+    """Arquivo carregado uma vez por processo; falha (DataFrame vazio) não entra no cache"""
+    df = _carregar_dados_grandes_arquivo(arquivo_path, n_registros)
+    if df.is_empty():
+        raise _CargaSemDados(arquivo_path)
+    return df
+
+
+def _carregar_dados_grandes_arquivo(arquivo_path: str, n_registros: Optional[int] = None) -> pl.DataFrame:
+    """Carrega e processa o arquivo de 3GB - versão otimizada para Parquet e CSV"""
     try:
         file_path = Path(arquivo_path)
         file_extension = file_path.suffix.lower()
@@ -317,10 +144,30 @@ def carregar_dados_grandes(arquivo_path: str) -> pl.DataFrame:
         st.info(f"🔄 Carregando arquivo {file_extension.upper()} de {file_size/(1024**3):.1f}GB...")
         
         df = None
-        n_rows = None  # Inicializar variável para evitar erro
+        
+        # CSV (export antigo): convertido uma vez para Parquet tipado em memória limitada;
+        # as cargas seguintes leem direto o Parquet do cache
+        if file_extension != '.parquet':
+            try:
+                with st.spinner("📄 Convertendo CSV para Parquet (só na primeira vez)..."):
+                    arquivo_path = str(parquet_de_csv(
+                        arquivo_path, progresso=lambda etapa, detalhe: st.info(f"📄 {detalhe}")
+                    ))
+            except Exception as e:
+                st.error(f"❌ Não foi possível converter o CSV: {e}")
+                return pl.DataFrame()
+            file_extension = '.parquet'
+            file_size = Path(arquivo_path).stat().st_size
         
         # PARQUET: Carregar de forma eficiente para evitar crash
         if file_extension == '.parquet':
+            # Assinatura, rodapé, total de linhas e colunas obrigatórias só pelos metadados
+            try:
+                info_parquet = validar_parquet(arquivo_path)
+            except ParquetInvalido as e:
+                st.error(f"❌ Parquet inválido: {e}")
+                return pl.DataFrame()
+            
             try:
                 st.info("🚀 Carregando arquivo Parquet (formato otimizado)...")
                 
@@ -330,44 +177,22 @@ def carregar_dados_grandes(arquivo_path: str) -> pl.DataFrame:
                     
                     try:
                         # Estratégia 1: Lazy loading com streaming
-                    df_lazy = pl.scan_parquet(arquivo_path)
-                        
-                        # Verificar quantas linhas existem primeiro
-                        total_rows = df_lazy.select(pl.len()).collect().item()
-                        st.info(f"📈 Total de registros: {total_rows:,}")
+                        df_lazy = pl.scan_parquet(arquivo_path)
                         
-                        # Interface SIMPLES para usuários não-técnicos
+                        # Total de linhas já conhecido pelo rodapé (nenhuma página de dados lida)
+                        total_rows = info_parquet['linhas']
                         st.success(f"📊 Arquivo detectado: {total_rows:,} registros")
                         
-                        # Opções simples e claras
-                        st.info("🎯 Escolha o tamanho da análise:")
-                        
-                        col1, col2, col3 = st.columns(3)
-                        
-                        with col1:
-                            if st.button("⚡ RÁPIDO\n500mil registros\n(2-3 minutos)", help="Recomendado para análise geral"):
-                                n_registros = 500_000
-                        
-                        with col2:
-                            if st.button("🔥 COMPLETO\n1 milhão registros\n(5-8 minutos)", help="Análise mais detalhada"):
-                                n_registros = 1_000_000
-                        
-                        with col3:
-                            if st.button("💪 MÁXIMO\nTodos os registros\n(10+ minutos)", help="Análise completa - pode ser lento"):
-                                n_registros = total_rows
-                        
-                        # Verificar se algum botão foi clicado
-                        if 'n_registros' not in locals():
-                            st.info("👆 Clique em uma das opções acima para começar")
-                            return pl.DataFrame()
+                        # Tamanho escolhido na barra lateral (None = todos os registros)
+                        n_registros = min(n_registros or total_rows, total_rows)
                         
                         # Carregar dados com feedback claro
                         if n_registros >= total_rows:
                             st.warning(f"💪 Processando TODOS os {total_rows:,} registros...")
                             st.info("☕ Isso pode demorar 10+ minutos. Aguarde...")
                             with st.spinner("🔄 Carregando dataset completo..."):
-                    df = df_lazy.collect(streaming=True)
-                else:
+                                df = df_lazy.collect(streaming=True)
+                        else:
                             st.info(f"⚡ Processando {n_registros:,} registros selecionados...")
                             st.info("⏳ Carregamento em andamento...")
                             with st.spinner(f"📊 Carregando {n_registros:,} registros..."):
@@ -385,7 +210,7 @@ def carregar_dados_grandes(arquivo_path: str) -> pl.DataFrame:
                         
                         # Fallback: carregar diretamente sem lazy loading
                         st.info("🔄 Tentando carregamento direto...")
-                    df = pl.read_parquet(arquivo_path)
+                        df = pl.read_parquet(arquivo_path)
                         st.success(f"✅ Arquivo carregado (fallback direto): {len(df):,} registros")
                         
                 else:
@@ -407,67 +232,11 @@ def carregar_dados_grandes(arquivo_path: str) -> pl.DataFrame:
                     st.info("💡 Tente a opção 'Upload de arquivo' ou 'Dados simulados'")
                 return pl.DataFrame()
         
-        # CSV: Fallback para arquivos antigos
-        else:
-            # Primeiro, tentar detectar o encoding automaticamente
-            encoding_detectado = detectar_encoding(arquivo_path)
-            
-            # Carregar apenas uma amostra para arquivos muito grandes (>1GB)
-            if file_size > 1024**3:  # > 1GB
-                st.warning("📊 Arquivo CSV muito grande! Carregando amostra otimizada para evitar problemas de memória...")
-                n_rows = 100000  # Carregar apenas 100k linhas
-            else:
-                n_rows = None
-            
-            # ESTRATÉGIA 1: Tentar com scan_csv (mais eficiente)
-            try:
-                st.info("🚀 Tentando carregamento eficiente com scan_csv...")
-                df_lazy = pl.scan_csv(
-                    arquivo_path,
-                    separator=";",
-                    encoding="utf8-lossy",  # Polars scan_csv só aceita utf8 ou utf8-lossy
-                    ignore_errors=True,
-                    truncate_ragged_lines=True
-                )
-                if n_rows:
-                    df = df_lazy.head(n_rows).collect()
-                else:
-                    df = df_lazy.collect()
-                st.success("✅ Arquivo carregado com scan_csv (otimizado)")
-                
-            except Exception as e:
-                st.warning(f"⚠️ scan_csv falhou: {str(e)[:100]}...")
-                
-                # ESTRATÉGIA 2: Fallback para read_csv com diferentes encodings
-                encodings = [encoding_detectado, 'utf-8', 'iso-8859-1', 'latin-1', 'windows-1252', 'cp1252', 'utf-8-sig']
-                # Remover duplicatas mantendo a ordem
-                encodings = list(dict.fromkeys(encodings))
-                
-                for encoding in encodings:
-                    try:
-                        st.info(f"🧪 Tentando carregar com encoding: {encoding}")
-                        df = pl.read_csv(
-                            arquivo_path,
-                            separator=";",
-                            encoding=encoding,
-                            ignore_errors=True,
-                            truncate_ragged_lines=True,
-                            n_rows=n_rows  # Limitar linhas para arquivos grandes
-                        )
-                        st.success(f"✅ Arquivo carregado com encoding: {encoding}")
-                        break
-                    except Exception as e2:
-                        st.warning(f"⚠️ Falhou com {encoding}: {str(e2)[:100]}...")
-                        continue
-        
         if df is None:
             st.error("❌ Não foi possível carregar o arquivo com nenhuma estratégia")
             return pl.DataFrame()
         
-        if n_rows:
-            st.info(f"📈 Carregadas {len(df):,} linhas (amostra otimizada de arquivo {file_size/(1024**3):.1f}GB)")
-        else:
-            st.info(f"📈 Carregadas {len(df):,} linhas do arquivo {file_size/(1024**3):.1f}GB")
+        st.info(f"📈 Carregadas {len(df):,} linhas do arquivo {file_size/(1024**3):.1f}GB")
         
         # Verificar uso de memória e otimizar se necessário
         if len(df) > 100_000:
@@ -570,6 +339,9 @@ def carregar_dados_grandes(arquivo_path: str) -> pl.DataFrame:
         
         st.success(f"✅ Dados carregados: {len(df_validos):,} registros válidos de {len(df):,} total")
         
+        # IDs inteiros de empresa, calculados uma vez junto com o cache dos dados
+        df_validos, _ = construir_dimensao(df_validos, 'ÓRGÃO')
+        
         # Mostrar informações sobre as colunas
         st.info(f"📋 Colunas encontradas: {', '.join(df.columns)}")
         
@@ -578,7 +350,6 @@ def carregar_dados_grandes(arquivo_path: str) -> pl.DataFrame:
     except Exception as e:
         st.error(f"❌ Erro ao carregar arquivo: {e}")
         st.info("💡 Dicas para resolver:")
-        st.info("• Para arquivos >1GB: Usando amostra otimizada automaticamente")
         st.info("• Tente usar 'Upload de arquivo' em vez de 'Caminho local'")
         st.info("• Use 'Dados simulados' para testar o simulador")
         st.info("• Verifique se o arquivo não está aberto em outro programa")
@@ -656,6 +427,100 @@ def encontrar_break_even(preco: float, custo_base: int, clientes: int) -> int:
             return volume
     return 0
 
+# === MEMOIZAÇÃO ENTRE RERUNS ===
+# Cada interação reexecuta main(); as etapas abaixo são cacheadas pela impressão
+# digital do dataset + parâmetros (argumentos com "_" não entram na chave).
+
+def impressao_digital_dataset(df: pl.DataFrame) -> str:
+    """Hash do conteúdo inteiro (schema + hash de cada linha, em ordem)"""
+    if df.is_empty():
+        return 'vazio'
+    digest = hashlib.sha1(repr(tuple((c, str(t)) for c, t in df.schema.items())).encode('utf-8'))
+    digest.update(df.hash_rows(seed=0).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def valores_filtro(_df: pl.DataFrame, impressao: str, coluna: str) -> List:
+    """Valores distintos (não nulos) de uma coluna para os selectbox de filtro"""
+    return sorted(_df.filter(pl.col(coluna).is_not_null())[coluna].unique().to_list())
+
+
+def _filtrar_dataset(df: pl.DataFrame, tribunal: str, grau: str, segmento: str) -> pl.DataFrame:
+    if tribunal != 'Todos':
+        df = df.filter(pl.col('TRIBUNAL') == tribunal)
+    if grau != 'Todos' and 'GRAU' in df.columns:
+        df = df.filter(pl.col('GRAU') == grau)
+    if segmento != 'Todos' and 'SEGMENTO' in df.columns:
+        df = df.filter(pl.col('SEGMENTO') == segmento)
+    return df
+
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _empresas_filtradas(_df: pl.DataFrame, impressao: str, tribunal: str, grau: str,
+                        segmento: str) -> pl.DataFrame:
+    return calcular_processos_mensais(agrupar_por_empresa(_filtrar_dataset(_df, tribunal, grau, segmento)))
+
+
+@st.cache_resource(max_entries=2, show_spinner=False)
+def _linhas_filtradas(_df: pl.DataFrame, impressao: str, tribunal: str, grau: str,
+                      segmento: str) -> pl.DataFrame:
+    # Nível de linha (pode ser o dataset inteiro): uma cópia compartilhada,
+    # sem a serialização a cada acerto do cache_data
+    return calcular_processos_mensais(_filtrar_dataset(_df, tribunal, grau, segmento))
+
+
+def preparar_dados_filtrados(df: pl.DataFrame, impressao: str, tribunal: str, grau: str,
+                             segmento: str, agrupar: bool) -> pl.DataFrame:
+    """Filtros + agrupamento por empresa (opcional) + volume mensal, cacheados por filtro"""
+    if agrupar:
+        return _empresas_filtradas(df, impressao, tribunal, grau, segmento)
+    return _linhas_filtradas(df, impressao, tribunal, grau, segmento).clone()
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def selecionar_top_empresas(_df_com_mensal: pl.DataFrame, chave: Tuple, busca: str, n: int) -> pl.DataFrame:
+    """Top N por volume mensal, opcionalmente restrito às empresas cujo nome contém `busca`"""
+    df_empresas = _df_com_mensal
+    if busca:
+        df_empresas = df_empresas.filter(
+            pl.col('ÓRGÃO').str.to_lowercase().str.contains(busca.lower(), literal=True)
+        )
+    return df_empresas.sort('volume_mensal', descending=True).head(n)
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def curva_lucro_volume(volume_maximo: int, preco: float, custo_base: int, clientes: int,
+                       reinvestimento: float) -> Tuple[List[int], List[float]]:
+    """Lucro líquido para volumes de 500 até volume_maximo (passo 500)"""
+    volumes = list(range(500, volume_maximo, 500))
+    lucros = [calcular_financas(vol, preco, custo_base, clientes, reinvestimento)['lucro_liquido'] for vol in volumes]
+    return volumes, lucros
+
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def curva_lucro_preco(volume: int, custo_base: int, clientes: int,
+                      reinvestimento: float) -> Tuple[List[int], List[float]]:
+    """Lucro líquido para preços de R$ 20 a R$ 100 (passo 5)"""
+    precos = list(range(20, 101, 5))
+    lucros = [calcular_financas(volume, p, custo_base, clientes, reinvestimento)['lucro_liquido'] for p in precos]
+    return precos, lucros
+
+
+def _formatar_milhar(expr: pl.Expr) -> pl.Expr:
+    """Número inteiro com separador de milhar (1,234,567) como expressão Polars vetorizada"""
+    return (
+        expr.round(0).cast(pl.Int64).abs().cast(pl.Utf8)
+        .str.reverse().str.replace_all(r"(\d{3})", "$1,").str.strip_chars_end(",").str.reverse()
+        .pipe(lambda texto: pl.when(expr < 0).then(pl.lit('-') + texto).otherwise(texto))
+    )
+
+
+def _dados_grafico(df: pl.DataFrame) -> Dict[str, np.ndarray]:
+    """Colunas como arrays numpy para o Plotly (numéricas sem nulos saem do buffer Arrow sem cópia)"""
+    return {coluna: df[coluna].to_numpy() for coluna in df.columns}
+
+
 def gerar_relatorio_detalhado(df: pl.DataFrame):
     """Gera relatório detalhado por porte de empresas, ramo e segmento"""
     
@@ -736,15 +601,13 @@ def gerar_relatorio_detalhado(df: pl.DataFrame):
         pl.col('PENDENTES BRUTO').sum().alias("Total_Pendentes")
     ]).sort("Volume_Total_Mensal", descending=True)
     
-    # Converter para pandas para visualização
-    df_porte_pandas = analise_porte.to_pandas()
-    
-    # Adicionar percentuais
-    total_empresas = df_porte_pandas['Quantidade_Empresas'].sum()
-    df_porte_pandas['Percentual_Empresas'] = (df_porte_pandas['Quantidade_Empresas'] / total_empresas * 100).round(1)
-    
-    total_volume = df_porte_pandas['Volume_Total_Mensal'].sum()
-    df_porte_pandas['Percentual_Volume'] = (df_porte_pandas['Volume_Total_Mensal'] / total_volume * 100).round(1)
+    # Percentuais calculados no próprio Polars
+    total_empresas = analise_porte['Quantidade_Empresas'].sum()
+    total_volume = analise_porte['Volume_Total_Mensal'].sum()
+    analise_porte = analise_porte.with_columns([
+        (pl.col('Quantidade_Empresas') / total_empresas * 100).round(1).alias('Percentual_Empresas'),
+        (pl.col('Volume_Total_Mensal') / total_volume * 100).round(1).alias('Percentual_Volume')
+    ])
     
     # Métricas gerais
     col1, col2, col3, col4 = st.columns(4)
@@ -753,35 +616,26 @@ def gerar_relatorio_detalhado(df: pl.DataFrame):
     with col2:
         st.metric("📈 Volume Total/Mês", f"{total_volume:,.0f}")
     with col3:
-        grandes_empresas = df_porte_pandas[df_porte_pandas['faixa_porte'].str.contains('Acima de 5.000')]['Quantidade_Empresas'].sum()
+        grandes_empresas = analise_porte.filter(pl.col('faixa_porte').str.contains('Acima de 5.000'))['Quantidade_Empresas'].sum()
         st.metric("🚀 Grandes (>5k)", f"{grandes_empresas:,}")
     with col4:
-        pequenas_empresas = df_porte_pandas[df_porte_pandas['faixa_porte'].str.contains('Menos de 500')]['Quantidade_Empresas'].sum()
+        pequenas_empresas = analise_porte.filter(pl.col('faixa_porte').str.contains('Menos de 500'))['Quantidade_Empresas'].sum()
         st.metric("🏪 Pequenas (<500)", f"{pequenas_empresas:,}")
     
     # Tabela principal
     st.subheader("📋 Distribuição por Faixas de Volume")
     
-    # Formatar tabela para exibição
-    df_display = df_porte_pandas.copy()
-    df_display['Volume_Total_Mensal'] = df_display['Volume_Total_Mensal'].apply(lambda x: f"{x:,.0f}")
-    df_display['Volume_Medio_Mensal'] = df_display['Volume_Medio_Mensal'].apply(lambda x: f"{x:,.0f}")
-    df_display['Total_Novos'] = df_display['Total_Novos'].apply(lambda x: f"{x:,}")
-    df_display['Total_Pendentes'] = df_display['Total_Pendentes'].apply(lambda x: f"{x:,}")
-    df_display['Percentual_Empresas'] = df_display['Percentual_Empresas'].apply(lambda x: f"{x}%")
-    df_display['Percentual_Volume'] = df_display['Percentual_Volume'].apply(lambda x: f"{x}%")
-    
-    # Renomear colunas
-    df_display = df_display.rename(columns={
-        'faixa_porte': 'Faixa de Porte',
-        'Quantidade_Empresas': 'Qtd Empresas',
-        'Volume_Total_Mensal': 'Volume Total/Mês',
-        'Volume_Medio_Mensal': 'Volume Médio/Mês',
-        'Total_Novos': 'Processos Novos',
-        'Total_Pendentes': 'Processos Pendentes',
-        'Percentual_Empresas': '% Empresas',
-        'Percentual_Volume': '% Volume'
-    })
+    # Formatar tabela para exibição (expressões vetorizadas, sem lambda por célula)
+    df_display = analise_porte.select([
+        pl.col('faixa_porte').alias('Faixa de Porte'),
+        pl.col('Quantidade_Empresas').alias('Qtd Empresas'),
+        _formatar_milhar(pl.col('Volume_Total_Mensal')).alias('Volume Total/Mês'),
+        _formatar_milhar(pl.col('Volume_Medio_Mensal')).alias('Volume Médio/Mês'),
+        _formatar_milhar(pl.col('Total_Novos')).alias('Processos Novos'),
+        _formatar_milhar(pl.col('Total_Pendentes')).alias('Processos Pendentes'),
+        (pl.col('Percentual_Empresas').cast(pl.Utf8) + pl.lit('%')).alias('% Empresas'),
+        (pl.col('Percentual_Volume').cast(pl.Utf8) + pl.lit('%')).alias('% Volume')
+    ])
     
     st.dataframe(df_display, use_container_width=True)
     
@@ -791,7 +645,7 @@ def gerar_relatorio_detalhado(df: pl.DataFrame):
     with col1:
         st.subheader("📊 Distribuição de Empresas")
         fig_empresas = px.pie(
-            df_porte_pandas,
+            _dados_grafico(analise_porte),
             values='Quantidade_Empresas',
             names='faixa_porte',
             title='Quantidade de Empresas por Porte'
@@ -801,40 +655,52 @@ def gerar_relatorio_detalhado(df: pl.DataFrame):
     with col2:
         st.subheader("📈 Concentração de Volume")
         fig_volume = px.pie(
-            df_porte_pandas,
+            _dados_grafico(analise_porte),
             values='Volume_Total_Mensal',
             names='faixa_porte',
             title='Volume de Processos por Porte'
         )
         st.plotly_chart(fig_volume, use_container_width=True)
     
+    # === CRUZAMENTOS (RAMO, SEGMENTO, PORTE) NUMA ÚNICA PASSADA ===
+    # Um CUBE sobre as dimensões disponíveis entrega (ramo, porte), (segmento, porte),
+    # (ramo, segmento) e os subtotais por ramo e por segmento de uma vez
+    dimensoes_cruzamento = [d for d in ['RAMO', 'SEGMENTO'] if d in df.columns] + ['faixa_porte']
+    chave_empresa = 'EMPRESA_ID' if 'EMPRESA_ID' in df_com_faixas.columns else 'ÓRGÃO'
+    cruzamentos = tabulacao_cruzada(
+        df_com_faixas, dimensoes_cruzamento, coluna_volume=coluna_volume,
+        chave_empresa=chave_empresa, colunas_soma=['NOVOS']
+    )
+    
+    def recorte(conjunto: List[str], renomear: Dict[str, str]) -> pl.DataFrame:
+        return (
+            selecionar_conjunto(cruzamentos, dimensoes_cruzamento, conjunto)
+            .rename({coluna_volume: 'volume_total'})
+            .rename(renomear)
+        )
+    
     # === 2. ANÁLISE POR RAMO ===
     st.markdown("---")
     st.header("🌳 Análise por Ramo de Atividade")
     
     if 'RAMO' in df.columns:
-        analise_ramo = df_com_faixas.group_by(['RAMO', 'faixa_porte']).agg([
-            pl.len().alias("Quantidade_Empresas"),
-            pl.col(coluna_volume).sum().alias("Volume_Total_Mensal"),
-            pl.col('NOVOS').sum().alias("Total_Novos")
-        ]).sort(['RAMO', 'Volume_Total_Mensal'], descending=[False, True])
-        
-        df_ramo_pandas = analise_ramo.to_pandas()
-        
-        if len(df_ramo_pandas) > 0:
-            # Resumo por ramo
-            resumo_ramo = df.group_by('RAMO').agg([
-                pl.len().alias("Total_Empresas"),
-                pl.col(coluna_volume).sum().alias("Volume_Total"),
-                pl.col(coluna_volume).mean().alias("Volume_Medio")
-            ]).sort("Volume_Total", descending=True).to_pandas()
+        analise_ramo = recorte(['RAMO', 'faixa_porte'], {
+            'empresas': 'Quantidade_Empresas', 'volume_total': 'Volume_Total_Mensal', 'NOVOS': 'Total_Novos'
+        }).select(['RAMO', 'faixa_porte', 'Quantidade_Empresas', 'Volume_Total_Mensal', 'Total_Novos'])
+        analise_ramo = analise_ramo.sort(['RAMO', 'Volume_Total_Mensal'], descending=[False, True])
+        
+        if not analise_ramo.is_empty():
+            # Resumo por ramo (subtotais do cruzamento)
+            resumo_ramo = recorte(['RAMO'], {
+                'empresas': 'Total_Empresas', 'volume_total': 'Volume_Total', 'volume_medio': 'Volume_Medio'
+            }).select(['RAMO', 'Total_Empresas', 'Volume_Total', 'Volume_Medio']).sort("Volume_Total", descending=True)
             
             st.subheader("📊 Resumo por Ramo")
             st.dataframe(resumo_ramo, use_container_width=True)
             
             # Gráfico de barras por ramo
             fig_ramo = px.bar(
-                df_ramo_pandas,
+                _dados_grafico(analise_ramo),
                 x='RAMO',
                 y='Volume_Total_Mensal',
                 color='faixa_porte',
@@ -846,7 +712,7 @@ def gerar_relatorio_detalhado(df: pl.DataFrame):
             
             # Tabela detalhada por ramo
             with st.expander("📋 Dados Detalhados por Ramo"):
-                st.dataframe(df_ramo_pandas, use_container_width=True)
+                st.dataframe(analise_ramo, use_container_width=True)
         else:
             st.info("Nenhum dado de ramo disponível.")
     else:
@@ -857,28 +723,23 @@ def gerar_relatorio_detalhado(df: pl.DataFrame):
     st.header("🏭 Análise por Segmento")
     
     if 'SEGMENTO' in df.columns:
-        analise_segmento = df_com_faixas.group_by(['SEGMENTO', 'faixa_porte']).agg([
-            pl.len().alias("Quantidade_Empresas"),
-            pl.col(coluna_volume).sum().alias("Volume_Total_Mensal"),
-            pl.col('NOVOS').sum().alias("Total_Novos")
-        ]).sort(['SEGMENTO', 'Volume_Total_Mensal'], descending=[False, True])
-        
-        df_segmento_pandas = analise_segmento.to_pandas()
-        
-        if len(df_segmento_pandas) > 0:
-            # Resumo por segmento
-            resumo_segmento = df.group_by('SEGMENTO').agg([
-                pl.len().alias("Total_Empresas"),
-                pl.col(coluna_volume).sum().alias("Volume_Total"),
-                pl.col(coluna_volume).mean().alias("Volume_Medio")
-            ]).sort("Volume_Total", descending=True).to_pandas()
+        analise_segmento = recorte(['SEGMENTO', 'faixa_porte'], {
+            'empresas': 'Quantidade_Empresas', 'volume_total': 'Volume_Total_Mensal', 'NOVOS': 'Total_Novos'
+        }).select(['SEGMENTO', 'faixa_porte', 'Quantidade_Empresas', 'Volume_Total_Mensal', 'Total_Novos'])
+        analise_segmento = analise_segmento.sort(['SEGMENTO', 'Volume_Total_Mensal'], descending=[False, True])
+        
+        if not analise_segmento.is_empty():
+            # Resumo por segmento (subtotais do cruzamento)
+            resumo_segmento = recorte(['SEGMENTO'], {
+                'empresas': 'Total_Empresas', 'volume_total': 'Volume_Total', 'volume_medio': 'Volume_Medio'
+            }).select(['SEGMENTO', 'Total_Empresas', 'Volume_Total', 'Volume_Medio']).sort("Volume_Total", descending=True)
             
             st.subheader("📊 Resumo por Segmento")
             st.dataframe(resumo_segmento, use_container_width=True)
             
             # Gráfico de barras por segmento
             fig_segmento = px.bar(
-                df_segmento_pandas,
+                _dados_grafico(analise_segmento),
                 x='SEGMENTO',
                 y='Volume_Total_Mensal',
                 color='faixa_porte',
@@ -890,7 +751,7 @@ def gerar_relatorio_detalhado(df: pl.DataFrame):
             
             # Tabela detalhada por segmento
             with st.expander("📋 Dados Detalhados por Segmento"):
-                st.dataframe(df_segmento_pandas, use_container_width=True)
+                st.dataframe(analise_segmento, use_container_width=True)
         else:
             st.info("Nenhum dado de segmento disponível.")
     else:
@@ -901,29 +762,20 @@ def gerar_relatorio_detalhado(df: pl.DataFrame):
         st.markdown("---")
         st.header("🔀 Análise Cruzada: Ramo vs Segmento")
         
-        # Matriz ramo x segmento
-        matriz_cruzada = df.group_by(['RAMO', 'SEGMENTO']).agg([
-            pl.len().alias("Quantidade_Empresas"),
-            pl.col('processos_mensais_estimado').sum().alias("Volume_Total")
-        ])
-        
-        df_matriz_pandas = matriz_cruzada.to_pandas()
+        # Matriz ramo x segmento (formato longo; o mapa de calor soma as células)
+        matriz_cruzada = recorte(['RAMO', 'SEGMENTO'], {
+            'empresas': 'Quantidade_Empresas', 'volume_total': 'Volume_Total'
+        }).select(['RAMO', 'SEGMENTO', 'Quantidade_Empresas', 'Volume_Total'])
         
-        if len(df_matriz_pandas) > 0:
-            # Criar pivot table
-            pivot_ramo_segmento = df_matriz_pandas.pivot(
-                index='RAMO', 
-                columns='SEGMENTO', 
-                values='Volume_Total'
-            ).fillna(0)
-            
+        if not matriz_cruzada.is_empty():
             # Mapa de calor
-            fig_heatmap = px.imshow(
-                pivot_ramo_segmento.values,
-                x=pivot_ramo_segmento.columns,
-                y=pivot_ramo_segmento.index,
+            fig_heatmap = px.density_heatmap(
+                _dados_grafico(matriz_cruzada),
+                x='SEGMENTO',
+                y='RAMO',
+                z='Volume_Total',
+                histfunc='sum',
                 title='Mapa de Calor: Volume por Ramo vs Segmento',
-                aspect="auto",
                 color_continuous_scale='Blues'
             )
             fig_heatmap.update_layout(height=600)
@@ -931,7 +783,7 @@ def gerar_relatorio_detalhado(df: pl.DataFrame):
             
             # Tabela da matriz
             with st.expander("📋 Matriz Detalhada Ramo vs Segmento"):
-                st.dataframe(df_matriz_pandas, use_container_width=True)
+                st.dataframe(matriz_cruzada, use_container_width=True)
 
 def verificar_senha():
     """Verifica se o usuário está autenticado"""
@@ -976,6 +828,20 @@ def verificar_senha():
     
     return True
 
+def escolher_limite_registros() -> Optional[int]:
+    """Quantidade de registros a carregar de arquivos grandes (None = todos)"""
+    opcoes = {
+        "💪 Todos os registros": None,
+        "🔥 1 milhão de registros": 1_000_000,
+        "⚡ 500 mil registros": 500_000,
+    }
+    escolha = st.sidebar.selectbox(
+        "📏 Tamanho da análise:", list(opcoes),
+        help="O dataset completo fica uma única vez na memória, compartilhado entre sessões"
+    )
+    return opcoes[escolha]
+
+
 def main():
     # Verificar autenticação antes de continuar
     if not verificar_senha():
@@ -1017,6 +883,7 @@ def main():
     )
     
     df = pl.DataFrame()
+    impressao = None
     
     if arquivo_opcao == "🚀 Google Drive (Recomendado)":
         st.sidebar.info("📡 Carregando do arquivo padrão no Google Drive")
@@ -1028,13 +895,12 @@ def main():
         
         with col1:
             if st.button("🚀 Carregar do Drive", help="Carrega automaticamente do Google Drive"):
-                file_id = "1Ns07hTZaK4Ry6bFEHvLACZ5tHJ7b-C2E"
-                df = carregar_dados_do_drive(file_id, "grandes_litigantes_202504.parquet")
+                st.session_state.fonte_dados = ('drive', "1Ns07hTZaK4Ry6bFEHvLACZ5tHJ7b-C2E", "grandes_litigantes_202504.parquet")
         
         with col2:
             if st.button("🎭 Usar Simulados", help="Usa dados simulados se o Drive falhar"):
                 st.info("🎭 Carregando dados simulados...")
-                df = gerar_dados_simulados()
+                st.session_state.fonte_dados = ('simulados',)
         
         # Opções avançadas para Google Drive
         with st.sidebar.expander("🔧 Configurações do Drive"):
@@ -1048,7 +914,7 @@ def main():
             
             if st.button("🔄 Tentar com ID personalizado"):
                 if custom_file_id:
-                    df = carregar_dados_do_drive(custom_file_id, "arquivo_personalizado.parquet")
+                    st.session_state.fonte_dados = ('drive', custom_file_id, "arquivo_personalizado.parquet")
             
             st.markdown("---")
             st.markdown("**💡 Como tornar arquivo público:**")
@@ -1063,8 +929,9 @@ def main():
             type=['csv', 'parquet'],
             help="Arquivo Parquet é mais eficiente que CSV"
         )
+        limite_registros = escolher_limite_registros()
         if uploaded_file:
-            df = carregar_dados_grandes(uploaded_file)
+            df, impressao = carregar_dados_grandes(uploaded_file, limite_registros)
             
     elif arquivo_opcao == "🔧 Caminho local":
         st.sidebar.info("🗂️ Opções avançadas para arquivos locais")
@@ -1083,21 +950,23 @@ def main():
                 arquivo_encontrado = arquivo
                 break
         
+        limite_registros = escolher_limite_registros()
+        
         if arquivo_encontrado:
             st.sidebar.success(f"📁 Arquivo local encontrado: {arquivo_encontrado}")
             if st.sidebar.button("🗂️ Carregar arquivo local"):
-                df = carregar_dados_grandes(arquivo_encontrado)
+                st.session_state.fonte_dados = ('local', arquivo_encontrado, limite_registros)
         else:
             # OPÇÃO 2: Caminho manual
             with st.sidebar.expander("📝 Caminho personalizado"):
                 caminho = st.text_input(
-                "Caminho do arquivo:",
-                value="grandes_litigantes_202504.parquet"
-            )
-            if caminho and Path(caminho).exists():
+                    "Caminho do arquivo:",
+                    value="grandes_litigantes_202504.parquet"
+                )
+                if caminho and Path(caminho).exists():
                     if st.button("📂 Carregar"):
-                df = carregar_dados_grandes(caminho)
-            elif caminho:
+                        st.session_state.fonte_dados = ('local', caminho, limite_registros)
+                elif caminho:
                     st.error("Arquivo não encontrado")
             
     else:  # Dados simulados (🎭 Dados simulados)
@@ -1134,10 +1003,33 @@ def main():
         }
         df = pl.DataFrame(dados_fake)
     
+    # Botões só valem no rerun do clique: a fonte escolhida fica na sessão e o
+    # dataset compartilhado volta do cache_resource (sem cópia) nos reruns seguintes
+    fontes_da_opcao = {
+        "🚀 Google Drive (Recomendado)": ('drive', 'simulados'),
+        "🔧 Caminho local": ('local',),
+    }
+    fonte = st.session_state.get('fonte_dados')
+    if df.is_empty() and fonte and fonte[0] in fontes_da_opcao.get(arquivo_opcao, ()):
+        if fonte[0] == 'drive':
+            df, impressao = carregar_dados_do_drive(fonte[1], fonte[2])
+        elif fonte[0] == 'local':
+            df, impressao = carregar_dados_grandes(fonte[1], fonte[2])
+        elif fonte[0] == 'simulados':
+            df = gerar_dados_simulados()
+    
     if df.is_empty():
         st.warning("⚠️ Carregue um arquivo para começar")
         return
     
+    # Fontes que não passam por carregar_dados_grandes (ex.: dados simulados) ganham IDs aqui
+    if 'EMPRESA_ID' not in df.columns and 'ÓRGÃO' in df.columns:
+        df, _ = construir_dimensao(df, 'ÓRGÃO')
+    
+    # Datasets em memória (pequenos) são varridos aqui; os carregados já vêm com o hash
+    if impressao is None:
+        impressao = impressao_digital_dataset(df)
+    
     # Filtros principais
     st.sidebar.header("🔍 Filtros de Dados")
     
@@ -1149,41 +1041,26 @@ def main():
     )
     
     # Filtro por tribunal
-    tribunais_disponiveis = ['Todos'] + sorted(df['TRIBUNAL'].unique().to_list())
+    tribunais_disponiveis = ['Todos'] + valores_filtro(df, impressao, 'TRIBUNAL')
     tribunal_selecionado = st.sidebar.selectbox("🏛️ Tribunal:", tribunais_disponiveis)
     
     # Filtro por grau (se existir)
     if 'GRAU' in df.columns:
-        graus_disponiveis = ['Todos'] + sorted(df['GRAU'].unique().to_list())
+        graus_disponiveis = ['Todos'] + valores_filtro(df, impressao, 'GRAU')
         grau_selecionado = st.sidebar.selectbox("⚖️ Grau:", graus_disponiveis)
     else:
         grau_selecionado = 'Todos'
     
     # Filtro por segmento
     if 'SEGMENTO' in df.columns:
-        segmentos_disponiveis = df.filter(pl.col('SEGMENTO').is_not_null())['SEGMENTO'].unique().to_list()
-        segmentos = ['Todos'] + sorted(segmentos_disponiveis)
+        segmentos = ['Todos'] + valores_filtro(df, impressao, 'SEGMENTO')
         segmento_selecionado = st.sidebar.selectbox("🏢 Segmento:", segmentos)
     else:
         segmento_selecionado = 'Todos'
     
-    # Aplicar filtros
-    df_filtrado = df
-    if tribunal_selecionado != 'Todos':
-        df_filtrado = df_filtrado.filter(pl.col('TRIBUNAL') == tribunal_selecionado)
-    if grau_selecionado != 'Todos' and 'GRAU' in df.columns:
-        df_filtrado = df_filtrado.filter(pl.col('GRAU') == grau_selecionado)
-    if segmento_selecionado != 'Todos' and 'SEGMENTO' in df.columns:
-        df_filtrado = df_filtrado.filter(pl.col('SEGMENTO') == segmento_selecionado)
-    
-    # Agrupar por empresa se solicitado
-    if agrupar_empresas:
-        df_processado = agrupar_por_empresa(df_filtrado)
-    else:
-        df_processado = df_filtrado
-    
-    # Calcular processos mensais para cada órgão
-    df_com_mensal = calcular_processos_mensais(df_processado)
+    # Aplicar filtros, agrupar por empresa e calcular processos mensais (cacheado por filtro)
+    chave_filtros = (impressao, tribunal_selecionado, grau_selecionado, segmento_selecionado, agrupar_empresas)
+    df_com_mensal = preparar_dados_filtrados(df, *chave_filtros)
     
     # Seleção de empresa específica
     st.sidebar.header("🏢 Seleção por Empresa")
@@ -1194,16 +1071,8 @@ def main():
         placeholder="Digite parte do nome da empresa..."
     )
     
-    # Filtrar empresas pela busca
-    if busca_empresa:
-        df_empresas = df_com_mensal.filter(
-            pl.col('ÓRGÃO').str.to_lowercase().str.contains(busca_empresa.lower())
-        )
-    else:
-        df_empresas = df_com_mensal
-    
-    # Top empresas por volume
-    df_top_empresas = df_empresas.sort('volume_mensal', descending=True).head(50)
+    # Top empresas por volume (filtradas pela busca)
+    df_top_empresas = selecionar_top_empresas(df_com_mensal, chave_filtros, busca_empresa, 50)
     
     if len(df_top_empresas) > 0:
         # Lista de empresas para seleção com informações relevantes
@@ -1284,7 +1153,7 @@ def main():
     # Top N litigantes para visualização geral
     st.sidebar.header("👥 Análise Geral")
     top_n = st.sidebar.slider("Top N empresas para análise:", 10, 100, 20)
-    df_top = df_com_mensal.sort('volume_mensal', descending=True).head(top_n)
+    df_top = selecionar_top_empresas(df_com_mensal, chave_filtros, '', top_n)
     
     # Layout principal
     col1, col2 = st.columns([2, 1])
@@ -1315,7 +1184,7 @@ def main():
         col_btn1, col_btn2, col_btn3 = st.columns(3)
         with col_btn1:
             if st.button("✅ Selecionar Todas"):
-                st.session_state.empresas_selecionadas = df_top['ÓRGÃO'].to_list()
+                st.session_state.empresas_selecionadas = df_top['EMPRESA_ID'].unique().to_list()
                 st.rerun()
         with col_btn2:
             if st.button("❌ Limpar Seleção"):
@@ -1323,7 +1192,7 @@ def main():
                 st.rerun()
         with col_btn3:
             if st.button("🔄 Inverter Seleção"):
-                todas_empresas = set(df_top['ÓRGÃO'].to_list())
+                todas_empresas = set(df_top['EMPRESA_ID'].to_list())
                 selecionadas = set(st.session_state.empresas_selecionadas)
                 st.session_state.empresas_selecionadas = list(todas_empresas - selecionadas)
                 st.rerun()
@@ -1333,6 +1202,7 @@ def main():
         
         for idx, empresa_info in enumerate(empresas_dados):
             nome_empresa = empresa_info['ÓRGÃO']
+            empresa_id = empresa_info['EMPRESA_ID']
             volume_mensal = empresa_info['volume_mensal']
             
             # Simplificar nome da empresa para exibição
@@ -1344,36 +1214,30 @@ def main():
             checkbox_key = f"checkbox_{idx}_{nome_empresa}"
             selecionada = st.checkbox(
                 f"🏢 **{nome_display}** - {volume_mensal:.0f} processos/mês",
-                value=nome_empresa in st.session_state.empresas_selecionadas,
+                value=empresa_id in st.session_state.empresas_selecionadas,
                 key=checkbox_key
             )
             
-            # Atualizar lista de selecionadas
-            if selecionada and nome_empresa not in st.session_state.empresas_selecionadas:
-                st.session_state.empresas_selecionadas.append(nome_empresa)
-            elif not selecionada and nome_empresa in st.session_state.empresas_selecionadas:
-                st.session_state.empresas_selecionadas.remove(nome_empresa)
+            # Atualizar lista de selecionadas (guarda o EMPRESA_ID, não o nome)
+            if selecionada and empresa_id not in st.session_state.empresas_selecionadas:
+                st.session_state.empresas_selecionadas.append(empresa_id)
+            elif not selecionada and empresa_id in st.session_state.empresas_selecionadas:
+                st.session_state.empresas_selecionadas.remove(empresa_id)
         
         # Resumo das seleções
         if st.session_state.empresas_selecionadas:
             st.success(f"✅ **{len(st.session_state.empresas_selecionadas)} empresas selecionadas**")
             
-            # Calcular volume total das empresas selecionadas
-            volume_total_selecionado = 0
-            for empresa_selecionada in st.session_state.empresas_selecionadas:
-                empresa_data = df_top.filter(pl.col('ÓRGÃO') == empresa_selecionada)
-                if len(empresa_data) > 0:
-                    volume_total_selecionado += empresa_data[0, 'volume_mensal']
+            # Calcular volume total das empresas selecionadas (um único filtro por ID)
+            df_selecionadas = df_top.filter(pl.col('EMPRESA_ID').is_in(st.session_state.empresas_selecionadas))
+            volume_total_selecionado = df_selecionadas['volume_mensal'].sum()
             
             st.info(f"📊 **Volume total estimado: {volume_total_selecionado:.0f} processos/mês**")
             
             with st.expander("📋 Ver empresas selecionadas"):
-                for empresa in st.session_state.empresas_selecionadas:
-                    empresa_data = df_top.filter(pl.col('ÓRGÃO') == empresa)
-                    if len(empresa_data) > 0:
-                        volume = empresa_data[0, 'volume_mensal']
-                        nome_clean = empresa.replace(' LTDA', '').replace(' S/A', '').replace(' S.A.', '').replace(' EIRELI', '')
-                        st.write(f"• {nome_clean}: {volume:.0f} proc/mês")
+                for empresa, volume in df_selecionadas.select(['ÓRGÃO', 'volume_mensal']).iter_rows():
+                    nome_clean = empresa.replace(' LTDA', '').replace(' S/A', '').replace(' S.A.', '').replace(' EIRELI', '')
+                    st.write(f"• {nome_clean}: {volume:.0f} proc/mês")
         else:
             st.warning("⚠️ Selecione pelo menos uma empresa para simulação")
         
@@ -1449,11 +1313,9 @@ def main():
         
         # Prioridade 1: Empresas selecionadas com checkbox
         if st.session_state.empresas_selecionadas:
-            volume_total_selecionado = 0
-            for empresa_selecionada in st.session_state.empresas_selecionadas:
-                empresa_data = df_top.filter(pl.col('ÓRGÃO') == empresa_selecionada)
-                if len(empresa_data) > 0:
-                    volume_total_selecionado += empresa_data[0, 'volume_mensal']
+            volume_total_selecionado = (
+                df_top.filter(pl.col('EMPRESA_ID').is_in(st.session_state.empresas_selecionadas))['volume_mensal'].sum()
+            )
             
             volume_inicial = int(volume_total_selecionado)
             fonte_volume = f"🎯 Volume baseado em {len(st.session_state.empresas_selecionadas)} empresas selecionadas"
@@ -1597,15 +1459,12 @@ def main():
         st.subheader("💹 Impacto do Volume")
         
         # Gerar cenários de volume
-        volumes = range(500, min(50000, max(volume_simulacao * 3, 10000)), 500)
-        lucros = []
-        
-        for vol in volumes:
-            res = calcular_financas(vol, preco, custo_base, clientes, reinvestimento)
-            lucros.append(res['lucro_liquido'])
+        volumes, lucros = curva_lucro_volume(
+            min(50000, max(volume_simulacao * 3, 10000)), preco, custo_base, clientes, reinvestimento
+        )
         
         fig_sens = go.Figure()
-        fig_sens.add_trace(go.Scatter(x=list(volumes), y=lucros, mode='lines', name='Lucro Líquido'))
+        fig_sens.add_trace(go.Scatter(x=volumes, y=lucros, mode='lines', name='Lucro Líquido'))
         fig_sens.add_hline(y=0, line_dash="dash", line_color="red", annotation_text="Break-even")
         
         # Destacar volume atual
@@ -1629,15 +1488,10 @@ def main():
         st.subheader("💰 Impacto do Preço")
         
         # Gerar cenários de preço
-        precos = range(20, 101, 5)
-        lucros_preco = []
-        
-        for p in precos:
-            res = calcular_financas(volume_simulacao, p, custo_base, clientes, reinvestimento)
-            lucros_preco.append(res['lucro_liquido'])
+        precos, lucros_preco = curva_lucro_preco(volume_simulacao, custo_base, clientes, reinvestimento)
         
         fig_preco = go.Figure()
-        fig_preco.add_trace(go.Scatter(x=list(precos), y=lucros_preco, mode='lines', name='Lucro Líquido'))
+        fig_preco.add_trace(go.Scatter(x=precos, y=lucros_preco, mode='lines', name='Lucro Líquido'))
         fig_preco.add_hline(y=0, line_dash="dash", line_color="red", annotation_text="Break-even")
         
         # Destacar preço atual
@@ -1691,7 +1545,33 @@ def agrupar_por_empresa(df: pl.DataFrame) -> pl.DataFrame:
     # Detectar se existe coluna de CNPJ
     colunas_cnpj = [col for col in df.columns if 'CNPJ' in col.upper()]
     
-    if colunas_cnpj:
+    if 'EMPRESA_ID' in df.columns:
+        # ID da dimensão de empresas (CNPJ ou nome normalizado): group_by em inteiro
+        agregacoes = [
+            pl.col('ÓRGÃO').first().alias('ÓRGÃO'),
+            pl.col('NOVOS').sum().alias('NOVOS'),
+            pl.col('TRIBUNAL').first().alias('TRIBUNAL'),
+            pl.len().alias('REGISTROS_AGRUPADOS')
+        ]
+        
+        if 'PENDENTES BRUTO' in df.columns:
+            agregacoes.append(pl.col('PENDENTES BRUTO').sum().alias('PENDENTES BRUTO'))
+        
+        colunas_excluidas = ['EMPRESA_ID', 'ÓRGÃO', 'NOVOS', 'TRIBUNAL', 'PENDENTES BRUTO'] + colunas_cnpj
+        agregacoes.extend([
+            pl.col(col).first().alias(col) for col in df.columns
+            if col not in colunas_excluidas
+        ])
+        
+        df_agrupado = df.group_by('EMPRESA_ID').agg(agregacoes)
+        
+        total_original = len(df)
+        total_agrupado = len(df_agrupado)
+        
+        if total_agrupado < total_original:
+            st.info(f"🏢 Agrupamento por empresa: {total_original:,} → {total_agrupado:,} empresas únicas")
+        
+    elif colunas_cnpj:
         # Usar CNPJ para agrupamento (método mais preciso)
         coluna_cnpj = colunas_cnpj[0]  # Usar primeira coluna CNPJ encontrada
         
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🔀 TABULAÇÃO CRUZADA - GROUPING SETS / ROLLUP / CUBE
+
+Cruza 2 ou 3 dimensões com subtotais e total geral numa única passada pelos
+dados: uma pré-agregação por (dimensões, empresa) e, sobre ela, um group_by
+por conjunto de agrupamento, todos no mesmo plano lazy. A coluna
+id_agrupamento segue o GROUPING_ID do SQL: o bit de cada dimensão vale 1
+quando ela está totalizada (valor nulo = "todos").
+"""
+
+from itertools import combinations
+from typing import List, Optional, Tuple, Union
+
+import polars as pl
+
+
+def conjuntos_agrupamento(dimensoes: List[str], modo: str = 'cube') -> List[Tuple[str, ...]]:
+    """CUBE: todos os subconjuntos; ROLLUP: prefixos (hierarquia na ordem dada)"""
+    if modo == 'rollup':
+        return [tuple(dimensoes[:n]) for n in range(len(dimensoes), -1, -1)]
+    return [conjunto for n in range(len(dimensoes), -1, -1) for conjunto in combinations(dimensoes, n)]
+
+
+def _id_agrupamento(dimensoes: List[str], conjunto) -> int:
+    return sum(1 << (len(dimensoes) - 1 - i) for i, d in enumerate(dimensoes) if d not in conjunto)
+
+
+def tabulacao_cruzada(dados: Union[pl.DataFrame, pl.LazyFrame], dimensoes: List[str],
+                      coluna_volume: str = 'volume_mensal', chave_empresa: str = 'EMPRESA_ID',
+                      modo: str = 'cube', colunas_soma: Optional[List[str]] = None) -> pl.DataFrame:
+    """
+    Linhas de detalhe, subtotais e total geral com empresas (distintas),
+    soma do volume, volume médio por empresa e somas extras (ex.: NOVOS)
+    """
+    lf = dados.lazy() if isinstance(dados, pl.DataFrame) else dados
+    colunas = lf.collect_schema().names()
+    ausentes = [c for c in dimensoes + [coluna_volume, chave_empresa] if c not in colunas]
+    if ausentes:
+        raise ValueError(f"Colunas ausentes para a tabulação cruzada: {ausentes}")
+
+    somas = [coluna_volume] + [c for c in (colunas_soma or []) if c in colunas and c != coluna_volume]
+
+    # Pré-agregação única; os conjuntos de agrupamento reagregam este frame (bem menor)
+    base = (
+        lf.with_columns([pl.col(d).cast(pl.Utf8) for d in dimensoes])
+        .group_by(dimensoes + [chave_empresa])
+        .agg([pl.col(c).sum() for c in somas] + [pl.len().alias('registros')])
+    )
+
+    planos = []
+    for conjunto in conjuntos_agrupamento(dimensoes, modo):
+        agregacoes = [
+            pl.col(chave_empresa).n_unique().alias('empresas'),
+            *[pl.col(c).sum() for c in somas],
+            pl.col('registros').sum()
+        ]
+        plano = base.group_by(list(conjunto)).agg(agregacoes) if conjunto else base.select(agregacoes)
+        id_agrupamento = _id_agrupamento(dimensoes, conjunto)
+        plano = plano.with_columns(
+            [pl.lit(None, dtype=pl.Utf8).alias(d) for d in dimensoes if d not in conjunto]
+            + [pl.lit(id_agrupamento, dtype=pl.UInt8).alias('id_agrupamento')]
+        )
+        planos.append(plano.select(dimensoes + ['id_agrupamento', 'empresas'] + somas + ['registros']))
+
+    # Um só collect: o subplano comum (pré-agregação) é calculado uma vez
+    return (
+        pl.concat(planos)
+        .with_columns((pl.col(coluna_volume) / pl.col('empresas')).alias('volume_medio'))
+        .sort(['id_agrupamento'] + dimensoes, nulls_last=True)
+        .collect()
+    )
+
+
+def selecionar_conjunto(resultado: pl.DataFrame, dimensoes: List[str], conjunto: List[str]) -> pl.DataFrame:
+    """Linhas de um conjunto de agrupamento (ex.: só os subtotais por RAMO), sem as colunas totalizadas"""
+    id_agrupamento = _id_agrupamento(dimensoes, conjunto)
+    totalizadas = [d for d in dimensoes if d not in conjunto]
+    return resultado.filter(pl.col('id_agrupamento') == id_agrupamento).drop(totalizadas + ['id_agrupamento'])
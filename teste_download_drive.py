@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Teste do download_drive.py contra um servidor HTTP local no lugar do Drive:
+download em partes (Range), sequencial (sem Range), retomada de um download
+interrompido e uso do cache (inclusive com o remoto fora do ar).
+
+    python teste_download_drive.py
+"""
+
+import hashlib
+import io
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import download_drive
+from download_drive import CacheDownloads, ErroDownload, baixar
+from gerador_sintetico import gerar_dataset
+
+
+class ServidorArquivo:
+    """Serve um único arquivo em http://127.0.0.1:<porta>/arquivo, com ou sem suporte a Range"""
+
+    def __init__(self, conteudo: bytes, aceita_range: bool = True):
+        self.conteudo = conteudo
+        self.aceita_range = aceita_range
+        self.fora_do_ar = False
+        self.falhar_a_partir_de = None  # partes que começam neste byte ou depois respondem 500
+        self.requisicoes = []  # (Range pedido, status, bytes enviados)
+        self._trava = threading.Lock()
+
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                servidor._responder(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/arquivo"
+
+    def _responder(self, handler: BaseHTTPRequestHandler):
+        intervalo = handler.headers.get('Range')
+        if self.fora_do_ar:
+            return self._enviar(handler, intervalo, 503, b'', {})
+        total = len(self.conteudo)
+        pedido = re.fullmatch(r'bytes=(\d+)-(\d*)', intervalo or '')
+        if self.aceita_range and pedido:
+            inicio = int(pedido.group(1))
+            fim = min(int(pedido.group(2) or total - 1), total - 1)
+            if self.falhar_a_partir_de is not None and inicio >= self.falhar_a_partir_de:
+                return self._enviar(handler, intervalo, 500, b'', {})
+            return self._enviar(handler, intervalo, 206, self.conteudo[inicio:fim + 1],
+                                {'Content-Range': f'bytes {inicio}-{fim}/{total}'})
+        return self._enviar(handler, intervalo, 200, self.conteudo, {})
+
+    def _enviar(self, handler, intervalo, status, corpo, cabecalhos):
+        with self._trava:
+            self.requisicoes.append((intervalo, status, len(corpo)))
+        handler.send_response(status)
+        handler.send_header('Content-Type', 'application/octet-stream')
+        handler.send_header('Content-Length', str(len(corpo)))
+        handler.send_header('ETag', '"v1"')
+        for nome, valor in cabecalhos.items():
+            handler.send_header(nome, valor)
+        handler.end_headers()
+        handler.wfile.write(corpo)
+
+    def bytes_enviados(self) -> int:
+        return sum(n for _, status, n in self.requisicoes if status in (200, 206))
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@contextmanager
+def ambiente_teste():
+    """Partes pequenas, uma tentativa por parte e cache num diretório temporário"""
+    originais = download_drive.TAMANHO_PARTE, download_drive.TENTATIVAS_POR_PARTE
+    download_drive.TAMANHO_PARTE, download_drive.TENTATIVAS_POR_PARTE = 64 * 1024, 1
+    try:
+        with tempfile.TemporaryDirectory() as diretorio:
+            yield CacheDownloads(Path(diretorio) / 'cache')
+    finally:
+        download_drive.TAMANHO_PARTE, download_drive.TENTATIVAS_POR_PARTE = originais
+
+
+def parquet_de_teste() -> bytes:
+    buffer = io.BytesIO()
+    gerar_dataset(20000, n_empresas=500).write_parquet(buffer)
+    return buffer.getvalue()
+
+
+CONTEUDO = parquet_de_teste()
+SHA256 = hashlib.sha256(CONTEUDO).hexdigest()
+
+
+def test_download_em_partes():
+    with ambiente_teste() as cache, ServidorArquivo(CONTEUDO) as servidor:
+        caminho = baixar([servidor.url], 'teste', cache=cache, partes_paralelas=4, sha256_esperado=SHA256)
+        assert caminho.read_bytes() == CONTEUDO
+        partes = [r for r in servidor.requisicoes if r[1] == 206 and r[0] != 'bytes=0-0']
+        assert len(partes) == -(-len(CONTEUDO) // download_drive.TAMANHO_PARTE)
+
+
+def test_download_sem_range():
+    with ambiente_teste() as cache, ServidorArquivo(CONTEUDO, aceita_range=False) as servidor:
+        caminho = baixar([servidor.url], 'teste', cache=cache, sha256_esperado=SHA256)
+        assert caminho.read_bytes() == CONTEUDO
+        assert all(status == 200 for _, status, _ in servidor.requisicoes)
+
+
+def test_retomada():
+    with ambiente_teste() as cache, ServidorArquivo(CONTEUDO) as servidor:
+        servidor.falhar_a_partir_de = len(CONTEUDO) // 2
+        try:
+            baixar([servidor.url], 'teste', cache=cache, partes_paralelas=1)
+            raise AssertionError('o download interrompido deveria falhar')
+        except ErroDownload:
+            pass
+        primeira = servidor.bytes_enviados()
+        assert 0 < primeira < len(CONTEUDO)
+
+        servidor.falhar_a_partir_de = None
+        servidor.requisicoes.clear()
+        caminho = baixar([servidor.url], 'teste', cache=cache, partes_paralelas=4, sha256_esperado=SHA256)
+        assert caminho.read_bytes() == CONTEUDO
+        # Só o que faltava (+1 byte da sondagem) foi pedido de novo
+        assert servidor.bytes_enviados() == len(CONTEUDO) - (primeira - 1) + 1
+
+
+def test_cache():
+    with ambiente_teste() as cache, ServidorArquivo(CONTEUDO) as servidor:
+        caminho = baixar([servidor.url], 'teste', cache=cache)
+
+        servidor.requisicoes.clear()
+        assert baixar([servidor.url], 'teste', cache=cache) == caminho
+        assert servidor.requisicoes == [('bytes=0-0', 206, 1)]
+
+        # Remoto fora do ar: a cópia em cache é usada
+        servidor.fora_do_ar = True
+        assert baixar([servidor.url], 'teste', cache=cache) == caminho
+        try:
+            baixar([servidor.url], 'teste', cache=cache, forcar=True)
+            raise AssertionError('forcar=True não deveria cair no cache')
+        except ErroDownload:
+            pass
+
+
+if __name__ == '__main__':
+    print(f"🧪 Testando download_drive.py contra servidor local ({len(CONTEUDO) / 1024:.0f}KB)...")
+    for teste in (test_download_em_partes, test_download_sem_range, test_retomada, test_cache):
+        teste()
+        print(f"✅ {teste.__name__}")
+    print("🎉 Todos os testes passaram")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🧾 VALIDAÇÃO DE PARQUET PELO RODAPÉ - SEM DECODIFICAR PÁGINAS DE DADOS
+
+Tudo o que a carga precisa saber antes de ler o arquivo está nos metadados
+do rodapé: assinatura PAR1, metadados legíveis, total de linhas, grupos de
+linhas e schema. A validação lê só o fim do arquivo (alguns KB), então vale
+para arquivos de vários GB em milissegundos.
+
+Usa pyarrow quando instalado; sem ele, o schema vem de pl.read_parquet_schema
+e o total de linhas do atalho de metadados do Polars para pl.len().
+"""
+
+import hashlib
+import os
+import re
+import struct
+from pathlib import Path
+from typing import Dict, List, Sequence, Union
+
+import polars as pl
+
+try:
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIVEL = True
+except ImportError:
+    PYARROW_DISPONIVEL = False
+
+MAGICO_PARQUET = b'PAR1'
+
+# Colunas sem as quais o simulador não funciona; tupla = alternativas (basta uma)
+COLUNAS_OBRIGATORIAS: List[Union[str, tuple]] = [
+    'NOVOS',
+    'TRIBUNAL',
+    ('NOME', 'EMPRESA', 'ÓRGÃO', 'ORGAO'),
+]
+
+
+class ParquetInvalido(ValueError):
+    """Arquivo truncado, corrompido ou sem as colunas obrigatórias"""
+
+
+def ler_rodape(caminho: Union[str, Path]) -> bytes:
+    """Bytes dos metadados do rodapé, conferindo PAR1 no início e no fim"""
+    caminho = Path(caminho)
+    tamanho = caminho.stat().st_size
+    if tamanho < 12:
+        raise ParquetInvalido(f"Arquivo pequeno demais para ser Parquet ({tamanho} bytes)")
+    with open(caminho, 'rb') as f:
+        if f.read(4) != MAGICO_PARQUET:
+            raise ParquetInvalido("Assinatura PAR1 ausente no início")
+        f.seek(-8, os.SEEK_END)
+        comprimento_rodape, magico = struct.unpack('<I4s', f.read(8))
+        if magico != MAGICO_PARQUET:
+            raise ParquetInvalido("Assinatura PAR1 ausente no fim (download incompleto?)")
+        if comprimento_rodape > tamanho - 12:
+            raise ParquetInvalido(f"Rodapé inválido ({comprimento_rodape} bytes num arquivo de {tamanho})")
+        f.seek(-(8 + comprimento_rodape), os.SEEK_END)
+        return f.read(comprimento_rodape)
+
+
+def hash_rodape_parquet(caminho: Union[str, Path]) -> str:
+    """SHA-256 do rodapé (metadados + tamanho do arquivo), que identifica o conteúdo"""
+    rodape = ler_rodape(caminho)
+    return hashlib.sha256(rodape + struct.pack('<Q', Path(caminho).stat().st_size)).hexdigest()
+
+
+def metadados_parquet(caminho: Union[str, Path]) -> Dict:
+    """Linhas, grupos de linhas e schema lidos só do rodapé"""
+    caminho = str(caminho)
+    try:
+        if PYARROW_DISPONIVEL:
+            metadados = pq.read_metadata(caminho)
+            schema = metadados.schema.to_arrow_schema()
+            return {
+                'linhas': metadados.num_rows,
+                'grupos_linhas': metadados.num_row_groups,
+                'colunas': {campo.name: str(campo.type) for campo in schema},
+            }
+        schema = pl.read_parquet_schema(caminho)
+        return {
+            # select(pl.len()) num scan de Parquet é respondido pelos metadados
+            'linhas': pl.scan_parquet(caminho).select(pl.len()).collect().item(),
+            'grupos_linhas': None,
+            'colunas': {nome: str(tipo) for nome, tipo in schema.items()},
+        }
+    except Exception as e:
+        raise ParquetInvalido(f"Metadados do rodapé ilegíveis: {e}") from e
+
+
+def _chave_coluna(nome: str) -> str:
+    # Só letras/dígitos ASCII: 'ÓRGÃO' e a versão mal codificada ('�RG�O') viram 'RGO'
+    return re.sub(r'[^A-Z0-9]', '', nome.upper())
+
+
+def colunas_ausentes(colunas: Sequence[str], obrigatorias: Sequence[Union[str, tuple]]) -> List[str]:
+    """Obrigatórias sem correspondência (alternativas aparecem como 'A|B|C')"""
+    presentes = {_chave_coluna(c) for c in colunas}
+    ausentes = []
+    for obrigatoria in obrigatorias:
+        alternativas = obrigatoria if isinstance(obrigatoria, tuple) else (obrigatoria,)
+        if not any(_chave_coluna(a) in presentes for a in alternativas):
+            ausentes.append('|'.join(alternativas))
+    return ausentes
+
+
+def validar_parquet(caminho: Union[str, Path],
+                    colunas_obrigatorias: Sequence[Union[str, tuple]] = COLUNAS_OBRIGATORIAS) -> Dict:
+    """
+    Assinatura, rodapé, total de linhas e colunas obrigatórias, sem ler páginas
+    de dados. Devolve os metadados (mais 'tamanho' e 'hash_rodape') ou levanta
+    ParquetInvalido.
+    """
+    hash_rodape = hash_rodape_parquet(caminho)
+    info = metadados_parquet(caminho)
+    ausentes = colunas_ausentes(list(info['colunas']), colunas_obrigatorias or [])
+    if ausentes:
+        raise ParquetInvalido(
+            f"Colunas obrigatórias ausentes: {', '.join(ausentes)} "
+            f"(disponíveis: {', '.join(info['colunas'])})"
+        )
+    info['tamanho'] = Path(caminho).stat().st_size
+    info['hash_rodape'] = hash_rodape
+    return info
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='Valida um Parquet pelo rodapé (sem ler os dados)')
+    parser.add_argument('arquivos', nargs='+')
+    args = parser.parse_args()
+
+    for arquivo in args.arquivos:
+        inicio = time.perf_counter()
+        try:
+            info = validar_parquet(arquivo)
+            print(f"✅ {arquivo}: {info['linhas']:,} linhas, {len(info['colunas'])} colunas, "
+                  f"{info['tamanho'] / 1024**2:.1f}MB ({(time.perf_counter() - inicio) * 1000:.1f}ms)")
+        except (ParquetInvalido, OSError) as e:
+            print(f"❌ {arquivo}: {e}")
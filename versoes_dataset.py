@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+🔄 VERSÕES DO DATASET - TROCA A QUENTE SEM DOWNTIME
+
+Cada carga de dados (ex.: novo extrato mensal do CNJ) gera uma nova versão
+imutável. A versão nova é carregada e indexada por fora e só então publicada
+numa troca atômica; requisições em andamento continuam na versão que
+adquiriram, e versões antigas são liberadas quando ninguém mais as referencia.
+"""
+
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Optional
+
+import polars as pl
+
+from log_estruturado import obter_logger
+
+log = obter_logger('versoes')
+
+
+class VersaoDataset:
+    """Snapshot imutável dos dados carregados, com cache próprio"""
+
+    def __init__(self, numero: int, df: pl.DataFrame, df_cnae: Optional[pl.DataFrame] = None,
+                 origem: str = '', indices: Optional[Dict] = None):
+        self.numero = numero
+        self.df = df
+        self.df_cnae = df_cnae
+        self.origem = origem
+        # Estruturas construídas na carga junto com os dados (ex.: dimensão de empresas)
+        self.indices: Dict = indices or {}
+        self.criado_em = datetime.now()
+        # Cache de resultados derivados desta versão (chaveado implicitamente pela versão)
+        self.cache: Dict = {}
+        self._cache_lock = threading.Lock()
+        self._referencias = 0
+
+    @property
+    def total_registros(self) -> int:
+        return len(self.df) if self.df is not None else 0
+
+    def obter_cache(self, chave, calcular):
+        """Retorna valor do cache da versão, calculando na primeira vez"""
+        with self._cache_lock:
+            if chave in self.cache:
+                return self.cache[chave]
+        valor = calcular()
+        with self._cache_lock:
+            return self.cache.setdefault(chave, valor)
+
+    def liberar_memoria(self):
+        """Solta as referências aos DataFrames para o coletor liberar a memória"""
+        # Índices com recursos fora do processo (ex.: tabela no DuckDB) são descartados junto
+        for nome, indice in self.indices.items():
+            descartar = getattr(indice, 'descartar', None)
+            if descartar is None:
+                continue
+            try:
+                descartar()
+            except Exception as e:
+                log.warning('⚠️ Falha ao descartar índice da versão',
+                            extra={'versao': self.numero, 'indice': nome, 'erro': str(e)})
+        self.df = None
+        self.df_cnae = None
+        self.indices = {}
+        with self._cache_lock:
+            self.cache.clear()
+
+    def resumo(self) -> Dict:
+        return {
+            'versao': self.numero,
+            'origem': self.origem,
+            'total_registros': self.total_registros,
+            'criado_em': self.criado_em.isoformat(timespec='seconds'),
+            'referencias': self._referencias
+        }
+
+
+class RegistroVersoes:
+    """Mantém a versão atual e as versões antigas ainda em uso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._atual: Optional[VersaoDataset] = None
+        self._antigas: Dict[int, VersaoDataset] = {}
+        self._proximo_numero = 1
+
+    @property
+    def atual(self) -> Optional[VersaoDataset]:
+        return self._atual
+
+    def publicar(self, df: pl.DataFrame, df_cnae: Optional[pl.DataFrame] = None,
+                 origem: str = '', indices: Optional[Dict] = None) -> VersaoDataset:
+        """Publica uma nova versão numa troca atômica"""
+        with self._lock:
+            nova = VersaoDataset(self._proximo_numero, df, df_cnae, origem, indices)
+            self._proximo_numero += 1
+            anterior = self._atual
+            self._atual = nova
+            if anterior is not None:
+                if anterior._referencias > 0:
+                    # Ainda há requisições usando a versão anterior
+                    self._antigas[anterior.numero] = anterior
+                else:
+                    anterior.liberar_memoria()
+
+        log.info('🔄 Versão publicada', extra={'versao': nova.numero, 'registros': nova.total_registros,
+                                              'origem': origem})
+        return nova
+
+    def adquirir(self) -> Optional[VersaoDataset]:
+        """Fixa a versão atual para uso de uma requisição"""
+        with self._lock:
+            versao = self._atual
+            if versao is not None:
+                versao._referencias += 1
+            return versao
+
+    def liberar(self, versao: Optional[VersaoDataset]):
+        """Libera a versão fixada; versões antigas sem uso são descartadas"""
+        if versao is None:
+            return
+        with self._lock:
+            versao._referencias = max(0, versao._referencias - 1)
+            descartar = versao is not self._atual and versao._referencias == 0
+            if descartar:
+                self._antigas.pop(versao.numero, None)
+        if descartar:
+            versao.liberar_memoria()
+            log.info('🧹 Versão liberada da memória', extra={'versao': versao.numero})
+
+    @contextmanager
+    def usar(self):
+        """Context manager: fixa a versão atual durante o bloco"""
+        versao = self.adquirir()
+        try:
+            yield versao
+        finally:
+            self.liberar(versao)
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                'atual': self._atual.resumo() if self._atual else None,
+                'antigas_em_uso': [v.resumo() for v in self._antigas.values()]
+            }